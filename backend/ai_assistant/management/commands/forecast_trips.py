@@ -0,0 +1,84 @@
+"""
+Management command: forecast_trips
+==================================
+Recalcule en lot les prévisions de remplissage (TripIntelligenceSnapshot) de
+tous les voyages programmés sur l'horizon demandé.
+
+Usage:
+    python manage.py forecast_trips                  # 14 jours par défaut
+    python manage.py forecast_trips --company=3      # seulement la compagnie 3
+    python manage.py forecast_trips --benchmark      # mesure sur historique synthétique
+
+À planifier par exemple toutes les heures :
+    0 * * * * /path/to/venv/bin/python /path/to/manage.py forecast_trips
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from ai_assistant.forecasting import (
+    FORECAST_HORIZON_DAYS,
+    HISTORY_DAYS,
+    benchmark_forecast,
+    forecast_scheduled_trips,
+    upcoming_scheduled_trips,
+)
+
+
+class Command(BaseCommand):
+    help = 'Prévoit le remplissage de tous les voyages à venir en un seul calcul groupé.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=FORECAST_HORIZON_DAYS,
+            help=f'Horizon en jours à partir d\'aujourd\'hui (défaut: {FORECAST_HORIZON_DAYS}).',
+        )
+        parser.add_argument(
+            '--history-days',
+            type=int,
+            default=HISTORY_DAYS,
+            help=f'Profondeur de l\'historique utilisé (défaut: {HISTORY_DAYS}).',
+        )
+        parser.add_argument(
+            '--company',
+            type=int,
+            default=None,
+            help='Limiter à une compagnie spécifique (ID).',
+        )
+        parser.add_argument(
+            '--benchmark',
+            action='store_true',
+            help='Mesurer le calcul vectorisé sur un historique synthétique, sans écrire en base.',
+        )
+        parser.add_argument(
+            '--trips',
+            type=int,
+            default=500,
+            help='Nombre de trajets synthétiques pour --benchmark (défaut: 500).',
+        )
+
+    def handle(self, *args, **options):
+        if options['benchmark']:
+            result = benchmark_forecast(
+                trips=options['trips'],
+                departures_per_trip=options['history_days'],
+            )
+            self.stdout.write(
+                f"{result['forecasts']} prévisions sur {result['history_departures']} départs historiques : "
+                f"NumPy {result['vectorized_ms']} ms, boucle Python {result['python_loop_ms']} ms "
+                f"(x{result['speedup']}, écart max {result['max_abs_difference']:.2e})."
+            )
+            return
+
+        started = time.perf_counter()
+        snapshots = forecast_scheduled_trips(
+            upcoming_scheduled_trips(days=options['days'], company_id=options.get('company')),
+            history_days=options['history_days'],
+        )
+        elapsed = (time.perf_counter() - started) * 1000
+        self.stdout.write(
+            self.style.SUCCESS(f'{len(snapshots)} prévision(s) mise(s) à jour en {elapsed:.0f} ms.')
+        )
@@ -15,6 +15,7 @@ from unidecode import unidecode
 from transport.models import Booking, City, Company, Notification, Review, ScheduledTrip
 from transport.serializers import ScheduledTripSerializer
 
+from .forecasting import forecast_scheduled_trips
 from .models import (
     AIInteractionLog,
     BookingRiskAssessment,
@@ -472,48 +473,15 @@ def answer_ticket_question(booking, question, user):
 
 
 def forecast_trip(scheduled_trip):
-    capacity = max(scheduled_trip.trip.capacity, 1)
-    current_bookings = Booking.objects.filter(
-        scheduled_trip=scheduled_trip,
-        status__in=["pending", "confirmed"],
-    ).count()
-    current_rate = min(current_bookings / capacity, 1)
-    historical = (
-        ScheduledTrip.objects.filter(
-            trip=scheduled_trip.trip,
-            date__lt=scheduled_trip.date,
-            date__gte=scheduled_trip.date - timedelta(days=120),
-        )
-        .annotate(
-            booked=Count(
-                "bookings",
-                filter=Q(bookings__status__in=["pending", "confirmed"]),
-            )
-        )
+    forecast_scheduled_trips(
+        ScheduledTrip.objects.filter(pk=scheduled_trip.pk),
+        today=min(timezone.localdate(), scheduled_trip.date),
     )
-    historical_rates = [min(item.booked / capacity, 1) for item in historical]
-    historical_rate = sum(historical_rates) / len(historical_rates) if historical_rates else current_rate
-    days_left = max((scheduled_trip.date - timezone.localdate()).days, 0)
-    progress = max(0.2, min(1.0, 1 - days_left / 14))
-    projected = max(current_rate, min(1.0, current_rate / progress))
-    predicted_rate = min(1.0, projected * 0.65 + historical_rate * 0.35)
-    confidence = min(0.9, 0.35 + len(historical_rates) * 0.07)
-
-    snapshot, _ = TripIntelligenceSnapshot.objects.get_or_create(scheduled_trip=scheduled_trip)
-    predicted_delay = snapshot.reported_delay_minutes
-    snapshot.predicted_occupancy_rate = round(predicted_rate * 100, 2)
-    snapshot.predicted_delay_minutes = predicted_delay
-    snapshot.confidence = round((0.9 if snapshot.reported_delay_minutes else confidence) * 100, 2)
-    snapshot.signals = {
-        "current_occupancy_rate": round(current_rate * 100, 2),
-        "historical_samples": len(historical_rates),
-        "delay_source": "reported" if snapshot.reported_delay_minutes else "no_live_signal",
-    }
-    snapshot.save()
+    snapshot = TripIntelligenceSnapshot.objects.get(scheduled_trip=scheduled_trip)
     return {
         "scheduled_trip_id": scheduled_trip.id,
         "occupancy_forecast_percent": float(snapshot.predicted_occupancy_rate),
-        "current_occupancy_percent": round(current_rate * 100, 2),
+        "current_occupancy_percent": snapshot.signals.get("current_occupancy_rate", 0),
         "predicted_delay_minutes": snapshot.predicted_delay_minutes,
         "reported_delay_minutes": snapshot.reported_delay_minutes,
         "confidence_percent": float(snapshot.confidence),
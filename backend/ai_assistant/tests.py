@@ -1,8 +1,10 @@
 from datetime import time, timedelta
 from decimal import Decimal
+from io import StringIO
 
 from django.contrib.auth.models import User
 from django.core.cache import cache
+from django.core.management import call_command
 from django.test import override_settings
 from django.utils import timezone
 from rest_framework.authtoken.models import Token
@@ -11,6 +13,7 @@ from rest_framework.test import APITestCase
 from guichet.models import Agence
 from transport.models import Booking, City, Company, ScheduledTrip, Trip
 
+from .forecasting import forecast_scheduled_trips, upcoming_scheduled_trips
 from .models import BookingRiskAssessment, TripIntelligenceSnapshot
 from .services import parse_natural_search
 
@@ -231,3 +234,62 @@ class AIAssistantApiTests(APITestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.data["booking_id"], self.booking.id)
         self.assertTrue(BookingRiskAssessment.objects.filter(booking=self.booking).exists())
+
+    def _past_departure_with_bookings(self, days_ago, early, late):
+        departure = ScheduledTrip.objects.create(
+            trip=self.trip,
+            date=timezone.localdate() - timedelta(days=days_ago),
+            available_seats=50,
+        )
+        for index in range(early + late):
+            booking = Booking.objects.create(
+                trip=self.trip,
+                scheduled_trip=departure,
+                passenger_name=f"Historique {index}",
+                passenger_email="historique@example.test",
+                passenger_phone="22890000009",
+                seat_number=str(index + 1),
+                status="confirmed",
+                payment_method="cash",
+                total_price=Decimal("7500"),
+            )
+            lead_days = 5 if index < early else 0
+            Booking.objects.filter(pk=booking.pk).update(
+                booking_date=timezone.make_aware(
+                    timezone.datetime.combine(departure.date - timedelta(days=lead_days), time(10, 0))
+                )
+            )
+        return departure
+
+    def test_batch_forecast_uses_booking_curve_pickup_and_keeps_reported_delay(self):
+        self._past_departure_with_bookings(7, early=4, late=6)
+        self._past_departure_with_bookings(14, early=4, late=6)
+        TripIntelligenceSnapshot.objects.create(
+            scheduled_trip=self.scheduled_trip,
+            reported_delay_minutes=20,
+        )
+
+        snapshots = forecast_scheduled_trips(upcoming_scheduled_trips(days=14))
+
+        self.assertEqual(len(snapshots), ScheduledTrip.objects.filter(
+            date__gte=timezone.localdate(),
+            date__lte=timezone.localdate() + timedelta(days=14),
+        ).count())
+        snapshot = TripIntelligenceSnapshot.objects.get(scheduled_trip=self.scheduled_trip)
+        # Pickup attendu à J-1 : 10 places finales - 4 déjà vendues = 6.
+        # (1 + 6) / 50 * 0.65 + 10 / 50 * 0.35 = 16.1 %
+        self.assertEqual(float(snapshot.predicted_occupancy_rate), 16.1)
+        self.assertEqual(snapshot.signals["model"], "pickup")
+        self.assertEqual(snapshot.signals["historical_samples"], 2)
+        self.assertEqual(snapshot.reported_delay_minutes, 20)
+        self.assertEqual(snapshot.predicted_delay_minutes, 20)
+        self.assertEqual(float(snapshot.confidence), 90.0)
+
+    def test_forecast_trips_command_updates_snapshots_in_batch(self):
+        call_command("forecast_trips", "--days", "14", stdout=StringIO())
+        self.assertTrue(TripIntelligenceSnapshot.objects.filter(scheduled_trip=self.scheduled_trip).exists())
+
+        self.authenticate(self.company_admin)
+        response = self.client.get(f"/api/ai/trips/{self.scheduled_trip.id}/insights/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["current_occupancy_percent"], 2.0)
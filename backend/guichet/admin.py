@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Agence, AgentGuichet, Guichet, VenteGuichet, ControlePassager
+from .models import Agence, AgentGuichet, CompteurAgentJour, Guichet, SessionCaisse, VenteGuichet, ControlePassager
 
 
 @admin.register(Agence)
@@ -28,3 +28,21 @@ class VenteGuichetAdmin(admin.ModelAdmin):
 @admin.register(ControlePassager)
 class ControlePassagerAdmin(admin.ModelAdmin):
     list_display = ('id','agent','voyage','resultat','created_at')
+
+
+@admin.register(CompteurAgentJour)
+class CompteurAgentJourAdmin(admin.ModelAdmin):
+    list_display = ('agent','jour','billets_cash','billets_flooz','billets_tmoney','controles','updated_at')
+    list_filter = ('jour',)
+
+
+@admin.register(SessionCaisse)
+class SessionCaisseAdmin(admin.ModelAdmin):
+    list_display = ('guichet','agence','statut','ouverte_at','fermee_at','montant_cash','especes_declarees','ecart')
+    list_filter = ('statut','compagnie','agence')
+
+    def get_readonly_fields(self, request, obj=None):
+        # Une session clôturée est un rapport figé.
+        if obj is not None and obj.statut == SessionCaisse.STATUT_FERMEE:
+            return [field.name for field in obj._meta.fields]
+        return super().get_readonly_fields(request, obj)
@@ -0,0 +1,307 @@
+"""Embarquement hors ligne : manifeste par voyage et synchronisation des scans.
+
+Le manifeste liste tous les billets d'un voyage, tous canaux confondus, à
+partir de ``TicketIndex``. Sa version est l'horodatage de la dernière ligne
+modifiée ; un appareil qui renvoie ``since`` ne reçoit que les lignes
+modifiées depuis (avec une marge de recouvrement, l'appareil fusionne par
+clé). Un billet supprimé ou déplacé vers un autre voyage laisse une pierre
+tombale (``TicketRemoval``) : la version avance et le différentiel le liste
+dans ``removed`` pour que l'appareil l'efface.
+
+Les scans faits hors ligne sont renvoyés par lots. Dans un lot, pour un même
+billet, le scan le plus ancien (puis l'appareil, puis l'identifiant de scan)
+gagne ; les autres deviennent ``deja_utilise``. Un ``scan_id`` déjà reçu
+renvoie le résultat enregistré sans rien réécrire. L'heure de scan annoncée
+par l'appareil est ramenée entre le premier téléchargement du manifeste du
+voyage par l'agent et la réception du lot : une horloge fausse ou un scan
+antidaté ne passe pas devant les autres.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from transport.models import Booking, Reservation, TicketIndex, TicketRemoval
+from transport.services.ticket_tokens import (
+    ExpiredTicketToken,
+    InvalidTicketToken,
+    used_tickets,
+    verify_ticket,
+)
+from transport.ticketing import boarding_state, sync_ticket_index
+
+from .compteurs import compter_controles
+from .models import ControlePassager, VenteGuichet
+
+
+MANIFEST_COLUMNS = ['source', 'id', 'seat', 'reference', 'client', 'state', 'token']
+MANIFEST_OVERLAP = timedelta(seconds=30)
+MAX_OFFLINE_SCANS = 500
+MANIFEST_SEEN_SECONDS = 7 * 24 * 3600
+MESSAGES = {
+    'valide': 'Billet valide',
+    'deja_utilise': 'Billet déjà utilisé',
+}
+
+
+def encode_version(moment):
+    return int(moment.timestamp() * 1_000_000) if moment else 0
+
+
+def decode_version(value):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    if value <= 0:
+        return None
+    return datetime.fromtimestamp(value / 1_000_000, tz=dt_timezone.utc)
+
+
+def boarding_manifest(voyage, since=None):
+    """Manifeste compact d'un voyage, complet ou différentiel depuis ``since``."""
+    rows = TicketIndex.objects.filter(voyage=voyage)
+    removals = TicketRemoval.objects.filter(voyage=voyage)
+    version = encode_version(max(
+        filter(None, [
+            rows.aggregate(latest=Max('indexed_at'))['latest'],
+            removals.aggregate(latest=Max('removed_at'))['latest'],
+        ]),
+        default=None,
+    ))
+    changed_since = decode_version(since)
+    removed = []
+    if changed_since is not None:
+        rows = rows.filter(indexed_at__gte=changed_since - MANIFEST_OVERLAP)
+        current = set(TicketIndex.objects.filter(voyage=voyage).values_list('source', 'source_id'))
+        removed = [
+            [source, source_id]
+            for source, source_id in removals.filter(
+                removed_at__gte=changed_since - MANIFEST_OVERLAP,
+            ).order_by('removed_at', 'id').values_list('source', 'source_id')
+            if (source, source_id) not in current
+        ]
+    tickets = [
+        [
+            source,
+            source_id,
+            seat,
+            reference,
+            client_name,
+            boarding_state(payload),
+            payload.get('qr_token'),
+        ]
+        for source, source_id, seat, reference, client_name, payload in rows.order_by('seat', 'id').values_list(
+            'source', 'source_id', 'seat', 'reference', 'client_name', 'payload',
+        )
+    ]
+    return {
+        'voyage_id': voyage.id,
+        'version': version,
+        'full': changed_since is None,
+        'columns': MANIFEST_COLUMNS,
+        'tickets': tickets,
+        'removed': removed,
+    }
+
+
+def _manifest_key(agent_id, voyage_id):
+    return f'guichet:manifeste:{agent_id}:{voyage_id}'
+
+
+def record_manifest_download(agent, voyage):
+    """Retient le premier téléchargement du manifeste par l'agent, borne basse de ses scans."""
+    cache.add(_manifest_key(agent.pk, voyage.pk), timezone.now(), MANIFEST_SEEN_SECONDS)
+
+
+def _parse_scan(agent, index, scan, received_at):
+    if not isinstance(scan, dict):
+        return {'index': index, 'error': 'Scan invalide'}
+    scan_id = str(scan.get('scan_id') or '').strip()
+    if not scan_id or len(scan_id) > 64:
+        return {'index': index, 'error': 'scan_id manquant ou trop long'}
+    parsed = {
+        'index': index,
+        'scan_id': scan_id,
+        'device_id': str(scan.get('device_id') or '').strip()[:64],
+        'scanned_at': received_at,
+        'token': None,
+        'error': None,
+    }
+    try:
+        scanned_at = parse_datetime(str(scan.get('scanned_at') or '')) or received_at
+    except ValueError:
+        # Format reconnu mais date impossible (mois 13...) : ce scan seul est invalide.
+        parsed['error'] = 'Date de scan invalide'
+        return parsed
+    if timezone.is_naive(scanned_at):
+        scanned_at = timezone.make_aware(scanned_at)
+    scanned_at = parsed['scanned_at'] = min(scanned_at, received_at)
+    try:
+        parsed['token'] = verify_ticket(str(scan.get('qr_code_data') or ''), agent.compagnie_id, now=scanned_at)
+    except ExpiredTicketToken as exc:
+        parsed['token'] = exc.token
+        parsed['error'] = str(exc)
+    except InvalidTicketToken as exc:
+        parsed['error'] = str(exc)
+    return parsed
+
+
+def _clamp_to_manifests(agent, parsed):
+    """Ramène au premier téléchargement du manifeste les scans datés d'avant."""
+    scans = [scan for scan in parsed if scan.get('token')]
+    floors = cache.get_many(list({_manifest_key(agent.pk, scan['token'].voyage_id) for scan in scans}))
+    for scan in scans:
+        floor = floors.get(_manifest_key(agent.pk, scan['token'].voyage_id))
+        if floor is None or scan['scanned_at'] >= floor:
+            continue
+        scan['scanned_at'] = floor
+        if not scan['error'] and floor.timestamp() > scan['token'].expires_at:
+            scan['error'] = str(ExpiredTicketToken(scan['token']))
+
+
+def _result(scan, resultat, message, state=None):
+    token = scan.get('token')
+    return {
+        'scan_id': scan.get('scan_id'),
+        'resultat': resultat,
+        'message': message,
+        'source': token.source if token else None,
+        'ticket_id': token.ticket_id if token else None,
+        'reference': state['reference'] if state else None,
+        'numero_siege': token.seat if token else None,
+    }
+
+
+def _lock_tickets(keys):
+    """Verrouille les billets concernés, comme le scanner en ligne."""
+    for source, model in (('booking', Booking.all_objects), ('mobile', Reservation.objects), ('guichet', VenteGuichet.objects)):
+        pks = [pk for key_source, pk in keys if key_source == source]
+        if pks:
+            list(model.select_for_update().filter(pk__in=pks).values_list('pk', flat=True))
+
+
+def _ticket_states(agent, keys):
+    condition = Q(pk__in=[])
+    for source in {source for source, _ in keys}:
+        condition |= Q(source=source, source_id__in=[pk for key_source, pk in keys if key_source == source])
+    return {
+        (source, source_id): {
+            'voyage_id': voyage_id,
+            'reference': reference,
+            'state': boarding_state(payload),
+        }
+        for source, source_id, voyage_id, reference, payload in TicketIndex.objects.filter(
+            condition,
+            company_id=agent.compagnie_id,
+        ).values_list('source', 'source_id', 'voyage_id', 'reference', 'payload')
+    }
+
+
+def _replay_scans(pending, results):
+    for control in ControlePassager.objects.filter(scan_id__in=list(pending)):
+        scan = pending.pop(control.scan_id)
+        results[scan['index']] = {**_result(scan, control.resultat, control.message), 'rejoue': True}
+
+
+@transaction.atomic
+def _record_scans(agent, pending, results):
+    keys = {(scan['token'].source, scan['token'].ticket_id) for scan in pending.values() if scan['token']}
+    _lock_tickets(keys)
+    states = _ticket_states(agent, keys)
+    consumed = {key for key, state in states.items() if state['state'] == 'used'}
+    controls = []
+    winners = []
+    boarded = []
+    ordered = sorted(pending.values(), key=lambda scan: (scan['scanned_at'], scan['device_id'], scan['scan_id']))
+    for scan in ordered:
+        token = scan['token']
+        if token is None:
+            results[scan['index']] = _result(scan, 'invalide', scan['error'])
+            continue
+        key = (token.source, token.ticket_id)
+        state = states.get(key)
+        if scan['error']:
+            resultat, message = 'invalide', scan['error']
+        elif state is None:
+            resultat, message = 'invalide', 'Billet introuvable'
+        elif state['voyage_id'] != token.voyage_id:
+            resultat, message = 'invalide', 'Billet rattaché à un autre voyage'
+        elif key in consumed:
+            resultat, message = 'deja_utilise', MESSAGES['deja_utilise']
+        elif state['state'] == 'invalid':
+            resultat, message = 'invalide', 'Billet annulé ou non payé'
+        else:
+            resultat, message = 'valide', MESSAGES['valide']
+            consumed.add(key)
+            winners.append(key)
+        results[scan['index']] = _result(scan, resultat, message, state)
+        if resultat != 'invalide':
+            boarded.append(token)
+        if state is None or state['voyage_id'] is None:
+            continue
+        controls.append(ControlePassager(
+            agent=agent,
+            vente_id=token.ticket_id if token.source == 'guichet' else None,
+            reservation_id=token.ticket_id if token.source == 'mobile' else None,
+            booking_id=int(token.ticket_id) if token.source == 'booking' else None,
+            voyage_id=state['voyage_id'],
+            resultat=resultat,
+            message=message,
+            scan_id=scan['scan_id'],
+            device_id=scan['device_id'],
+            scanned_at=scan['scanned_at'],
+        ))
+
+    ControlePassager.objects.bulk_create(controls, batch_size=500)
+    compter_controles(controls)
+    VenteGuichet.objects.filter(
+        pk__in=[pk for source, pk in winners if source == 'guichet'],
+    ).update(statut='utilise')
+    # Les réservations application passent par save() pour l'XP fidélité.
+    for booking in Booking.all_objects.filter(pk__in=[pk for source, pk in winners if source == 'booking']):
+        booking.status = 'completed'
+        booking.save(update_fields=['status'])
+    for source in ('booking', 'mobile', 'guichet'):
+        sync_ticket_index(source, [pk for key_source, pk in keys if key_source == source])
+    return boarded
+
+
+def apply_offline_scans(agent, scans):
+    """Enregistre un lot de scans hors ligne et retourne un résultat par scan."""
+    if not isinstance(scans, list) or not scans:
+        raise ValidationError({'detail': 'La liste des scans est obligatoire.'})
+    if len(scans) > MAX_OFFLINE_SCANS:
+        raise ValidationError({'detail': f'{MAX_OFFLINE_SCANS} scans maximum par envoi.'})
+
+    received_at = timezone.now()
+    parsed = [_parse_scan(agent, index, scan, received_at) for index, scan in enumerate(scans)]
+    _clamp_to_manifests(agent, parsed)
+    results = {}
+    pending = {}
+    for scan in parsed:
+        if not scan.get('scan_id'):
+            results[scan['index']] = _result(scan, 'invalide', scan['error'])
+        elif scan['scan_id'] in pending:
+            results[scan['index']] = _result(scan, 'invalide', 'scan_id en double dans le lot')
+        else:
+            pending[scan['scan_id']] = scan
+
+    # Un même scan_id envoyé en parallèle viole la contrainte d'unicité :
+    # le second envoi est rejoué et retrouve le contrôle du premier.
+    for attempt in range(2):
+        _replay_scans(pending, results)
+        try:
+            boarded = _record_scans(agent, pending, results)
+            break
+        except IntegrityError:
+            if attempt:
+                raise
+
+    for token in boarded:
+        used_tickets.mark_used(token)
+    return [results[index] for index in range(len(scans))]
@@ -0,0 +1,238 @@
+"""Sessions de caisse des guichets et rapprochement de fin de journée.
+
+Un guichet a au plus une ``SessionCaisse`` ouverte. Chaque vente y est
+rattachée (la session est ouverte à la volée si l'agent ne l'a pas fait) et
+ses totaux par mode de paiement avancent en une requête
+``UPDATE ... SET x = x + n`` filtrée sur ``statut='ouverte'``. Une annulation
+est retirée de la session de la vente si elle est encore ouverte, sinon de la
+session ouverte du guichet au moment de l'annulation : les totaux d'une
+session sont les encaissements nets de la caisse pendant son ouverture.
+
+À la clôture, les espèces déclarées sont comparées aux espèces attendues
+(fonds initial + espèces nettes) et le rapport est figé dans ``rapport`` ;
+aucune écriture ne touche plus une session fermée. La consolidation de la
+compagnie additionne les totaux des sessions, sans relire les ventes.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .models import SessionCaisse, VenteGuichet
+
+
+MODES_PAIEMENT = [mode for mode, _ in VenteGuichet.MODE_CHOICES]
+CHAMPS_TOTAUX = [
+    champ
+    for mode in MODES_PAIEMENT
+    for champ in (f'billets_{mode}', f'montant_{mode}')
+] + ['annulations', 'montant_annule']
+
+
+def montant_caisse(valeur, champ):
+    """Montant entier positif saisi par l'agent."""
+    try:
+        montant = int(valeur)
+    except (TypeError, ValueError):
+        raise ValidationError({champ: 'Montant invalide.'})
+    if montant < 0:
+        raise ValidationError({champ: 'Le montant ne peut pas être négatif.'})
+    return montant
+
+
+def session_ouverte(guichet_id):
+    return SessionCaisse.objects.filter(guichet_id=guichet_id, statut=SessionCaisse.STATUT_OUVERTE).first()
+
+
+def _nouvelle_session(guichet, user, fonds_initial=0):
+    with transaction.atomic():
+        return SessionCaisse.objects.create(
+            compagnie_id=guichet.agence.compagnie_id,
+            agence_id=guichet.agence_id,
+            guichet=guichet,
+            ouverte_par=user,
+            fonds_initial=fonds_initial,
+        )
+
+
+def ouvrir_session(guichet, user, fonds_initial=0):
+    if guichet is None:
+        raise ValidationError({'detail': 'Aucun guichet affecté à cet agent.'})
+    try:
+        return _nouvelle_session(guichet, user, montant_caisse(fonds_initial, 'fonds_initial'))
+    except IntegrityError:
+        raise ValidationError({'detail': 'Une session de caisse est déjà ouverte sur ce guichet.'})
+
+
+def session_pour_vente(agent):
+    """Session ouverte du guichet de l'agent, ouverte à la volée si besoin."""
+    if not agent.guichet_id:
+        return None
+    session = session_ouverte(agent.guichet_id)
+    if session is not None:
+        return session
+    try:
+        return _nouvelle_session(agent.guichet, agent.user)
+    except IntegrityError:
+        # Ouverte entre-temps par une autre vente du même guichet.
+        return session_ouverte(agent.guichet_id)
+
+
+def _appliquer(session_id, deltas):
+    deltas = {champ: valeur for champ, valeur in deltas.items() if valeur}
+    if not deltas:
+        return True
+    return bool(SessionCaisse.objects.filter(pk=session_id, statut=SessionCaisse.STATUT_OUVERTE).update(
+        **{champ: F(champ) + valeur for champ, valeur in deltas.items()},
+    ))
+
+
+def _delta_vente(deltas, vente, sens):
+    deltas[f'billets_{vente.mode_paiement}'] += sens
+    deltas[f'montant_{vente.mode_paiement}'] += sens * vente.montant_total
+    if sens < 0:
+        deltas['annulations'] += 1
+        deltas['montant_annule'] += vente.montant_total
+
+
+def cumuler_ventes(ventes):
+    deltas = defaultdict(lambda: defaultdict(int))
+    par_session = defaultdict(list)
+    for vente in ventes:
+        if vente.session_id:
+            _delta_vente(deltas[vente.session_id], vente, 1)
+            par_session[vente.session_id].append(vente)
+    for session_id, valeurs in deltas.items():
+        if _appliquer(session_id, valeurs):
+            continue
+        # Session clôturée pendant la vente : la vente passe sur la session suivante.
+        ventes_session = par_session[session_id]
+        session = session_pour_vente(ventes_session[0].agent)
+        VenteGuichet.objects.filter(pk__in=[vente.pk for vente in ventes_session]).update(session=session)
+        for vente in ventes_session:
+            vente.session_id = session.pk
+        _appliquer(session.pk, valeurs)
+
+
+def decompter_ventes(ventes):
+    ventes = [vente for vente in ventes if vente.guichet_id]
+    if not ventes:
+        return
+    ouvertes = dict(
+        SessionCaisse.objects.filter(
+            statut=SessionCaisse.STATUT_OUVERTE,
+            guichet_id__in={vente.guichet_id for vente in ventes},
+        ).values_list('guichet_id', 'pk')
+    )
+    deltas = defaultdict(lambda: defaultdict(int))
+    for vente in ventes:
+        session_id = ouvertes.get(vente.guichet_id)
+        if session_id is not None:
+            _delta_vente(deltas[session_id], vente, -1)
+    for session_id, valeurs in deltas.items():
+        _appliquer(session_id, valeurs)
+
+
+def rapport_session(session):
+    paiements = {
+        mode: {
+            'billets': getattr(session, f'billets_{mode}'),
+            'montant': getattr(session, f'montant_{mode}'),
+        }
+        for mode in MODES_PAIEMENT
+    }
+    return {
+        'session_id': str(session.pk),
+        'compagnie_id': session.compagnie_id,
+        'agence': {'id': str(session.agence_id), 'nom': session.agence.nom},
+        'guichet': {'id': str(session.guichet_id), 'code': session.guichet.code, 'nom': session.guichet.nom},
+        'ouverte_at': session.ouverte_at.isoformat(),
+        'ouverte_par': session.ouverte_par.username if session.ouverte_par_id else None,
+        'fermee_at': session.fermee_at.isoformat() if session.fermee_at else None,
+        'fermee_par': session.fermee_par.username if session.fermee_par_id else None,
+        'paiements': paiements,
+        'total_billets': sum(ligne['billets'] for ligne in paiements.values()),
+        'total_montant': sum(ligne['montant'] for ligne in paiements.values()),
+        'annulations': {'billets': session.annulations, 'montant': session.montant_annule},
+        'fonds_initial': session.fonds_initial,
+        'especes_attendues': session.fonds_initial + session.montant_cash,
+        'especes_declarees': session.especes_declarees,
+        'ecart': session.ecart,
+        'note': session.note,
+    }
+
+
+@transaction.atomic
+def cloturer_session(session_id, user, especes_declarees, note=''):
+    """Clôture la session, calcule l'écart de caisse et fige le rapport."""
+    especes_declarees = montant_caisse(especes_declarees, 'especes_declarees')
+    try:
+        session = SessionCaisse.objects.select_for_update(of=('self',)).select_related(
+            'agence', 'guichet', 'ouverte_par',
+        ).get(pk=session_id)
+    except SessionCaisse.DoesNotExist:
+        raise ValidationError({'detail': 'Session de caisse introuvable.'})
+    if session.statut != SessionCaisse.STATUT_OUVERTE:
+        raise ValidationError({'detail': 'Cette session de caisse est déjà clôturée.'})
+    session.statut = SessionCaisse.STATUT_FERMEE
+    session.fermee_par = user
+    session.fermee_at = timezone.now()
+    session.especes_declarees = especes_declarees
+    session.ecart = especes_declarees - (session.fonds_initial + session.montant_cash)
+    session.note = str(note or '').strip()[:400]
+    session.rapport = rapport_session(session)
+    session.save(update_fields=[
+        'statut', 'fermee_par', 'fermee_at', 'especes_declarees', 'ecart', 'note', 'rapport',
+    ])
+    return session
+
+
+def _ligne_consolidee(valeurs):
+    paiements = {
+        mode: {'billets': valeurs[f'billets_{mode}'] or 0, 'montant': valeurs[f'montant_{mode}'] or 0}
+        for mode in MODES_PAIEMENT
+    }
+    return {
+        'sessions': valeurs['sessions'],
+        'sessions_ouvertes': valeurs['sessions_ouvertes'],
+        'paiements': paiements,
+        'total_billets': sum(ligne['billets'] for ligne in paiements.values()),
+        'total_montant': sum(ligne['montant'] for ligne in paiements.values()),
+        'annulations': {'billets': valeurs['annulations'] or 0, 'montant': valeurs['montant_annule'] or 0},
+        'ecart': valeurs['ecart'] or 0,
+    }
+
+
+def consolider_sessions(compagnie, date_debut, date_fin, agence_id=None):
+    """Totaux des sessions ouvertes entre deux dates locales incluses, par agence et pour la compagnie."""
+    debut = timezone.make_aware(datetime.combine(date_debut, time.min))
+    fin = timezone.make_aware(datetime.combine(date_fin, time.min)) + timedelta(days=1)
+    sessions = SessionCaisse.objects.filter(compagnie=compagnie, ouverte_at__gte=debut, ouverte_at__lt=fin)
+    if agence_id:
+        sessions = sessions.filter(agence_id=agence_id)
+    agences = list(
+        sessions.values('agence_id', 'agence__nom')
+        .annotate(
+            sessions=Count('id'),
+            sessions_ouvertes=Count('id', filter=Q(statut=SessionCaisse.STATUT_OUVERTE)),
+            ecart=Sum('ecart'),
+            **{champ: Sum(champ) for champ in CHAMPS_TOTAUX},
+        )
+        .order_by('agence__nom')
+    )
+    return {
+        'date_debut': date_debut,
+        'date_fin': date_fin,
+        'agences': [
+            {'agence_id': str(ligne['agence_id']), 'agence': ligne['agence__nom'], **_ligne_consolidee(ligne)}
+            for ligne in agences
+        ],
+        # Le total de la compagnie s'additionne depuis les lignes d'agence, sans autre requête.
+        'total': _ligne_consolidee({
+            champ: sum(ligne[champ] or 0 for ligne in agences)
+            for champ in ['sessions', 'sessions_ouvertes', 'ecart', *CHAMPS_TOTAUX]
+        }),
+    }
@@ -3,6 +3,8 @@ from django.urls import path
 from .views import (
     AffecterAgentAgenceView,
     AffecterGestionnaireAgenceView,
+    CloturerSessionCaisseView,
+    ConsolidationCaisseView,
     CreerAgenceView,
     CreerGuichetAgenceView,
     DetailAgenceView,
@@ -11,6 +13,7 @@ from .views import (
     ModifierAgenceView,
     ModifierGuichetAgenceView,
     SupprimerAgenceView,
+    SessionsCaisseView,
     SupprimerGuichetAgenceView,
 )
 
@@ -27,4 +30,7 @@ urlpatterns = [
     path('agences/<uuid:id>/guichets/<uuid:guichet_id>/supprimer/', SupprimerGuichetAgenceView.as_view(), name='compagnie-agence-guichet-supprimer'),
     path('agences/<uuid:id>/supprimer/', SupprimerAgenceView.as_view(), name='compagnie-agence-supprimer'),
     path('agents/<int:id>/affectation/', AffecterAgentAgenceView.as_view(), name='compagnie-agent-affectation'),
+    path('caisse/sessions/', SessionsCaisseView.as_view(), name='compagnie-caisse-sessions'),
+    path('caisse/sessions/<uuid:id>/cloturer/', CloturerSessionCaisseView.as_view(), name='compagnie-caisse-session-cloturer'),
+    path('caisse/consolidation/', ConsolidationCaisseView.as_view(), name='compagnie-caisse-consolidation'),
 ]
@@ -0,0 +1,110 @@
+"""Compteurs journaliers des agents de guichet.
+
+Une ligne ``CompteurAgentJour`` par agent et par jour porte les ventes
+valides (nombre et montant par mode de paiement) et les contrôles effectués.
+Chaque vente, annulation ou scan applique un delta en une requête
+``UPDATE ... SET x = x + n`` ; le tableau de bord lit la ligne du jour au lieu
+de réagréger les ventes. ``python manage.py rebuild_agent_counters`` recalcule
+les lignes depuis les ventes et les contrôles.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .caisse import cumuler_ventes, decompter_ventes
+from .models import CompteurAgentJour, ControlePassager, VenteGuichet
+
+
+VENTES_COMPTEES = ('valide', 'utilise')
+
+
+def _jour(moment):
+    return timezone.localdate(moment) if moment else timezone.localdate()
+
+
+def _appliquer(agent_id, jour, deltas):
+    deltas = {champ: valeur for champ, valeur in deltas.items() if valeur}
+    if not deltas:
+        return
+    lignes = CompteurAgentJour.objects.filter(agent_id=agent_id, jour=jour)
+    increments = {champ: F(champ) + valeur for champ, valeur in deltas.items()}
+    if lignes.update(**increments, updated_at=timezone.now()):
+        return
+    try:
+        with transaction.atomic():
+            CompteurAgentJour.objects.create(agent_id=agent_id, jour=jour, **deltas)
+    except IntegrityError:
+        # Ligne créée entre-temps par une autre vente du même agent.
+        lignes.update(**increments, updated_at=timezone.now())
+
+
+def compter_ventes(ventes, sens=1):
+    """Ajoute (``sens=1``) ou retire (``sens=-1``) des ventes valides des compteurs de leur jour.
+
+    Les sessions de caisse des guichets suivent le même delta (``guichet.caisse``).
+    """
+    deltas = defaultdict(lambda: defaultdict(int))
+    for vente in ventes:
+        cle = (vente.agent_id, _jour(vente.created_at))
+        deltas[cle][f'billets_{vente.mode_paiement}'] += sens
+        deltas[cle][f'montant_{vente.mode_paiement}'] += sens * vente.montant_total
+    for (agent_id, jour), valeurs in deltas.items():
+        _appliquer(agent_id, jour, valeurs)
+    if sens > 0:
+        cumuler_ventes(ventes)
+    else:
+        decompter_ventes(ventes)
+
+
+def compter_controles(controles):
+    deltas = defaultdict(lambda: defaultdict(int))
+    for controle in controles:
+        if not controle.agent_id:
+            continue
+        cle = (controle.agent_id, _jour(controle.scanned_at or controle.created_at))
+        deltas[cle]['controles'] += 1
+        deltas[cle]['controles_valides'] += int(controle.resultat == 'valide')
+    for (agent_id, jour), valeurs in deltas.items():
+        _appliquer(agent_id, jour, valeurs)
+
+
+def compteur_du_jour(agent, jour=None):
+    return CompteurAgentJour.objects.filter(agent=agent, jour=jour or timezone.localdate()).first()
+
+
+def _bornes(jour):
+    debut = timezone.make_aware(datetime.combine(jour, time.min))
+    return debut, debut + timedelta(days=1)
+
+
+@transaction.atomic
+def recalculer_compteurs(jour):
+    """Réécrit les compteurs d'une journée à partir des ventes et des contrôles."""
+    debut, fin = _bornes(jour)
+    valeurs = defaultdict(lambda: defaultdict(int))
+    for ligne in (
+        VenteGuichet.objects.filter(created_at__gte=debut, created_at__lt=fin, statut__in=VENTES_COMPTEES)
+        .values('agent_id', 'mode_paiement')
+        .annotate(billets=Count('id'), montant=Sum('montant_total'))
+    ):
+        valeurs[ligne['agent_id']][f"billets_{ligne['mode_paiement']}"] = ligne['billets']
+        valeurs[ligne['agent_id']][f"montant_{ligne['mode_paiement']}"] = ligne['montant'] or 0
+    scans = ControlePassager.objects.filter(agent__isnull=False).filter(
+        Q(scanned_at__gte=debut, scanned_at__lt=fin)
+        | Q(scanned_at__isnull=True, created_at__gte=debut, created_at__lt=fin)
+    )
+    for ligne in scans.values('agent_id').annotate(
+        total=Count('id'),
+        valides=Count('id', filter=Q(resultat='valide')),
+    ):
+        valeurs[ligne['agent_id']]['controles'] = ligne['total']
+        valeurs[ligne['agent_id']]['controles_valides'] = ligne['valides']
+    CompteurAgentJour.objects.filter(jour=jour).delete()
+    CompteurAgentJour.objects.bulk_create([
+        CompteurAgentJour(agent_id=agent_id, jour=jour, **champs)
+        for agent_id, champs in valeurs.items()
+    ])
+    return len(valeurs)
@@ -0,0 +1,45 @@
+"""
+Management command: rebuild_agent_counters
+==========================================
+Recalcule les compteurs journaliers des agents de guichet (CompteurAgentJour)
+à partir des ventes et des contrôles.
+
+Usage:
+    python manage.py rebuild_agent_counters
+    python manage.py rebuild_agent_counters --date=2026-03-14 --days=7
+
+Les compteurs sont tenus à jour à chaque vente, annulation et scan ; la
+commande sert après une correction directe en base ou une reprise de données.
+"""
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from guichet.compteurs import recalculer_compteurs
+
+
+class Command(BaseCommand):
+    help = "Recalcule les compteurs journaliers des agents de guichet."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            help="Dernier jour recalculé, au format AAAA-MM-JJ (défaut: aujourd'hui).",
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=1,
+            help='Nombre de jours recalculés en remontant depuis --date (défaut: 1).',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            fin = date.fromisoformat(options['date']) if options['date'] else timezone.localdate()
+        except ValueError:
+            raise CommandError('Date invalide, format attendu : AAAA-MM-JJ.')
+        lignes = 0
+        for decalage in range(max(options['days'], 1)):
+            lignes += recalculer_compteurs(fin - timedelta(days=decalage))
+        self.stdout.write(self.style.SUCCESS(f'{lignes} compteur(s) recalculé(s).'))
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.4 on 2026-10-19 11:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guichet', '0006_alter_venteguichet_statut'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='controlepassager',
+            name='device_id',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='controlepassager',
+            name='scan_id',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='controlepassager',
+            name='scanned_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
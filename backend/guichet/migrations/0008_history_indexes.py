@@ -0,0 +1,21 @@
+# Generated by Django 5.1.4 on 2026-10-19 11:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guichet', '0007_controle_offline_sync'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='controlepassager',
+            index=models.Index(fields=['agent', '-created_at', '-id'], name='guichet_con_agent_i_417283_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venteguichet',
+            index=models.Index(fields=['agent', '-created_at', '-id'], name='guichet_ven_agent_i_d8b0c8_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.4 on 2026-10-19 11:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guichet', '0008_history_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompteurAgentJour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jour', models.DateField()),
+                ('billets_cash', models.IntegerField(default=0)),
+                ('montant_cash', models.IntegerField(default=0)),
+                ('billets_flooz', models.IntegerField(default=0)),
+                ('montant_flooz', models.IntegerField(default=0)),
+                ('billets_tmoney', models.IntegerField(default=0)),
+                ('montant_tmoney', models.IntegerField(default=0)),
+                ('controles', models.IntegerField(default=0)),
+                ('controles_valides', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('agent', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='compteurs', to='guichet.agentguichet')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('agent', 'jour'), name='unique_compteur_agent_jour')],
+            },
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.1.4 on 2026-10-19 11:34
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guichet', '0009_compteur_agent_jour'),
+        ('transport', '0013_search_grams'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SessionCaisse',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('statut', models.CharField(choices=[('ouverte', 'Ouverte'), ('fermee', 'Fermée')], default='ouverte', max_length=10)),
+                ('ouverte_at', models.DateTimeField(auto_now_add=True)),
+                ('fermee_at', models.DateTimeField(blank=True, null=True)),
+                ('fonds_initial', models.IntegerField(default=0)),
+                ('billets_cash', models.IntegerField(default=0)),
+                ('montant_cash', models.IntegerField(default=0)),
+                ('billets_flooz', models.IntegerField(default=0)),
+                ('montant_flooz', models.IntegerField(default=0)),
+                ('billets_tmoney', models.IntegerField(default=0)),
+                ('montant_tmoney', models.IntegerField(default=0)),
+                ('annulations', models.IntegerField(default=0)),
+                ('montant_annule', models.IntegerField(default=0)),
+                ('especes_declarees', models.IntegerField(blank=True, null=True)),
+                ('ecart', models.IntegerField(blank=True, null=True)),
+                ('note', models.CharField(blank=True, max_length=400)),
+                ('rapport', models.JSONField(blank=True, null=True)),
+                ('agence', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='sessions_caisse', to='guichet.agence')),
+                ('compagnie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sessions_caisse', to='transport.company')),
+                ('fermee_par', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sessions_caisse_fermees', to=settings.AUTH_USER_MODEL)),
+                ('guichet', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='sessions_caisse', to='guichet.guichet')),
+                ('ouverte_par', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sessions_caisse_ouvertes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-ouverte_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='venteguichet',
+            name='session',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ventes', to='guichet.sessioncaisse'),
+        ),
+        migrations.AddIndex(
+            model_name='sessioncaisse',
+            index=models.Index(fields=['compagnie', '-ouverte_at'], name='guichet_ses_compagn_3af91a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sessioncaisse',
+            index=models.Index(fields=['guichet', '-ouverte_at'], name='guichet_ses_guichet_bdf4a9_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='sessioncaisse',
+            constraint=models.UniqueConstraint(condition=models.Q(('statut', 'ouverte')), fields=('guichet',), name='unique_session_caisse_ouverte'),
+        ),
+    ]
@@ -143,8 +143,20 @@ class VenteGuichet(models.Model):
     reference_vente = models.CharField(max_length=64, unique=True)
     qr_code_data = models.TextField()
     statut = models.CharField(max_length=10, choices=STATUT_CHOICES, default='valide')
+    session = models.ForeignKey(
+        'SessionCaisse',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='ventes',
+    )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['agent', '-created_at', '-id']),
+        ]
+
     def __str__(self):
         return f"{self.reference_vente} - {self.client_nom}"
 
@@ -164,7 +176,115 @@ class ControlePassager(models.Model):
     voyage = models.ForeignKey(ScheduledTrip, on_delete=models.PROTECT, related_name='controles')
     resultat = models.CharField(max_length=20, choices=RESULTAT_CHOICES)
     message = models.CharField(max_length=400, blank=True)
+    # Contrôles faits hors ligne puis synchronisés : identifiant unique fourni
+    # par l'appareil (rejeu sans doublon) et heure réelle du scan.
+    scan_id = models.CharField(max_length=64, null=True, blank=True, unique=True)
+    device_id = models.CharField(max_length=64, blank=True)
+    scanned_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['agent', '-created_at', '-id']),
+        ]
+
     def __str__(self):
         return f"Controle {self.id} - {self.resultat}"
+
+
+class CompteurAgentJour(models.Model):
+    """Totaux courants d'un agent pour une journée (voir ``guichet.compteurs``)."""
+
+    agent = models.ForeignKey(AgentGuichet, on_delete=models.CASCADE, related_name='compteurs')
+    jour = models.DateField()
+    billets_cash = models.IntegerField(default=0)
+    montant_cash = models.IntegerField(default=0)
+    billets_flooz = models.IntegerField(default=0)
+    montant_flooz = models.IntegerField(default=0)
+    billets_tmoney = models.IntegerField(default=0)
+    montant_tmoney = models.IntegerField(default=0)
+    controles = models.IntegerField(default=0)
+    controles_valides = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['agent', 'jour'], name='unique_compteur_agent_jour'),
+        ]
+
+    def __str__(self):
+        return f"{self.agent} - {self.jour}"
+
+    @property
+    def billets(self):
+        return sum(getattr(self, f'billets_{mode}') for mode, _ in VenteGuichet.MODE_CHOICES)
+
+    @property
+    def montant(self):
+        return sum(getattr(self, f'montant_{mode}') for mode, _ in VenteGuichet.MODE_CHOICES)
+
+    def paiements(self):
+        return {
+            mode: {
+                'billets': getattr(self, f'billets_{mode}'),
+                'montant': getattr(self, f'montant_{mode}'),
+            }
+            for mode, _ in VenteGuichet.MODE_CHOICES
+            if getattr(self, f'billets_{mode}')
+        }
+
+
+class SessionCaisse(models.Model):
+    """Session de caisse d'un guichet, de l'ouverture à la clôture (voir ``guichet.caisse``).
+
+    Les totaux par mode de paiement sont cumulés à chaque vente et annulation
+    tant que la session est ouverte ; à la clôture, le rapport est figé dans
+    ``rapport`` et la ligne n'est plus modifiée.
+    """
+
+    STATUT_OUVERTE = 'ouverte'
+    STATUT_FERMEE = 'fermee'
+    STATUT_CHOICES = [
+        (STATUT_OUVERTE, 'Ouverte'),
+        (STATUT_FERMEE, 'Fermée'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    compagnie = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='sessions_caisse')
+    agence = models.ForeignKey(Agence, on_delete=models.PROTECT, related_name='sessions_caisse')
+    guichet = models.ForeignKey(Guichet, on_delete=models.PROTECT, related_name='sessions_caisse')
+    statut = models.CharField(max_length=10, choices=STATUT_CHOICES, default=STATUT_OUVERTE)
+    ouverte_par = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='sessions_caisse_ouvertes')
+    fermee_par = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='sessions_caisse_fermees')
+    ouverte_at = models.DateTimeField(auto_now_add=True)
+    fermee_at = models.DateTimeField(null=True, blank=True)
+    fonds_initial = models.IntegerField(default=0)
+    billets_cash = models.IntegerField(default=0)
+    montant_cash = models.IntegerField(default=0)
+    billets_flooz = models.IntegerField(default=0)
+    montant_flooz = models.IntegerField(default=0)
+    billets_tmoney = models.IntegerField(default=0)
+    montant_tmoney = models.IntegerField(default=0)
+    annulations = models.IntegerField(default=0)
+    montant_annule = models.IntegerField(default=0)
+    especes_declarees = models.IntegerField(null=True, blank=True)
+    ecart = models.IntegerField(null=True, blank=True)
+    note = models.CharField(max_length=400, blank=True)
+    rapport = models.JSONField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-ouverte_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['guichet'],
+                condition=models.Q(statut='ouverte'),
+                name='unique_session_caisse_ouverte',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['compagnie', '-ouverte_at']),
+            models.Index(fields=['guichet', '-ouverte_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.guichet} - {self.ouverte_at:%d/%m/%Y %H:%M} ({self.statut})"
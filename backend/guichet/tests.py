@@ -1,6 +1,14 @@
+import base64
+import hashlib
+import hmac
+import uuid
 from datetime import time, timedelta
+from io import StringIO
+from unittest import mock
 
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import override_settings
 from django.utils import timezone
 from rest_framework import status
@@ -11,14 +19,32 @@ from transport.models import (
     Booking,
     City,
     Company,
+    CompteCagnotte,
+    MouvementCagnotte,
+    Notification,
     Reservation,
     ScheduledTrip,
+    SearchGram,
     Siege,
+    TicketIndex,
     Trip,
+    TripStop,
     XPTransaction,
 )
-
-from .models import Agence, AgentGuichet, ControlePassager, Guichet, VenteGuichet
+from transport.services.ticket_tokens import sign_ticket, used_tickets, verify_ticket
+from transport.ticketing import remove_ticket_index, sync_ticket_index
+
+from . import boarding
+from .models import (
+    Agence,
+    AgentGuichet,
+    CompteurAgentJour,
+    ControlePassager,
+    Guichet,
+    SessionCaisse,
+    VenteGuichet,
+)
+from .utils_qr import qr_cache, render_qr
 
 
 @override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
@@ -124,6 +150,8 @@ class GuichetApiTests(APITestCase):
             date=timezone.localdate(),
             is_active=True,
         )
+        used_tickets.clear()
+        cache.clear()
 
     def authenticate_agent(self):
         self.client.force_authenticate(user=self.agent_user)
@@ -197,6 +225,144 @@ class GuichetApiTests(APITestCase):
         self.assertIn('ventes_recentes', response.data)
         self.assertIn('controles_recents', response.data)
 
+    # Cache en mémoire : seules les requêtes de l'application sont comptées.
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_dashboard_reads_agent_counters_and_cached_voyages(self):
+        self.authenticate_agent()
+        first = self.client.get('/api/guichet/dashboard/')
+        references = []
+        for seat, mode in ((1, 'cash'), (2, 'cash'), (3, 'flooz')):
+            response = self.client.post(
+                '/api/guichet/ventes/creer/',
+                {
+                    'voyage_id': self.voyage.id,
+                    'numero_siege': seat,
+                    'client_nom': f'Client compteur {seat}',
+                    'client_telephone': f'9000008{seat}',
+                    'mode_paiement': mode,
+                },
+                format='json',
+            )
+            references.append(response.data)
+        self.client.delete(f"/api/guichet/ventes/{references[1]['reference_vente']}/annuler/")
+        self.client.post('/api/guichet/controle/scanner/', {'qr_code_data': references[0]['qr_token']}, format='json')
+        self.client.post('/api/guichet/controle/scanner/', {'qr_code_data': references[0]['qr_token']}, format='json')
+
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/guichet/dashboard/')
+        stats = response.data['stats_aujourd_hui']
+        montant = references[0]['montant_total']
+        self.assertEqual((response.data['billets_vendus'], response.data['montant_collecte']), (2, 2 * montant))
+        self.assertEqual(stats['paiements'], {
+            'cash': {'billets': 1, 'montant': montant},
+            'flooz': {'billets': 1, 'montant': montant},
+        })
+        self.assertEqual((stats['controles'], stats['controles_valides']), (2, 1))
+        self.assertEqual(len(response.data['ventes_recentes']), 3)
+        self.assertEqual(response.data['voyages_du_jour'], first.data['voyages_du_jour'])
+
+        compteur = CompteurAgentJour.objects.get(agent=self.agent)
+        CompteurAgentJour.objects.all().delete()
+        call_command('rebuild_agent_counters', stdout=StringIO())
+        rebuilt = CompteurAgentJour.objects.get(agent=self.agent)
+        self.assertEqual(
+            (rebuilt.billets, rebuilt.montant, rebuilt.controles, rebuilt.controles_valides),
+            (compteur.billets, compteur.montant, compteur.controles, compteur.controles_valides),
+        )
+
+    def test_cash_session_accumulates_sales_and_freezes_closing_report(self):
+        agency = Agence.objects.create(
+            compagnie=self.company,
+            nom='Agence Caisse',
+            ville=self.trip.departure_city,
+            adresse='Gare routière',
+            telephone='90000012',
+            created_by=self.admin,
+            updated_by=self.admin,
+        )
+        counter = Guichet.objects.create(agence=agency, code='C01', nom='Caisse 1')
+        self.agent.agence = agency
+        self.agent.guichet = counter
+        self.agent.save(update_fields=['agence', 'guichet'])
+        self.authenticate_agent()
+
+        opened = self.client.post('/api/guichet/caisse/session/ouvrir/', {'fonds_initial': 10000}, format='json')
+        self.assertEqual(opened.status_code, status.HTTP_201_CREATED)
+        twice = self.client.post('/api/guichet/caisse/session/ouvrir/', {}, format='json')
+        self.assertEqual(twice.status_code, status.HTTP_400_BAD_REQUEST)
+
+        def sell(seat, mode):
+            return self.client.post(
+                '/api/guichet/ventes/creer/',
+                {
+                    'voyage_id': self.voyage.id,
+                    'numero_siege': seat,
+                    'client_nom': f'Client caisse {seat}',
+                    'client_telephone': f'9000009{seat}',
+                    'mode_paiement': mode,
+                },
+                format='json',
+            ).data
+
+        sales = [sell(1, 'cash'), sell(2, 'cash'), sell(3, 'flooz')]
+        montant = sales[0]['montant_total']
+        self.client.delete(f"/api/guichet/ventes/{sales[1]['reference_vente']}/annuler/")
+
+        current = self.client.get('/api/guichet/caisse/session/').data['session']
+        self.assertEqual(current['id'], opened.data['id'])
+        self.assertEqual(current['paiements']['cash'], {'billets': 1, 'montant': montant})
+        self.assertEqual(current['paiements']['flooz'], {'billets': 1, 'montant': montant})
+        self.assertEqual(current['annulations'], {'billets': 1, 'montant': montant})
+        self.assertEqual(current['especes_attendues'], 10000 + montant)
+
+        closed = self.client.post(
+            f"/api/guichet/caisse/sessions/{current['id']}/cloturer/",
+            {'especes_declarees': 10000 + montant - 500, 'note': 'Billet abîmé'},
+            format='json',
+        )
+        self.assertEqual(closed.status_code, status.HTTP_200_OK)
+        self.assertEqual((closed.data['statut'], closed.data['ecart']), ('fermee', -500))
+        self.assertIsNone(self.client.get('/api/guichet/caisse/session/').data['session'])
+        again = self.client.post(
+            f"/api/guichet/caisse/sessions/{current['id']}/cloturer/",
+            {'especes_declarees': 0},
+            format='json',
+        )
+        self.assertEqual(again.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # La vente suivante ouvre une nouvelle session ; l'annulation d'une vente
+        # de la session clôturée sort de la caisse ouverte, le rapport figé ne bouge pas.
+        sell(4, 'cash')
+        self.client.delete(f"/api/guichet/ventes/{sales[0]['reference_vente']}/annuler/")
+        first = SessionCaisse.objects.get(pk=current['id'])
+        self.assertEqual((first.billets_cash, first.rapport['paiements']['cash']['billets']), (1, 1))
+        second = SessionCaisse.objects.get(guichet=counter, statut='ouverte')
+        self.assertEqual((second.billets_cash, second.montant_cash, second.annulations), (0, 0, 1))
+        self.assertEqual(VenteGuichet.objects.get(siege__numero=4).session, second)
+
+        self.client.force_authenticate(user=self.other_admin)
+        hidden = self.client.post(
+            f'/api/compagnie/caisse/sessions/{second.pk}/cloturer/',
+            {'especes_declarees': 0},
+            format='json',
+        )
+        self.assertEqual(hidden.status_code, status.HTTP_404_NOT_FOUND)
+
+        self.client.force_authenticate(user=self.admin)
+        with self.assertNumQueries(3):
+            consolidation = self.client.get('/api/compagnie/caisse/consolidation/').data
+        self.assertEqual(len(consolidation['agences']), 1)
+        total = consolidation['total']
+        self.assertEqual((total['sessions'], total['sessions_ouvertes']), (2, 1))
+        self.assertEqual(total['paiements']['cash'], {'billets': 1, 'montant': montant})
+        self.assertEqual(total['paiements']['flooz'], {'billets': 1, 'montant': montant})
+        self.assertEqual((total['annulations']['billets'], total['ecart']), (2, -500))
+        for url in ('/api/compagnie/caisse/consolidation/', '/api/compagnie/caisse/sessions/'):
+            self.assertEqual(
+                self.client.get(url, {'agence_id': 'pas-un-uuid'}).status_code,
+                status.HTTP_400_BAD_REQUEST,
+            )
+
     def test_dashboard_and_default_trip_list_return_next_active_voyages(self):
         self.voyage.date = timezone.localdate() - timedelta(days=1)
         self.voyage.save(update_fields=['date'])
@@ -500,6 +666,74 @@ class GuichetApiTests(APITestCase):
         self.voyage.refresh_from_db()
         self.assertEqual(self.voyage.available_seats, self.trip.capacity - 1)
 
+    def test_batch_sale_assigns_adjacent_seats_in_one_transaction(self):
+        self.authenticate_agent()
+        single = self.client.post(
+            '/api/guichet/ventes/creer/',
+            {
+                'voyage_id': self.voyage.id,
+                'numero_siege': 4,
+                'client_nom': 'Client seul',
+                'client_telephone': '90000070',
+                'mode_paiement': 'cash',
+            },
+            format='json',
+        )
+        self.assertEqual(single.status_code, status.HTTP_201_CREATED)
+
+        conflict = self.client.post(
+            '/api/guichet/ventes/creer-lot/',
+            {
+                'voyage_id': self.voyage.id,
+                'mode_paiement': 'cash',
+                'client_nom': 'Famille Amegah',
+                'client_telephone': '90000071',
+                'passagers': [{'numero_siege': 4}, {}],
+            },
+            format='json',
+        )
+        self.assertEqual(conflict.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(conflict.data['sieges'], ['4'])
+        self.assertEqual(VenteGuichet.objects.count(), 1)
+
+        response = self.client.post(
+            '/api/guichet/ventes/creer-lot/',
+            {
+                'voyage_id': self.voyage.id,
+                'mode_paiement': 'flooz',
+                'client_nom': 'Famille Amegah',
+                'client_telephone': '90000071',
+                'qr_format': 'svg',
+                'passagers': [{'numero_siege': 1}, {'client_nom': 'Enfant Amegah'}, {}, {}],
+            },
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        billets = response.data['billets']
+        self.assertEqual([billet['siege'] for billet in billets], [1, 5, 6, 7])
+        self.assertEqual(billets[1]['client_nom'], 'Enfant Amegah')
+        self.assertEqual(response.data['montant_total'], 4 * billets[0]['montant_total'])
+        self.assertTrue(all(billet['qr_code_svg'].startswith('<svg') for billet in billets))
+
+        ventes = VenteGuichet.objects.filter(reference_vente__in=[billet['reference_vente'] for billet in billets])
+        self.assertEqual(ventes.count(), 4)
+        for vente in ventes:
+            token = verify_ticket(vente.qr_code_data, self.company.id)
+            self.assertEqual((token.ticket_id, token.seat), (str(vente.id), vente.siege.numero))
+        self.assertEqual(
+            TicketIndex.objects.filter(source='guichet', source_id__in=[str(vente.id) for vente in ventes]).count(),
+            4,
+        )
+        self.assertEqual(AuditLog.objects.filter(new_values__bulk=True, new_values__operation='sale').count(), 4)
+        self.assertEqual(
+            Siege.objects.filter(voyage=self.voyage, statut=Siege.STATUT_OCCUPE).count(),
+            5,
+        )
+        self.voyage.refresh_from_db()
+        self.assertEqual(self.voyage.available_seats, self.trip.capacity - 5)
+        compteur = CompteurAgentJour.objects.get(agent=self.agent)
+        self.assertEqual((compteur.billets_cash, compteur.billets_flooz), (1, 4))
+
     def test_sale_history_filters_and_only_seller_can_cancel(self):
         self.authenticate_agent()
         sale_response = self.client.post(
@@ -550,6 +784,51 @@ class GuichetApiTests(APITestCase):
         self.assertEqual(history_after_cancel.data['total_annules'], 1)
         self.assertEqual(history_after_cancel.data['total_montant'], 0)
 
+    def test_sales_and_control_history_page_with_keyset_cursor(self):
+        self.authenticate_agent()
+        for seat in range(1, 6):
+            self.client.post(
+                '/api/guichet/ventes/creer/',
+                {
+                    'voyage_id': self.voyage.id,
+                    'numero_siege': seat,
+                    'client_nom': f'Client page {seat}',
+                    'client_telephone': f'9000007{seat}',
+                    'mode_paiement': 'cash',
+                },
+                format='json',
+            )
+        moment = timezone.now()
+        VenteGuichet.objects.filter(agent=self.agent).update(created_at=moment)
+        ControlePassager.objects.bulk_create([
+            ControlePassager(agent=self.agent, voyage=self.voyage, resultat='invalide', message='QR invalide')
+            for _ in range(3)
+        ])
+
+        references, cursor, pages = [], None, 0
+        while True:
+            params = {'limit': 2, 'date': timezone.localdate().isoformat()}
+            if cursor:
+                params['cursor'] = cursor
+            response = self.client.get('/api/guichet/ventes/historique/', params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data['total_billets'], 5)
+            self.assertEqual(response.data['total_montant'], 5 * response.data['ventes'][0]['montant_total'])
+            references.extend(vente['reference_vente'] for vente in response.data['ventes'])
+            cursor, pages = response.data['next_cursor'], pages + 1
+            if not cursor:
+                break
+        self.assertEqual(pages, 3)
+        self.assertEqual(sorted(references), sorted(VenteGuichet.objects.values_list('reference_vente', flat=True)))
+
+        first = self.client.get('/api/guichet/controle/historique/', {'limit': 2})
+        rest = self.client.get('/api/guichet/controle/historique/', {'limit': 2, 'cursor': first.data['next_cursor']})
+        self.assertEqual(first.data['invalides'], 3)
+        self.assertEqual(len(first.data['controles'] + rest.data['controles']), 3)
+        self.assertIsNone(rest.data['next_cursor'])
+        invalid = self.client.get('/api/guichet/controle/historique/', {'cursor': 'pas-un-curseur'})
+        self.assertEqual(invalid.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_scanner_marks_ticket_used_and_exposes_control_history(self):
         self.authenticate_agent()
         sale_response = self.client.post(
@@ -584,6 +863,695 @@ class GuichetApiTests(APITestCase):
         self.assertEqual(history_response.data['valides'], 1)
         self.assertEqual(history_response.data['deja_utilises'], 1)
 
+    def test_ticket_index_follows_sales_scans_and_cancellations(self):
+        self.authenticate_agent()
+        references = []
+        for seat in (6, 7):
+            response = self.client.post(
+                '/api/guichet/ventes/creer/',
+                {
+                    'voyage_id': self.voyage.id,
+                    'numero_siege': seat,
+                    'client_nom': f'Client index {seat}',
+                    'client_telephone': f'9000004{seat}',
+                    'mode_paiement': 'cash',
+                },
+                format='json',
+            )
+            references.append((response.data['reference_vente'], response.data['qr_code_data']))
+
+        self.client.post(
+            '/api/guichet/controle/scanner/',
+            {'qr_code_data': references[0][1]},
+            format='json',
+        )
+        self.client.delete(f'/api/guichet/ventes/{references[1][0]}/annuler/')
+
+        scanned = TicketIndex.objects.get(reference=references[0][0])
+        cancelled = TicketIndex.objects.get(reference=references[1][0])
+        self.assertEqual(scanned.source, 'guichet')
+        self.assertEqual((scanned.voyage_id, scanned.seat), (self.voyage.id, '6'))
+        self.assertEqual(scanned.control_status, 'valide')
+        self.assertFalse(scanned.payload['can_cancel'])
+        self.assertEqual(cancelled.status, 'annule')
+
+        passengers = self.client.get(f'/api/guichet/voyages/{self.voyage.id}/passagers/')
+        self.assertEqual(
+            [item['reference'] for item in passengers.data],
+            [references[0][0]],
+        )
+
+        output = StringIO()
+        call_command('rebuild_ticket_index', '--if-incomplete', stdout=output)
+        self.assertEqual(output.getvalue().strip(), 'Index des billets complet.')
+
+        TicketIndex.objects.all().delete()
+        call_command('rebuild_ticket_index', '--if-incomplete', stdout=StringIO())
+        self.assertEqual(
+            TicketIndex.objects.get(reference=references[0][0]).control_status,
+            'valide',
+        )
+
+    def test_ticket_index_follows_company_trip_and_city_edits(self):
+        booking = Booking.objects.create(
+            trip=self.trip,
+            scheduled_trip=self.voyage,
+            passenger_name='Client renommé',
+            passenger_email='renomme@example.com',
+            passenger_phone='90000048',
+            seat_number='8',
+            status='confirmed',
+            payment_method='cash',
+            total_price=self.trip.price,
+        )
+
+        self.company.name = 'Alpha Express'
+        self.company.save()
+        self.trip.departure_time = time(9, 30)
+        self.trip.save()
+        self.trip.arrival_city.name = 'Kara Centre'
+        self.trip.arrival_city.save()
+
+        row = TicketIndex.objects.get(source='booking', source_id=str(booking.id))
+        self.assertEqual(row.company_name, 'Alpha Express')
+        self.assertEqual(row.route, 'Lomé Test → Kara Centre')
+        self.assertEqual(row.payload['departure_time'], '09:30:00')
+        self.assertIsInstance(row.payload['amount'], float)
+
+    def test_bulk_ticket_actions_move_cancel_and_board_across_channels(self):
+        self.authenticate_agent()
+        target, _ = ScheduledTrip.objects.get_or_create(
+            trip=self.trip,
+            date=timezone.localdate() + timedelta(days=1),
+            defaults={'is_active': True},
+        )
+        sales = {}
+        for voyage, seat in ((self.voyage, 2), (self.voyage, 4), (self.voyage, 5), (target, 2)):
+            response = self.client.post(
+                '/api/guichet/ventes/creer/',
+                {
+                    'voyage_id': voyage.id,
+                    'numero_siege': seat,
+                    'client_nom': f'Client groupe {seat}',
+                    'client_telephone': f'9000005{seat}',
+                    'mode_paiement': 'cash',
+                },
+                format='json',
+            )
+            sales[(voyage.id, seat)] = str(
+                VenteGuichet.objects.get(reference_vente=response.data['reference_vente']).pk
+            )
+        booking = Booking.objects.create(
+            trip=self.trip,
+            scheduled_trip=self.voyage,
+            passenger_name='Passager groupe',
+            passenger_email='groupe@example.com',
+            passenger_phone='90000059',
+            seat_number='3',
+            status='confirmed',
+            payment_method='cash',
+            total_price=self.trip.price,
+        )
+
+        moved = self.client.post(
+            '/api/guichet/billets/actions/',
+            {
+                'action': 'move',
+                'reason': 'Panne du bus',
+                'target_voyage_id': target.id,
+                'tickets': [
+                    {'source': 'guichet', 'id': sales[(self.voyage.id, 2)]},
+                    {'source': 'booking', 'id': booking.id},
+                    {'source': 'guichet', 'id': sales[(target.id, 2)]},
+                ],
+            },
+            format='json',
+        )
+        self.assertEqual(moved.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            sorted((ticket['source'], ticket['voyage_id'], ticket['seat']) for ticket in moved.data['tickets']),
+            [('booking', target.id, '3'), ('guichet', target.id, 1)],
+        )
+        self.assertEqual(moved.data['skipped'][0]['detail'], 'Le billet est déjà sur ce voyage.')
+        vente = VenteGuichet.objects.get(pk=sales[(self.voyage.id, 2)])
+        self.assertEqual(verify_ticket(vente.qr_code_data, self.company.id).voyage_id, target.id)
+        self.assertEqual(Siege.objects.get(voyage=self.voyage, numero=2).statut, Siege.STATUT_LIBRE)
+        target.refresh_from_db()
+        self.voyage.refresh_from_db()
+        self.assertEqual((target.available_seats, self.voyage.available_seats), (7, 8))
+
+        self.client.post(
+            '/api/guichet/billets/actions/',
+            {'action': 'mark_used', 'tickets': [{'source': 'guichet', 'id': sales[(self.voyage.id, 4)]}]},
+            format='json',
+        )
+        cancelled = self.client.post(
+            '/api/guichet/billets/actions/',
+            {
+                'action': 'cancel',
+                'reason': 'Voyage annulé',
+                'tickets': [
+                    {'source': 'guichet', 'id': sales[(self.voyage.id, 4)]},
+                    {'source': 'guichet', 'id': sales[(self.voyage.id, 5)]},
+                ],
+            },
+            format='json',
+        )
+        self.assertEqual([ticket['status'] for ticket in cancelled.data['tickets']], ['annule'])
+        self.assertEqual(
+            cancelled.data['skipped'][0]['detail'],
+            'Un billet déjà utilisé ne peut plus être modifié, annulé ou remboursé.',
+        )
+        self.assertEqual(
+            TicketIndex.objects.get(source='guichet', source_id=sales[(self.voyage.id, 4)]).control_status,
+            'valide',
+        )
+        bulk_logs = AuditLog.objects.filter(new_values__bulk=True)
+        self.assertEqual(bulk_logs.count(), 4)
+        self.assertTrue(
+            SearchGram.objects.filter(scope=SearchGram.SCOPE_AUDIT, object_id__in=bulk_logs.values('pk')).exists()
+        )
+
+        refused = self.client.post(
+            '/api/guichet/billets/actions/',
+            {'action': 'refund', 'tickets': [{'source': 'guichet', 'id': sales[(target.id, 2)]}]},
+            format='json',
+        )
+        self.assertEqual(refused.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_voyage_migration_places_segments_and_refunds_unplaced(self):
+        middle = City.objects.create(name='Atakpamé Test', region='Plateaux')
+        trip = Trip.objects.create(
+            company=self.company,
+            departure_city=self.trip.departure_city,
+            arrival_city=self.trip.arrival_city,
+            departure_time=time(14, 0),
+            arrival_time=time(18, 0),
+            price=5000,
+            duration=240,
+            bus_type='Standard',
+            capacity=3,
+        )
+        stops = [
+            TripStop.objects.create(trip=trip, city=city, sequence=sequence)
+            for sequence, city in enumerate((trip.departure_city, middle, trip.arrival_city))
+        ]
+        source = ScheduledTrip.objects.get(trip=trip, date=timezone.localdate() + timedelta(days=1))
+        target = ScheduledTrip.objects.get(trip=trip, date=timezone.localdate() + timedelta(days=2))
+
+        def book(voyage, seat, origin, destination, name, user=None):
+            return Booking.objects.create(
+                trip=trip,
+                scheduled_trip=voyage,
+                passenger_name=name,
+                passenger_email='segment@example.com',
+                passenger_phone='90000060',
+                seat_number=str(seat),
+                origin_stop=stops[origin],
+                destination_stop=stops[destination],
+                status='confirmed',
+                payment_method='cash',
+                total_price=2500,
+                user=user,
+            )
+
+        book(target, 1, 0, 1, 'Occupant A-B')
+        book(target, 2, 1, 2, 'Occupant B-C')
+        Siege.objects.create(voyage=target, numero=3, statut=Siege.STATUT_OCCUPE)
+        first_leg = book(source, 2, 0, 1, 'Migrant A-B', self.client_user)
+        second_leg = book(source, 2, 1, 2, 'Migrant B-C', self.client_user)
+        reservation = Reservation.objects.create(
+            voyage=source,
+            siege=Siege.objects.create(voyage=source, numero=1, statut=Siege.STATUT_OCCUPE),
+            client_nom='Passager complet',
+            client_telephone='90000061',
+            montant_billet=5000,
+            frais_evex=300,
+            montant_total=5300,
+            frais_qos=90,
+            revenu_net_evex=210,
+            montant_reverse_compagnie=5000,
+            operateur=Reservation.OPERATEUR_FLOOZ,
+            reference_evex='EVEX-MIGRATION-001',
+            statut_paiement=Reservation.STATUT_PAYE,
+            reversement_effectue=True,
+        )
+        self.client.force_authenticate(user=self.admin)
+        url = f'/api/guichet/voyages/{source.id}/migrer/'
+        payload = {'target_voyage_id': target.id, 'reason': 'Panne moteur'}
+
+        plan = self.client.post(url, {**payload, 'dry_run': True}, format='json')
+        self.assertEqual(plan.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            sorted((line['client_name'], line['new_seat']) for line in plan.data['placed']),
+            [('Migrant A-B', '2'), ('Migrant B-C', '1')],
+        )
+        self.assertEqual(plan.data['unplaced'][0]['client_phone'], '90000061')
+        self.assertEqual(Booking.objects.filter(scheduled_trip=target).count(), 2)
+
+        invalid = self.client.post(url, {**payload, 'dry_run': 'peut-être'}, format='json')
+        self.assertEqual(invalid.status_code, status.HTTP_400_BAD_REQUEST)
+
+        migrated = self.client.post(url, {**payload, 'dry_run': 'false', 'cancel_source': 'true'}, format='json')
+        self.assertFalse(migrated.data['dry_run'])
+        self.assertEqual((len(migrated.data['placed']), migrated.data['refunded']), (2, 1))
+        first_leg.refresh_from_db()
+        second_leg.refresh_from_db()
+        self.assertEqual((first_leg.scheduled_trip_id, first_leg.seat_number), (target.id, '2'))
+        self.assertEqual((second_leg.scheduled_trip_id, second_leg.seat_number), (target.id, '1'))
+        reservation.refresh_from_db()
+        self.assertEqual(reservation.statut_paiement, Reservation.STATUT_REMBOURSE)
+        self.assertEqual(CompteCagnotte.objects.get(compagnie=self.company).solde_a_reverser, -5000)
+        self.assertEqual(MouvementCagnotte.objects.get(reservation=reservation).montant, -5000)
+        self.assertEqual(Notification.objects.filter(user=self.client_user, type='trip_update').count(), 2)
+        source.refresh_from_db()
+        self.assertFalse(source.is_active)
+        self.assertEqual(source.available_seats, 3)
+        self.assertEqual(Siege.objects.get(voyage=source, numero=1).statut, Siege.STATUT_LIBRE)
+        self.assertEqual(
+            TicketIndex.objects.get(source='booking', source_id=str(first_leg.id)).voyage_id,
+            target.id,
+        )
+
+    def test_scanner_verifies_signed_ticket_and_uses_memory_bitmap(self):
+        self.authenticate_agent()
+        sale_response = self.client.post(
+            '/api/guichet/ventes/creer/',
+            {
+                'voyage_id': self.voyage.id,
+                'numero_siege': 8,
+                'client_nom': 'Client Signé',
+                'client_telephone': '90000015',
+                'mode_paiement': 'cash',
+            },
+            format='json',
+        )
+        token = sale_response.data['qr_token']
+        self.assertTrue(token.startswith('EVX1'))
+        self.assertLessEqual(len(token), 80)
+        sale = VenteGuichet.objects.get(reference_vente=sale_response.data['reference_vente'])
+        self.assertEqual(sale.qr_code_data, token)
+
+        first_scan = self.client.post(
+            '/api/guichet/controle/scanner/',
+            {'qr_code_data': token},
+            format='json',
+        )
+        self.assertEqual(first_scan.data['resultat'], 'valide')
+        self.assertEqual(first_scan.data['reference'], sale.reference_vente)
+        self.assertEqual(first_scan.data['numero_siege'], 8)
+        sale.refresh_from_db()
+        self.assertEqual(sale.statut, 'utilise')
+
+        with self.assertNumQueries(0):
+            self.assertTrue(used_tickets.is_used(verify_ticket(token, self.company.id)))
+        second_scan = self.client.post(
+            '/api/guichet/controle/scanner/',
+            {'qr_code_data': token.lower()},
+            format='json',
+        )
+        self.assertEqual(second_scan.data['resultat'], 'deja_utilise')
+
+        tampered = token[:-3] + ('AAA' if not token.endswith('AAA') else 'BBB')
+        forged = self.client.post(
+            '/api/guichet/controle/scanner/',
+            {'qr_code_data': tampered},
+            format='json',
+        )
+        self.assertEqual(forged.data['resultat'], 'invalide')
+
+        self.client.force_authenticate(user=self.other_agent_user)
+        foreign = self.client.post(
+            '/api/guichet/controle/scanner/',
+            {'qr_code_data': token},
+            format='json',
+        )
+        self.assertEqual(foreign.data['message'], 'Signature du billet invalide')
+        self.assertEqual(
+            ControlePassager.objects.filter(vente=sale).count(),
+            2,
+        )
+
+    def test_offline_key_lets_agents_verify_their_company_tickets(self):
+        token = sign_ticket(
+            self.company.id,
+            source='guichet',
+            ticket_id=uuid.uuid4(),
+            voyage_id=self.voyage.id,
+            seat=3,
+            expires_at=int(timezone.now().timestamp()) + 3600,
+        )
+        self.authenticate_agent()
+
+        response = self.client.get('/api/guichet/controle/cle-hors-ligne/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Cache-Control'], 'no-store')
+        encoded = token[len(response.data['prefixe']):]
+        data = base64.b32decode(encoded + '=' * (-len(encoded) % 8))
+        body, signature = data[:-response.data['signature_octets']], data[-response.data['signature_octets']:]
+        key = base64.b64decode(response.data['cle'])
+        self.assertEqual(hmac.new(key, body, hashlib.sha256).digest()[:len(signature)], signature)
+
+        self.client.force_authenticate(user=self.other_agent_user)
+        other = self.client.get('/api/guichet/controle/cle-hors-ligne/')
+        self.assertNotEqual(other.data['cle'], response.data['cle'])
+        self.client.force_authenticate(user=self.admin)
+        self.assertEqual(
+            self.client.get('/api/guichet/controle/cle-hors-ligne/').status_code,
+            status.HTTP_403_FORBIDDEN,
+        )
+
+    def test_scanner_answers_signed_ticket_of_a_deleted_sale(self):
+        token = sign_ticket(
+            self.company.id,
+            source='guichet',
+            ticket_id=uuid.uuid4(),
+            voyage_id=self.voyage.id + 1000,
+            seat=5,
+            expires_at=int(timezone.now().timestamp()) + 3600,
+        )
+        self.authenticate_agent()
+
+        response = self.client.post(
+            '/api/guichet/controle/scanner/',
+            {'qr_code_data': token},
+            format='json',
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['resultat'], 'invalide')
+        self.assertEqual(response.data['message'], 'Vente introuvable')
+        self.assertFalse(ControlePassager.objects.exists())
+
+    def test_scanner_rejects_signed_ticket_moved_since_issue(self):
+        booking = Booking.objects.create(
+            trip=self.trip,
+            scheduled_trip=self.voyage,
+            passenger_name='Passager déplacé',
+            passenger_email='deplace@example.com',
+            passenger_phone='90000017',
+            seat_number='12',
+            status='confirmed',
+            payment_method='cash',
+            total_price=self.trip.price,
+        )
+        old_seat = sign_ticket(
+            self.company.id,
+            source='booking',
+            ticket_id=booking.id,
+            voyage_id=self.voyage.id,
+            seat=11,
+            expires_at=int(timezone.now().timestamp()) + 3600,
+        )
+        old_voyage = sign_ticket(
+            self.company.id,
+            source='booking',
+            ticket_id=booking.id,
+            voyage_id=self.voyage.id + 1000,
+            seat=12,
+            expires_at=int(timezone.now().timestamp()) + 3600,
+        )
+        self.authenticate_agent()
+
+        seat_scan = self.client.post('/api/guichet/controle/scanner/', {'qr_code_data': old_seat}, format='json')
+        voyage_scan = self.client.post('/api/guichet/controle/scanner/', {'qr_code_data': old_voyage}, format='json')
+
+        self.assertEqual(
+            (seat_scan.data['resultat'], seat_scan.data['message']),
+            ('invalide', 'Billet rattaché à un autre siège'),
+        )
+        self.assertEqual(
+            (voyage_scan.data['resultat'], voyage_scan.data['message']),
+            ('invalide', 'Billet rattaché à un autre voyage'),
+        )
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, 'confirmed')
+        self.assertFalse(used_tickets.is_used(verify_ticket(old_seat, self.company.id)))
+
+    def test_scanner_rejects_expired_signed_ticket(self):
+        booking = Booking.objects.create(
+            trip=self.trip,
+            scheduled_trip=self.voyage,
+            passenger_name='Passager expiré',
+            passenger_email='expire@example.com',
+            passenger_phone='90000016',
+            seat_number='9',
+            status='confirmed',
+            payment_method='cash',
+            total_price=self.trip.price,
+        )
+        token = sign_ticket(
+            self.company.id,
+            source='booking',
+            ticket_id=booking.id,
+            voyage_id=self.voyage.id,
+            seat=9,
+            expires_at=int(timezone.now().timestamp()) - 60,
+        )
+        self.authenticate_agent()
+
+        response = self.client.post(
+            '/api/guichet/controle/scanner/',
+            {'qr_code_data': token},
+            format='json',
+        )
+
+        self.assertEqual(response.data['resultat'], 'invalide')
+        self.assertEqual(response.data['message'], 'Billet expiré')
+        self.assertFalse(ControlePassager.objects.filter(booking=booking).exists())
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, 'confirmed')
+        self.assertTrue(TicketIndex.objects.get(source='booking', source_id=str(booking.id)).payload['qr_token'])
+
+    def test_offline_manifest_and_batched_scans_resolve_conflicts(self):
+        self.authenticate_agent()
+        tokens = []
+        for seat in (2, 4):
+            response = self.client.post(
+                '/api/guichet/ventes/creer/',
+                {
+                    'voyage_id': self.voyage.id,
+                    'numero_siege': seat,
+                    'client_nom': f'Client hors ligne {seat}',
+                    'client_telephone': f'9000006{seat % 10}',
+                    'mode_paiement': 'cash',
+                },
+                format='json',
+            )
+            tokens.append(response.data['qr_token'])
+
+        manifest = self.client.get(f'/api/guichet/voyages/{self.voyage.id}/manifeste/')
+        self.assertEqual(manifest.status_code, status.HTTP_200_OK)
+        self.assertTrue(manifest.data['full'])
+        columns = manifest.data['columns']
+        rows = [dict(zip(columns, row)) for row in manifest.data['tickets']]
+        self.assertEqual([row['seat'] for row in rows], ['2', '4'])
+        self.assertEqual({row['state'] for row in rows}, {'valid'})
+        self.assertEqual({row['token'] for row in rows}, set(tokens))
+
+        # Après le téléchargement du manifeste : l'heure annoncée est conservée.
+        scanned_at = timezone.now()
+        scans = [
+            {
+                'scan_id': 'device-b-1',
+                'device_id': 'B',
+                'scanned_at': (scanned_at + timedelta(seconds=5)).isoformat(),
+                'qr_code_data': tokens[0],
+            },
+            {
+                'scan_id': 'device-a-1',
+                'device_id': 'A',
+                'scanned_at': scanned_at.isoformat(),
+                'qr_code_data': tokens[0],
+            },
+            {
+                'scan_id': 'device-a-2',
+                'device_id': 'A',
+                'scanned_at': scanned_at.isoformat(),
+                'qr_code_data': tokens[1][:-4] + 'AAAA',
+            },
+        ]
+        sync = self.client.post('/api/guichet/controle/synchroniser/', {'scans': scans}, format='json')
+
+        self.assertEqual(sync.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item['resultat'] for item in sync.data['resultats']],
+            ['deja_utilise', 'valide', 'invalide'],
+        )
+        winner = ControlePassager.objects.get(scan_id='device-a-1')
+        self.assertEqual((winner.resultat, winner.device_id), ('valide', 'A'))
+        self.assertEqual(winner.scanned_at, scanned_at)
+        self.assertEqual(VenteGuichet.objects.get(pk=winner.vente_id).statut, 'utilise')
+
+        replay = self.client.post('/api/guichet/controle/synchroniser/', {'scans': scans[:2]}, format='json')
+        self.assertEqual(
+            [item['resultat'] for item in replay.data['resultats']],
+            ['deja_utilise', 'valide'],
+        )
+        self.assertEqual(ControlePassager.objects.filter(scan_id__isnull=False).count(), 2)
+
+        delta = self.client.get(
+            f'/api/guichet/voyages/{self.voyage.id}/manifeste/',
+            {'since': manifest.data['version']},
+        )
+        self.assertFalse(delta.data['full'])
+        self.assertGreaterEqual(delta.data['version'], manifest.data['version'])
+        states = {row[1]: row[5] for row in delta.data['tickets']}
+        self.assertEqual(states[str(winner.vente_id)], 'used')
+
+    def test_offline_scan_times_are_bounded_and_bad_dates_stay_local(self):
+        self.authenticate_agent()
+        tokens = []
+        for seat in (3, 5):
+            response = self.client.post(
+                '/api/guichet/ventes/creer/',
+                {
+                    'voyage_id': self.voyage.id,
+                    'numero_siege': seat,
+                    'client_nom': f'Client horloge {seat}',
+                    'client_telephone': f'9000007{seat}',
+                    'mode_paiement': 'cash',
+                },
+                format='json',
+            )
+            tokens.append(response.data['qr_token'])
+        downloaded_at = timezone.now()
+        self.client.get(f'/api/guichet/voyages/{self.voyage.id}/manifeste/')
+
+        before = timezone.now()
+        sync = self.client.post('/api/guichet/controle/synchroniser/', {'scans': [
+            {'scan_id': 'clock-1', 'scanned_at': '2026-13-01T10:00:00', 'qr_code_data': tokens[0]},
+            {'scan_id': 'clock-2', 'scanned_at': '2000-01-01T10:00:00+00:00', 'qr_code_data': tokens[0]},
+            {'scan_id': 'clock-3', 'scanned_at': '2999-01-01T10:00:00+00:00', 'qr_code_data': tokens[1]},
+        ]}, format='json')
+        after = timezone.now()
+
+        self.assertEqual(sync.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(item['resultat'], item['message']) for item in sync.data['resultats']],
+            [('invalide', 'Date de scan invalide'), ('valide', 'Billet valide'), ('valide', 'Billet valide')],
+        )
+        self.assertFalse(ControlePassager.objects.filter(scan_id='clock-1').exists())
+        backdated = ControlePassager.objects.get(scan_id='clock-2').scanned_at
+        self.assertTrue(downloaded_at <= backdated <= before)
+        future = ControlePassager.objects.get(scan_id='clock-3').scanned_at
+        self.assertTrue(before <= future <= after)
+
+    def test_offline_manifest_delta_lists_removed_tickets(self):
+        self.authenticate_agent()
+        ventes = []
+        for seat in (2, 4):
+            response = self.client.post(
+                '/api/guichet/ventes/creer/',
+                {
+                    'voyage_id': self.voyage.id,
+                    'numero_siege': seat,
+                    'client_nom': f'Client retiré {seat}',
+                    'client_telephone': f'9000008{seat % 10}',
+                    'mode_paiement': 'cash',
+                },
+                format='json',
+            )
+            ventes.append(VenteGuichet.objects.get(reference_vente=response.data['reference_vente']))
+        manifest = self.client.get(f'/api/guichet/voyages/{self.voyage.id}/manifeste/')
+        self.assertEqual(manifest.data['removed'], [])
+
+        later, _ = ScheduledTrip.objects.get_or_create(
+            trip=self.trip,
+            date=timezone.localdate() + timedelta(days=1),
+            defaults={'is_active': True},
+        )
+        VenteGuichet.objects.filter(pk=ventes[0].pk).update(voyage=later)
+        sync_ticket_index('guichet', [ventes[0].pk])
+        deleted_id = str(ventes[1].pk)
+        ventes[1].delete()
+        remove_ticket_index('guichet', deleted_id)
+
+        delta = self.client.get(
+            f'/api/guichet/voyages/{self.voyage.id}/manifeste/',
+            {'since': manifest.data['version']},
+        )
+        self.assertGreater(delta.data['version'], manifest.data['version'])
+        self.assertEqual(delta.data['tickets'], [])
+        self.assertEqual(
+            sorted(delta.data['removed']),
+            sorted([['guichet', str(ventes[0].pk)], ['guichet', deleted_id]]),
+        )
+        moved = self.client.get(f'/api/guichet/voyages/{later.id}/manifeste/', {'since': manifest.data['version']})
+        self.assertEqual([row[1] for row in moved.data['tickets']], [str(ventes[0].pk)])
+        self.assertEqual(moved.data['removed'], [])
+
+    def test_offline_scan_uploaded_concurrently_is_replayed(self):
+        self.authenticate_agent()
+        response = self.client.post(
+            '/api/guichet/ventes/creer/',
+            {
+                'voyage_id': self.voyage.id,
+                'numero_siege': 5,
+                'client_nom': 'Client concurrent',
+                'client_telephone': '90000085',
+                'mode_paiement': 'cash',
+            },
+            format='json',
+        )
+        scan = {'scan_id': 'device-c-1', 'device_id': 'C', 'qr_code_data': response.data['qr_token']}
+        first = self.client.post('/api/guichet/controle/synchroniser/', {'scans': [scan]}, format='json')
+        self.assertEqual(first.data['resultats'][0]['resultat'], 'valide')
+
+        # Le second envoi ne voit pas le premier avant d'écrire, comme deux requêtes parallèles.
+        calls = iter([lambda pending, results: None, boarding._replay_scans])
+        with mock.patch('guichet.boarding._replay_scans', side_effect=lambda *args: next(calls)(*args)) as replay:
+            second = self.client.post('/api/guichet/controle/synchroniser/', {'scans': [scan]}, format='json')
+
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.data['resultats'][0]['resultat'], 'valide')
+        self.assertTrue(second.data['resultats'][0]['rejoue'])
+        self.assertEqual(replay.call_count, 2)
+        self.assertEqual(ControlePassager.objects.filter(scan_id='device-c-1').count(), 1)
+
+    def test_sale_renders_qr_after_commit_with_cache_and_svg_batch(self):
+        qr_cache.clear()
+        self.authenticate_agent()
+        response = self.client.post(
+            '/api/guichet/ventes/creer/',
+            {
+                'voyage_id': self.voyage.id,
+                'numero_siege': 3,
+                'client_nom': 'Client SVG',
+                'client_telephone': '90000071',
+                'mode_paiement': 'cash',
+                'qr_format': 'svg',
+            },
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(response.data['qr_code_svg'].startswith('<svg'))
+        self.assertNotIn('qr_code_base64', response.data)
+
+        batch = self.client.get(f'/api/guichet/voyages/{self.voyage.id}/qr/')
+        self.assertEqual(batch.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(batch.data), 1)
+        self.assertEqual(batch.data[0]['qr'], response.data['qr_code_svg'])
+        self.assertEqual(qr_cache.hits, 1)
+
+        self.assertEqual(render_qr(response.data['qr_token'], 'text'), response.data['qr_token'])
+        png = render_qr(response.data['qr_token'], 'png')
+        self.assertIs(render_qr(response.data['qr_token'], 'png'), png)
+        invalid = self.client.post(
+            '/api/guichet/ventes/creer/',
+            {
+                'voyage_id': self.voyage.id,
+                'numero_siege': 4,
+                'client_nom': 'Client format',
+                'client_telephone': '90000072',
+                'mode_paiement': 'cash',
+                'qr_format': 'gif',
+            },
+            format='json',
+        )
+        self.assertEqual(invalid.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_scanner_accepts_enriched_mobile_booking_qr(self):
         booking = Booking.objects.create(
             trip=self.trip,
@@ -740,7 +1708,7 @@ class GuichetApiTests(APITestCase):
         self.assertEqual(tickets_response.status_code, status.HTTP_200_OK)
         self.assertEqual(passengers_response.status_code, status.HTTP_200_OK)
         self.assertEqual(
-            {item['source'] for item in tickets_response.data},
+            {item['source'] for item in tickets_response.data['tickets']},
             {'booking', 'mobile', 'guichet'},
         )
         self.assertEqual(
@@ -748,7 +1716,7 @@ class GuichetApiTests(APITestCase):
             {'booking', 'mobile', 'guichet'},
         )
         booking_payload = next(
-            item for item in tickets_response.data
+            item for item in tickets_response.data['tickets']
             if item['source'] == 'booking' and item['id'] == str(booking.id)
         )
         self.assertEqual(booking_payload['channel'], 'application')
@@ -761,6 +1729,89 @@ class GuichetApiTests(APITestCase):
         self.assertEqual(stats_response.data['guichet_sales'], 1)
         self.assertEqual(stats_response.data['total_bookings'], 3)
 
+    def test_ticket_search_filters_in_sql_and_pages_with_cursor(self):
+        same_instant = timezone.now() - timedelta(hours=1)
+        for index in range(5):
+            Booking.objects.create(
+                trip=self.trip,
+                scheduled_trip=self.voyage,
+                passenger_name=f'Client page {index}',
+                passenger_email=f'page{index}@example.com',
+                passenger_phone=f'9100000{index}',
+                seat_number=str(index + 10),
+                status='confirmed',
+                payment_method='cash',
+                total_price=self.trip.price,
+            )
+        for index in range(3):
+            seat = Siege.objects.create(
+                voyage=self.voyage,
+                numero=index + 20,
+                statut=Siege.STATUT_OCCUPE,
+            )
+            Reservation.objects.create(
+                voyage=self.voyage,
+                siege=seat,
+                client_nom=f'Client mobile {index}',
+                client_telephone=f'9200000{index}',
+                montant_billet=5000,
+                frais_evex=300,
+                montant_total=5300,
+                frais_qos=90,
+                revenu_net_evex=210,
+                montant_reverse_compagnie=5000,
+                operateur=Reservation.OPERATEUR_FLOOZ,
+                reference_evex=f'EVEX-PAGE-{index}',
+                statut_paiement=Reservation.STATUT_PAYE,
+            )
+        # Même horodatage partout : seul le départage (canal, id) ordonne les pages.
+        Booking.objects.update(booking_date=same_instant)
+        Reservation.objects.update(created_at=same_instant)
+        call_command('rebuild_ticket_index', stdout=StringIO())
+        Booking.objects.create(
+            trip=self.other_trip,
+            scheduled_trip=self.other_voyage,
+            passenger_name='Client page autre',
+            passenger_email='other-page@example.com',
+            passenger_phone='91000009',
+            seat_number='1',
+            status='confirmed',
+            payment_method='cash',
+            total_price=self.other_trip.price,
+        )
+        self.authenticate_agent()
+
+        seen = []
+        cursor = None
+        for _ in range(10):
+            params = {'limit': 3}
+            if cursor:
+                params['cursor'] = cursor
+            response = self.client.get('/api/guichet/billets/', params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data['tickets']), 3)
+            seen.extend((item['source'], item['id']) for item in response.data['tickets'])
+            cursor = response.data['next_cursor']
+            if not cursor:
+                break
+
+        self.assertEqual(len(seen), 8)
+        self.assertEqual(len(set(seen)), 8)
+
+        phone_response = self.client.get('/api/guichet/billets/', {'q': '92000001'})
+        self.assertEqual(
+            [item['reference'] for item in phone_response.data['tickets']],
+            ['EVEX-PAGE-1'],
+        )
+        source_response = self.client.get(
+            '/api/guichet/billets/',
+            {'source': 'booking', 'status': 'confirmed'},
+        )
+        self.assertEqual(len(source_response.data['tickets']), 5)
+        self.assertIsNone(source_response.data['next_cursor'])
+        invalid_response = self.client.get('/api/guichet/billets/', {'cursor': 'invalide'})
+        self.assertEqual(invalid_response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_agent_and_company_admin_manage_own_tickets_with_audit(self):
         booking = Booking.objects.create(
             trip=self.trip,
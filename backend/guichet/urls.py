@@ -1,9 +1,11 @@
 from django.urls import path
 from .views import (
     CreerAgentView, ListeAgentsView, ActiverAgentView, DashboardGuichetView,
-    VoyagesDisponiblesView, SiegesVoyageView, CreerVenteView, AnnulerVenteView,
+    VoyagesDisponiblesView, SiegesVoyageView, CreerVenteView, CreerVentesLotView, AnnulerVenteView,
     ScannerQRView, HistoriqueControlesView, HistoriqueVentesView, PassagersVoyageView,
-    ActionBilletView, BilletsCompagnieView, OperationsBilletsView,
+    ActionBilletView, ActionsGroupeesBilletsView, BilletsCompagnieView, OperationsBilletsView,
+    CleHorsLigneView, ManifesteVoyageView, MigrerVoyageView, QRCodesVoyageView, SynchroniserControlesView,
+    SessionCaisseGuichetView, OuvrirSessionCaisseView, SessionsCaisseView, CloturerSessionCaisseView,
 )
 
 urlpatterns = [
@@ -14,12 +16,23 @@ urlpatterns = [
     path('voyages/disponibles/', VoyagesDisponiblesView.as_view()),
     path('voyages/<int:vid>/sieges/', SiegesVoyageView.as_view()),
     path('ventes/creer/', CreerVenteView.as_view()),
+    path('ventes/creer-lot/', CreerVentesLotView.as_view()),
     path('ventes/<str:ref>/annuler/', AnnulerVenteView.as_view()),
     path('controle/scanner/', ScannerQRView.as_view()),
     path('controle/historique/', HistoriqueControlesView.as_view()),
+    path('controle/synchroniser/', SynchroniserControlesView.as_view()),
+    path('controle/cle-hors-ligne/', CleHorsLigneView.as_view()),
     path('ventes/historique/', HistoriqueVentesView.as_view()),
     path('billets/', BilletsCompagnieView.as_view()),
     path('billets/operations/', OperationsBilletsView.as_view()),
+    path('billets/actions/', ActionsGroupeesBilletsView.as_view()),
+    path('voyages/<int:vid>/migrer/', MigrerVoyageView.as_view()),
     path('billets/<str:source>/<str:pk>/action/', ActionBilletView.as_view()),
     path('voyages/<int:vid>/passagers/', PassagersVoyageView.as_view()),
+    path('voyages/<int:vid>/manifeste/', ManifesteVoyageView.as_view()),
+    path('voyages/<int:vid>/qr/', QRCodesVoyageView.as_view()),
+    path('caisse/session/', SessionCaisseGuichetView.as_view()),
+    path('caisse/session/ouvrir/', OuvrirSessionCaisseView.as_view()),
+    path('caisse/sessions/', SessionsCaisseView.as_view()),
+    path('caisse/sessions/<uuid:id>/cloturer/', CloturerSessionCaisseView.as_view()),
 ]
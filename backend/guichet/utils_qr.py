@@ -1,15 +1,155 @@
-import qrcode
-import json
+"""Rendu des QR codes de billets.
+
+Le rendu est fait hors des transactions de vente. Les images sont gardées dans
+un cache LRU indexé par l'empreinte SHA-256 du contenu : une réimpression ou
+un second affichage du même billet ne recalcule rien. Trois formats :
+
+- ``png`` : image PNG en base64 (historique, via qrcode/PIL) ;
+- ``svg`` : chemin SVG construit directement depuis la matrice, sans PIL ;
+- ``text`` : le contenu brut, que le client dessine lui-même (aucun rendu).
+
+Pour l'impression par lots, ``render_qr_batch`` peut répartir les rendus
+manquants sur un pool de processus (``QR_RENDER_WORKERS``).
+"""
 import base64
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from io import BytesIO
 
+import qrcode
+from django.conf import settings
+
 
-def generer_qr_code_base64(data: dict) -> str:
-    json_data = json.dumps(data, ensure_ascii=False)
-    qr = qrcode.QRCode(version=1, box_size=10, border=4)
-    qr.add_data(json_data)
+QR_FORMATS = ('png', 'svg', 'text')
+QR_CACHE_SIZE = 1024
+BATCH_POOL_THRESHOLD = 32
+
+
+def qr_text(data) -> str:
+    return data if isinstance(data, str) else json.dumps(data, ensure_ascii=False)
+
+
+def _matrix(text):
+    qr = qrcode.QRCode(version=None, box_size=10, border=4)
+    qr.add_data(text)
     qr.make(fit=True)
-    img = qr.make_image(fill_color="black", back_color="white")
+    return qr
+
+
+def _png(text):
+    img = _matrix(text).make_image(fill_color="black", back_color="white")
     buffer = BytesIO()
     img.save(buffer, format="PNG")
     return base64.b64encode(buffer.getvalue()).decode()
+
+
+def _svg(text, box_size=10):
+    matrix = _matrix(text).get_matrix()
+    size = len(matrix)
+    path = []
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < size:
+            if not row[x]:
+                x += 1
+                continue
+            start = x
+            while x < size and row[x]:
+                x += 1
+            path.append(f"M{start} {y}h{x - start}v1h-{x - start}z")
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}" '
+        f'width="{size * box_size}" height="{size * box_size}" shape-rendering="crispEdges">'
+        f'<rect width="{size}" height="{size}" fill="#fff"/>'
+        f'<path d="{"".join(path)}" fill="#000"/></svg>'
+    )
+
+
+def _render(text, fmt):
+    if fmt == "text":
+        return text
+    if fmt == "svg":
+        return _svg(text)
+    return _png(text)
+
+
+class QRRenderCache:
+    def __init__(self, maxsize=QR_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(text, fmt):
+        return hashlib.sha256(text.encode()).digest(), fmt
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.hits = self.misses = 0
+
+
+qr_cache = QRRenderCache()
+
+
+def render_qr(data, fmt="png") -> str:
+    if fmt not in QR_FORMATS:
+        raise ValueError(f"Format de QR inconnu : {fmt}")
+    text = qr_text(data)
+    if fmt == "text":
+        return text
+    key = qr_cache.key(text, fmt)
+    cached = qr_cache.get(key)
+    if cached is None:
+        cached = _render(text, fmt)
+        qr_cache.put(key, cached)
+    return cached
+
+
+def render_qr_batch(items, fmt="png", workers=None):
+    """Rend une liste de contenus ; les absents du cache peuvent passer par un pool de processus."""
+    if fmt not in QR_FORMATS:
+        raise ValueError(f"Format de QR inconnu : {fmt}")
+    texts = [qr_text(item) for item in items]
+    if fmt == "text":
+        return texts
+    workers = settings.QR_RENDER_WORKERS if workers is None else workers
+    results = [qr_cache.get(qr_cache.key(text, fmt)) for text in texts]
+    missing = [index for index, value in enumerate(results) if value is None]
+    if workers > 1 and len(missing) >= BATCH_POOL_THRESHOLD:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            rendered = pool.map(_render, [texts[index] for index in missing], [fmt] * len(missing), chunksize=8)
+            for index, value in zip(missing, rendered):
+                results[index] = value
+    else:
+        for index in missing:
+            results[index] = _render(texts[index], fmt)
+    for index in missing:
+        qr_cache.put(qr_cache.key(texts[index], fmt), results[index])
+    return results
+
+
+def generer_qr_code_base64(data) -> str:
+    return render_qr(data, "png")
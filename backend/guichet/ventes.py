@@ -0,0 +1,221 @@
+"""Vente de plusieurs places au guichet en une seule transaction.
+
+Le voyage est verrouillé une fois pour tout le lot. Les sièges demandés (ou
+choisis automatiquement, côte à côte si possible) sont vérifiés ensemble,
+puis les sièges, les ventes et le journal d'audit sont écrits par
+``bulk_create``/``update``. Les QR codes sont rendus après la transaction, en
+un seul appel à ``render_qr_batch``.
+"""
+import uuid
+
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import NotFound, ValidationError
+
+from transport.models import Booking, PlatformConfiguration, ScheduledTrip, Siege
+from transport.services.ticket_tokens import sign_ticket, token_expiry
+from transport.ticketing import bulk_log_actions, sync_ticket_index
+
+from .caisse import session_pour_vente
+from .compteurs import compter_ventes
+from .models import VenteGuichet
+
+
+MAX_PLACES_PAR_VENTE = 20
+
+
+def reference_vente():
+    return f"GUICHET-{timezone.localdate().strftime('%Y%m%d')}-{uuid.uuid4().hex[:8].upper()}"
+
+
+def qr_payload_vente(vente, voyage, agent):
+    return {
+        'type': 'guichet',
+        'reference': vente.reference_vente,
+        'voyage_id': str(voyage.id),
+        'siege': vente.siege.numero,
+        'client': vente.client_nom,
+        'compagnie': voyage.trip.company.name,
+        'agence': agent.agence.nom if agent.agence else None,
+        'guichet': agent.guichet.code if agent.guichet else None,
+    }
+
+
+def recu_vente(vente, voyage, agent, qr_format):
+    return {
+        'reference_vente': vente.reference_vente,
+        'qr_code_data': qr_payload_vente(vente, voyage, agent),
+        'qr_token': vente.qr_code_data,
+        'qr_format': qr_format,
+        'client_nom': vente.client_nom,
+        'client_telephone': vente.client_telephone,
+        'voyage': {
+            'trajet': f"{voyage.trip.departure_city.name}→{voyage.trip.arrival_city.name}",
+            'heure_depart': voyage.trip.departure_time,
+            'date': voyage.date,
+        },
+        'siege': vente.siege.numero,
+        'montant_billet': vente.montant_billet,
+        'frais_evex': vente.frais_evex,
+        'montant_total': vente.montant_total,
+        'mode_paiement': vente.mode_paiement,
+        'agence': agent.agence.nom if agent.agence else None,
+        'guichet': agent.guichet.nom if agent.guichet else None,
+        'created_at': vente.created_at,
+    }
+
+
+def _passagers(passagers, client_nom, client_telephone):
+    if not isinstance(passagers, list) or not passagers:
+        raise ValidationError({'detail': 'La liste des passagers est obligatoire.'})
+    if len(passagers) > MAX_PLACES_PAR_VENTE:
+        raise ValidationError({'detail': f'{MAX_PLACES_PAR_VENTE} places maximum par vente.'})
+    lignes = []
+    for passager in passagers:
+        if not isinstance(passager, dict):
+            raise ValidationError({'detail': 'Passager invalide.'})
+        nom = str(passager.get('client_nom') or client_nom or '').strip()
+        telephone = str(passager.get('client_telephone') or client_telephone or '').strip()
+        if not nom or not telephone:
+            raise ValidationError({'detail': 'Nom et téléphone obligatoires pour chaque passager.'})
+        siege = passager.get('numero_siege')
+        if siege not in (None, ''):
+            try:
+                siege = int(siege)
+            except (TypeError, ValueError):
+                raise ValidationError({'detail': 'Numéro de siège invalide.'})
+        else:
+            siege = None
+        lignes.append({'client_nom': nom, 'client_telephone': telephone, 'numero_siege': siege})
+    demandes = [ligne['numero_siege'] for ligne in lignes if ligne['numero_siege'] is not None]
+    if len(demandes) != len(set(demandes)):
+        raise ValidationError({'detail': 'Un même siège est demandé deux fois.'})
+    return lignes
+
+
+def _places_libres_groupees(libres, nombre):
+    """Premier bloc de ``nombre`` sièges consécutifs, sinon les plus petits numéros libres."""
+    for index in range(len(libres) - nombre + 1):
+        bloc = libres[index:index + nombre]
+        if bloc[-1] - bloc[0] == nombre - 1:
+            return bloc
+    return libres[:nombre]
+
+
+@transaction.atomic
+def vendre_places(*, agent, user, voyage_id, passagers, mode_paiement, client_nom='', client_telephone='', ip_address=None):
+    """Vend un lot de places sur un voyage et retourne ``(voyage, ventes)``."""
+    if mode_paiement not in dict(VenteGuichet.MODE_CHOICES):
+        raise ValidationError({'detail': 'Mode de paiement invalide.'})
+    lignes = _passagers(passagers, client_nom, client_telephone)
+    voyage = (
+        ScheduledTrip.objects.select_for_update(of=('self',))
+        .select_related('trip__company', 'trip__departure_city', 'trip__arrival_city')
+        .filter(
+            id=voyage_id,
+            trip__company=agent.compagnie,
+            is_active=True,
+            date__gte=timezone.localdate(),
+        )
+        .first()
+    )
+    if voyage is None:
+        raise NotFound('Voyage introuvable')
+    capacite = voyage.trip.capacity
+    if any(not 1 <= ligne['numero_siege'] <= capacite for ligne in lignes if ligne['numero_siege'] is not None):
+        raise ValidationError({'detail': 'Numéro de siège hors capacité.'})
+
+    sieges = {siege.numero: siege for siege in Siege.objects.select_for_update().filter(voyage=voyage)}
+    pris = {numero for numero, siege in sieges.items() if siege.statut != Siege.STATUT_LIBRE}
+    pris.update(
+        int(numero)
+        for numero in Booking.objects.filter(
+            scheduled_trip=voyage,
+            status__in=['confirmed', 'pending'],
+        ).values_list('seat_number', flat=True)
+        if str(numero).isdigit()
+    )
+    demandes = {ligne['numero_siege'] for ligne in lignes if ligne['numero_siege'] is not None}
+    indisponibles = sorted(demandes & pris)
+    if indisponibles:
+        raise ValidationError({
+            'detail': 'Siège(s) non disponible(s).',
+            'sieges': indisponibles,
+        })
+    sans_siege = [ligne for ligne in lignes if ligne['numero_siege'] is None]
+    libres = [numero for numero in range(1, capacite + 1) if numero not in pris and numero not in demandes]
+    if len(libres) < len(sans_siege):
+        raise ValidationError({'detail': 'Plus assez de sièges libres sur ce voyage.'})
+    for ligne, numero in zip(sans_siege, _places_libres_groupees(libres, len(sans_siege))):
+        ligne['numero_siege'] = numero
+
+    numeros = [ligne['numero_siege'] for ligne in lignes]
+    Siege.objects.filter(pk__in=[sieges[numero].pk for numero in numeros if numero in sieges]).update(
+        statut=Siege.STATUT_OCCUPE,
+    )
+    nouveaux = Siege.objects.bulk_create([
+        Siege(voyage=voyage, numero=numero, statut=Siege.STATUT_OCCUPE)
+        for numero in numeros
+        if numero not in sieges
+    ])
+    sieges.update({siege.numero: siege for siege in nouveaux})
+
+    montant_billet = int(voyage.trip.price)
+    frais_evex = PlatformConfiguration.load().service_fee
+    session = session_pour_vente(agent)
+    expiration = token_expiry(voyage.date)
+    ventes = []
+    for ligne in lignes:
+        vente_id = uuid.uuid4()
+        ventes.append(VenteGuichet(
+            id=vente_id,
+            agent=agent,
+            agence=agent.agence,
+            guichet=agent.guichet,
+            session=session,
+            voyage=voyage,
+            siege=sieges[ligne['numero_siege']],
+            client_nom=ligne['client_nom'],
+            client_telephone=ligne['client_telephone'],
+            montant_billet=montant_billet,
+            frais_evex=frais_evex,
+            montant_total=montant_billet + frais_evex,
+            mode_paiement=mode_paiement,
+            reference_vente=reference_vente(),
+            qr_code_data=sign_ticket(
+                agent.compagnie_id,
+                source='guichet',
+                ticket_id=vente_id,
+                voyage_id=voyage.id,
+                seat=ligne['numero_siege'],
+                expires_at=expiration,
+            ),
+        ))
+    VenteGuichet.objects.bulk_create(ventes)
+    compter_ventes(ventes)
+    sync_ticket_index('guichet', [vente.pk for vente in ventes])
+    bulk_log_actions(
+        user,
+        'CREATE',
+        [
+            (
+                vente,
+                None,
+                {
+                    'operation': 'sale',
+                    'bulk': True,
+                    'source': 'guichet',
+                    'client_name': vente.client_nom,
+                    'client_phone': vente.client_telephone,
+                    'voyage_id': voyage.id,
+                    'seat': vente.siege.numero,
+                    'amount': vente.montant_total,
+                },
+            )
+            for vente in ventes
+        ],
+        ip_address=ip_address,
+    )
+    voyage.available_seats = max(0, voyage.available_seats - len(ventes))
+    voyage.save(update_fields=['available_seats'])
+    return voyage, ventes
@@ -1,14 +1,16 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
+from django.core.cache import cache
 from django.db import transaction
 from django.db.models import Count, Q, Sum
 from django.utils import timezone
-from transport.models import ScheduledTrip, Siege, Reservation, Booking, PlatformConfiguration
-from .models import Agence, AgentGuichet, Guichet, VenteGuichet, ControlePassager
+from transport.models import ScheduledTrip, Siege, Reservation, Booking, PlatformConfiguration, TicketIndex
+from .models import Agence, AgentGuichet, Guichet, SessionCaisse, VenteGuichet, ControlePassager
 from .serializers import AgenceSerializer, AgentGuichetSerializer, GuichetSerializer, VenteGuichetSerializer, ControlePassagerSerializer, VoyageDisponibleSerializer, PassagerSerializer
 from .permissions import (
     IsAdminCompagnie,
@@ -16,16 +18,45 @@ from .permissions import (
     IsAgentGuichet,
     get_admin_company,
 )
-from .utils_qr import generer_qr_code_base64
+from .boarding import apply_offline_scans, boarding_manifest, record_manifest_download
+from .caisse import (
+    cloturer_session,
+    consolider_sessions,
+    ouvrir_session,
+    rapport_session,
+    session_ouverte,
+    session_pour_vente,
+)
+from .compteurs import compter_controles, compter_ventes, compteur_du_jour
+from .utils_qr import QR_FORMATS, render_qr, render_qr_batch
+from .ventes import recu_vente, reference_vente, vendre_places
 from transport.models.audit import log_action
+from transport.services.ticket_tokens import (
+    ExpiredTicketToken,
+    InvalidTicketToken,
+    is_ticket_token,
+    offline_key,
+    sign_ticket,
+    token_expiry,
+    used_tickets,
+    verify_ticket,
+)
+from transport.services.voyage_migration import migrate_voyage_passengers
 from transport.ticketing import (
-    filter_ticket_collection,
+    keyset_page,
+    perform_bulk_ticket_action,
     perform_ticket_action,
     ticket_audit_queryset,
-    ticket_collection,
+    ticket_page,
+    ticket_page_limit,
+    ticket_page_response,
 )
 import uuid
 import json
+import logging
+from datetime import datetime, time as dt_time, timedelta
+
+logger = logging.getLogger(__name__)
 
 
 def get_client_ip(request):
@@ -553,49 +584,162 @@ class ActiverAgentView(APIView):
         return Response({'status':'ok','actif':agent.actif})
 
 
-def vente_payload(vente):
+VENTE_PAYLOAD_FIELDS = (
+    'id',
+    'created_at',
+    'reference_vente',
+    'client_nom',
+    'client_telephone',
+    'voyage_id',
+    'voyage__date',
+    'voyage__trip__departure_time',
+    'voyage__trip__departure_city__name',
+    'voyage__trip__arrival_city__name',
+    'siege__numero',
+    'montant_billet',
+    'frais_evex',
+    'montant_total',
+    'mode_paiement',
+    'statut',
+    'agence__nom',
+    'guichet__nom',
+)
+
+CONTROLE_PAYLOAD_FIELDS = (
+    'id',
+    'created_at',
+    'vente__reference_vente',
+    'reservation__reference_evex',
+    'resultat',
+    'message',
+    'voyage_id',
+)
+
+
+def vente_row_payload(row):
+    """Payload d'une vente à partir d'une projection ``values(*VENTE_PAYLOAD_FIELDS)``."""
     return {
+        'reference_vente': row['reference_vente'],
+        'client_nom': row['client_nom'],
+        'client_telephone': row['client_telephone'],
+        'voyage_id': row['voyage_id'],
+        'trajet': f"{row['voyage__trip__departure_city__name']} → {row['voyage__trip__arrival_city__name']}",
+        'date_voyage': row['voyage__date'],
+        'heure_depart': row['voyage__trip__departure_time'],
+        'numero_siege': row['siege__numero'],
+        'montant_billet': row['montant_billet'],
+        'frais_evex': row['frais_evex'],
+        'montant_total': row['montant_total'],
+        'mode_paiement': row['mode_paiement'],
+        'statut': row['statut'],
+        'agence': row['agence__nom'],
+        'guichet': row['guichet__nom'],
+        'created_at': row['created_at'],
+        'annulable': (
+            row['statut'] == 'valide'
+            and row['voyage__date'] >= timezone.localdate()
+        ),
+    }
+
+
+def vente_payload(vente):
+    return vente_row_payload({
         'reference_vente': vente.reference_vente,
         'client_nom': vente.client_nom,
         'client_telephone': vente.client_telephone,
         'voyage_id': vente.voyage_id,
-        'trajet': f'{vente.voyage.trip.departure_city.name} → {vente.voyage.trip.arrival_city.name}',
-        'date_voyage': vente.voyage.date,
-        'heure_depart': vente.voyage.trip.departure_time,
-        'numero_siege': vente.siege.numero,
+        'voyage__date': vente.voyage.date,
+        'voyage__trip__departure_time': vente.voyage.trip.departure_time,
+        'voyage__trip__departure_city__name': vente.voyage.trip.departure_city.name,
+        'voyage__trip__arrival_city__name': vente.voyage.trip.arrival_city.name,
+        'siege__numero': vente.siege.numero,
         'montant_billet': vente.montant_billet,
         'frais_evex': vente.frais_evex,
         'montant_total': vente.montant_total,
         'mode_paiement': vente.mode_paiement,
         'statut': vente.statut,
-        'agence': vente.agence.nom if vente.agence else None,
-        'guichet': vente.guichet.nom if vente.guichet else None,
+        'agence__nom': vente.agence.nom if vente.agence else None,
+        'guichet__nom': vente.guichet.nom if vente.guichet else None,
         'created_at': vente.created_at,
-        'annulable': (
-            vente.statut == 'valide'
-            and vente.voyage.date >= timezone.localdate()
-        ),
-    }
+    })
 
 
-def controle_payload(controle):
+def controle_row_payload(row):
+    """Payload d'un contrôle à partir d'une projection ``values(*CONTROLE_PAYLOAD_FIELDS)``."""
     reference = None
     source = None
-    if controle.vente:
-        reference = controle.vente.reference_vente
+    if row['vente__reference_vente']:
+        reference = row['vente__reference_vente']
         source = 'guichet'
-    elif controle.reservation:
-        reference = controle.reservation.reference_evex
+    elif row['reservation__reference_evex']:
+        reference = row['reservation__reference_evex']
         source = 'mobile'
     return {
-        'id': str(controle.id),
+        'id': str(row['id']),
         'reference': reference,
         'source': source,
+        'resultat': row['resultat'],
+        'message': row['message'],
+        'voyage_id': row['voyage_id'],
+        'created_at': row['created_at'],
+    }
+
+
+def controle_payload(controle):
+    return controle_row_payload({
+        'id': controle.id,
+        'vente__reference_vente': controle.vente.reference_vente if controle.vente else None,
+        'reservation__reference_evex': controle.reservation.reference_evex if controle.reservation else None,
         'resultat': controle.resultat,
         'message': controle.message,
         'voyage_id': controle.voyage_id,
         'created_at': controle.created_at,
-    }
+    })
+
+
+def local_day_start(value):
+    """Début de journée locale d'une date ISO, ou ``None`` si la valeur est invalide."""
+    try:
+        day = datetime.fromisoformat(value).date()
+    except (TypeError, ValueError):
+        return None
+    return timezone.make_aware(datetime.combine(day, dt_time.min))
+
+
+def voyages_compagnie(compagnie_id):
+    """Prochains voyages d'une compagnie, calculés une fois pour tous ses agents (cache court)."""
+    today = timezone.localdate()
+    cle = f'guichet:voyages:{compagnie_id}:{today.isoformat()}'
+    resume = cache.get(cle)
+    if resume is not None:
+        return resume
+    prochains_voyages = ScheduledTrip.objects.filter(
+        trip__company_id=compagnie_id,
+        date__gte=today,
+        is_active=True,
+    ).select_related(
+        'trip__departure_city', 'trip__arrival_city',
+    ).order_by('date', 'trip__departure_time')
+    voyages_list = []
+    for v in prochains_voyages[:8]:
+        places_total = v.trip.capacity
+        places_libres = v.available_seats if v.available_seats is not None else places_total
+        places_occupees = places_total - places_libres
+        voyages_list.append({
+            'id': v.id,
+            'trajet': f"{v.trip.departure_city.name}→{v.trip.arrival_city.name}",
+            'date': v.date,
+            'heure_depart': v.trip.departure_time,
+            'heure_arrivee': v.trip.arrival_time,
+            'prix': v.trip.price,
+            'places_libres': places_libres,
+            'places_occupees': places_occupees,
+            'places_total': places_total,
+            'statut': 'actif' if v.is_active else 'inactif',
+        })
+    resume = {'voyages_actifs': prochains_voyages.count(), 'voyages': voyages_list}
+    cache.set(cle, resume, settings.GUICHET_DASHBOARD_CACHE_SECONDS)
+    return resume
 
 
 class DashboardGuichetView(APIView):
@@ -605,58 +749,18 @@ class DashboardGuichetView(APIView):
         agent = AgentGuichet.objects.select_related(
             'user', 'compagnie', 'agence__ville', 'guichet',
         ).get(user=request.user)
-        today = timezone.localdate()
-        ventes_du_jour = VenteGuichet.objects.filter(
-            agent=agent,
-            created_at__date=today,
-            statut__in=['valide', 'utilise'],
-        )
-        billets_vendus = ventes_du_jour.count()
-        montant_collecte = ventes_du_jour.aggregate(total=Sum('montant_total'))['total'] or 0
-        prochains_voyages = ScheduledTrip.objects.filter(
-            trip__company=agent.compagnie,
-            date__gte=today,
-            is_active=True,
-        ).select_related(
-            'trip__departure_city', 'trip__arrival_city',
-        ).order_by('date', 'trip__departure_time')
-        voyages_actifs = prochains_voyages.count()
-        voyages = prochains_voyages[:8]
-        voyages_list = []
-        for v in voyages:
-            places_total = v.trip.capacity
-            places_libres = v.available_seats if v.available_seats is not None else places_total
-            places_occupees = places_total - places_libres
-            voyages_list.append({
-                'id': v.id,
-                'trajet': f"{v.trip.departure_city.name}→{v.trip.arrival_city.name}",
-                'date': v.date,
-                'heure_depart': v.trip.departure_time,
-                'heure_arrivee': v.trip.arrival_time,
-                'prix': v.trip.price,
-                'places_libres': places_libres,
-                'places_occupees': places_occupees,
-                'places_total': places_total,
-                'statut': 'actif' if v.is_active else 'inactif',
-            })
-        paiement = {
-            row['mode_paiement']: {
-                'billets': row['billets'],
-                'montant': row['montant'] or 0,
-            }
-            for row in ventes_du_jour.values('mode_paiement').annotate(
-                billets=Count('id'),
-                montant=Sum('montant_total'),
-            )
-        }
-        ventes_recentes = VenteGuichet.objects.filter(agent=agent).select_related(
-            'voyage__trip__departure_city',
-            'voyage__trip__arrival_city',
-            'siege', 'agence', 'guichet',
-        ).order_by('-created_at')[:5]
-        controles_recents = ControlePassager.objects.filter(agent=agent).select_related(
-            'vente', 'reservation', 'voyage',
-        ).order_by('-created_at')[:5]
+        compteur = compteur_du_jour(agent)
+        billets_vendus = compteur.billets if compteur else 0
+        montant_collecte = compteur.montant if compteur else 0
+        paiement = compteur.paiements() if compteur else {}
+        voyages = voyages_compagnie(agent.compagnie_id)
+        voyages_actifs = voyages['voyages_actifs']
+        ventes_recentes = VenteGuichet.objects.filter(agent=agent).values(
+            *VENTE_PAYLOAD_FIELDS,
+        ).order_by('-created_at', '-id')[:5]
+        controles_recents = ControlePassager.objects.filter(agent=agent).values(
+            *CONTROLE_PAYLOAD_FIELDS,
+        ).order_by('-created_at', '-id')[:5]
         return Response({
             'agent': {
                 'id': agent.id,
@@ -685,10 +789,12 @@ class DashboardGuichetView(APIView):
                 'montant_collecte': montant_collecte,
                 'voyages_actifs': voyages_actifs,
                 'paiements': paiement,
+                'controles': compteur.controles if compteur else 0,
+                'controles_valides': compteur.controles_valides if compteur else 0,
             },
-            'voyages_du_jour': voyages_list,
-            'ventes_recentes': [vente_payload(vente) for vente in ventes_recentes],
-            'controles_recents': [controle_payload(controle) for controle in controles_recents],
+            'voyages_du_jour': voyages['voyages'],
+            'ventes_recentes': [vente_row_payload(row) for row in ventes_recentes],
+            'controles_recents': [controle_row_payload(row) for row in controles_recents],
         })
 
 
@@ -790,6 +896,9 @@ class CreerVenteView(APIView):
             return Response({'detail':'Champs manquants'}, status=400)
         if mode_paiement not in dict(VenteGuichet.MODE_CHOICES):
             return Response({'detail': 'Mode de paiement invalide.'}, status=400)
+        qr_format = data.get('qr_format') or 'png'
+        if qr_format not in QR_FORMATS:
+            return Response({'detail': 'Format de QR invalide.'}, status=400)
         try:
             seat_number = int(numero_siege)
         except (TypeError, ValueError):
@@ -822,22 +931,22 @@ class CreerVenteView(APIView):
                 montant_billet = int(voyage.trip.price)
                 frais_evex = PlatformConfiguration.load().service_fee
                 montant_total = montant_billet + frais_evex
-                ref = f"GUICHET-{timezone.localdate().strftime('%Y%m%d')}-{uuid.uuid4().hex[:8].upper()}"
-                qr_payload = {
-                    'type': 'guichet',
-                    'reference': ref,
-                    'voyage_id': str(voyage.id),
-                    'siege': seat_number,
-                    'client': client_nom,
-                    'compagnie': voyage.trip.company.name,
-                    'agence': agent.agence.nom if agent.agence else None,
-                    'guichet': agent.guichet.code if agent.guichet else None,
-                }
-                qr_b64 = generer_qr_code_base64(qr_payload)
+                ref = reference_vente()
+                vente_id = uuid.uuid4()
+                qr_token = sign_ticket(
+                    agent.compagnie_id,
+                    source='guichet',
+                    ticket_id=vente_id,
+                    voyage_id=voyage.id,
+                    seat=seat_number,
+                    expires_at=token_expiry(voyage.date),
+                )
                 vente = VenteGuichet.objects.create(
+                    id=vente_id,
                     agent=agent,
                     agence=agent.agence,
                     guichet=agent.guichet,
+                    session=session_pour_vente(agent),
                     voyage=voyage,
                     siege=siege,
                     client_nom=client_nom,
@@ -847,8 +956,9 @@ class CreerVenteView(APIView):
                     montant_total=montant_total,
                     mode_paiement=mode_paiement,
                     reference_vente=ref,
-                    qr_code_data=json.dumps(qr_payload),
+                    qr_code_data=qr_token,
                 )
+                compter_ventes([vente])
                 log_action(
                     user=request.user,
                     action='CREATE',
@@ -866,24 +976,48 @@ class CreerVenteView(APIView):
                 )
                 voyage.available_seats = max(0, voyage.available_seats - 1)
                 voyage.save(update_fields=['available_seats'])
-                return Response({
-                    'reference_vente': vente.reference_vente,
-                    'qr_code_data': qr_payload,
-                    'qr_code_base64': qr_b64,
-                    'client_nom': vente.client_nom,
-                    'client_telephone': vente.client_telephone,
-                    'voyage': {'trajet': f"{voyage.trip.departure_city.name}→{voyage.trip.arrival_city.name}", 'heure_depart': voyage.trip.departure_time, 'date': voyage.date},
-                    'siege': siege.numero,
-                    'montant_billet': montant_billet,
-                    'frais_evex': frais_evex,
-                    'montant_total': montant_total,
-                    'mode_paiement': vente.mode_paiement,
-                    'agence': agent.agence.nom if agent.agence else None,
-                    'guichet': agent.guichet.nom if agent.guichet else None,
-                    'created_at': vente.created_at,
-                }, status=201)
+                receipt = recu_vente(vente, voyage, agent, qr_format)
         except ScheduledTrip.DoesNotExist:
             return Response({'detail':'Voyage introuvable'}, status=404)
+        # Rendu après la transaction : le verrou du voyage est déjà relâché.
+        if qr_format == 'png':
+            receipt['qr_code_base64'] = render_qr(qr_token, 'png')
+        elif qr_format == 'svg':
+            receipt['qr_code_svg'] = render_qr(qr_token, 'svg')
+        return Response(receipt, status=201)
+
+
+class CreerVentesLotView(APIView):
+    permission_classes = [IsAgentGuichet]
+
+    def post(self, request):
+        agent = AgentGuichet.objects.select_related('agence', 'guichet').get(user=request.user)
+        data = request.data
+        qr_format = data.get('qr_format') or 'png'
+        if qr_format not in QR_FORMATS:
+            return Response({'detail': 'Format de QR invalide.'}, status=400)
+        voyage, ventes = vendre_places(
+            agent=agent,
+            user=request.user,
+            voyage_id=data.get('voyage_id'),
+            passagers=data.get('passagers'),
+            mode_paiement=data.get('mode_paiement'),
+            client_nom=data.get('client_nom'),
+            client_telephone=data.get('client_telephone'),
+            ip_address=get_client_ip(request),
+        )
+        billets = [recu_vente(vente, voyage, agent, qr_format) for vente in ventes]
+        # Rendu après la transaction, en un seul lot.
+        if qr_format in ('png', 'svg'):
+            champ = 'qr_code_base64' if qr_format == 'png' else 'qr_code_svg'
+            images = render_qr_batch([vente.qr_code_data for vente in ventes], qr_format)
+            for billet, image in zip(billets, images):
+                billet[champ] = image
+        return Response({
+            'nombre_billets': len(billets),
+            'montant_total': sum(vente.montant_total for vente in ventes),
+            'billets': billets,
+        }, status=201)
 
 
 class AnnulerVenteView(APIView):
@@ -911,6 +1045,7 @@ class AnnulerVenteView(APIView):
 
             vente.statut = 'annule'
             vente.save(update_fields=['statut'])
+            compter_ventes([vente], sens=-1)
             vente.siege.statut = Siege.STATUT_LIBRE
             vente.siege.save(update_fields=['statut'])
             vente.voyage.available_seats = min(
@@ -942,6 +1077,8 @@ class ScannerQRView(APIView):
     def post(self, request):
         agent = request.user.agentguichet
         raw = request.data.get('qr_code_data')
+        if is_ticket_token(raw):
+            return self.scan_token(agent, raw)
         try:
             data = json.loads(raw) if isinstance(raw, str) else raw
         except Exception:
@@ -1026,7 +1163,7 @@ class ScannerQRView(APIView):
                 message = 'Réservation introuvable'
 
         if voyage_obj is not None:
-            ControlePassager.objects.create(
+            compter_controles([ControlePassager.objects.create(
                 agent=agent,
                 vente=vente_obj,
                 reservation=reservation_obj,
@@ -1034,7 +1171,7 @@ class ScannerQRView(APIView):
                 voyage=voyage_obj,
                 resultat=resultat,
                 message=message,
-            )
+            )])
             if booking_obj is not None and resultat == 'valide':
                 booking_obj.status = 'completed'
                 booking_obj.save(update_fields=['status'])
@@ -1049,6 +1186,224 @@ class ScannerQRView(APIView):
             'numero_siege': vente_obj.siege.numero if vente_obj else (reservation_obj.siege.numero if reservation_obj else None),
         })
 
+    def scan_token(self, agent, raw):
+        """Chemin rapide des billets signés : signature vérifiée en mémoire,
+        bitmap des billets embarqués, puis au plus une lecture par clé primaire."""
+        voyage_id = None
+        try:
+            token = verify_ticket(raw, agent.compagnie_id)
+        except ExpiredTicketToken as exc:
+            token = exc.token
+            resultat, message, reference, client_nom = 'invalide', str(exc), None, None
+        except InvalidTicketToken as exc:
+            return Response({
+                'resultat': 'invalide',
+                'message': str(exc),
+                'reference': None,
+                'source': None,
+                'voyage_id': None,
+                'client_nom': None,
+                'numero_siege': None,
+            })
+        else:
+            if used_tickets.is_used(token):
+                # Bit posé après relecture du billet sur ce voyage, que son
+                # contrôle valide protège de la suppression.
+                resultat, message, reference, client_nom = 'deja_utilise', 'Billet déjà utilisé', None, None
+                voyage_id = token.voyage_id
+            else:
+                resultat, message, reference, client_nom, voyage_id = claim_signed_ticket(token)
+                if resultat in ('valide', 'deja_utilise') and voyage_id == token.voyage_id:
+                    used_tickets.mark_used(token)
+
+        # Comme pour les QR JSON, le contrôle n'est tracé que pour un billet
+        # relu en base : les identifiants d'un jeton signé peuvent désigner une
+        # vente ou un voyage supprimés depuis (jeton expiré, billet introuvable).
+        if voyage_id is not None:
+            compter_controles([ControlePassager.objects.create(
+                agent=agent,
+                vente_id=token.ticket_id if token.source == 'guichet' else None,
+                reservation_id=token.ticket_id if token.source == 'mobile' else None,
+                booking_id=int(token.ticket_id) if token.source == 'booking' else None,
+                voyage_id=voyage_id,
+                resultat=resultat,
+                message=message,
+            )])
+        return Response({
+            'resultat': resultat,
+            'message': message,
+            'reference': reference,
+            'source': token.source,
+            'voyage_id': token.voyage_id,
+            'client_nom': client_nom,
+            'numero_siege': token.seat,
+        })
+
+
+def _signed_ticket_moved(token, voyage_id, seat):
+    """Message si le billet relu n'est plus sur le voyage ou le siège du jeton."""
+    if voyage_id != token.voyage_id:
+        return 'Billet rattaché à un autre voyage'
+    if str(seat) != str(token.seat):
+        return 'Billet rattaché à un autre siège'
+    return None
+
+
+def claim_signed_ticket(token):
+    """Marque un billet signé comme embarqué ; verrouille sa seule ligne.
+
+    Retourne ``(resultat, message, reference, client_nom, voyage_id)`` ;
+    ``voyage_id`` est celui du billet relu, ``None`` s'il est introuvable.
+    Un billet déplacé depuis l'émission du jeton (autre voyage ou autre
+    siège) est invalide, comme à la synchronisation hors ligne.
+    """
+    if token.source == 'guichet':
+        vente = VenteGuichet.objects.select_for_update(of=('self',)).select_related('siege').only(
+            'statut', 'client_nom', 'reference_vente', 'voyage_id', 'siege__numero',
+        ).filter(pk=token.ticket_id).first()
+        if vente is None:
+            return 'invalide', 'Vente introuvable', None, None, None
+        moved = _signed_ticket_moved(token, vente.voyage_id, vente.siege.numero)
+        if moved:
+            return 'invalide', moved, vente.reference_vente, vente.client_nom, vente.voyage_id
+        if vente.statut == 'utilise':
+            return 'deja_utilise', 'Billet déjà utilisé', vente.reference_vente, vente.client_nom, vente.voyage_id
+        if vente.statut != 'valide':
+            return 'invalide', 'Billet annulé', vente.reference_vente, vente.client_nom, vente.voyage_id
+        vente.statut = 'utilise'
+        vente.save(update_fields=['statut'])
+        return (
+            'valide',
+            f"Billet valide — {vente.client_nom} — Siège {token.seat}",
+            vente.reference_vente,
+            vente.client_nom,
+            vente.voyage_id,
+        )
+
+    if token.source == 'mobile':
+        reservation = Reservation.objects.select_for_update(of=('self',)).select_related('siege').only(
+            'statut_paiement', 'client_nom', 'reference_evex', 'voyage_id', 'siege__numero',
+        ).filter(pk=token.ticket_id).first()
+        if reservation is None:
+            return 'invalide', 'Réservation introuvable', None, None, None
+        reference, client_nom = reservation.reference_evex, reservation.client_nom
+        moved = _signed_ticket_moved(token, reservation.voyage_id, reservation.siege.numero)
+        if moved:
+            return 'invalide', moved, reference, client_nom, reservation.voyage_id
+        if reservation.statut_paiement != Reservation.STATUT_PAYE:
+            return 'invalide', 'Réservation non payée', reference, client_nom, reservation.voyage_id
+        if ControlePassager.objects.filter(reservation_id=reservation.pk, resultat='valide').exists():
+            return 'deja_utilise', 'Billet déjà utilisé', reference, client_nom, reservation.voyage_id
+        return (
+            'valide',
+            f"Billet mobile valide — {client_nom} — Siège {token.seat}",
+            reference,
+            client_nom,
+            reservation.voyage_id,
+        )
+
+    booking = Booking.all_objects.select_for_update().only(
+        'status', 'passenger_name', 'scheduled_trip_id', 'seat_number',
+    ).filter(pk=token.ticket_id).first()
+    if booking is None:
+        return 'invalide', 'Réservation introuvable', None, None, None
+    reference, client_nom = f'EVEX-{booking.pk:06d}', booking.passenger_name
+    moved = _signed_ticket_moved(token, booking.scheduled_trip_id, booking.seat_number)
+    if moved:
+        return 'invalide', moved, reference, client_nom, booking.scheduled_trip_id
+    if ControlePassager.objects.filter(booking_id=booking.pk, resultat='valide').exists():
+        return 'deja_utilise', 'Billet déjà utilisé', reference, client_nom, booking.scheduled_trip_id
+    if booking.status != 'confirmed':
+        return 'invalide', 'Réservation non confirmée', reference, client_nom, booking.scheduled_trip_id
+    booking.status = 'completed'
+    booking.save(update_fields=['status'])
+    return (
+        'valide',
+        f"Billet valide — {client_nom} — Siège {token.seat}",
+        reference,
+        client_nom,
+        booking.scheduled_trip_id,
+    )
+
+
+class QRCodesVoyageView(APIView):
+    permission_classes = [IsAgentGuichet | IsAdminCompagnie]
+
+    def get(self, request, vid=None):
+        company = request_company(request)
+        try:
+            voyage = ScheduledTrip.objects.get(id=vid, trip__company=company)
+        except ScheduledTrip.DoesNotExist:
+            return Response({'detail': 'Voyage introuvable'}, status=404)
+        qr_format = request.query_params.get('format') or 'svg'
+        if qr_format not in QR_FORMATS:
+            return Response({'detail': 'Format de QR invalide.'}, status=400)
+        tickets = [
+            payload for payload in TicketIndex.objects.filter(voyage=voyage)
+            .order_by('seat', 'id')
+            .values_list('payload', flat=True)
+            if payload.get('qr_token')
+        ]
+        images = render_qr_batch([ticket['qr_token'] for ticket in tickets], qr_format)
+        return Response([{
+            'source': ticket['source'],
+            'reference': ticket['reference'],
+            'numero_siege': ticket['seat'],
+            'client_nom': ticket['client_name'],
+            'qr_format': qr_format,
+            'qr': image,
+        } for ticket, image in zip(tickets, images)])
+
+
+class ManifesteVoyageView(APIView):
+    permission_classes = [IsAgentGuichet]
+
+    def get(self, request, vid=None):
+        agent = request.user.agentguichet
+        try:
+            voyage = ScheduledTrip.objects.get(id=vid, trip__company=agent.compagnie)
+        except ScheduledTrip.DoesNotExist:
+            return Response({'detail': 'Voyage introuvable'}, status=404)
+        record_manifest_download(agent, voyage)
+        return Response(boarding_manifest(voyage, since=request.query_params.get('since')))
+
+
+class CleHorsLigneView(APIView):
+    """Clé de vérification des billets signés, pour les scanners hors ligne.
+
+    Clé symétrique : elle permet aussi de signer des billets de la compagnie.
+    Réservée aux agents actifs, jamais mise en cache, chaque remise est tracée.
+    """
+    permission_classes = [IsAgentGuichet]
+
+    def get(self, request):
+        agent = request.user.agentguichet
+        cle = offline_key(agent.compagnie_id)
+        logger.info(
+            "Offline ticket key delivered agent=%s company=%s fingerprint=%s ip=%s",
+            agent.pk,
+            agent.compagnie_id,
+            cle['empreinte'],
+            get_client_ip(request),
+        )
+        response = Response(cle)
+        response['Cache-Control'] = 'no-store'
+        return response
+
+
+class SynchroniserControlesView(APIView):
+    permission_classes = [IsAgentGuichet]
+
+    def post(self, request):
+        resultats = apply_offline_scans(request.user.agentguichet, request.data.get('scans'))
+        return Response({
+            'total': len(resultats),
+            'valides': sum(1 for item in resultats if item['resultat'] == 'valide'),
+            'deja_utilises': sum(1 for item in resultats if item['resultat'] == 'deja_utilise'),
+            'invalides': sum(1 for item in resultats if item['resultat'] == 'invalide'),
+            'resultats': resultats,
+        })
+
 
 class HistoriqueVentesView(APIView):
     permission_classes = [IsAgentGuichet]
@@ -1061,23 +1416,14 @@ class HistoriqueVentesView(APIView):
         statut_filtre = request.query_params.get('statut')
         paiement_filtre = request.query_params.get('mode_paiement')
         recherche = str(request.query_params.get('q') or '').strip()
-        qs = VenteGuichet.objects.filter(agent=agent).select_related(
-            'voyage__trip__departure_city',
-            'voyage__trip__arrival_city',
-            'siege', 'agence', 'guichet',
-        )
-        if date_debut:
-            try:
-                from datetime import datetime
-                qs = qs.filter(created_at__date__gte=datetime.fromisoformat(date_debut).date())
-            except (TypeError, ValueError):
-                pass
-        if date_fin:
-            try:
-                from datetime import datetime
-                qs = qs.filter(created_at__date__lte=datetime.fromisoformat(date_fin).date())
-            except (TypeError, ValueError):
-                pass
+        # Bornes en intervalle sur created_at : l'index (agent, created_at) reste utilisable.
+        qs = VenteGuichet.objects.filter(agent=agent)
+        debut = local_day_start(date_debut) if date_debut else None
+        if debut:
+            qs = qs.filter(created_at__gte=debut)
+        fin = local_day_start(date_fin) if date_fin else None
+        if fin:
+            qs = qs.filter(created_at__lt=fin + timedelta(days=1))
         if statut_filtre in dict(VenteGuichet.STATUT_CHOICES):
             qs = qs.filter(statut=statut_filtre)
         if paiement_filtre in dict(VenteGuichet.MODE_CHOICES):
@@ -1089,13 +1435,24 @@ class HistoriqueVentesView(APIView):
                 | Q(client_telephone__icontains=recherche)
             )
 
-        ventes_valides = qs.filter(statut__in=['valide', 'utilise'])
+        valides = Q(statut__in=['valide', 'utilise'])
+        totaux = qs.aggregate(
+            total_billets=Count('id'),
+            total_valides=Count('id', filter=valides),
+            total_annules=Count('id', filter=Q(statut='annule')),
+            total_montant=Sum('montant_total', filter=valides),
+        )
+        rows, next_cursor = keyset_page(
+            qs.values(*VENTE_PAYLOAD_FIELDS),
+            cursor=request.query_params.get('cursor'),
+            limit=ticket_page_limit(request.query_params, default=100, maximum=500),
+            pk_type=uuid.UUID,
+        )
         return Response({
-            'total_billets': qs.count(),
-            'total_valides': ventes_valides.count(),
-            'total_annules': qs.filter(statut='annule').count(),
-            'total_montant': ventes_valides.aggregate(total=Sum('montant_total'))['total'] or 0,
-            'ventes': [vente_payload(vente) for vente in qs.order_by('-created_at')],
+            **totaux,
+            'total_montant': totaux['total_montant'] or 0,
+            'ventes': [vente_row_payload(row) for row in rows],
+            'next_cursor': next_cursor,
         })
 
 
@@ -1106,23 +1463,28 @@ class HistoriqueControlesView(APIView):
         agent = request.user.agentguichet
         resultat = request.query_params.get('resultat')
         date = request.query_params.get('date')
-        qs = ControlePassager.objects.filter(agent=agent).select_related(
-            'vente', 'reservation', 'voyage',
-        )
+        qs = ControlePassager.objects.filter(agent=agent)
         if resultat in dict(ControlePassager.RESULTAT_CHOICES):
             qs = qs.filter(resultat=resultat)
-        if date:
-            try:
-                from datetime import datetime
-                qs = qs.filter(created_at__date=datetime.fromisoformat(date).date())
-            except (TypeError, ValueError):
-                pass
+        debut = local_day_start(date) if date else None
+        if debut:
+            qs = qs.filter(created_at__gte=debut, created_at__lt=debut + timedelta(days=1))
+        totaux = qs.aggregate(
+            total=Count('id'),
+            valides=Count('id', filter=Q(resultat='valide')),
+            invalides=Count('id', filter=Q(resultat='invalide')),
+            deja_utilises=Count('id', filter=Q(resultat='deja_utilise')),
+        )
+        rows, next_cursor = keyset_page(
+            qs.values(*CONTROLE_PAYLOAD_FIELDS),
+            cursor=request.query_params.get('cursor'),
+            limit=ticket_page_limit(request.query_params, default=100, maximum=500),
+            pk_type=uuid.UUID,
+        )
         return Response({
-            'total': qs.count(),
-            'valides': qs.filter(resultat='valide').count(),
-            'invalides': qs.filter(resultat='invalide').count(),
-            'deja_utilises': qs.filter(resultat='deja_utilise').count(),
-            'controles': [controle_payload(controle) for controle in qs.order_by('-created_at')[:100]],
+            **totaux,
+            'controles': [controle_row_payload(row) for row in rows],
+            'next_cursor': next_cursor,
         })
 
 
@@ -1131,11 +1493,13 @@ class BilletsCompagnieView(APIView):
 
     def get(self, request):
         company = request_company(request)
-        items = filter_ticket_collection(
-            ticket_collection(company=company),
-            request.query_params,
+        items, next_cursor = ticket_page(
+            company=company,
+            params=request.query_params,
+            cursor=request.query_params.get('cursor'),
+            limit=ticket_page_limit(request.query_params, default=500, maximum=500),
         )
-        return Response(items[:500])
+        return ticket_page_response(items, next_cursor)
 
 
 class ActionBilletView(APIView):
@@ -1164,6 +1528,62 @@ class ActionBilletView(APIView):
         return Response({'detail': detail, 'ticket': ticket})
 
 
+class ActionsGroupeesBilletsView(APIView):
+    permission_classes = [IsAdminCompagnieOrAgentGuichet]
+
+    def post(self, request):
+        result = perform_bulk_ticket_action(
+            user=request.user,
+            company=request_company(request),
+            tickets=request.data.get('tickets'),
+            action=str(request.data.get('action') or '').strip(),
+            reason=request.data.get('reason'),
+            target_voyage_id=request.data.get('target_voyage_id'),
+            ip_address=get_client_ip(request),
+        )
+        detail = {
+            'cancel': 'billet(s) annulé(s), sièges libérés.',
+            'refund': 'remboursement(s) enregistré(s), sièges libérés.',
+            'move': 'billet(s) transféré(s) vers le voyage cible.',
+            'mark_used': 'billet(s) marqué(s) comme utilisé(s).',
+        }[result['action']]
+        return Response({'detail': f"{len(result['tickets'])} {detail}", **result})
+
+
+class MigrerVoyageView(APIView):
+    permission_classes = [IsAdminCompagnie]
+
+    FLAGS = {'cancel_source': True, 'dry_run': False}
+
+    def post(self, request, vid=None):
+        flags = {}
+        for name, default in self.FLAGS.items():
+            value = request.data.get(name, default)
+            if str(value).strip().lower() in ('1', 'true', 'yes', 'oui'):
+                flags[name] = True
+            elif str(value).strip().lower() in ('0', 'false', 'no', 'non'):
+                flags[name] = False
+            else:
+                return Response(
+                    {'detail': f'{name} doit valoir true ou false.'},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+        report = migrate_voyage_passengers(
+            user=request.user,
+            company=get_admin_company(request.user),
+            voyage_id=vid,
+            target_voyage_id=request.data.get('target_voyage_id'),
+            reason=request.data.get('reason'),
+            ip_address=get_client_ip(request),
+            **flags,
+        )
+        if report['dry_run']:
+            detail = f"Simulation : {len(report['placed'])} passager(s) placé(s), {len(report['unplaced'])} sans place."
+        else:
+            detail = f"{len(report['placed'])} passager(s) transféré(s), {len(report['unplaced'])} sans place."
+        return Response({'detail': detail, **report})
+
+
 class OperationsBilletsView(APIView):
     permission_classes = [IsAdminCompagnieOrAgentGuichet]
 
@@ -1200,16 +1620,11 @@ class PassagersVoyageView(APIView):
             voyage = ScheduledTrip.objects.get(id=vid, trip__company=company)
         except ScheduledTrip.DoesNotExist:
             return Response({'detail':'Voyage introuvable'}, status=404)
+        tickets = TicketIndex.objects.filter(company=company, voyage=voyage).exclude(
+            status__in=['annule', 'cancelled', 'expire', 'echoue', 'rembourse'],
+        ).order_by('seat').values_list('payload', flat=True)
         passengers = []
-        for ticket in ticket_collection(company=company, voyage=voyage, limit=None):
-            if ticket['status'] in {
-                'annule',
-                'cancelled',
-                'expire',
-                'echoue',
-                'rembourse',
-            }:
-                continue
+        for ticket in tickets:
             passengers.append({
                 **ticket,
                 'numero_siege': ticket['seat'],
@@ -1225,3 +1640,130 @@ class PassagersVoyageView(APIView):
                 return (1, str(item['numero_siege']))
 
         return Response(sorted(passengers, key=seat_key))
+
+
+def session_caisse_payload(session):
+    """Rapport figé d'une session fermée, ou situation courante d'une session ouverte."""
+    return {
+        'id': str(session.pk),
+        'statut': session.statut,
+        **(session.rapport or rapport_session(session)),
+    }
+
+
+def sessions_caisse_visibles(request):
+    """Sessions de la compagnie pour un administrateur, de l'agence pour son gestionnaire, du guichet sinon."""
+    sessions = SessionCaisse.objects.select_related('agence', 'guichet', 'ouverte_par', 'fermee_par')
+    if not hasattr(request.user, 'agentguichet'):
+        return sessions.filter(compagnie=get_admin_company(request.user))
+    agent = request.user.agentguichet
+    if agent.agence_id and Agence.objects.filter(pk=agent.agence_id, gestionnaire=agent).exists():
+        return sessions.filter(agence_id=agent.agence_id)
+    if agent.guichet_id:
+        return sessions.filter(guichet_id=agent.guichet_id)
+    return sessions.none()
+
+
+class SessionCaisseGuichetView(APIView):
+    permission_classes = [IsAgentGuichet]
+
+    def get(self, request):
+        agent = request.user.agentguichet
+        session = session_ouverte(agent.guichet_id) if agent.guichet_id else None
+        return Response({'session': session_caisse_payload(session) if session else None})
+
+
+class OuvrirSessionCaisseView(APIView):
+    permission_classes = [IsAgentGuichet]
+
+    def post(self, request):
+        agent = AgentGuichet.objects.select_related('guichet__agence').get(user=request.user)
+        session = ouvrir_session(agent.guichet, request.user, request.data.get('fonds_initial', 0))
+        log_action(
+            user=request.user,
+            action='CREATE',
+            instance=session,
+            new_values={'operation': 'open_cash_session', 'fonds_initial': session.fonds_initial},
+            ip_address=get_client_ip(request),
+        )
+        return Response(session_caisse_payload(session), status=status.HTTP_201_CREATED)
+
+
+def agence_id_param(request):
+    """``agence_id`` de la requête en UUID, ``None`` s'il est absent ; ``ValueError`` s'il est mal formé."""
+    value = request.query_params.get('agence_id')
+    return uuid.UUID(str(value)) if value else None
+
+
+class SessionsCaisseView(APIView):
+    permission_classes = [IsAdminCompagnieOrAgentGuichet]
+
+    def get(self, request):
+        sessions = sessions_caisse_visibles(request)
+        statut = request.query_params.get('statut')
+        if statut in dict(SessionCaisse.STATUT_CHOICES):
+            sessions = sessions.filter(statut=statut)
+        try:
+            agence_id = agence_id_param(request)
+        except ValueError:
+            return Response({'detail': 'Agence invalide.'}, status=status.HTTP_400_BAD_REQUEST)
+        if agence_id:
+            sessions = sessions.filter(agence_id=agence_id)
+        debut = local_day_start(request.query_params.get('date_debut'))
+        if debut:
+            sessions = sessions.filter(ouverte_at__gte=debut)
+        fin = local_day_start(request.query_params.get('date_fin'))
+        if fin:
+            sessions = sessions.filter(ouverte_at__lt=fin + timedelta(days=1))
+        limit = ticket_page_limit(request.query_params, default=50, maximum=200)
+        return Response([session_caisse_payload(session) for session in sessions[:limit]])
+
+
+class CloturerSessionCaisseView(APIView):
+    permission_classes = [IsAdminCompagnieOrAgentGuichet]
+
+    def post(self, request, id=None):
+        if not sessions_caisse_visibles(request).filter(pk=id).exists():
+            return Response({'detail': 'Session de caisse introuvable.'}, status=status.HTTP_404_NOT_FOUND)
+        session = cloturer_session(
+            id,
+            request.user,
+            request.data.get('especes_declarees'),
+            note=request.data.get('note'),
+        )
+        log_action(
+            user=request.user,
+            action='UPDATE',
+            instance=session,
+            old_values={'statut': SessionCaisse.STATUT_OUVERTE},
+            new_values={
+                'operation': 'close_cash_session',
+                'statut': session.statut,
+                'especes_declarees': session.especes_declarees,
+                'ecart': session.ecart,
+            },
+            ip_address=get_client_ip(request),
+        )
+        return Response(session_caisse_payload(session))
+
+
+class ConsolidationCaisseView(APIView):
+    permission_classes = [IsAdminCompagnie]
+
+    def get(self, request):
+        debut = local_day_start(request.query_params.get('date_debut'))
+        fin = local_day_start(request.query_params.get('date_fin'))
+        date_debut = timezone.localdate(debut) if debut else timezone.localdate()
+        date_fin = timezone.localdate(fin) if fin else date_debut
+        if date_fin < date_debut:
+            return Response({'detail': 'La date de fin précède la date de début.'}, status=400)
+        try:
+            agence_id = agence_id_param(request)
+        except ValueError:
+            return Response({'detail': 'Agence invalide.'}, status=400)
+        return Response(consolider_sessions(
+            get_admin_company(request.user),
+            date_debut,
+            date_fin,
+            agence_id=agence_id,
+        ))
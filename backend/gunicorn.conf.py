@@ -0,0 +1,31 @@
+"""Configuration Gunicorn (Procfile, start.sh, Dockerfile).
+
+Workers ``gthread`` : les flux Server-Sent Events (statut de paiement, suivi
+GPS, carte de flotte) gardent une requête ouverte jusqu'à quelques minutes
+dans un thread. Le thread principal du worker continue de répondre au
+maître, qui ne le tue donc pas au ``timeout`` comme un worker ``sync``, et
+les autres threads servent l'API. ``SSE_MAX_STREAMS`` (settings) borne les
+flux par processus et doit rester inférieur à ``WEB_THREADS``.
+
+Le maître lance les checks Django avant de démarrer les workers : un cache
+local au processus (``transport.E001``) arrête le serveur plutôt que de
+servir des flux qui manqueraient les publications des autres workers.
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+threads = int(os.environ.get('WEB_THREADS', '16'))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = 5
+
+
+def on_starting(server):
+    import django
+    from django.core.management import call_command
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'togotrans_api.settings')
+    django.setup()
+    call_command('check')
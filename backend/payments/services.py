@@ -3,11 +3,14 @@ import uuid
 from typing import Any
 from urllib.parse import urljoin
 
-import requests
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
 from requests.auth import HTTPBasicAuth
 
+from transport.services import operator_health
+from transport.services.qospay_client import qospay_client
+
 from .models import Transaction
 
 logger = logging.getLogger(__name__)
@@ -21,6 +24,13 @@ CODE_STATUS_MAP = {
     '96': Transaction.STATUS_SYSTEM_ERROR,
 }
 
+FINAL_STATUSES = {
+    Transaction.STATUS_SUCCESS,
+    Transaction.STATUS_FAILED,
+    Transaction.STATUS_INSUFFICIENT_FUNDS,
+    Transaction.STATUS_SYSTEM_ERROR,
+}
+
 
 class QosPayService:
     """Service d'integration QosPay pour TOGOCEL et MOOV MONEY."""
@@ -82,6 +92,7 @@ class QosPayService:
             url=operator_config['request_url'],
             payload=payload,
             password=operator_config['password'],
+            operator=operator_config['operator'],
         )
         response_data.setdefault('transref', transref)
         return response_data
@@ -101,6 +112,8 @@ class QosPayService:
             url=operator_config['status_url'],
             payload=payload,
             password=operator_config['password'],
+            idempotent=True,
+            operator=operator_config['operator'],
         )
 
     def get_operator_config(self, operator: str) -> dict[str, str]:
@@ -153,18 +166,23 @@ class QosPayService:
         url: str,
         payload: dict[str, Any],
         password: str,
+        idempotent: bool = False,
+        operator: str | None = None,
     ) -> dict[str, Any]:
-        logger.info('Appel QosPay vers %s, transref=%s', url, payload['transref'])
-        response = requests.post(
+        if operator:
+            # Disjoncteur de l'operateur : echoue aussitot s'il est ouvert.
+            return operator_health.executer(
+                operator,
+                lambda: self._post(url, payload, password, idempotent),
+                echec=lambda data: extract_response_code(data) == '96',
+            )
+        response = qospay_client.post(
             url,
-            json=payload,
+            payload,
             auth=HTTPBasicAuth(self.username, password),
-            headers={
-                'Accept': 'application/json',
-                'Content-Type': 'application/json',
-            },
-            timeout=self.timeout,
             verify=self.verify_ssl,
+            deadline=settings.QOSPAY_STATUS_DEADLINE if idempotent else self.timeout,
+            idempotent=idempotent,
         )
         response.raise_for_status()
 
@@ -245,6 +263,27 @@ def check_transaction_status(transref: str) -> tuple[Transaction, dict[str, Any]
     return transaction, qos_response
 
 
+def apply_webhook(transref: str, payload: dict[str, Any]) -> bool:
+    """Applique un callback QosPay ; un statut final n'est jamais reecrit.
+
+    Retourne ``False`` si la transaction est inconnue ou deja finalisee.
+    """
+    response_code = extract_response_code(payload)
+    updated = (
+        Transaction.objects
+        .filter(transref=transref)
+        .exclude(status__in=FINAL_STATUSES)
+        .update(
+            status=status_from_qospay_code(response_code),
+            qos_response_code=response_code,
+            qos_response_message=extract_message(payload),
+            qos_raw_response=payload,
+            updated_at=timezone.now(),
+        )
+    )
+    return bool(updated)
+
+
 def _request_payment(
     method: str,
     phone: str,
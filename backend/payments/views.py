@@ -1,3 +1,5 @@
+import logging
+
 import requests
 from django.core.exceptions import ImproperlyConfigured
 from django.utils.decorators import method_decorator
@@ -7,6 +9,10 @@ from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from transport.models import PaymentWebhook
+from transport.services import operator_health, qos_service
+from transport.services.payment_webhooks import recevoir_webhook
+
 from .models import Transaction
 from .serializers import (
     PaymentRequestSerializer,
@@ -21,6 +27,23 @@ from .services import (
     status_from_qospay_code,
 )
 
+logger = logging.getLogger(__name__)
+
+
+def _operator_unavailable_response(exc):
+    """Reponse 503 quand le disjoncteur de l'operateur est ouvert."""
+    response = Response(
+        {
+            'detail': str(exc),
+            'operator': exc.operateur,
+            'alternative': exc.alternative,
+            'retry_after': exc.reessayer_dans,
+        },
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+    )
+    response['Retry-After'] = str(exc.reessayer_dans)
+    return response
+
 
 class PaymentView(APIView):
     """Endpoint mobile pour initier un paiement QosPay."""
@@ -71,6 +94,8 @@ class PaymentView(APIView):
                 },
                 status=status.HTTP_201_CREATED,
             )
+        except operator_health.OperatorUnavailable as exc:
+            return _operator_unavailable_response(exc)
         except requests.RequestException as exc:
             return Response(
                 {'detail': 'Impossible de contacter QosPay.', 'error': str(exc)},
@@ -106,6 +131,8 @@ class TransactionStatusView(APIView):
                 {'detail': 'Transaction introuvable.'},
                 status=status.HTTP_404_NOT_FOUND,
             )
+        except operator_health.OperatorUnavailable as exc:
+            return _operator_unavailable_response(exc)
         except requests.RequestException as exc:
             return Response(
                 {'detail': 'Impossible de contacter QosPay.', 'error': str(exc)},
@@ -131,6 +158,13 @@ class QosPayWebhookView(APIView):
     authentication_classes = []
 
     def post(self, request):
+        if not qos_service.valider_webhook(request.body, request.headers.get('X-QOS-Signature')):
+            logger.warning('Invalid QosPay webhook signature')
+            return Response(
+                {'detail': 'Signature invalide.'},
+                status=status.HTTP_401_UNAUTHORIZED,
+            )
+
         payload = request.data
         transref = (
             payload.get('transref')
@@ -143,28 +177,18 @@ class QosPayWebhookView(APIView):
                 {'detail': 'transref manquant.'},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-
-        try:
-            transaction = Transaction.objects.get(transref=transref)
-        except Transaction.DoesNotExist:
+        # Seules les transactions initiees ici ont un callback a stocker.
+        if not Transaction.objects.filter(transref=str(transref)).exists():
             return Response(
                 {'detail': 'Transaction introuvable.'},
                 status=status.HTTP_404_NOT_FOUND,
             )
 
-        response_code = extract_response_code(payload)
-        transaction.status = status_from_qospay_code(response_code)
-        transaction.qos_response_code = response_code
-        transaction.qos_response_message = extract_message(payload)
-        transaction.qos_raw_response = payload if isinstance(payload, dict) else {
-            'raw': payload,
-        }
-        transaction.save(update_fields=[
-            'status',
-            'qos_response_code',
-            'qos_response_message',
-            'qos_raw_response',
-            'updated_at',
-        ])
-
-        return Response({'received': True, 'status': transaction.status})
+        # Acquittement immediat : le callback est applique par le worker.
+        recevoir_webhook(
+            PaymentWebhook.SOURCE_TRANSACTION,
+            transref,
+            extract_response_code(payload),
+            payload,
+        )
+        return Response({'received': True})
@@ -8,6 +8,13 @@ echo "=== STARTING SERVER ==="
 echo "Running migrations..."
 python manage.py migrate
 
+# Table du cache partage entre les workers (disjoncteur, suivi en direct)
+python manage.py createcachetable
+
+# Index des billets : rempli au premier deploiement, ensuite
+# reconstruit seulement s'il manque des lignes
+python manage.py rebuild_ticket_index --if-incomplete
+
 
 
 #creation des villes
@@ -23,4 +30,4 @@ python manage.py createsuperuser --no-input || echo "Superuser already exists or
 # 2. Lancer le serveur Django avec Gunicorn
 # Remplace "nom_de_ton_projet" par le nom du dossier qui contient ton fichier wsgi.py
 echo "Starting Gunicorn..."
-exec gunicorn togotrans_api.wsgi:application --bind 0.0.0.0:$PORT
\ No newline at end of file
+exec gunicorn togotrans_api.wsgi:application --config gunicorn.conf.py
\ No newline at end of file
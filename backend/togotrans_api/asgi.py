@@ -5,6 +5,10 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Non utilisé en production : les flux SSE (``togotrans_api.streaming``) sont
+des générateurs synchrones que Django lirait en entier avant d'envoyer quoi
+que ce soit sous ASGI. Le service tourne en WSGI (``gunicorn.conf.py``).
 """
 
 import os
@@ -23,3 +23,18 @@ class SafeIntegerJSONRenderer(JSONRenderer):
     def render(self, data, accepted_media_type=None, renderer_context=None):
         safe_data = preserve_large_integer_ids(data)
         return super().render(safe_data, accepted_media_type, renderer_context)
+
+
+class EventStreamRenderer(SafeIntegerJSONRenderer):
+    """Let ``Accept: text/event-stream`` clients reach streaming views.
+
+    Streaming views return their own ``StreamingHttpResponse``; only error
+    responses go through this renderer, as a single ``erreur`` event.
+    """
+
+    media_type = 'text/event-stream'
+    format = 'sse'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        body = super().render(data, accepted_media_type, renderer_context)
+        return b'event: erreur\ndata: ' + body + b'\n\n'
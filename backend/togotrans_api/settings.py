@@ -142,6 +142,19 @@ elif DATABASE_ENGINE:
 
 DATABASES = {'default': DATABASE_CONFIG}
 
+# Cache partage entre les processus : disjoncteur QosPay, canaux du suivi en
+# direct et de la flotte, geometries et passagers des trajets. Par defaut la
+# table de la base (python manage.py createcachetable, lance par start.sh) ;
+# Redis avec django.core.cache.backends.redis.RedisCache et une URL en
+# CACHE_LOCATION. Un cache local au processus (LocMemCache) n'est accepte
+# qu'en DEBUG (check transport.E001).
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': config('CACHE_LOCATION', default='evex_cache'),
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -297,6 +310,21 @@ QOSPAY_STATUS_URL_MOOV = config('QOSPAY_STATUS_URL_MOOV', default='')
 QOSPAY_CALLBACK_URL = config('QOSPAY_CALLBACK_URL', default='')
 QOSPAY_TIMEOUT = config('QOSPAY_TIMEOUT', default=30, cast=int)
 QOSPAY_VERIFY_SSL = config('QOSPAY_VERIFY_SSL', default=True, cast=bool)
+# Client HTTP partage : connexions gardees ouvertes, delai de connexion et
+# budget total (en secondes) des verifications de statut, retries compris.
+QOSPAY_POOL_SIZE = config('QOSPAY_POOL_SIZE', default=10, cast=int)
+QOSPAY_CONNECT_TIMEOUT = config('QOSPAY_CONNECT_TIMEOUT', default=5, cast=float)
+QOSPAY_STATUS_DEADLINE = config('QOSPAY_STATUS_DEADLINE', default=10, cast=float)
+QOSPAY_STATUS_RETRIES = config('QOSPAY_STATUS_RETRIES', default=2, cast=int)
+# Disjoncteur par operateur : fenetre glissante (et taille de ses tranches),
+# appels minimum et taux d'appels en erreur ou lents qui l'ouvrent, duree d'un
+# appel lent, pause avant l'appel de sonde.
+QOSPAY_BREAKER_WINDOW_SECONDS = config('QOSPAY_BREAKER_WINDOW_SECONDS', default=60, cast=int)
+QOSPAY_BREAKER_BUCKET_SECONDS = config('QOSPAY_BREAKER_BUCKET_SECONDS', default=10, cast=int)
+QOSPAY_BREAKER_MIN_CALLS = config('QOSPAY_BREAKER_MIN_CALLS', default=5, cast=int)
+QOSPAY_BREAKER_ERROR_RATE = config('QOSPAY_BREAKER_ERROR_RATE', default=0.5, cast=float)
+QOSPAY_BREAKER_SLOW_SECONDS = config('QOSPAY_BREAKER_SLOW_SECONDS', default=5, cast=float)
+QOSPAY_BREAKER_OPEN_SECONDS = config('QOSPAY_BREAKER_OPEN_SECONDS', default=30, cast=int)
 
 # Compatibilite avec les anciens noms encore presents dans certains modules.
 QOSPAY_USERNAME = QOSPAY_API_USERNAME
@@ -312,6 +340,55 @@ QOSPAY_CLIENT_ID = config(
 # Reservation temporaire des sieges
 SIEGE_EXPIRY_MINUTES = config('SIEGE_EXPIRY_MINUTES', default=5, cast=int)
 
+# Initiation asynchrone des paiements mobiles : threads par processus (0 = seule
+# la commande run_payment_jobs execute les taches), delai avant qu'une tache
+# en cours soit consideree abandonnee, duree maximale d'un flux SSE de statut.
+PAYMENT_WORKERS = config('PAYMENT_WORKERS', default=4, cast=int)
+PAYMENT_JOB_STALE_SECONDS = config('PAYMENT_JOB_STALE_SECONDS', default=120, cast=int)
+PAYMENT_SSE_SECONDS = config('PAYMENT_SSE_SECONDS', default=60, cast=int)
+# Flux SSE ouverts en meme temps par processus (un thread chacun) : doit rester
+# inferieur a WEB_THREADS (gunicorn.conf.py) pour garder des threads a l'API.
+SSE_MAX_STREAMS = config('SSE_MAX_STREAMS', default=8, cast=int)
+
+# Callbacks QoS : taille d'un lot de la boite de reception et nombre d'essais
+# avant qu'un callback en erreur soit abandonne.
+PAYMENT_WEBHOOK_BATCH = config('PAYMENT_WEBHOOK_BATCH', default=100, cast=int)
+PAYMENT_WEBHOOK_MAX_ATTEMPTS = config('PAYMENT_WEBHOOK_MAX_ATTEMPTS', default=5, cast=int)
+
+# Reconciliation des paiements en attente : age minimal d'un paiement avant
+# interrogation de QosPay, threads d'interrogation et appels par seconde
+# autorises pour chaque operateur.
+RECONCILIATION_MIN_AGE_SECONDS = config('RECONCILIATION_MIN_AGE_SECONDS', default=60, cast=int)
+RECONCILIATION_WORKERS = config('RECONCILIATION_WORKERS', default=8, cast=int)
+RECONCILIATION_RATE_PER_OPERATOR = config('RECONCILIATION_RATE_PER_OPERATOR', default=5, cast=float)
+
+# Reversements aux compagnies : duree d'une fenetre de reglement (un
+# reversement par compagnie et par fenetre), delai avant de relire chez QoS
+# le statut d'un reversement reste en cours.
+REVERSEMENT_FENETRE_MINUTES = config('REVERSEMENT_FENETRE_MINUTES', default=60, cast=int)
+REVERSEMENT_VERIFICATION_MINUTES = config('REVERSEMENT_VERIFICATION_MINUTES', default=10, cast=int)
+
+# Billets QR signes : une cle HMAC derivee par compagnie permet aux scanners
+# de verifier un billet hors ligne. Elle est remise aux agents par
+# /api/guichet/controle/cle-hors-ligne/ et permet aussi de signer : la changer
+# revoque toutes les cles distribuees.
+TICKET_SIGNING_KEY = config('TICKET_SIGNING_KEY', default=SECRET_KEY)
+TICKET_TOKEN_GRACE_HOURS = config('TICKET_TOKEN_GRACE_HOURS', default=24, cast=int)
+# Processus dedies au rendu des QR pour l'impression par lots (0 = rendu local).
+QR_RENDER_WORKERS = config('QR_RENDER_WORKERS', default=0, cast=int)
+# Duree de vie du resume des prochains voyages partage par les agents d'une compagnie.
+GUICHET_DASHBOARD_CACHE_SECONDS = config('GUICHET_DASHBOARD_CACHE_SECONDS', default=30, cast=int)
+# Geometrie des trajets pour le suivi GPS : videe a chaque changement d'arret,
+# de zone d'embarquement ou d'agence ; la duree n'est qu'un filet de securite.
+TRACKING_ROUTE_CACHE_SECONDS = config('TRACKING_ROUTE_CACHE_SECONDS', default=86400, cast=int)
+# Duree maximale d'un flux SSE de suivi GPS avant reconnexion du client.
+TRACKING_SSE_SECONDS = config('TRACKING_SSE_SECONDS', default=300, cast=int)
+# Compactage des trajectoires : delai apres l'arret du suivi, ecart maximal
+# (metres) et ecart de vitesse (km/h) toleres par la simplification.
+TRACKING_COMPACT_AFTER_MINUTES = config('TRACKING_COMPACT_AFTER_MINUTES', default=30, cast=int)
+TRACKING_SIMPLIFY_TOLERANCE_M = config('TRACKING_SIMPLIFY_TOLERANCE_M', default=15, cast=float)
+TRACKING_SIMPLIFY_SPEED_KMH = config('TRACKING_SIMPLIFY_SPEED_KMH', default=10, cast=float)
+
 # Intelligence assistée EVEX.
 # La clé reste exclusivement côté Django. Le mode fallback conserve les fonctions
 # essentielles lorsque le fournisseur IA n'est pas configuré ou indisponible.
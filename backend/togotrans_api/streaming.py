@@ -0,0 +1,69 @@
+"""Flux Server-Sent Events servis par les workers ``gthread`` de Gunicorn.
+
+Un flux est un générateur synchrone qui occupe un thread du worker pendant
+toute sa durée (``PAYMENT_SSE_SECONDS``, ``TRACKING_SSE_SECONDS``). Avec
+``gthread``, le processus continue de répondre au maître et n'est pas tué au
+``timeout`` ; ``event_stream_response`` borne en plus le nombre de flux par
+processus à ``SSE_MAX_STREAMS`` pour laisser des threads libres à l'API.
+Au-delà, le client reçoit un 503 et repasse en interrogation simple.
+
+Sous ASGI, Django lit un itérateur synchrone jusqu'au bout avant d'envoyer
+la réponse : ces flux supposent le déploiement WSGI de ``gunicorn.conf.py``.
+"""
+import threading
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework import status
+from rest_framework.response import Response
+
+RETRY_AFTER_SECONDS = 5
+
+_lock = threading.Lock()
+_open_streams = 0
+
+
+def open_streams():
+    return _open_streams
+
+
+class _StreamSlot:
+    """Itérable du flux ; Django appelle ``close`` à la fin de la réponse, même jamais lue."""
+
+    def __init__(self, events):
+        self._events = events
+        self._closed = False
+
+    def __iter__(self):
+        return iter(self._events)
+
+    def close(self):
+        global _open_streams
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._events.close()
+        finally:
+            with _lock:
+                _open_streams -= 1
+
+
+def event_stream_response(events):
+    """Réponse ``text/event-stream`` de ``events``, ou 503 si le processus a déjà assez de flux."""
+    global _open_streams
+    with _lock:
+        if _open_streams >= settings.SSE_MAX_STREAMS:
+            return Response(
+                {
+                    'erreur': 'FLUX_INDISPONIBLE',
+                    'detail': 'Trop de flux en direct ouverts ; réessayez ou interrogez le statut.',
+                },
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={'Retry-After': str(RETRY_AFTER_SECONDS)},
+            )
+        _open_streams += 1
+    response = StreamingHttpResponse(_StreamSlot(events), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
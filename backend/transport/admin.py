@@ -14,9 +14,13 @@ from .models import (
     Reservation,
     CompteCagnotte,
     HistoriqueReversement,
+    ReversementCompagnie,
+    MouvementCagnotte,
     XPTransaction,
     BusPosition,
+    CompactTrajectory,
     TripTrackingSession,
+    TicketIndex,
 )
 
 
@@ -96,6 +100,24 @@ class BusPositionAdmin(admin.ModelAdmin):
     readonly_fields = ['session', 'latitude', 'longitude', 'speed_kmh', 'accuracy_m', 'heading', 'recorded_at', 'created_at']
 
 
+@admin.register(CompactTrajectory)
+class CompactTrajectoryAdmin(admin.ModelAdmin):
+    list_display = ['session', 'started_at', 'ended_at', 'points', 'raw_points', 'distance_km', 'compacted_at']
+    list_filter = ['compacted_at']
+    readonly_fields = [
+        'session', 'polyline', 'times', 'speeds', 'started_at', 'ended_at', 'raw_points', 'points',
+        'distance_km', 'max_speed_kmh', 'avg_speed_kmh', 'compacted_at',
+    ]
+
+
+@admin.register(TicketIndex)
+class TicketIndexAdmin(admin.ModelAdmin):
+    list_display = ['reference', 'source', 'company_name', 'route', 'seat', 'status', 'control_status', 'created_at']
+    list_filter = ['source', 'status', 'control_status']
+    search_fields = ['reference', 'client_name', 'client_phone']
+    readonly_fields = [field.name for field in TicketIndex._meta.fields]
+
+
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
     list_display = ['booking', 'amount', 'payment_method', 'status', 'payment_date']
@@ -144,3 +166,25 @@ class HistoriqueReversementAdmin(admin.ModelAdmin):
     list_display = ['compagnie', 'reservation', 'montant', 'statut', 'created_at']
     list_filter = ['statut', 'created_at']
     search_fields = ['reservation__reference_evex', 'reference_qos_reversement']
+
+
+@admin.register(ReversementCompagnie)
+class ReversementCompagnieAdmin(admin.ModelAdmin):
+    list_display = ['reference', 'compagnie', 'fenetre_fin', 'montant', 'nombre_mouvements', 'statut']
+    list_filter = ['statut', 'fenetre_fin']
+    search_fields = ['reference', 'compagnie__name', 'reference_qos_reversement']
+    readonly_fields = ['created_at', 'effectue_at']
+
+
+@admin.register(MouvementCagnotte)
+class MouvementCagnotteAdmin(admin.ModelAdmin):
+    list_display = ['compagnie', 'type', 'montant', 'reservation', 'reversement', 'created_at']
+    list_filter = ['type', 'created_at']
+    search_fields = ['compagnie__name', 'reservation__reference_evex', 'reversement__reference']
+
+    # Grand livre en ajout seul : pas de modification ni de suppression manuelle.
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
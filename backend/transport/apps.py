@@ -6,4 +6,4 @@ class TransportConfig(AppConfig):
     name = 'transport'
 
     def ready(self):
-        from . import signals  # noqa: F401
+        from . import checks, signals  # noqa: F401
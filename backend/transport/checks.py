@@ -0,0 +1,31 @@
+"""Checks Django propres au transport."""
+from django.conf import settings
+from django.core.checks import Error, register
+
+LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register()
+def shared_cache_check(app_configs, **kwargs):
+    """Hors DEBUG, le cache par défaut doit être commun aux workers Gunicorn.
+
+    Le disjoncteur des opérateurs, les canaux du suivi en direct et de la
+    carte de flotte, et les géométries et passagers des trajets y vivent :
+    avec un cache local au processus, chaque worker a son propre état et un
+    flux servi par un worker ne voit pas les positions publiées par l'autre.
+    """
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if settings.DEBUG or backend not in LOCAL_CACHES:
+        return []
+    return [Error(
+        f'Le cache par défaut ({backend}) est local au processus.',
+        hint=(
+            'Utiliser django.core.cache.backends.db.DatabaseCache '
+            '(python manage.py createcachetable) ou '
+            'django.core.cache.backends.redis.RedisCache via CACHE_BACKEND.'
+        ),
+        id='transport.E001',
+    )]
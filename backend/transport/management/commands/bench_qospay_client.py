@@ -0,0 +1,79 @@
+"""
+Management command: bench_qospay_client
+=======================================
+Compare, contre un serveur QosPay local (``transport.qospay_stub``), un
+``requests.post`` par appel (nouvelle connexion à chaque fois) et le client
+partagé ``qospay_client`` (connexions keep-alive réutilisées).
+
+Usage:
+    python manage.py bench_qospay_client
+    python manage.py bench_qospay_client --calls=500 --delay=0.005
+
+Le serveur local est en HTTP : le gain mesuré ne compte que la connexion TCP.
+Contre QosPay en HTTPS, chaque connexion évitée économise aussi la
+négociation TLS.
+"""
+import logging
+import statistics
+import time
+
+import requests
+from django.core.management.base import BaseCommand
+
+from transport.qospay_stub import QosPayStub
+from transport.services.qospay_client import QosPayClient
+
+
+STATUS_PATH = '/QosicBridge/tg/v1/gettransactionstatus'
+
+
+class Command(BaseCommand):
+    help = 'Mesure le gain du client QosPay partagé contre un serveur local.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--calls', type=int, default=200, help="Nombre d'appels par mode (défaut: 200).")
+        parser.add_argument('--delay', type=float, default=0.0, help='Latence simulée du serveur, en secondes.')
+
+    def _measure(self, call, calls):
+        durations = []
+        for index in range(calls):
+            started = time.perf_counter()
+            call({'transref': f'BENCH-{index}', 'clientid': 'BENCH'}).raise_for_status()
+            durations.append((time.perf_counter() - started) * 1000)
+        durations.sort()
+        return {
+            'moyenne': statistics.fmean(durations),
+            'p50': durations[len(durations) // 2],
+            'p95': durations[min(int(len(durations) * 0.95), len(durations) - 1)],
+        }
+
+    def handle(self, *args, **options):
+        calls = max(options['calls'], 1)
+        # Les journaux par appel fausseraient la mesure.
+        logging.getLogger('transport.services.qospay_client').setLevel(logging.WARNING)
+        with QosPayStub(delay=max(options['delay'], 0)) as stub:
+            url = f'{stub.url}{STATUS_PATH}'
+            auth = ('bench', 'bench')
+            direct = self._measure(
+                lambda payload: requests.post(url, json=payload, auth=auth, timeout=30),
+                calls,
+            )
+            connexions_direct = stub.connections
+            client = QosPayClient(pool_size=1)
+            pooled = self._measure(
+                lambda payload: client.post(url, payload, auth=auth, deadline=30, idempotent=True),
+                calls,
+            )
+            client.close()
+            connexions_pool = stub.connections - connexions_direct
+
+        for label, mesure, connexions in (
+            ('requests.post', direct, connexions_direct),
+            ('qospay_client', pooled, connexions_pool),
+        ):
+            self.stdout.write(
+                f"{label:<14} moyenne={mesure['moyenne']:.2f} ms  p50={mesure['p50']:.2f} ms  "
+                f"p95={mesure['p95']:.2f} ms  connexions={connexions}"
+            )
+        gain = 100 * (1 - pooled['moyenne'] / direct['moyenne'])
+        self.stdout.write(self.style.SUCCESS(f'Gain moyen : {gain:.0f} % sur {calls} appel(s).'))
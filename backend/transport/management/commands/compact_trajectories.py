@@ -0,0 +1,37 @@
+"""
+Management command: compact_trajectories
+========================================
+Simplifie les trajectoires GPS des suivis arrêtés en polylines encodées et
+supprime leurs positions brutes.
+
+Usage:
+    python manage.py compact_trajectories --once
+    python manage.py compact_trajectories --interval=600
+    python manage.py compact_trajectories --once --limit=500 --min-age=0
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from transport.services.trajectories import compact_trajectories
+
+
+class Command(BaseCommand):
+    help = 'Compacte les trajectoires GPS des suivis terminés.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=100, help='Suivis compactés par passage (défaut: 100).')
+        parser.add_argument('--min-age', type=int, default=None, help='Minutes depuis l\'arrêt du suivi (défaut: TRACKING_COMPACT_AFTER_MINUTES).')
+        parser.add_argument('--interval', type=float, default=600.0, help='Pause entre deux passages, en secondes.')
+        parser.add_argument('--once', action='store_true', help='Un seul passage puis arrêt.')
+
+    def handle(self, *args, **options):
+        while True:
+            metrics = compact_trajectories(limit=max(options['limit'], 1), min_age_minutes=options['min_age'])
+            self.stdout.write(self.style.SUCCESS(
+                f"{metrics['sessions']} suivi(s) compacté(s) : {metrics['positions_supprimees']} position(s) "
+                f"remplacée(s) par {metrics['points_conserves']} point(s)."
+            ))
+            if options['once']:
+                return
+            time.sleep(max(options['interval'], 1.0))
@@ -0,0 +1,43 @@
+"""
+Management command: drain_payment_webhooks
+==========================================
+Worker de la boîte de réception des callbacks QoS (``PaymentWebhook``) :
+applique par lots, dans l'ordre de réception, les callbacks qu'aucun
+processus web n'a encore traités.
+
+Usage:
+    python manage.py drain_payment_webhooks
+    python manage.py drain_payment_webhooks --batch=200 --interval=1
+    python manage.py drain_payment_webhooks --once
+
+Avec ``PAYMENT_WORKERS=0`` les vues webhook ne font qu'enregistrer les
+callbacks et ce worker est le seul à les appliquer.
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from transport.services.payment_webhooks import drain_webhooks, release_stale_webhooks
+
+
+class Command(BaseCommand):
+    help = 'Applique les callbacks de paiement QoS en attente.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=None, help='Callbacks pris par lot (défaut: PAYMENT_WEBHOOK_BATCH).')
+        parser.add_argument('--interval', type=float, default=1.0, help='Pause entre deux lots incomplets, en secondes.')
+        parser.add_argument('--once', action='store_true', help='Traite un seul lot puis s\'arrête.')
+
+    def handle(self, *args, **options):
+        batch = max(options['batch'] or settings.PAYMENT_WEBHOOK_BATCH, 1)
+        while True:
+            stale = release_stale_webhooks()
+            if stale:
+                self.stdout.write(self.style.WARNING(f'{stale} callback(s) interrompu(s) remis en file.'))
+            done = drain_webhooks(limit=batch)
+            if options['once']:
+                self.stdout.write(self.style.SUCCESS(f'{done} callback(s) de paiement traité(s).'))
+                return
+            if done < batch:
+                time.sleep(max(options['interval'], 0.1))
@@ -0,0 +1,87 @@
+"""
+Management command: loadtest_payments
+=====================================
+Test de charge du parcours de paiement mobile contre un serveur EVEX en
+cours d'exécution : réservation du siège → demande de paiement → webhook →
+confirmation, pour des milliers d'acheteurs simultanés sur un voyage.
+
+Usage:
+    python manage.py loadtest_payments --voyage=42 --buyers=2000 --concurrency=200
+    python manage.py loadtest_payments --voyage=42 --simulator-port=8900 \\
+        --latency=0.2 --failure-rate=0.01 --callback-delay=2 --success-rate=0.9
+
+Avec ``--simulator-port``, la commande démarre elle-même le simulateur QosPay
+et lui fait appeler ``<base-url>/api/payment/webhook/`` ; le serveur testé
+doit alors être lancé avec ``QOSPAY_BASE_URL=http://127.0.0.1:<port>``.
+La commande lit la même base que le serveur pour contrôler les sièges.
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from transport.models import Reservation, ScheduledTrip
+from transport.qospay_stub import QosPayStub
+from transport.services.payment_loadtest import run_scenario, seat_violations
+
+
+class Command(BaseCommand):
+    help = 'Test de charge du paiement mobile (p50/p95/p99 et cohérence des sièges).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--voyage', type=int, required=True, help='Voyage programmé visé.')
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000', help='Serveur EVEX testé.')
+        parser.add_argument('--buyers', type=int, default=1000, help='Nombre d\'acheteurs (défaut: 1000).')
+        parser.add_argument('--concurrency', type=int, default=100, help='Acheteurs simultanés (défaut: 100).')
+        parser.add_argument('--operateur', default=Reservation.OPERATEUR_FLOOZ, choices=[
+            Reservation.OPERATEUR_FLOOZ, Reservation.OPERATEUR_TMONEY,
+        ])
+        parser.add_argument('--timeout', type=float, default=60.0, help='Attente maximale d\'un acheteur, en secondes.')
+        parser.add_argument('--poll', type=float, default=0.5, help='Intervalle de suivi du statut, en secondes.')
+        parser.add_argument('--seed', type=int, default=None, help='Graine du tirage des sièges.')
+        parser.add_argument('--simulator-port', type=int, default=None, help='Démarre le simulateur QosPay sur ce port.')
+        parser.add_argument('--latency', type=float, default=0.0, help='Latence du simulateur, en secondes.')
+        parser.add_argument('--failure-rate', type=float, default=0.0, help='Part des requêtes QosPay en 503.')
+        parser.add_argument('--callback-delay', type=float, default=2.0, help='Délai des callbacks, en secondes.')
+        parser.add_argument('--success-rate', type=float, default=1.0, help='Part des paiements réussis.')
+
+    def handle(self, *args, **options):
+        voyage = ScheduledTrip.objects.select_related('trip').filter(pk=options['voyage']).first()
+        if voyage is None:
+            raise CommandError('Voyage introuvable.')
+
+        simulator = None
+        if options['simulator_port'] is not None:
+            simulator = QosPayStub(
+                port=options['simulator_port'],
+                delay=max(options['latency'], 0),
+                failure_rate=options['failure_rate'],
+                callback_url=f"{options['base_url'].rstrip('/')}/api/payment/webhook/",
+                callback_delay=max(options['callback_delay'], 0),
+                success_rate=options['success_rate'],
+                seed=options['seed'],
+            ).start()
+            self.stdout.write(f'Simulateur QosPay sur {simulator.url}.')
+        try:
+            report = run_scenario(
+                options['base_url'],
+                voyage.pk,
+                seats=voyage.trip.capacity,
+                montant_billet=int(voyage.trip.price),
+                buyers=max(options['buyers'], 1),
+                concurrency=options['concurrency'],
+                operateur=options['operateur'],
+                timeout=options['timeout'],
+                poll_interval=options['poll'],
+                seed=options['seed'],
+            )
+        finally:
+            if simulator:
+                simulator.stop()
+
+        self.stdout.write(json.dumps(report, indent=2, ensure_ascii=False))
+        violations = seat_violations(voyage.pk)
+        if violations:
+            for violation in violations:
+                self.stdout.write(self.style.ERROR(json.dumps(violation, ensure_ascii=False)))
+            raise CommandError(f'{len(violations)} incohérence(s) de sièges.')
+        self.stdout.write(self.style.SUCCESS('Aucune incohérence de sièges.'))
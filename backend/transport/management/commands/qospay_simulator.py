@@ -0,0 +1,51 @@
+"""
+Management command: qospay_simulator
+====================================
+Lance le simulateur QosPay local (``transport.qospay_stub``) comme serveur
+autonome, pour tester l'application sans QosicBridge.
+
+Usage:
+    python manage.py qospay_simulator --port=8900
+    python manage.py qospay_simulator --port=8900 --latency=0.2 --failure-rate=0.02 \\
+        --callback-url=http://127.0.0.1:8000/api/payment/webhook/ --callback-delay=3 --success-rate=0.9
+
+Le serveur testé doit viser le simulateur : ``QOSPAY_BASE_URL=http://127.0.0.1:8900``.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from transport.qospay_stub import QosPayStub
+
+
+class Command(BaseCommand):
+    help = 'Lance un simulateur QosPay local.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='Adresse d\'écoute (défaut: 127.0.0.1).')
+        parser.add_argument('--port', type=int, default=8900, help='Port d\'écoute (défaut: 8900).')
+        parser.add_argument('--latency', type=float, default=0.0, help='Latence par requête, en secondes.')
+        parser.add_argument('--failure-rate', type=float, default=0.0, help='Part des requêtes en 503 (0 à 1).')
+        parser.add_argument('--callback-url', default=None, help='Webhook à appeler pour chaque paiement.')
+        parser.add_argument('--callback-delay', type=float, default=2.0, help='Délai avant le callback, en secondes.')
+        parser.add_argument('--success-rate', type=float, default=1.0, help='Part des paiements réussis (0 à 1).')
+
+    def handle(self, *args, **options):
+        stub = QosPayStub(
+            host=options['host'],
+            port=options['port'],
+            delay=max(options['latency'], 0),
+            failure_rate=options['failure_rate'],
+            callback_url=options['callback_url'],
+            callback_delay=max(options['callback_delay'], 0),
+            success_rate=options['success_rate'],
+        ).start()
+        self.stdout.write(self.style.SUCCESS(f'Simulateur QosPay sur {stub.url} (Ctrl+C pour arrêter).'))
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stub.stop()
+            self.stdout.write(f'{stub.requests} requête(s), {stub.callbacks} callback(s) envoyé(s).')
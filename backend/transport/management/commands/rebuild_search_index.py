@@ -0,0 +1,81 @@
+"""
+Management command: rebuild_search_index
+========================================
+Recalcule les textes de recherche et les trigrammes (SearchGram) des billets
+indexés et du journal d'audit.
+
+Usage:
+    python manage.py rebuild_search_index
+    python manage.py rebuild_search_index --scope=audit
+
+Les trigrammes sont tenus à jour à chaque écriture ; la commande sert à la
+mise en place initiale et après une modification directe en base. Pour
+reconstruire aussi les lignes de billets, utiliser rebuild_ticket_index.
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from transport.models import AuditLog, SearchGram, TicketIndex
+from transport.services.search import audit_search_document, index_documents
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index de recherche par trigrammes (billets et audit)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scope',
+            choices=[SearchGram.SCOPE_TICKET, SearchGram.SCOPE_AUDIT],
+            default=None,
+            help='Limiter la reconstruction aux billets ou au journal d\'audit.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Nombre de lignes traitées par lot (défaut: 1000).',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(options['batch_size'], 1)
+        scopes = [options['scope']] if options['scope'] else [SearchGram.SCOPE_TICKET, SearchGram.SCOPE_AUDIT]
+        for scope in scopes:
+            with transaction.atomic():
+                SearchGram.objects.filter(scope=scope).delete()
+                if scope == SearchGram.SCOPE_AUDIT:
+                    total = self.rebuild_audit(batch_size)
+                else:
+                    total = self.rebuild_tickets(batch_size)
+            self.stdout.write(self.style.SUCCESS(f'{scope} : {total} ligne(s) indexée(s).'))
+
+    def rebuild_tickets(self, batch_size):
+        total = 0
+        documents = {}
+        rows = TicketIndex.objects.values_list('id', 'search_text').iterator(chunk_size=batch_size)
+        for pk, text in rows:
+            documents[pk] = text
+            if len(documents) >= batch_size:
+                index_documents(SearchGram.SCOPE_TICKET, documents)
+                total += len(documents)
+                documents = {}
+        index_documents(SearchGram.SCOPE_TICKET, documents)
+        return total + len(documents)
+
+    def rebuild_audit(self, batch_size):
+        total = 0
+        entries = []
+        for entry in AuditLog.objects.select_related('user').iterator(chunk_size=batch_size):
+            entry.search_text = audit_search_document(entry)
+            entries.append(entry)
+            if len(entries) >= batch_size:
+                total += self.write_audit(entries)
+                entries = []
+        return total + self.write_audit(entries)
+
+    def write_audit(self, entries):
+        if not entries:
+            return 0
+        AuditLog.objects.bulk_update(entries, ['search_text'])
+        index_documents(SearchGram.SCOPE_AUDIT, {entry.pk: entry.search_text for entry in entries})
+        return len(entries)
@@ -0,0 +1,45 @@
+"""
+Management command: rebuild_ticket_index
+========================================
+Reconstruit l'index dénormalisé des billets (TicketIndex) à partir des
+réservations application, des paiements mobile et des ventes guichet.
+
+Usage:
+    python manage.py rebuild_ticket_index
+    python manage.py rebuild_ticket_index --batch-size=2000
+    python manage.py rebuild_ticket_index --if-incomplete
+
+L'index est maintenu à chaque écriture ; la commande sert après un import de
+données, une modification directe en base ou le renommage d'une compagnie.
+Avec --if-incomplete (start.sh, release du Procfile), elle ne reconstruit
+que si une table source compte plus de billets que l'index : les billets
+antérieurs à la migration 0012 y entrent au premier déploiement.
+"""
+
+from django.core.management.base import BaseCommand
+
+from transport.ticketing import rebuild_ticket_index, ticket_index_incomplete
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index des billets tous canaux confondus."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Nombre de billets écrits par lot (défaut: 500).',
+        )
+        parser.add_argument(
+            '--if-incomplete',
+            action='store_true',
+            help="Ne reconstruit que s'il manque des billets dans l'index.",
+        )
+
+    def handle(self, *args, **options):
+        if options['if_incomplete'] and not ticket_index_incomplete():
+            self.stdout.write('Index des billets complet.')
+            return
+        total = rebuild_ticket_index(batch_size=max(options['batch_size'], 1))
+        self.stdout.write(self.style.SUCCESS(f'{total} billet(s) indexé(s).'))
@@ -0,0 +1,43 @@
+"""
+Management command: reconcile_payments
+======================================
+Interroge QosPay pour les réservations mobiles et les transactions restées
+en attente, et applique les statuts obtenus par lots.
+
+Usage:
+    python manage.py reconcile_payments --once
+    python manage.py reconcile_payments --interval=60
+    python manage.py reconcile_payments --once --workers=16 --page-size=200 --min-age=30
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from transport.services.reconciliation import reconcilier_paiements
+
+
+class Command(BaseCommand):
+    help = 'Réconcilie les paiements mobiles en attente avec QosPay.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=100, help='Paiements lus par page (défaut: 100).')
+        parser.add_argument('--workers', type=int, default=None, help='Threads d\'interrogation (défaut: RECONCILIATION_WORKERS).')
+        parser.add_argument('--min-age', type=int, default=None, help='Âge minimal en secondes (défaut: RECONCILIATION_MIN_AGE_SECONDS).')
+        parser.add_argument('--interval', type=float, default=60.0, help='Pause entre deux passages, en secondes.')
+        parser.add_argument('--once', action='store_true', help='Un seul passage puis arrêt.')
+
+    def handle(self, *args, **options):
+        while True:
+            metrics = reconcilier_paiements(
+                page_size=max(options['page_size'], 1),
+                workers=options['workers'],
+                min_age=options['min_age'],
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f"{metrics['examines']} paiement(s) examiné(s) : {metrics['resolus']} résolu(s), "
+                f"{metrics['toujours_en_attente']} toujours en attente, "
+                f"{metrics['erreurs_operateur']} erreur(s) opérateur ({metrics['duree_ms']} ms)."
+            ))
+            if options['once']:
+                return
+            time.sleep(max(options['interval'], 1.0))
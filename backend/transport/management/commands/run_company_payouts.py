@@ -0,0 +1,54 @@
+"""
+Management command: run_company_payouts
+=======================================
+Règle les fenêtres de reversement closes : un reversement par compagnie et
+par fenêtre (``REVERSEMENT_FENETRE_MINUTES``), puis contrôle le grand livre.
+Chaque passage conclut d'abord les reversements restés en cours (dépôt sans
+réponse nette, worker interrompu) d'après leur statut chez QoS.
+
+Usage:
+    python manage.py run_company_payouts --once
+    python manage.py run_company_payouts --interval=300
+    python manage.py run_company_payouts --reconcile-only --fix
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from transport.models import ReversementCompagnie
+from transport.services.company_payouts import (
+    reconcilier_cagnottes,
+    regler_fenetre,
+    verifier_reversements_en_cours,
+)
+
+
+class Command(BaseCommand):
+    help = 'Règle les reversements groupés des compagnies.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=300.0, help='Pause entre deux passages, en secondes.')
+        parser.add_argument('--once', action='store_true', help='Un seul passage puis arrêt.')
+        parser.add_argument('--reconcile-only', action='store_true', help='Contrôle le grand livre sans reverser.')
+        parser.add_argument('--fix', action='store_true', help='Crédite les réservations payées absentes du grand livre.')
+
+    def handle(self, *args, **options):
+        while True:
+            if not options['reconcile_only']:
+                verifies = verifier_reversements_en_cours()
+                if verifies:
+                    self.stdout.write(self.style.SUCCESS(f'{len(verifies)} reversement(s) en cours conclu(s).'))
+                reversements = regler_fenetre()
+                effectues = [item for item in reversements if item.statut == ReversementCompagnie.STATUT_EFFECTUE]
+                self.stdout.write(self.style.SUCCESS(
+                    f'{len(effectues)}/{len(reversements)} reversement(s) effectué(s), '
+                    f'{sum(item.montant for item in effectues)} FCFA.'
+                ))
+            for ecart in reconcilier_cagnottes(corriger=options['fix']):
+                self.stdout.write(self.style.WARNING(
+                    f"Compagnie {ecart['compagnie_id']} : attendu {ecart['attendu']} FCFA, "
+                    f"grand livre {ecart['grand_livre']} FCFA ({ecart['manquantes']} réservation(s) sans crédit)."
+                ))
+            if options['once'] or options['reconcile_only']:
+                return
+            time.sleep(max(options['interval'], 1.0))
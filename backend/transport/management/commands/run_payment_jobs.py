@@ -0,0 +1,42 @@
+"""
+Management command: run_payment_jobs
+====================================
+Worker des demandes de paiement mobile (``PaymentJob``) : exécute par lots,
+sur un pool de threads, les tâches qu'aucun processus web n'a prises.
+
+Usage:
+    python manage.py run_payment_jobs
+    python manage.py run_payment_jobs --workers=8 --batch=100 --interval=1
+    python manage.py run_payment_jobs --once
+
+Avec ``PAYMENT_WORKERS=0`` les processus web ne font qu'enregistrer les
+tâches et ce worker est le seul à appeler les opérateurs.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from transport.services.payment_jobs import release_stale_jobs, run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = 'Exécute les demandes de paiement mobile en attente.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help='Threads par lot (défaut: PAYMENT_WORKERS).')
+        parser.add_argument('--batch', type=int, default=50, help='Tâches prises par lot (défaut: 50).')
+        parser.add_argument('--interval', type=float, default=1.0, help='Pause entre deux lots vides, en secondes.')
+        parser.add_argument('--once', action='store_true', help='Traite un seul lot puis s\'arrête.')
+
+    def handle(self, *args, **options):
+        batch = max(options['batch'], 1)
+        while True:
+            stale = release_stale_jobs()
+            if stale:
+                self.stdout.write(self.style.WARNING(f'{stale} tâche(s) interrompue(s) marquée(s) échouée(s).'))
+            done = run_pending_jobs(limit=batch, workers=options['workers'])
+            if options['once']:
+                self.stdout.write(self.style.SUCCESS(f'{done} tâche(s) de paiement traitée(s).'))
+                return
+            if done < batch:
+                time.sleep(max(options['interval'], 0.1))
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.4 on 2026-10-19 11:01
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transport', '0011_triptrackingsession_busposition'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('booking', 'Réservation application'), ('mobile', 'Paiement mobile'), ('guichet', 'Vente guichet')], max_length=10)),
+                ('source_id', models.CharField(max_length=64)),
+                ('reference', models.CharField(max_length=64)),
+                ('client_name', models.CharField(blank=True, max_length=200)),
+                ('client_phone', models.CharField(blank=True, max_length=30)),
+                ('company_name', models.CharField(blank=True, max_length=200)),
+                ('route', models.CharField(blank=True, max_length=250)),
+                ('seat', models.CharField(blank=True, max_length=10)),
+                ('travel_date', models.DateField(blank=True, null=True)),
+                ('status', models.CharField(max_length=20)),
+                ('control_status', models.CharField(default='en_attente', max_length=20)),
+                ('payload', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('created_at', models.DateTimeField()),
+                ('indexed_at', models.DateTimeField(auto_now=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ticket_index', to='transport.company')),
+                ('voyage', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ticket_index', to='transport.scheduledtrip')),
+            ],
+            options={
+                'verbose_name': 'Index billet',
+                'verbose_name_plural': 'Index billets',
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['company', '-created_at', '-id'], name='transport_t_company_05fe72_idx'), models.Index(fields=['-created_at', '-id'], name='transport_t_created_9f8f78_idx'), models.Index(fields=['voyage', 'seat'], name='transport_t_voyage__bf8e82_idx'), models.Index(fields=['reference'], name='transport_t_referen_5c77bd_idx'), models.Index(fields=['client_phone'], name='transport_t_client__f646fa_idx')],
+                'constraints': [models.UniqueConstraint(fields=('source', 'source_id'), name='unique_ticket_index_source')],
+            },
+        ),
+    ]
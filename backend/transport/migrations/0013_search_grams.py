@@ -0,0 +1,38 @@
+# Generated by Django 5.1.4 on 2026-10-19 11:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transport', '0012_ticketindex'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auditlog',
+            name='search_text',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='ticketindex',
+            name='search_text',
+            field=models.TextField(blank=True),
+        ),
+        migrations.CreateModel(
+            name='SearchGram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('ticket', 'Billets'), ('audit', "Journal d'audit")], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('gram', models.CharField(max_length=3)),
+            ],
+            options={
+                'verbose_name': 'Trigramme de recherche',
+                'verbose_name_plural': 'Trigrammes de recherche',
+                'indexes': [models.Index(fields=['scope', 'gram', 'object_id'], name='transport_s_scope_dacfd2_idx')],
+                'constraints': [models.UniqueConstraint(fields=('scope', 'object_id', 'gram'), name='unique_search_gram')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-19 11:46
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transport', '0013_search_grams'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'En file'), ('running', 'En cours'), ('done', 'Envoyée'), ('failed', 'Échouée')], default='pending', max_length=10)),
+                ('description', models.CharField(blank=True, max_length=200)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('reservation', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='payment_job', to='transport.reservation')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'run_after'], name='transport_p_status_a046a1_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.4 on 2026-10-19 11:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transport', '0014_payment_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentWebhook',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('reservation', 'Réservation mobile'), ('transaction', 'Transaction QosPay')], max_length=20)),
+                ('transref', models.CharField(max_length=64)),
+                ('provider_status', models.CharField(blank=True, max_length=30)),
+                ('transaction_id', models.CharField(blank=True, max_length=100)),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('status', models.CharField(choices=[('pending', 'À traiter'), ('running', 'En cours'), ('done', 'Appliqué'), ('ignored', 'Sans effet'), ('failed', 'Échoué')], default='pending', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'received_at'], name='transport_p_status_deda16_idx')],
+                'constraints': [models.UniqueConstraint(fields=('source', 'transref', 'provider_status'), name='unique_payment_webhook')],
+            },
+        ),
+    ]
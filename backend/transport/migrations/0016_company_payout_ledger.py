@@ -0,0 +1,104 @@
+# Generated by Django 5.1.4 on 2026-10-19 11:58
+
+from collections import defaultdict
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def reporter_soldes_cagnotte(apps, schema_editor):
+    """Reprend les soldes hérités dans le grand livre.
+
+    L'ancien ``solde_a_reverser`` est la somme des reversements échoués,
+    c'est-à-dire des réservations payées restées ``reversement_effectue=False`` :
+    chacune reçoit son crédit, que le règlement marquera reversé. Seul un
+    reliquat éventuel, sans réservation, est reporté en bloc.
+    """
+    CompteCagnotte = apps.get_model('transport', 'CompteCagnotte')
+    MouvementCagnotte = apps.get_model('transport', 'MouvementCagnotte')
+    Reservation = apps.get_model('transport', 'Reservation')
+
+    impayees = (
+        Reservation.objects
+        .filter(statut_paiement='paye', reversement_effectue=False)
+        .values_list('pk', 'voyage__trip__company_id', 'montant_reverse_compagnie')
+    )
+    credits = defaultdict(int)
+    mouvements = []
+    for pk, company_id, montant in impayees.iterator():
+        credits[company_id] += montant
+        mouvements.append(MouvementCagnotte(
+            compagnie_id=company_id,
+            reservation_id=pk,
+            type='credit',
+            montant=montant,
+        ))
+    MouvementCagnotte.objects.bulk_create(mouvements, batch_size=500, ignore_conflicts=True)
+
+    MouvementCagnotte.objects.bulk_create([
+        MouvementCagnotte(
+            compagnie_id=cagnotte.compagnie_id,
+            type='report',
+            montant=cagnotte.solde_a_reverser - credits[cagnotte.compagnie_id],
+        )
+        for cagnotte in CompteCagnotte.objects.all()
+        if cagnotte.solde_a_reverser > credits[cagnotte.compagnie_id]
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transport', '0015_payment_webhooks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReversementCompagnie',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fenetre_fin', models.DateTimeField()),
+                ('reference', models.CharField(max_length=64, unique=True)),
+                ('montant', models.IntegerField(default=0)),
+                ('nombre_mouvements', models.PositiveIntegerField(default=0)),
+                ('statut', models.CharField(choices=[('en_cours', 'En cours'), ('effectue', 'Effectué'), ('echoue', 'Échoué')], default='en_cours', max_length=10)),
+                ('reference_qos_reversement', models.CharField(blank=True, max_length=100, null=True)),
+                ('erreur', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('effectue_at', models.DateTimeField(blank=True, null=True)),
+                ('compagnie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reversements', to='transport.company')),
+            ],
+            options={
+                'ordering': ['-fenetre_fin'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MouvementCagnotte',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(choices=[('credit', 'Billet payé'), ('regularisation', 'Régularisation'), ('reversement', 'Reversement'), ('report', 'Report de solde')], max_length=20)),
+                ('montant', models.IntegerField()),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('compagnie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mouvements_cagnotte', to='transport.company')),
+                ('reservation', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='mouvements_cagnotte', to='transport.reservation')),
+                ('reversement', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='mouvements', to='transport.reversementcompagnie')),
+            ],
+            options={
+                'ordering': ['created_at'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='reversementcompagnie',
+            constraint=models.UniqueConstraint(fields=('compagnie', 'fenetre_fin'), name='unique_reversement_fenetre'),
+        ),
+        migrations.AddIndex(
+            model_name='mouvementcagnotte',
+            index=models.Index(fields=['compagnie', 'reversement', 'created_at'], name='transport_m_compagn_26873f_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='mouvementcagnotte',
+            constraint=models.UniqueConstraint(condition=models.Q(('type', 'credit')), fields=('reservation',), name='unique_credit_reservation'),
+        ),
+        migrations.RunPython(reporter_soldes_cagnotte, migrations.RunPython.noop),
+    ]
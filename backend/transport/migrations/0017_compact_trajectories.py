@@ -0,0 +1,36 @@
+# Generated by Django 5.1.4 on 2026-10-19 12:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transport', '0016_company_payout_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompactTrajectory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('polyline', models.TextField()),
+                ('times', models.TextField()),
+                ('speeds', models.TextField()),
+                ('started_at', models.DateTimeField()),
+                ('ended_at', models.DateTimeField()),
+                ('raw_points', models.PositiveIntegerField()),
+                ('points', models.PositiveIntegerField()),
+                ('distance_km', models.FloatField(default=0)),
+                ('max_speed_kmh', models.FloatField(blank=True, null=True)),
+                ('avg_speed_kmh', models.FloatField(blank=True, null=True)),
+                ('compacted_at', models.DateTimeField(auto_now=True)),
+                ('session', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='compact_trajectory', to='transport.triptrackingsession')),
+            ],
+            options={
+                'verbose_name': 'Trajectoire compactée',
+                'verbose_name_plural': 'Trajectoires compactées',
+            },
+        ),
+    ]
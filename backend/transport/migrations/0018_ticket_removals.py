@@ -0,0 +1,28 @@
+# Generated by Django 5.1.4 on 2026-10-19 12:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transport', '0017_compact_trajectories'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketRemoval',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('booking', 'Réservation application'), ('mobile', 'Paiement mobile'), ('guichet', 'Vente guichet')], max_length=10)),
+                ('source_id', models.CharField(max_length=64)),
+                ('removed_at', models.DateTimeField()),
+                ('voyage', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ticket_removals', to='transport.scheduledtrip')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['voyage', 'removed_at'], name='transport_t_voyage__17f12f_idx')],
+                'constraints': [models.UniqueConstraint(fields=('voyage', 'source', 'source_id'), name='unique_ticket_removal')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.4 on 2026-10-19 13:02
+
+import transport.models.tickets
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transport', '0018_ticket_removals'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ticketindex',
+            name='payload',
+            field=models.JSONField(encoder=transport.models.tickets.TicketPayloadEncoder),
+        ),
+    ]
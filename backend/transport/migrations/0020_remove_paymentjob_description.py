@@ -0,0 +1,17 @@
+# Generated by Django 5.1.4 on 2026-10-19 13:22
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transport', '0019_ticket_payload_encoder'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='paymentjob',
+            name='description',
+        ),
+    ]
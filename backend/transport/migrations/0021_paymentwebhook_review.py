@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-19 13:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transport', '0020_remove_paymentjob_description'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='paymentwebhook',
+            name='status',
+            field=models.CharField(choices=[('pending', 'À traiter'), ('running', 'En cours'), ('done', 'Appliqué'), ('ignored', 'Sans effet'), ('failed', 'Échoué'), ('review', 'À vérifier')], default='pending', max_length=10),
+        ),
+    ]
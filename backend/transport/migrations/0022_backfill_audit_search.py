@@ -0,0 +1,52 @@
+# Generated by Django 5.1.4 on 2026-10-19 15:40
+
+from django.db import migrations
+
+from transport.services.search import audit_search_document, trigrams
+
+
+BATCH_SIZE = 1000
+
+
+def indexer_journal_audit(apps, schema_editor):
+    """Indexe les entrées du journal antérieures à la recherche (0013).
+
+    Le signal de sauvegarde renseigne ``search_text`` et les trigrammes des
+    nouvelles entrées ; celles restées à texte vide n'ont jamais été
+    indexées et reçoivent ici les deux.
+    """
+    AuditLog = apps.get_model('transport', 'AuditLog')
+    SearchGram = apps.get_model('transport', 'SearchGram')
+
+    entries = []
+    for entry in AuditLog.objects.filter(search_text='').select_related('user').iterator(chunk_size=BATCH_SIZE):
+        entry.search_text = audit_search_document(entry)
+        if entry.search_text:
+            entries.append(entry)
+        if len(entries) >= BATCH_SIZE:
+            _ecrire(AuditLog, SearchGram, entries)
+            entries = []
+    _ecrire(AuditLog, SearchGram, entries)
+
+
+def _ecrire(AuditLog, SearchGram, entries):
+    AuditLog.objects.bulk_update(entries, ['search_text'])
+    SearchGram.objects.bulk_create(
+        [
+            SearchGram(scope='audit', object_id=entry.pk, gram=gram)
+            for entry in entries
+            for gram in trigrams(entry.search_text)
+        ],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transport', '0021_paymentwebhook_review'),
+    ]
+
+    operations = [
+        migrations.RunPython(indexer_journal_audit, migrations.RunPython.noop),
+    ]
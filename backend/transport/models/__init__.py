@@ -7,7 +7,10 @@ from .base import (
 from .base import ScheduledTrip
 from .mixins import SoftDeleteModel
 from .loyalty import XPTransaction
-from .tracking import BusPosition, TripTrackingSession
+from .tracking import BusPosition, CompactTrajectory, TripTrackingSession
+from .tickets import TicketIndex, TicketRemoval
+from .search import SearchGram
+from .payments import MouvementCagnotte, PaymentJob, PaymentWebhook, ReversementCompagnie
 
 __all__ = [
     'UserProfile',
@@ -31,4 +34,12 @@ __all__ = [
     'XPTransaction',
     'TripTrackingSession',
     'BusPosition',
+    'CompactTrajectory',
+    'TicketIndex',
+    'TicketRemoval',
+    'SearchGram',
+    'PaymentJob',
+    'PaymentWebhook',
+    'ReversementCompagnie',
+    'MouvementCagnotte',
 ]
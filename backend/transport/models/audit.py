@@ -20,6 +20,7 @@ class AuditLog(models.Model):
     new_values = models.JSONField(null=True, blank=True)
     timestamp = models.DateTimeField(auto_now_add=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
+    search_text = models.TextField(blank=True, default="")
 
     class Meta:
         ordering = ["-timestamp"]
@@ -0,0 +1,213 @@
+from django.db import models
+from django.utils import timezone
+
+from .base import Company, Reservation
+
+
+class PaymentJob(models.Model):
+    """Demande de paiement QoS à envoyer pour une réservation mobile.
+
+    ``InitierPaiementView`` enregistre la tâche et répond tout de suite ; un
+    pool de workers (``transport.services.payment_jobs``) appelle l'opérateur
+    et met la réservation à jour. Le client suit le statut stocké de la
+    réservation, par polling ou par SSE.
+    """
+
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'En file'),
+        (STATUS_RUNNING, 'En cours'),
+        (STATUS_DONE, 'Envoyée'),
+        (STATUS_FAILED, 'Échouée'),
+    ]
+
+    reservation = models.OneToOneField(
+        Reservation,
+        on_delete=models.CASCADE,
+        related_name='payment_job',
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    run_after = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+        ]
+
+    def __str__(self):
+        return f'{self.reservation_id} ({self.status})'
+
+
+class PaymentWebhook(models.Model):
+    """Callback QoS reçu, stocké une seule fois puis appliqué par un worker.
+
+    Les vues webhook ne font qu'insérer la ligne et acquitter. La contrainte
+    unique sur (source, transref, statut fournisseur) absorbe les rejeux de
+    QoS ; ``transport.services.payment_webhooks`` draine la table par lots,
+    dans l'ordre de réception.
+    """
+
+    SOURCE_RESERVATION = 'reservation'
+    SOURCE_TRANSACTION = 'transaction'
+
+    SOURCE_CHOICES = [
+        (SOURCE_RESERVATION, 'Réservation mobile'),
+        (SOURCE_TRANSACTION, 'Transaction QosPay'),
+    ]
+
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_IGNORED = 'ignored'
+    STATUS_FAILED = 'failed'
+    STATUS_REVIEW = 'review'
+
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'À traiter'),
+        (STATUS_RUNNING, 'En cours'),
+        (STATUS_DONE, 'Appliqué'),
+        (STATUS_IGNORED, 'Sans effet'),
+        (STATUS_FAILED, 'Échoué'),
+        (STATUS_REVIEW, 'À vérifier'),
+    ]
+
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    transref = models.CharField(max_length=64)
+    provider_status = models.CharField(max_length=30, blank=True)
+    transaction_id = models.CharField(max_length=100, blank=True)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['source', 'transref', 'provider_status'],
+                name='unique_payment_webhook',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'received_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.source} {self.transref} {self.provider_status} ({self.status})'
+
+
+class ReversementCompagnie(models.Model):
+    """Reversement groupé d'une compagnie pour une fenêtre de règlement.
+
+    Un seul reversement par compagnie et par fin de fenêtre ; il solde les
+    mouvements du grand livre (``MouvementCagnotte``) qui lui sont rattachés.
+    """
+
+    STATUT_EN_COURS = 'en_cours'
+    STATUT_EFFECTUE = 'effectue'
+    STATUT_ECHOUE = 'echoue'
+
+    STATUT_CHOICES = [
+        (STATUT_EN_COURS, 'En cours'),
+        (STATUT_EFFECTUE, 'Effectué'),
+        (STATUT_ECHOUE, 'Échoué'),
+    ]
+
+    compagnie = models.ForeignKey(
+        Company,
+        on_delete=models.CASCADE,
+        related_name='reversements',
+    )
+    fenetre_fin = models.DateTimeField()
+    reference = models.CharField(max_length=64, unique=True)
+    montant = models.IntegerField(default=0)
+    nombre_mouvements = models.PositiveIntegerField(default=0)
+    statut = models.CharField(max_length=10, choices=STATUT_CHOICES, default=STATUT_EN_COURS)
+    reference_qos_reversement = models.CharField(max_length=100, null=True, blank=True)
+    erreur = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    effectue_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-fenetre_fin']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['compagnie', 'fenetre_fin'],
+                name='unique_reversement_fenetre',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.reference} - {self.montant} FCFA ({self.statut})'
+
+
+class MouvementCagnotte(models.Model):
+    """Écriture du grand livre des sommes dues aux compagnies.
+
+    Les écritures ne sont jamais modifiées, sauf leur rattachement à un
+    reversement : le solde d'une compagnie est la somme de ses écritures et
+    s'accumule par simples insertions, sans verrou sur ``CompteCagnotte``.
+    Une réservation payée n'est créditée qu'une fois (contrainte unique).
+    """
+
+    TYPE_CREDIT = 'credit'
+    TYPE_REGULARISATION = 'regularisation'
+    TYPE_REVERSEMENT = 'reversement'
+    TYPE_REPORT = 'report'
+
+    TYPE_CHOICES = [
+        (TYPE_CREDIT, 'Billet payé'),
+        (TYPE_REGULARISATION, 'Régularisation'),
+        (TYPE_REVERSEMENT, 'Reversement'),
+        (TYPE_REPORT, 'Report de solde'),
+    ]
+
+    compagnie = models.ForeignKey(
+        Company,
+        on_delete=models.CASCADE,
+        related_name='mouvements_cagnotte',
+    )
+    reservation = models.ForeignKey(
+        Reservation,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='mouvements_cagnotte',
+    )
+    reversement = models.ForeignKey(
+        ReversementCompagnie,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='mouvements',
+    )
+    type = models.CharField(max_length=20, choices=TYPE_CHOICES)
+    montant = models.IntegerField()
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        ordering = ['created_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['reservation'],
+                condition=models.Q(type='credit'),
+                name='unique_credit_reservation',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['compagnie', 'reversement', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.compagnie_id} {self.type} {self.montant} FCFA'
@@ -0,0 +1,35 @@
+from django.db import models
+
+
+class SearchGram(models.Model):
+    """Trigramme d'un document indexé pour la recherche partielle.
+
+    ``scope`` désigne la table indexée (``ticket`` pour ``TicketIndex``,
+    ``audit`` pour ``AuditLog``) et ``object_id`` la ligne correspondante.
+    """
+
+    SCOPE_TICKET = 'ticket'
+    SCOPE_AUDIT = 'audit'
+
+    SCOPE_CHOICES = [
+        (SCOPE_TICKET, 'Billets'),
+        (SCOPE_AUDIT, "Journal d'audit"),
+    ]
+
+    scope = models.CharField(max_length=10, choices=SCOPE_CHOICES)
+    object_id = models.BigIntegerField()
+    gram = models.CharField(max_length=3)
+
+    class Meta:
+        verbose_name = 'Trigramme de recherche'
+        verbose_name_plural = 'Trigrammes de recherche'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['scope', 'object_id', 'gram'],
+                name='unique_search_gram',
+            ),
+        ]
+        indexes = [models.Index(fields=['scope', 'gram', 'object_id'])]
+
+    def __str__(self):
+        return f'{self.scope}:{self.object_id}:{self.gram}'
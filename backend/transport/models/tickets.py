@@ -0,0 +1,118 @@
+from decimal import Decimal
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+from .base import Company, ScheduledTrip
+
+
+class TicketPayloadEncoder(DjangoJSONEncoder):
+    """Montants en nombres, comme les rend l'API ; dates et heures en ISO 8601."""
+
+    def default(self, o):
+        if isinstance(o, Decimal):
+            return float(o)
+        return super().default(o)
+
+
+class TicketIndex(models.Model):
+    """Vue dénormalisée d'un billet, quel que soit son canal de vente.
+
+    Une ligne par réservation application (``Booking``), paiement mobile
+    (``Reservation``) ou vente guichet (``VenteGuichet``). Elle est réécrite à
+    chaque enregistrement du billet ou d'un contrôle, et quand le nom de la
+    compagnie, un horaire ou une ville du trajet change. Les autres
+    modifications (agence, guichet, date d'un voyage programmé) ne la
+    réécrivent pas : ``python manage.py rebuild_ticket_index`` la reconstruit.
+    """
+
+    SOURCE_BOOKING = 'booking'
+    SOURCE_MOBILE = 'mobile'
+    SOURCE_GUICHET = 'guichet'
+
+    SOURCE_CHOICES = [
+        (SOURCE_BOOKING, 'Réservation application'),
+        (SOURCE_MOBILE, 'Paiement mobile'),
+        (SOURCE_GUICHET, 'Vente guichet'),
+    ]
+
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES)
+    source_id = models.CharField(max_length=64)
+    company = models.ForeignKey(
+        Company,
+        on_delete=models.CASCADE,
+        related_name='ticket_index',
+    )
+    voyage = models.ForeignKey(
+        ScheduledTrip,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='ticket_index',
+    )
+    reference = models.CharField(max_length=64)
+    client_name = models.CharField(max_length=200, blank=True)
+    client_phone = models.CharField(max_length=30, blank=True)
+    company_name = models.CharField(max_length=200, blank=True)
+    route = models.CharField(max_length=250, blank=True)
+    seat = models.CharField(max_length=10, blank=True)
+    travel_date = models.DateField(null=True, blank=True)
+    status = models.CharField(max_length=20)
+    control_status = models.CharField(max_length=20, default='en_attente')
+    search_text = models.TextField(blank=True)
+    payload = models.JSONField(encoder=TicketPayloadEncoder)
+    created_at = models.DateTimeField()
+    indexed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        verbose_name = 'Index billet'
+        verbose_name_plural = 'Index billets'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['source', 'source_id'],
+                name='unique_ticket_index_source',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['company', '-created_at', '-id']),
+            models.Index(fields=['-created_at', '-id']),
+            models.Index(fields=['voyage', 'seat']),
+            models.Index(fields=['reference']),
+            models.Index(fields=['client_phone']),
+        ]
+
+    def __str__(self):
+        return f'{self.reference} ({self.source})'
+
+
+class TicketRemoval(models.Model):
+    """Billet sorti du manifeste d'un voyage : supprimé ou rattaché à un autre voyage.
+
+    Sert de pierre tombale aux manifestes différentiels des scanners hors
+    ligne ; une seule ligne par billet et par voyage quitté, datée de la
+    dernière sortie.
+    """
+
+    voyage = models.ForeignKey(
+        ScheduledTrip,
+        on_delete=models.CASCADE,
+        related_name='ticket_removals',
+    )
+    source = models.CharField(max_length=10, choices=TicketIndex.SOURCE_CHOICES)
+    source_id = models.CharField(max_length=64)
+    removed_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['voyage', 'source', 'source_id'],
+                name='unique_ticket_removal',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['voyage', 'removed_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.source}:{self.source_id} retiré du voyage {self.voyage_id}'
@@ -60,3 +60,36 @@ class BusPosition(models.Model):
 
     def __str__(self):
         return f'{self.session_id} @ {self.latitude}, {self.longitude}'
+
+
+class CompactTrajectory(models.Model):
+    """Trajectoire simplifiée d'un suivi terminé ; remplace ses ``BusPosition``.
+
+    ``polyline`` suit l'algorithme « encoded polyline » (précision 1e-5) ;
+    ``times`` et ``speeds`` encodent de la même façon, point par point, les
+    secondes écoulées depuis ``started_at`` et la vitesse en dixièmes de km/h
+    (-1 si inconnue).
+    """
+    session = models.OneToOneField(
+        TripTrackingSession,
+        on_delete=models.CASCADE,
+        related_name='compact_trajectory',
+    )
+    polyline = models.TextField()
+    times = models.TextField()
+    speeds = models.TextField()
+    started_at = models.DateTimeField()
+    ended_at = models.DateTimeField()
+    raw_points = models.PositiveIntegerField()
+    points = models.PositiveIntegerField()
+    distance_km = models.FloatField(default=0)
+    max_speed_kmh = models.FloatField(null=True, blank=True)
+    avg_speed_kmh = models.FloatField(null=True, blank=True)
+    compacted_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Trajectoire compactée'
+        verbose_name_plural = 'Trajectoires compactées'
+
+    def __str__(self):
+        return f'Trajectoire #{self.session_id} ({self.points}/{self.raw_points} points)'
@@ -26,13 +26,17 @@ from .models import (
     PlatformConfiguration,
     Reservation,
     ScheduledTrip,
+    SearchGram,
     Siege,
     Trip,
 )
 from .models.audit import log_action
+from .services.search import apply_search
 from .ticketing import (
-    filter_ticket_collection,
     ticket_collection as collect_tickets,
+    ticket_page,
+    ticket_page_limit,
+    ticket_page_response,
 )
 
 
@@ -696,8 +700,12 @@ class PlatformTicketsView(APIView):
     permission_classes = [IsPlatformAdmin]
 
     def get(self, request):
-        items = filter_ticket_collection(ticket_collection(), request.query_params)
-        return Response(items[:300])
+        items, next_cursor = ticket_page(
+            params=request.query_params,
+            cursor=request.query_params.get('cursor'),
+            limit=ticket_page_limit(request.query_params, default=300, maximum=300),
+        )
+        return ticket_page_response(items, next_cursor)
 
 
 class PlatformFinanceView(APIView):
@@ -768,7 +776,7 @@ class PlatformAuditView(APIView):
         query = request.query_params.get('q', '').strip()
         action = request.query_params.get('action', '')
         if query:
-            queryset = queryset.filter(Q(object_repr__icontains=query) | Q(model_name__icontains=query) | Q(user__email__icontains=query))
+            queryset = apply_search(queryset, SearchGram.SCOPE_AUDIT, query)
         if action:
             queryset = queryset.filter(action=action)
         return Response([{
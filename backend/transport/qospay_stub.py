@@ -0,0 +1,201 @@
+"""Serveur QosPay local pour les tests, les mesures et les tests de charge.
+
+Répond aux points d'entrée QosicBridge utilisés par l'application
+(demande de paiement, statut, dépôt des reversements) en HTTP/1.1
+keep-alive, dans un thread.
+
+- ``delay`` ajoute une latence fixe par requête, ``failure_rate`` fait
+  répondre 503 à cette proportion des requêtes et ``fail_next`` aux N
+  prochaines.
+- ``statuses`` fixe le code de statut d'un transref donné (``status_code``
+  sinon). Un dépôt répond ``deposit_code`` et y enregistre son transref ;
+  une demande de paiement répond ``request_code`` (``01`` par défaut).
+- Avec ``callback_url``, chaque demande de paiement acceptée est résolue
+  après ``callback_delay`` secondes : succès avec la probabilité
+  ``success_rate``, échec sinon. Le statut du transref passe de ``01`` à
+  ``00`` ou ``02`` et le callback est envoyé, au format de QoS, à
+  ``callback_url``.
+
+``connections`` compte les connexions TCP acceptées, ``requests`` les
+requêtes reçues et ``callbacks`` les callbacks envoyés.
+"""
+import heapq
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.stub.lock:
+            self.server.stub.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        stub = self.server.stub
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        with stub.lock:
+            stub.requests += 1
+            failing = stub.fail_next > 0 or stub.random.random() < stub.failure_rate
+            if stub.fail_next > 0:
+                stub.fail_next -= 1
+        if stub.delay:
+            time.sleep(stub.delay)
+        if failing:
+            self._send(503, {'responsecode': '96', 'responsemsg': 'Service indisponible'})
+            return
+        try:
+            payload = json.loads(body or b'{}')
+        except ValueError:
+            self._send(400, {'responsecode': '96', 'responsemsg': 'JSON invalide'})
+            return
+        transref = payload.get('transref')
+        if self.path.endswith('gettransactionstatus'):
+            with stub.lock:
+                code = stub.statuses.get(transref, stub.status_code)
+        elif self.path.endswith('deposit'):
+            with stub.lock:
+                code = stub.deposit_code
+                stub.statuses[transref] = code
+        else:
+            code = stub.request_code
+            if code == '01':
+                stub.schedule_callback(transref)
+        self._send(200, {
+            'responsecode': code,
+            'responsemsg': 'SUCCESSFUL' if code == '00' else 'PENDING' if code == '01' else 'FAILED',
+            'transref': transref,
+        })
+
+    def _send(self, status, data):
+        content = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+class QosPayStub:
+    def __init__(
+        self,
+        delay=0.0,
+        status_code='00',
+        *,
+        host='127.0.0.1',
+        port=0,
+        failure_rate=0.0,
+        callback_url=None,
+        callback_delay=0.0,
+        success_rate=1.0,
+        seed=None,
+    ):
+        self.delay = delay
+        self.status_code = status_code
+        self.host = host
+        self.port = port
+        self.failure_rate = failure_rate
+        self.callback_url = callback_url
+        self.callback_delay = callback_delay
+        self.success_rate = success_rate
+        self.random = random.Random(seed)
+        self.statuses = {}
+        self.deposit_code = '00'
+        self.request_code = '01'
+        self.fail_next = 0
+        self.connections = 0
+        self.requests = 0
+        self.callbacks = 0
+        self.lock = threading.Lock()
+        self._server = None
+        self._thread = None
+        self._due = []
+        self._due_ready = threading.Condition(self.lock)
+        self._dispatcher = None
+        self._senders = None
+        self._session = None
+        self._running = False
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def schedule_callback(self, transref):
+        """Fixe l'issue d'une demande de paiement et programme son callback."""
+        if not self.callback_url or not transref:
+            return
+        with self.lock:
+            success = self.random.random() < self.success_rate
+            self.statuses[transref] = '01'
+            heapq.heappush(self._due, (time.monotonic() + self.callback_delay, transref, success))
+            self._due_ready.notify()
+
+    def _dispatch(self):
+        while True:
+            with self.lock:
+                while self._running and (not self._due or self._due[0][0] > time.monotonic()):
+                    timeout = self._due[0][0] - time.monotonic() if self._due else None
+                    self._due_ready.wait(timeout)
+                if not self._running:
+                    return
+                _, transref, success = heapq.heappop(self._due)
+                self.statuses[transref] = '00' if success else '02'
+            self._senders.submit(self._send_callback, transref, success)
+
+    def _send_callback(self, transref, success):
+        try:
+            self._session.post(self.callback_url, json={
+                'reference': transref,
+                'transref': transref,
+                'status': 'SUCCESS' if success else 'FAILED',
+                'responsecode': '00' if success else '02',
+                'transactionId': f'QOS-{transref}',
+            }, timeout=30)
+        except requests.RequestException:
+            pass
+        with self.lock:
+            self.callbacks += 1
+
+    def start(self):
+        self._server = ThreadingHTTPServer((self.host, self.port), _Handler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        if self.callback_url:
+            self._running = True
+            self._session = requests.Session()
+            self._senders = ThreadPoolExecutor(max_workers=16, thread_name_prefix='qospay-callback')
+            self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+            self._dispatcher.start()
+        return self
+
+    def stop(self):
+        if self._dispatcher:
+            with self.lock:
+                self._running = False
+                self._due_ready.notify()
+            self._dispatcher.join()
+            self._senders.shutdown(wait=True)
+            self._session.close()
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,310 @@
+"""Reversements groupés aux compagnies.
+
+Chaque réservation payée crédite la compagnie d'une écriture
+``MouvementCagnotte`` (insertion seule, dédupliquée par contrainte unique) :
+plus de verrou sur ``CompteCagnotte`` ni d'appel à l'opérateur par billet.
+
+``regler_fenetre`` solde ensuite le grand livre par fenêtres de
+``REVERSEMENT_FENETRE_MINUTES`` : un seul ``ReversementCompagnie`` par
+compagnie et par fenêtre, qui rattache toutes les écritures antérieures à
+la fin de la fenêtre. Un reversement refusé par QoS (code métier, 02…)
+libère ses écritures, reprises à la fenêtre suivante. Sans réponse nette
+(exception, délai dépassé, code 96), le dépôt a pu être accepté : le
+reversement reste ``en_cours`` avec ses écritures, et
+``verifier_reversements_en_cours`` relit son statut chez QoS sous le même
+transref avant de le solder ou de le libérer. Elle reprend aussi les
+reversements laissés ouverts par un worker interrompu. ``CompteCagnotte``
+n'est plus qu'un instantané du grand livre, réécrit une fois par règlement.
+
+``reconcilier_cagnottes`` compare, par compagnie, les crédits du grand livre
+aux ``montant_reverse_compagnie`` des réservations payées.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef, Q, Sum
+from django.utils import timezone
+
+from transport.models import (
+    Company,
+    CompteCagnotte,
+    HistoriqueReversement,
+    MouvementCagnotte,
+    Reservation,
+    ReversementCompagnie,
+)
+from transport.services import qos_service
+
+logger = logging.getLogger(__name__)
+
+
+def crediter_reservations(reservation_ids):
+    """Crédite les compagnies des réservations payées ; sans effet si déjà fait."""
+    rows = (
+        Reservation.objects
+        .filter(pk__in=list(reservation_ids), statut_paiement=Reservation.STATUT_PAYE)
+        .values_list('pk', 'voyage__trip__company_id', 'montant_reverse_compagnie')
+    )
+    MouvementCagnotte.objects.bulk_create([
+        MouvementCagnotte(
+            compagnie_id=company_id,
+            reservation_id=pk,
+            type=MouvementCagnotte.TYPE_CREDIT,
+            montant=montant,
+        )
+        for pk, company_id, montant in rows
+    ], ignore_conflicts=True)
+
+
+def regulariser_reservations(reservation_ids):
+    """Débite les compagnies des billets mobiles remboursés ; retourne le total.
+
+    Appelée par chaque chemin qui passe une réservation payée à
+    ``rembourse`` (billet unique, action groupée, migration de voyage) :
+    son crédit ne doit plus être reversé.
+    """
+    rows = [
+        (pk, company_id, montant)
+        for pk, company_id, montant in Reservation.objects
+        .filter(pk__in=list(reservation_ids), statut_paiement=Reservation.STATUT_REMBOURSE)
+        .values_list('pk', 'voyage__trip__company_id', 'montant_reverse_compagnie')
+        if montant
+    ]
+    MouvementCagnotte.objects.bulk_create([
+        MouvementCagnotte(
+            compagnie_id=company_id,
+            reservation_id=pk,
+            type=MouvementCagnotte.TYPE_REGULARISATION,
+            montant=-montant,
+        )
+        for pk, company_id, montant in rows
+    ])
+    for company_id in {company_id for _, company_id, _ in rows}:
+        actualiser_cagnotte(company_id)
+    return sum(montant for _, _, montant in rows)
+
+
+def actualiser_cagnotte(company_id):
+    """Réécrit l'instantané ``CompteCagnotte`` à partir du grand livre."""
+    solde = MouvementCagnotte.objects.filter(compagnie_id=company_id).aggregate(solde=Sum('montant'))['solde'] or 0
+    CompteCagnotte.objects.update_or_create(compagnie_id=company_id, defaults={'solde_a_reverser': solde})
+    return solde
+
+
+def fin_fenetre(moment=None):
+    """Fin de la dernière fenêtre de règlement close à ``moment``."""
+    moment = timezone.localtime(moment or timezone.now())
+    minutes = max(settings.REVERSEMENT_FENETRE_MINUTES, 1)
+    debut_jour = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    ecoulees = int((moment - debut_jour).total_seconds() // 60)
+    return debut_jour + timedelta(minutes=ecoulees - ecoulees % minutes)
+
+
+def _ouvrir_reversement(company_id, fin):
+    with transaction.atomic():
+        reversement, created = ReversementCompagnie.objects.get_or_create(
+            compagnie_id=company_id,
+            fenetre_fin=fin,
+            defaults={'reference': f"REV-{company_id}-{timezone.localtime(fin).strftime('%Y%m%d%H%M%S')}"},
+        )
+        if not created:
+            # Fenêtre déjà réglée (ou en cours) par un autre worker.
+            return None
+        MouvementCagnotte.objects.filter(
+            compagnie_id=company_id,
+            reversement__isnull=True,
+            created_at__lt=fin,
+        ).update(reversement=reversement)
+        totals = reversement.mouvements.aggregate(montant=Sum('montant'), nombre=Count('pk'))
+        reversement.montant = totals['montant'] or 0
+        reversement.nombre_mouvements = totals['nombre']
+        reversement.save(update_fields=['montant', 'nombre_mouvements'])
+        return reversement
+
+
+def _cloturer_reversement(reversement, resultat):
+    now = timezone.now()
+    with transaction.atomic():
+        reversement = ReversementCompagnie.objects.select_for_update().get(pk=reversement.pk)
+        if reversement.statut != ReversementCompagnie.STATUT_EN_COURS:
+            # Déjà conclu par un autre worker (règlement ou vérification).
+            return reversement
+        if resultat.get('incertain'):
+            # Le dépôt a pu être accepté : écritures gardées jusqu'à vérification.
+            reversement.erreur = str(resultat.get('erreur') or 'Statut du dépôt inconnu')
+            reversement.save(update_fields=['erreur'])
+            return reversement
+        if not resultat.get('succes'):
+            reversement.mouvements.update(reversement=None)
+            reversement.statut = ReversementCompagnie.STATUT_ECHOUE
+            reversement.erreur = str(resultat.get('erreur') or 'Reversement refusé')
+            reversement.save(update_fields=['statut', 'erreur'])
+            return reversement
+
+        credits = list(
+            reversement.mouvements
+            .filter(type=MouvementCagnotte.TYPE_CREDIT)
+            .values_list('reservation_id', 'montant')
+        )
+        MouvementCagnotte.objects.create(
+            compagnie_id=reversement.compagnie_id,
+            reversement=reversement,
+            type=MouvementCagnotte.TYPE_REVERSEMENT,
+            montant=-reversement.montant,
+        )
+        Reservation.objects.filter(pk__in=[pk for pk, _ in credits]).update(
+            reversement_effectue=True,
+            reversement_at=now,
+        )
+        HistoriqueReversement.objects.bulk_create([
+            HistoriqueReversement(
+                compagnie_id=reversement.compagnie_id,
+                reservation_id=pk,
+                montant=montant,
+                reference_qos_reversement=resultat.get('transaction_id'),
+                statut=HistoriqueReversement.STATUT_EFFECTUE,
+            )
+            for pk, montant in credits
+        ], batch_size=500)
+        reversement.statut = ReversementCompagnie.STATUT_EFFECTUE
+        reversement.reference_qos_reversement = resultat.get('transaction_id')
+        reversement.effectue_at = now
+        reversement.save(update_fields=['statut', 'reference_qos_reversement', 'effectue_at'])
+
+        actualiser_cagnotte(reversement.compagnie_id)
+        CompteCagnotte.objects.filter(compagnie_id=reversement.compagnie_id).update(
+            total_reverse=F('total_reverse') + reversement.montant,
+        )
+    return reversement
+
+
+def regler_fenetre(fin=None):
+    """Règle chaque compagnie créditrice pour la fenêtre close à ``fin`` ; retourne les reversements."""
+    fin = fin or fin_fenetre()
+    dues = (
+        MouvementCagnotte.objects
+        .filter(reversement__isnull=True, created_at__lt=fin)
+        .values('compagnie_id')
+        .annotate(total=Sum('montant'))
+        .filter(total__gt=0)
+        .order_by('compagnie_id')
+    )
+    dues = list(dues)
+    phones = dict(Company.objects.filter(pk__in=[row['compagnie_id'] for row in dues]).values_list('pk', 'phone'))
+    reversements = []
+    for row in dues:
+        reversement = _ouvrir_reversement(row['compagnie_id'], fin)
+        if reversement is None:
+            continue
+        if reversement.montant <= 0:
+            # Régularisations arrivées entre-temps : rien à verser, solde reporté.
+            _cloturer_reversement(reversement, {'succes': False, 'erreur': 'Solde nul ou négatif'})
+            continue
+        # Appel opérateur hors transaction : aucune écriture n'attend le réseau.
+        resultat = qos_service.reverser_compagnie(
+            phones[row['compagnie_id']],
+            reversement.montant,
+            reversement.reference,
+        )
+        reversement = _cloturer_reversement(reversement, resultat)
+        reversements.append(reversement)
+        logger.info(
+            "Company payout reference=%s company=%s amount=%s entries=%s status=%s",
+            reversement.reference,
+            reversement.compagnie_id,
+            reversement.montant,
+            reversement.nombre_mouvements,
+            reversement.statut,
+        )
+    return reversements
+
+
+def verifier_reversements_en_cours(age_minutes=None):
+    """Conclut les reversements restés ``en_cours`` d'après le statut QoS de leur transref.
+
+    Seuls ceux ouverts depuis ``REVERSEMENT_VERIFICATION_MINUTES`` sont
+    relus : un règlement en cours d'appel n'est pas concurrencé. Retourne
+    les reversements conclus.
+    """
+    cutoff = timezone.now() - timedelta(
+        minutes=settings.REVERSEMENT_VERIFICATION_MINUTES if age_minutes is None else age_minutes,
+    )
+    ouverts = ReversementCompagnie.objects.filter(
+        statut=ReversementCompagnie.STATUT_EN_COURS,
+        created_at__lt=cutoff,
+    ).order_by('created_at')
+    conclus = []
+    for reversement in ouverts:
+        if reversement.montant <= 0:
+            resultat = {'succes': False, 'erreur': 'Solde nul ou négatif'}
+        else:
+            statut = qos_service.check_transaction_status(reversement.reference)
+            if statut['statut'] == 'success':
+                resultat = {
+                    'succes': True,
+                    'transaction_id': statut['raw'].get('serviceref') or reversement.reference,
+                }
+            elif statut['succes'] and statut['statut'] in ('failed', 'insufficient_funds'):
+                resultat = {'succes': False, 'erreur': statut['responsemsg'] or 'Reversement refusé'}
+            else:
+                # Toujours inconnu (en attente, 96, QoS injoignable) : prochain passage.
+                continue
+        reversement = _cloturer_reversement(reversement, resultat)
+        conclus.append(reversement)
+        logger.info(
+            "Company payout verified reference=%s company=%s status=%s",
+            reversement.reference,
+            reversement.compagnie_id,
+            reversement.statut,
+        )
+    return conclus
+
+
+def reconcilier_cagnottes(corriger=False):
+    """Écarts entre crédits du grand livre et montants dus des réservations payées.
+
+    Une réservation payée, non reversée par l'ancien circuit et sans crédit
+    est « manquante » ; ``corriger=True`` la crédite.
+    """
+    credit = MouvementCagnotte.objects.filter(
+        reservation=OuterRef('pk'),
+        type=MouvementCagnotte.TYPE_CREDIT,
+    )
+    payees = (
+        Reservation.objects
+        .filter(statut_paiement=Reservation.STATUT_PAYE)
+        .annotate(credite=Exists(credit))
+        .filter(Q(credite=True) | Q(reversement_effectue=False))
+    )
+    attendus = {
+        row['voyage__trip__company_id']: row
+        for row in payees.values('voyage__trip__company_id').annotate(
+            attendu=Sum('montant_reverse_compagnie'),
+            manquantes=Count('pk', filter=Q(credite=False)),
+        )
+    }
+    credits = dict(
+        MouvementCagnotte.objects
+        .filter(type=MouvementCagnotte.TYPE_CREDIT, reservation__statut_paiement=Reservation.STATUT_PAYE)
+        .values('compagnie_id')
+        .annotate(total=Sum('montant'))
+        .values_list('compagnie_id', 'total')
+    )
+
+    ecarts = []
+    for company_id in sorted(set(attendus) | set(credits)):
+        attendu = attendus.get(company_id, {}).get('attendu') or 0
+        grand_livre = credits.get(company_id) or 0
+        if attendu != grand_livre:
+            ecarts.append({
+                'compagnie_id': company_id,
+                'attendu': attendu,
+                'grand_livre': grand_livre,
+                'ecart': attendu - grand_livre,
+                'manquantes': attendus.get(company_id, {}).get('manquantes') or 0,
+            })
+    if corriger and ecarts:
+        crediter_reservations(payees.filter(credite=False).values_list('pk', flat=True))
+    return ecarts
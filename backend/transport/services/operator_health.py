@@ -0,0 +1,224 @@
+"""Disjoncteur et santé des opérateurs mobile money (Moov, Togocel).
+
+Chaque appel QosPay d'un opérateur est compté dans une fenêtre glissante
+(``QOSPAY_BREAKER_WINDOW_SECONDS``, découpée en tranches de
+``QOSPAY_BREAKER_BUCKET_SECONDS``). Un appel est mauvais s'il échoue
+(erreur réseau, 5xx, code 96) ou dépasse ``QOSPAY_BREAKER_SLOW_SECONDS`` ;
+une réponse 4xx compte comme un appel abouti.
+Au-delà de ``QOSPAY_BREAKER_MIN_CALLS`` appels et d'un taux de mauvais
+appels de ``QOSPAY_BREAKER_ERROR_RATE``, le disjoncteur s'ouvre : les appels
+échouent aussitôt avec ``OperatorUnavailable`` pendant
+``QOSPAY_BREAKER_OPEN_SECONDS``. Ensuite un seul appel de sonde passe
+(semi-ouvert) ; son succès referme le disjoncteur, son échec le rouvre.
+
+L'état et les compteurs vivent dans le cache Django, partagé entre les
+processus (base de données par défaut, ou Redis) : tous les workers voient le
+même disjoncteur. Hors DEBUG, un cache local au processus bloque le démarrage
+(check ``transport.E001``).
+"""
+import logging
+import math
+import time
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+ETAT_FERME = 'ferme'
+ETAT_OUVERT = 'ouvert'
+ETAT_SEMI_OUVERT = 'semi_ouvert'
+
+OPERATEURS = {
+    'MOOV': 'Flooz (Moov)',
+    'TOGOCEL': 'T-Money (Togocel)',
+}
+
+ALIASES = {
+    'MOOV': 'MOOV',
+    'MOOV MONEY': 'MOOV',
+    'FLOOZ': 'MOOV',
+    'TOGOCEL': 'TOGOCEL',
+    'TMONEY': 'TOGOCEL',
+    'T-MONEY': 'TOGOCEL',
+}
+
+# Code à utiliser pour chaque canal : réservations mobiles et paiements directs.
+CODES_RESERVATION = {'MOOV': 'FLOOZ', 'TOGOCEL': 'TMONEY'}
+CODES_PAIEMENT = {'MOOV': 'moov', 'TOGOCEL': 'togocel'}
+
+
+class OperatorUnavailable(Exception):
+    """Opérateur coupé par le disjoncteur ; l'appel n'a pas été envoyé."""
+
+    def __init__(self, operateur, reessayer_dans):
+        self.operateur = operateur
+        self.reessayer_dans = reessayer_dans
+        self.alternative = next((code for code in OPERATEURS if code != operateur), None)
+        super().__init__(
+            f"{OPERATEURS[operateur]} est momentanément indisponible. "
+            f"Réessayez dans {reessayer_dans} s ou payez avec {OPERATEURS[self.alternative]}."
+        )
+
+
+def normaliser_operateur(value):
+    key = str(value or '').strip().upper()
+    return ALIASES.get(key, key)
+
+
+def _key(operateur, *parts):
+    return ':'.join(('qospay:disjoncteur', operateur) + tuple(str(part) for part in parts))
+
+
+def _tranches(now):
+    size = max(settings.QOSPAY_BREAKER_BUCKET_SECONDS, 1)
+    current = int(now // size)
+    count = max(math.ceil(settings.QOSPAY_BREAKER_WINDOW_SECONDS / size), 1)
+    return range(current - count + 1, current + 1)
+
+
+def _incr(key, delta):
+    ttl = settings.QOSPAY_BREAKER_WINDOW_SECONDS + settings.QOSPAY_BREAKER_BUCKET_SECONDS
+    cache.add(key, 0, ttl)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.set(key, delta, ttl)
+
+
+def _etat(operateur):
+    return cache.get(_key(operateur, 'etat')) or {'etat': ETAT_FERME}
+
+
+def _fenetre(operateur):
+    keys = {
+        field: [_key(operateur, tranche, field) for tranche in _tranches(time.time())]
+        for field in ('appels', 'mauvais', 'latence_ms')
+    }
+    values = cache.get_many([key for group in keys.values() for key in group])
+    return {field: sum(values.get(key, 0) for key in group) for field, group in keys.items()}
+
+
+def _ouvrir(operateur):
+    cache.set(_key(operateur, 'etat'), {'etat': ETAT_OUVERT, 'ouvert_at': time.time()}, None)
+    logger.warning("Operator circuit opened operator=%s", operateur)
+
+
+def _fermer(operateur):
+    now = time.time()
+    cache.delete_many([_key(operateur, 'etat')] + [
+        _key(operateur, tranche, field)
+        for tranche in _tranches(now)
+        for field in ('appels', 'mauvais', 'latence_ms')
+    ])
+    logger.info("Operator circuit closed operator=%s", operateur)
+
+
+def _reste(etat):
+    return etat.get('ouvert_at', 0) + settings.QOSPAY_BREAKER_OPEN_SECONDS - time.time()
+
+
+def verifier_disponible(operateur):
+    """Lève ``OperatorUnavailable`` si un appel serait refusé, sans prendre la sonde."""
+    operateur = normaliser_operateur(operateur)
+    etat = _etat(operateur)
+    if etat['etat'] == ETAT_FERME:
+        return
+    reste = _reste(etat)
+    if reste > 0:
+        raise OperatorUnavailable(operateur, math.ceil(reste))
+    if cache.get(_key(operateur, 'sonde')):
+        raise OperatorUnavailable(operateur, 1)
+
+
+def autoriser(operateur):
+    """Autorise un appel à l'opérateur ou lève ``OperatorUnavailable``."""
+    operateur = normaliser_operateur(operateur)
+    etat = _etat(operateur)
+    if etat['etat'] == ETAT_FERME:
+        return
+    reste = _reste(etat)
+    if reste > 0:
+        raise OperatorUnavailable(operateur, math.ceil(reste))
+    # Pause écoulée : une seule sonde, tous processus confondus.
+    if not cache.add(_key(operateur, 'sonde'), 1, settings.QOSPAY_TIMEOUT + 5):
+        raise OperatorUnavailable(operateur, 1)
+    cache.set(_key(operateur, 'etat'), {**etat, 'etat': ETAT_SEMI_OUVERT}, None)
+
+
+def enregistrer(operateur, succes, duree):
+    """Compte un appel terminé et fait évoluer le disjoncteur."""
+    operateur = normaliser_operateur(operateur)
+    mauvais = not succes or duree >= settings.QOSPAY_BREAKER_SLOW_SECONDS
+    tranche = _tranches(time.time())[-1]
+    _incr(_key(operateur, tranche, 'appels'), 1)
+    _incr(_key(operateur, tranche, 'latence_ms'), int(duree * 1000))
+    if mauvais:
+        _incr(_key(operateur, tranche, 'mauvais'), 1)
+
+    etat = _etat(operateur)
+    if etat['etat'] == ETAT_SEMI_OUVERT:
+        cache.delete(_key(operateur, 'sonde'))
+        if mauvais:
+            _ouvrir(operateur)
+        else:
+            _fermer(operateur)
+        return
+    if etat['etat'] == ETAT_FERME and mauvais:
+        fenetre = _fenetre(operateur)
+        if (
+            fenetre['appels'] >= settings.QOSPAY_BREAKER_MIN_CALLS
+            and fenetre['mauvais'] >= settings.QOSPAY_BREAKER_ERROR_RATE * fenetre['appels']
+        ):
+            _ouvrir(operateur)
+
+
+def erreur_operateur(exc):
+    """Une réponse 4xx est un refus de la requête : l'opérateur a bien répondu."""
+    response = getattr(exc, 'response', None) if isinstance(exc, requests.HTTPError) else None
+    return response is None or response.status_code >= 500
+
+
+def executer(operateur, func, echec=None):
+    """Appelle ``func()`` sous le disjoncteur ; ``echec(resultat)`` signale une réponse en erreur."""
+    autoriser(operateur)
+    started = time.monotonic()
+    try:
+        result = func()
+    except Exception as exc:
+        enregistrer(operateur, not erreur_operateur(exc), time.monotonic() - started)
+        raise
+    enregistrer(operateur, not (echec and echec(result)), time.monotonic() - started)
+    return result
+
+
+def sante_operateurs():
+    """État de chaque opérateur, tel que le client l'affiche."""
+    result = []
+    for operateur, nom in OPERATEURS.items():
+        etat = _etat(operateur)
+        fenetre = _fenetre(operateur)
+        appels = fenetre['appels']
+        taux = fenetre['mauvais'] / appels if appels else 0.0
+        reste = max(math.ceil(_reste(etat)), 0) if etat['etat'] != ETAT_FERME else 0
+        if etat['etat'] == ETAT_OUVERT and reste > 0:
+            sante = 'indisponible'
+        elif etat['etat'] != ETAT_FERME or taux >= settings.QOSPAY_BREAKER_ERROR_RATE / 2:
+            sante = 'degrade'
+        else:
+            sante = 'ok'
+        result.append({
+            'operateur': operateur,
+            'nom': nom,
+            'code_reservation': CODES_RESERVATION[operateur],
+            'code_paiement': CODES_PAIEMENT[operateur],
+            'etat': sante,
+            'disjoncteur': etat['etat'],
+            'disponible': sante != 'indisponible',
+            'appels': appels,
+            'taux_erreur': round(taux, 3),
+            'latence_ms': round(fenetre['latence_ms'] / appels) if appels else None,
+            'reessayer_dans': reste,
+        })
+    return result
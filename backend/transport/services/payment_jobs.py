@@ -0,0 +1,199 @@
+"""Initiation asynchrone des paiements mobiles.
+
+``InitierPaiementView`` réserve le siège, crée la ``Reservation`` et une
+``PaymentJob``, puis répond sans attendre l'opérateur. Après le commit, la
+tâche part sur un pool de threads du processus (``PAYMENT_WORKERS``) ; la
+commande ``python manage.py run_payment_jobs`` reprend celles qu'aucun
+processus web n'a exécutées (redémarrage, pool désactivé).
+
+Chaque tâche est prise par un ``UPDATE ... WHERE status='pending'`` : deux
+workers ne l'exécutent jamais tous les deux. Une demande de paiement n'est
+pas rejouée automatiquement (le client recevrait deux demandes) ; la
+référence EVEX sert de transref, le statut reste donc vérifiable chez QoS
+même si la réponse de l'initiation est perdue. Seul un refus explicite de
+l'opérateur libère le siège : sans réponse ou sur un code 96, la
+réservation reste en attente.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from transport.models import PaymentJob, Reservation
+from transport.services import qos_service, reservation_service
+from transport.ticketing import sync_ticket_index
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=max(settings.PAYMENT_WORKERS, 1),
+                thread_name_prefix='payment-job',
+            )
+        return _executor
+
+
+def _run_in_thread(func, *args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception("Payment background task crashed task=%s args=%s", func.__name__, args)
+    finally:
+        # Chaque thread du pool a sa propre connexion : la rendre tout de suite.
+        connection.close()
+
+
+def submit_background(func, *args):
+    """Exécute ``func(*args)`` sur le pool de paiement du processus."""
+    return _pool().submit(_run_in_thread, func, *args)
+
+
+def enqueue_payment(reservation):
+    """Enregistre la demande de paiement ; elle part sur le pool après le commit."""
+    job = PaymentJob.objects.create(reservation=reservation)
+    if settings.PAYMENT_WORKERS > 0:
+        transaction.on_commit(lambda: submit_background(run_payment_job, job.pk))
+    return job
+
+
+def _fail_reservation(reservation):
+    with transaction.atomic():
+        failed = Reservation.objects.filter(
+            pk=reservation.pk,
+            statut_paiement=Reservation.STATUT_EN_ATTENTE,
+        ).update(statut_paiement=Reservation.STATUT_ECHOUE)
+        if failed:
+            reservation_service.liberer_siege(reservation.siege_id)
+            sync_ticket_index('mobile', [reservation.pk])
+
+
+def run_payment_job(job_id):
+    """Exécute une tâche en attente ; ``None`` si un autre worker l'a déjà prise."""
+    now = timezone.now()
+    claimed = PaymentJob.objects.filter(
+        pk=job_id,
+        status=PaymentJob.STATUS_PENDING,
+        run_after__lte=now,
+    ).update(status=PaymentJob.STATUS_RUNNING, attempts=F('attempts') + 1, started_at=now)
+    if not claimed:
+        return None
+    job = PaymentJob.objects.select_related('reservation').get(pk=job_id)
+    reservation = job.reservation
+    if reservation.statut_paiement != Reservation.STATUT_EN_ATTENTE:
+        # Expirée ou annulée entre-temps : rien à demander au client.
+        job.status = PaymentJob.STATUS_DONE
+        job.save(update_fields=['status', 'updated_at'])
+        return job
+
+    try:
+        paiement = qos_service.initier_paiement(
+            reservation.client_telephone,
+            reservation.montant_total,
+            reservation.reference_evex,
+            reservation.operateur,
+            reservation.client_nom,
+        )
+    except Exception as exc:
+        logger.exception("Payment initiation failed reference=%s", reservation.reference_evex)
+        paiement = {'succes': False, 'incertain': True, 'erreur': str(exc)}
+
+    if paiement.get('succes'):
+        Reservation.objects.filter(pk=reservation.pk).update(
+            transaction_id_qos=paiement.get('transaction_id'),
+            reference_qos=paiement.get('reference_qos'),
+        )
+        sync_ticket_index('mobile', [reservation.pk])
+        job.status = PaymentJob.STATUS_DONE
+        job.last_error = ''
+    elif paiement.get('incertain'):
+        # La demande a pu partir : le webhook ou la réconciliation tranchera,
+        # sinon l'expiration du siège.
+        logger.warning("Payment initiation outcome unknown reference=%s", reservation.reference_evex)
+        job.status = PaymentJob.STATUS_DONE
+        job.last_error = str(paiement.get('erreur') or 'Réponse de l\'opérateur incertaine')
+    else:
+        _fail_reservation(reservation)
+        job.status = PaymentJob.STATUS_FAILED
+        job.last_error = str(paiement.get('erreur') or 'Initiation refusée')
+    job.save(update_fields=['status', 'last_error', 'updated_at'])
+    logger.info("Payment job finished job=%s reference=%s status=%s", job.pk, reservation.reference_evex, job.status)
+    return job
+
+
+def release_stale_jobs():
+    """Marque échouées les tâches restées en cours après l'arrêt d'un worker.
+
+    La réservation reste en attente : l'appel a pu partir, le webhook ou
+    l'expiration du siège tranchera.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.PAYMENT_JOB_STALE_SECONDS)
+    return PaymentJob.objects.filter(status=PaymentJob.STATUS_RUNNING, started_at__lt=cutoff).update(
+        status=PaymentJob.STATUS_FAILED,
+        last_error='Worker interrompu pendant l\'appel à l\'opérateur.',
+    )
+
+
+def run_pending_jobs(limit=50, workers=None):
+    """Exécute un lot de tâches en attente sur un pool de threads ; retourne le nombre traité."""
+    job_ids = list(
+        PaymentJob.objects.filter(status=PaymentJob.STATUS_PENDING, run_after__lte=timezone.now())
+        .order_by('created_at')
+        .values_list('pk', flat=True)[:limit]
+    )
+    if not job_ids:
+        return 0
+    workers = workers or settings.PAYMENT_WORKERS
+    if workers <= 1:
+        return sum(run_payment_job(job_id) is not None for job_id in job_ids)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='payment-job') as pool:
+        futures = [pool.submit(_run_in_thread, run_payment_job, job_id) for job_id in job_ids]
+        for future in futures:
+            future.result()
+    return len(job_ids)
+
+
+TERMINAL_STATUSES = {
+    Reservation.STATUT_PAYE,
+    Reservation.STATUT_ECHOUE,
+    Reservation.STATUT_EXPIRE,
+    Reservation.STATUT_REMBOURSE,
+}
+
+
+STATUS_MESSAGES = {
+    Reservation.STATUT_PAYE: 'Paiement confirme',
+    Reservation.STATUT_ECHOUE: 'Paiement echoue',
+    Reservation.STATUT_EXPIRE: 'Reservation expiree',
+    Reservation.STATUT_REMBOURSE: 'Paiement rembourse',
+}
+
+
+def payment_status_payload(reservation):
+    """Statut stocké d'une réservation mobile, tel que le client le suit."""
+    job = getattr(reservation, 'payment_job', None)
+    paye = reservation.statut_paiement == Reservation.STATUT_PAYE
+    return {
+        'reference': reservation.reference_evex,
+        'statut': reservation.statut_paiement,
+        'montant_total': reservation.montant_total,
+        'frais_evex': reservation.frais_evex,
+        'montant_billet': reservation.montant_billet,
+        'siege': reservation.siege.numero,
+        'paye': paye,
+        'termine': reservation.statut_paiement in TERMINAL_STATUSES,
+        'initiation': job.status if job else None,
+        'erreur': (job.last_error or None) if job else None,
+        'message': STATUS_MESSAGES.get(reservation.statut_paiement, 'Paiement en attente'),
+    }
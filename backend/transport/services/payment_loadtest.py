@@ -0,0 +1,154 @@
+"""Scénario de charge du parcours de paiement mobile.
+
+Chaque acheteur virtuel réserve un siège tiré au hasard et lance le
+paiement (``payment/initier/``), puis suit son statut jusqu'à un état final.
+Le simulateur QosPay (``transport.qospay_stub``) joue l'opérateur et envoie
+les callbacks au webhook du serveur testé : le scénario couvre ainsi
+réservation du siège → demande de paiement → webhook → confirmation.
+
+``seat_violations`` contrôle ensuite en base qu'aucun siège n'a été vendu
+deux fois ni laissé bloqué.
+"""
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.db.models import Count, Exists, OuterRef
+
+from transport.models import Reservation, Siege
+
+STATUTS_FINAUX = {'paye', 'echoue', 'expire', 'rembourse'}
+
+
+def percentiles(durations, points=(50, 95, 99)):
+    """Percentiles (ms) par rang le plus proche ; ``None`` sans mesure."""
+    ordered = sorted(durations)
+    result = {}
+    for point in points:
+        if not ordered:
+            result[f'p{point}'] = None
+            continue
+        rank = max(math.ceil(point / 100 * len(ordered)), 1)
+        result[f'p{point}'] = round(ordered[rank - 1], 1)
+    return result
+
+
+def _buyer(session, base_url, voyage_id, seat, index, montant_billet, operateur, timeout, poll_interval):
+    started = time.perf_counter()
+    try:
+        response = session.post(f'{base_url}/api/payment/initier/', json={
+            'voyage_id': voyage_id,
+            'numero_siege': seat,
+            'client_nom': f'Acheteur {index}',
+            'client_telephone': f'+2289{index % 10000000:07d}',
+            'montant_billet': montant_billet,
+            'operateur': operateur,
+        }, timeout=timeout)
+    except requests.RequestException:
+        return {'issue': 'erreur'}
+    initiation = (time.perf_counter() - started) * 1000
+    if response.status_code == 409:
+        return {'issue': 'conflit', 'initiation': initiation}
+    if response.status_code != 202:
+        return {'issue': 'erreur', 'initiation': initiation}
+
+    statut_url = response.json()['statut_url']
+    deadline = started + timeout
+    while time.perf_counter() < deadline:
+        time.sleep(poll_interval)
+        try:
+            statut = session.get(statut_url, timeout=timeout).json().get('statut')
+        except (requests.RequestException, ValueError):
+            continue
+        if statut in STATUTS_FINAUX:
+            return {
+                'issue': statut,
+                'initiation': initiation,
+                'confirmation': (time.perf_counter() - started) * 1000,
+            }
+    return {'issue': 'delai', 'initiation': initiation}
+
+
+def run_scenario(
+    base_url,
+    voyage_id,
+    seats,
+    montant_billet,
+    buyers=1000,
+    concurrency=100,
+    operateur=Reservation.OPERATEUR_FLOOZ,
+    timeout=60.0,
+    poll_interval=0.5,
+    seed=None,
+):
+    """Lance ``buyers`` acheteurs, ``concurrency`` à la fois ; retourne le rapport."""
+    base_url = base_url.rstrip('/')
+    rng = random.Random(seed)
+    choices = [rng.randint(1, seats) for _ in range(buyers)]
+    local = threading.local()
+    sessions = []
+    sessions_lock = threading.Lock()
+
+    def run(index):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+            with sessions_lock:
+                sessions.append(session)
+        return _buyer(
+            session, base_url, voyage_id, choices[index], index, montant_billet, operateur, timeout, poll_interval,
+        )
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1), thread_name_prefix='loadtest-buyer') as pool:
+        results = list(pool.map(run, range(buyers)))
+    elapsed = time.perf_counter() - started
+    for session in sessions:
+        session.close()
+
+    issues = {}
+    for result in results:
+        issues[result['issue']] = issues.get(result['issue'], 0) + 1
+    return {
+        'acheteurs': buyers,
+        'duree_s': round(elapsed, 2),
+        'debit_par_s': round(buyers / elapsed, 1) if elapsed else None,
+        'issues': issues,
+        'initiation_ms': percentiles([item['initiation'] for item in results if 'initiation' in item]),
+        'confirmation_ms': percentiles([item['confirmation'] for item in results if 'confirmation' in item]),
+    }
+
+
+def seat_violations(voyage_id):
+    """Incohérences de sièges d'un voyage après le scénario."""
+    violations = []
+    payees = Reservation.objects.filter(voyage_id=voyage_id, statut_paiement=Reservation.STATUT_PAYE)
+
+    for row in payees.values('siege__numero').annotate(total=Count('pk')).filter(total__gt=1):
+        violations.append({
+            'type': 'vendu_plusieurs_fois',
+            'siege': row['siege__numero'],
+            'reservations': row['total'],
+        })
+    for numero in payees.exclude(siege__statut=Siege.STATUT_OCCUPE).values_list('siege__numero', flat=True):
+        violations.append({'type': 'paye_sans_siege_occupe', 'siege': numero})
+
+    actives = Reservation.objects.filter(
+        siege=OuterRef('pk'),
+        statut_paiement__in=[Reservation.STATUT_EN_ATTENTE, Reservation.STATUT_PAYE],
+    )
+    bloques = (
+        Siege.objects
+        .filter(voyage_id=voyage_id, reservations__isnull=False)
+        .exclude(statut=Siege.STATUT_LIBRE)
+        .annotate(active=Exists(actives))
+        .filter(active=False, ventes_guichet__isnull=True)
+        .distinct()
+        .values_list('numero', flat=True)
+    )
+    for numero in bloques:
+        violations.append({'type': 'siege_bloque', 'siege': numero})
+    return violations
@@ -0,0 +1,180 @@
+"""Boîte de réception des callbacks QoS.
+
+Les vues webhook (``WebhookQOSView`` pour les réservations mobiles,
+``payments.views.QosPayWebhookView`` pour les transactions QosPay) ne font
+qu'insérer le callback dans ``PaymentWebhook`` et acquitter : la contrainte
+unique (source, transref, statut fournisseur) absorbe les rejeux, sans
+verrou ni appel sortant pendant la requête.
+
+``drain_webhooks`` applique ensuite les callbacks par lots, dans l'ordre de
+réception. Les transitions sont idempotentes et ne reviennent jamais en
+arrière : un échec reçu après un succès reste sans effet, un succès déjà
+appliqué aussi. Un succès ne confirme qu'une réservation en attente ; reçu
+pour une réservation échouée, expirée ou remboursée, il passe ``review``
+pour un remboursement manuel. Deux workers peuvent donc drainer en même temps ; dans un
+même lot, les callbacks suivants d'une référence en erreur attendent le
+lot suivant.
+"""
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from transport.models import PaymentWebhook, Reservation
+from transport.services import reservation_service
+from transport.services.payment_jobs import submit_background
+from transport.ticketing import sync_ticket_index
+
+logger = logging.getLogger(__name__)
+
+STATUTS_ECHEC = {'FAILED', 'CANCELLED', 'EXPIRED'}
+
+_drain_lock = threading.Lock()
+_drain_scheduled = False
+
+
+def _as_dict(payload):
+    if hasattr(payload, 'dict'):
+        return payload.dict()
+    return payload if isinstance(payload, dict) else {'raw': str(payload)}
+
+
+def recevoir_webhook(source, transref, provider_status, payload, transaction_id=''):
+    """Enregistre un callback une seule fois ; le traitement part après le commit."""
+    PaymentWebhook.objects.bulk_create([
+        PaymentWebhook(
+            source=source,
+            transref=str(transref)[:64],
+            provider_status=str(provider_status or '')[:30],
+            transaction_id=str(transaction_id or '')[:100],
+            payload=_as_dict(payload),
+        ),
+    ], ignore_conflicts=True)
+    if settings.PAYMENT_WORKERS > 0:
+        transaction.on_commit(_schedule_drain)
+
+
+def _schedule_drain():
+    # Un seul drain en file par processus : un pic de callbacks ne remplit pas le pool.
+    global _drain_scheduled
+    with _drain_lock:
+        if _drain_scheduled:
+            return
+        _drain_scheduled = True
+    submit_background(_drain_until_empty)
+
+
+def _drain_until_empty():
+    global _drain_scheduled
+    with _drain_lock:
+        _drain_scheduled = False
+    batch = settings.PAYMENT_WEBHOOK_BATCH
+    while drain_webhooks(limit=batch) >= batch:
+        pass
+
+
+def _appliquer_reservation(webhook):
+    statut = webhook.provider_status
+    if statut == 'SUCCESS':
+        courant = Reservation.objects.filter(
+            reference_evex=webhook.transref,
+        ).values_list('statut_paiement', flat=True).first()
+        if courant is None or courant == Reservation.STATUT_PAYE:
+            return False
+        if courant != Reservation.STATUT_EN_ATTENTE:
+            # Le siège a pu être revendu : le client débité est remboursé à la main.
+            logger.warning(
+                "Late payment success needs review reference=%s status=%s", webhook.transref, courant,
+            )
+            return f'Succès reçu pour une réservation {courant} : remboursement à vérifier.'
+        reservation_service.confirmer_paiement(webhook.transref, webhook.transaction_id or None)
+        return True
+    if statut in STATUTS_ECHEC:
+        reservation = Reservation.objects.filter(reference_evex=webhook.transref).only('pk', 'siege_id').first()
+        if reservation is None:
+            return False
+        failed = Reservation.objects.filter(
+            pk=reservation.pk,
+            statut_paiement=Reservation.STATUT_EN_ATTENTE,
+        ).update(statut_paiement=Reservation.STATUT_ECHOUE)
+        if not failed:
+            return False
+        reservation_service.liberer_siege(reservation.siege_id)
+        sync_ticket_index('mobile', [reservation.pk])
+        return True
+    return False
+
+
+def _appliquer_transaction(webhook):
+    from payments.services import apply_webhook
+
+    return apply_webhook(webhook.transref, webhook.payload)
+
+
+HANDLERS = {
+    PaymentWebhook.SOURCE_RESERVATION: _appliquer_reservation,
+    PaymentWebhook.SOURCE_TRANSACTION: _appliquer_transaction,
+}
+
+
+def drain_webhooks(limit=100):
+    """Applique un lot de callbacks en attente ; retourne le nombre traité."""
+    webhooks = list(
+        PaymentWebhook.objects
+        .filter(status=PaymentWebhook.STATUS_PENDING)
+        .order_by('received_at', 'pk')[:limit]
+    )
+    blocked = set()
+    processed = 0
+    for webhook in webhooks:
+        key = (webhook.source, webhook.transref)
+        if key in blocked:
+            continue
+        claimed = PaymentWebhook.objects.filter(
+            pk=webhook.pk,
+            status=PaymentWebhook.STATUS_PENDING,
+        ).update(status=PaymentWebhook.STATUS_RUNNING, attempts=F('attempts') + 1, claimed_at=timezone.now())
+        if not claimed:
+            blocked.add(key)
+            continue
+
+        try:
+            with transaction.atomic():
+                applied = HANDLERS[webhook.source](webhook)
+                if isinstance(applied, str):
+                    status, note = PaymentWebhook.STATUS_REVIEW, applied
+                else:
+                    status, note = PaymentWebhook.STATUS_DONE if applied else PaymentWebhook.STATUS_IGNORED, ''
+                PaymentWebhook.objects.filter(pk=webhook.pk).update(
+                    status=status,
+                    processed_at=timezone.now(),
+                    last_error=note,
+                )
+        except Exception as exc:
+            logger.exception("Webhook processing failed webhook=%s transref=%s", webhook.pk, webhook.transref)
+            blocked.add(key)
+            exhausted = webhook.attempts + 1 >= settings.PAYMENT_WEBHOOK_MAX_ATTEMPTS
+            PaymentWebhook.objects.filter(pk=webhook.pk).update(
+                status=PaymentWebhook.STATUS_FAILED if exhausted else PaymentWebhook.STATUS_PENDING,
+                last_error=str(exc),
+            )
+            continue
+
+        processed += 1
+    return processed
+
+
+def release_stale_webhooks():
+    """Remet en file les callbacks restés en cours après l'arrêt d'un worker.
+
+    Les transitions étant idempotentes, les rejouer est sans risque.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.PAYMENT_JOB_STALE_SECONDS)
+    return PaymentWebhook.objects.filter(
+        status=PaymentWebhook.STATUS_RUNNING,
+        claimed_at__lt=cutoff,
+    ).update(status=PaymentWebhook.STATUS_PENDING)
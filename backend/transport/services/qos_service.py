@@ -2,11 +2,13 @@ import json
 import logging
 import time
 import random
-import requests
 import urllib3
 
 from django.conf import settings
 
+from . import operator_health
+from .qospay_client import qospay_client, redact
+
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 logger = logging.getLogger(__name__)
@@ -34,34 +36,42 @@ def _normaliser_phone(phone: str) -> str:
     return phone
 
 
-def _post_to_qospay(path, payload):
+def _appel_incertain(exc):
+    """L'appel a pu atteindre QoS : ni coupé par le disjoncteur ni refusé en 4xx."""
+    return not isinstance(exc, operator_health.OperatorUnavailable) and operator_health.erreur_operateur(exc)
+
+
+def _post_to_qospay(path, payload, idempotent=False, operateur=None):
     """
-    Appel HTTP POST vers QosicBridge.
+    Appel HTTP POST vers QosicBridge, via le client partagé (connexions réutilisées).
     Authentification Basic (username/password).
     verify=False car le staging utilise un certificat auto-signé.
+    ``idempotent`` autorise les retries (vérification de statut uniquement).
+    Avec ``operateur``, l'appel passe par son disjoncteur : erreurs réseau,
+    5xx et code 96 comptent comme des échecs, un 4xx ou un refus métier
+    (02, 529) non.
     """
+    if operateur:
+        return operator_health.executer(
+            operateur,
+            lambda: _post_to_qospay(path, payload, idempotent),
+            echec=lambda data: data.get('responsecode') == '96',
+        )
     url = f"{settings.QOSPAY_BASE_URL}{path}"
 
-    logger.info("QosPay request → %s | payload: %s", url, payload)
-
-    response = requests.post(
+    response = qospay_client.post(
         url,
-        json=payload,
+        payload,
         auth=get_auth(),
         verify=False,   # staging: certificat auto-signé
-        timeout=30,
-    )
-
-    logger.info(
-        "QosPay response ← status: %s | body: %s",
-        response.status_code,
-        response.text,
+        deadline=settings.QOSPAY_STATUS_DEADLINE if idempotent else settings.QOSPAY_TIMEOUT,
+        idempotent=idempotent,
     )
 
     if response.status_code == 400:
         logger.error(
             "QosPay HTTP 400 Bad Request → %s | response: %s",
-            url, response.text,
+            path, redact(response.text),
         )
 
     response.raise_for_status()
@@ -74,12 +84,12 @@ def _post_to_qospay(path, payload):
 
 
 # ─── TOGOCEL (T-Money) ────────────────────────────────────────────
-def pay_togocel(phone, amount, firstname, lastname):
+def pay_togocel(phone, amount, firstname, lastname, transref=None):
     """
     Initie un paiement T-Money (Togocel) via QosicBridge.
     Endpoint: /QosicBridge/tg/v1/requestpayment  (même que Moov)
     """
-    transref = generate_transref()
+    transref = transref or generate_transref()
     payload = {
         "msisdn":    _normaliser_phone(phone),   # numéro local sans 228
         "amount":    str(amount),                # string obligatoire
@@ -92,11 +102,13 @@ def pay_togocel(phone, amount, firstname, lastname):
         data = _post_to_qospay(
             '/QosicBridge/tg/v1/requestpayment',   # ✅ endpoint correct
             payload,
+            operateur='TOGOCEL',
         )
         responsecode = data.get('responsecode', '96')
         succes = responsecode == '00'
         return {
             'succes':       succes,
+            'incertain':    responsecode == '96',
             'transref':     transref,
             'responsecode': responsecode,
             'responsemsg':  data.get('responsemsg', ''),
@@ -107,6 +119,7 @@ def pay_togocel(phone, amount, firstname, lastname):
         logger.exception("Togocel payment failed transref=%s: %s", transref, exc)
         return {
             'succes':       False,
+            'incertain':    _appel_incertain(exc),
             'transref':     transref,
             'responsecode': '96',
             'responsemsg':  '',
@@ -116,12 +129,12 @@ def pay_togocel(phone, amount, firstname, lastname):
 
 
 # ─── MOOV TOGO (Flooz) ────────────────────────────────────────────
-def pay_moov_togo(phone, amount, firstname, lastname):
+def pay_moov_togo(phone, amount, firstname, lastname, transref=None):
     """
     Initie un paiement Flooz (Moov Togo) via QosicBridge.
     Endpoint: /QosicBridge/tg/v1/requestpayment
     """
-    transref = generate_transref()
+    transref = transref or generate_transref()
     payload = {
         "msisdn":    _normaliser_phone(phone),
         "amount":    str(amount),
@@ -134,11 +147,13 @@ def pay_moov_togo(phone, amount, firstname, lastname):
         data = _post_to_qospay(
             '/QosicBridge/tg/v1/requestpayment',   # ✅ endpoint correct
             payload,
+            operateur='MOOV',
         )
         responsecode = data.get('responsecode', '96')
         succes = responsecode == '00'
         return {
             'succes':       succes,
+            'incertain':    responsecode == '96',
             'transref':     transref,
             'responsecode': responsecode,
             'responsemsg':  data.get('responsemsg', ''),
@@ -149,6 +164,7 @@ def pay_moov_togo(phone, amount, firstname, lastname):
         logger.exception("Moov Togo payment failed transref=%s: %s", transref, exc)
         return {
             'succes':       False,
+            'incertain':    _appel_incertain(exc),
             'transref':     transref,
             'responsecode': '96',
             'responsemsg':  '',
@@ -157,11 +173,37 @@ def pay_moov_togo(phone, amount, firstname, lastname):
         }
 
 
+# ─── INITIATION PAR OPÉRATEUR ─────────────────────────────────────
+def initier_paiement(telephone, montant, reference, operateur, client_nom=''):
+    """
+    Initie le paiement d'une réservation mobile chez son opérateur.
+    La référence EVEX sert de transref : le statut reste vérifiable même si
+    la réponse de l'initiation est perdue.
+
+    ``incertain`` : sans réponse ou code 96, la demande a pu être acceptée et
+    le client débité ; seul un refus explicite (02, 529...) est un échec.
+    """
+    payer = pay_togocel if operateur == 'TMONEY' else pay_moov_togo
+    prenom, _, nom = str(client_nom or 'Client EVEX').strip().partition(' ')
+    resultat = payer(telephone, montant, prenom, nom or prenom, transref=reference)
+    # 01 : demande acceptée, le client doit encore valider sur son téléphone.
+    accepte = resultat['responsecode'] in ('00', '01')
+    return {
+        'succes':         accepte,
+        'incertain':      not accepte and resultat['incertain'],
+        'transaction_id': resultat['transref'],
+        'reference_qos':  resultat['raw'].get('serviceref') or resultat['raw'].get('reference'),
+        'responsecode':   resultat['responsecode'],
+        'erreur':         None if accepte else resultat['erreur'],
+    }
+
+
 # ─── VÉRIFIER STATUT ──────────────────────────────────────────────
-def check_transaction_status(transref):
+def check_transaction_status(transref, operateur=None):
     """
     Vérifie le statut d'une transaction QosicBridge.
     Endpoint: /QosicBridge/tg/v1/gettransactionstatus  ✅
+    ``operateur`` (FLOOZ, TMONEY...) fait passer l'appel par son disjoncteur.
 
     Codes de réponse QOS :
       00  → success (paiement confirmé)
@@ -178,6 +220,8 @@ def check_transaction_status(transref):
         data = _post_to_qospay(
             '/QosicBridge/tg/v1/gettransactionstatus',   # ✅ endpoint correct
             payload,
+            idempotent=True,
+            operateur=operateur,
         )
 
         code = data.get('responsecode', '96')
@@ -249,6 +293,45 @@ def calculer_montant_total(montant_billet: int) -> dict:
 
 
 # ─── WEBHOOK SIGNATURE ────────────────────────────────────────────
+# ─── REVERSEMENT COMPAGNIE ────────────────────────────────────────
+def reverser_compagnie(telephone, montant, reference):
+    """
+    Verse à une compagnie le montant d'une fenêtre de reversement (dépôt mobile).
+    Endpoint: /QosicBridge/tg/v1/deposit
+    La référence du reversement sert de transref : un rejeu est refusé par QoS.
+
+    ``incertain`` : sans réponse (exception, délai dépassé) ou code 96/01, le
+    dépôt a pu être accepté ; seul un statut relu avec le même transref
+    permet de conclure.
+    """
+    payload = {
+        "msisdn":   _normaliser_phone(telephone),
+        "amount":   str(montant),
+        "transref": reference,
+        "clientid": settings.QOSPAY_CLIENT_ID,
+    }
+    try:
+        data = _post_to_qospay('/QosicBridge/tg/v1/deposit', payload)
+        responsecode = data.get('responsecode', '96')
+        succes = responsecode == '00'
+        return {
+            'succes':         succes,
+            'incertain':      responsecode in ('01', '96'),
+            'transaction_id': data.get('serviceref') or reference,
+            'responsecode':   responsecode,
+            'erreur':         None if succes else data.get('responsemsg', 'Erreur inconnue'),
+        }
+    except Exception as exc:
+        logger.exception("Company payout failed transref=%s: %s", reference, exc)
+        return {
+            'succes':         False,
+            'incertain':      True,
+            'transaction_id': None,
+            'responsecode':   '96',
+            'erreur':         str(exc),
+        }
+
+
 def valider_webhook(request_body, signature_header):
     """
     Validation de signature webhook QOS.
@@ -0,0 +1,145 @@
+"""Client HTTP partagé pour QosPay (QosicBridge).
+
+Une seule ``requests.Session`` par processus, avec un pool de connexions
+keep-alive : les appels successifs réutilisent la connexion TLS au lieu d'en
+ouvrir une par requête. Chaque appel a un budget total (``deadline``) ; le
+délai de lecture de chaque tentative est borné par ce qu'il en reste.
+
+Seuls les appels idempotents (vérification de statut) sont rejoués, sur
+erreur réseau, délai dépassé ou réponse 429/502/503/504, avec un backoff
+exponentiel à jitter complet et dans la limite du budget. Une demande de
+paiement n'est jamais rejouée : un second envoi débiterait le client deux
+fois.
+
+Les journaux sont une ligne par tentative (méthode, chemin, statut, durée,
+transref). Le contenu des requêtes et réponses n'est écrit qu'en DEBUG, les
+numéros de téléphone et identifiants masqués par ``redact``.
+"""
+import logging
+import random
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 502, 503, 504}
+RETRY_BACKOFF = 0.2
+RETRY_BACKOFF_MAX = 2.0
+REDACTED_FIELDS = {'msisdn', 'phone', 'clientid', 'password', 'firstname', 'lastname'}
+DIGITS = re.compile(r'\d{6,}')
+
+
+def _mask(value):
+    text = str(value)
+    return '*' * max(len(text) - 2, 0) + text[-2:]
+
+
+def redact(value):
+    """Copie d'un contenu QosPay sans numéro de téléphone ni identifiant lisible."""
+    if isinstance(value, dict):
+        return {
+            key: _mask(item) if str(key).lower() in REDACTED_FIELDS and item not in (None, '') else redact(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [redact(item) for item in value]
+    if isinstance(value, str):
+        return DIGITS.sub(lambda match: _mask(match.group()), value)
+    return value
+
+
+class QosPayClient:
+    """Client keep-alive partagé par les deux intégrations QosPay."""
+
+    def __init__(self, pool_size=None):
+        self.pool_size = pool_size
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    size = self.pool_size or settings.QOSPAY_POOL_SIZE
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=size)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    session.headers.update({
+                        'Accept': 'application/json',
+                        'Content-Type': 'application/json',
+                    })
+                    self._session = session
+        return self._session
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    def post(self, url, payload, *, auth, verify=True, deadline=None, idempotent=False):
+        """POST JSON vers QosPay ; retourne la dernière ``requests.Response``.
+
+        ``deadline`` est le budget total en secondes (``QOSPAY_TIMEOUT`` par
+        défaut). Les erreurs réseau remontent telles quelles une fois le budget
+        ou les tentatives épuisés.
+        """
+        budget = float(deadline if deadline is not None else settings.QOSPAY_TIMEOUT)
+        expires = time.monotonic() + budget
+        attempts = 1 + (max(settings.QOSPAY_STATUS_RETRIES, 0) if idempotent else 0)
+        path = urlsplit(url).path
+        transref = payload.get('transref')
+        logger.debug('QosPay request %s | payload: %s', path, redact(payload))
+        for attempt in range(1, attempts + 1):
+            remaining = expires - time.monotonic()
+            started = time.monotonic()
+            try:
+                response = self.session.post(
+                    url,
+                    json=payload,
+                    auth=auth,
+                    verify=verify,
+                    timeout=(min(settings.QOSPAY_CONNECT_TIMEOUT, remaining), remaining),
+                )
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                logger.warning(
+                    'QosPay POST %s error=%s attempt=%s/%s duration_ms=%d transref=%s',
+                    path, exc.__class__.__name__, attempt, attempts,
+                    (time.monotonic() - started) * 1000, transref,
+                )
+                if not self._retry(attempt, attempts, expires):
+                    raise
+                continue
+            logger.info(
+                'QosPay POST %s status=%s attempt=%s/%s duration_ms=%d transref=%s',
+                path, response.status_code, attempt, attempts,
+                (time.monotonic() - started) * 1000, transref,
+            )
+            if response.status_code in RETRY_STATUSES and self._retry(attempt, attempts, expires):
+                continue
+            logger.debug('QosPay response %s | body: %s', path, redact(response.text))
+            return response
+
+    @staticmethod
+    def _retry(attempt, attempts, expires):
+        """Attend avant la tentative suivante ; ``False`` s'il n'y en a plus ou si le budget est épuisé."""
+        if attempt >= attempts:
+            return False
+        pause = random.uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF * 2 ** (attempt - 1)))
+        # Garder au moins le délai de connexion pour la tentative suivante.
+        if time.monotonic() + pause + settings.QOSPAY_CONNECT_TIMEOUT > expires:
+            return False
+        time.sleep(pause)
+        return True
+
+
+qospay_client = QosPayClient()
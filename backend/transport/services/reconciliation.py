@@ -0,0 +1,238 @@
+"""Réconciliation des paiements mobiles restés en attente.
+
+Sans webhook, une ``Reservation`` ou une ``payments.Transaction`` en attente
+n'était résolue que si le client revenait interroger son statut. Le balayage
+parcourt les paiements en attente depuis ``RECONCILIATION_MIN_AGE_SECONDS``
+par pages (pagination par clé sur ``created_at``), interroge QosPay en
+parallèle sur un pool borné, avec un débit maximal par opérateur, puis
+applique chaque page en quelques requêtes groupées.
+
+Les mises à jour ne portent que sur les lignes encore en attente : un
+webhook appliqué entre-temps garde la priorité. Les compteurs du dernier
+passage sont journalisés et conservés dans le cache.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from payments.models import Transaction
+from payments.services import (
+    FINAL_STATUSES,
+    QosPayService,
+    extract_message,
+    extract_response_code,
+    status_from_qospay_code,
+)
+from transport.models import PaymentJob, Reservation, Siege
+from transport.services import qos_service
+from transport.services.company_payouts import crediter_reservations
+from transport.ticketing import sync_ticket_index
+
+logger = logging.getLogger(__name__)
+
+METRICS_CACHE_KEY = 'payments:reconciliation:last'
+
+STATUTS_ECHEC = {'failed', 'insufficient_funds'}
+
+
+class _RateLimiter:
+    """Espace les appels d'un opérateur ; partagé par tous les threads."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self.lock = threading.Lock()
+        self.next_at = 0.0
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_at)
+            self.next_at = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def _operateur(value):
+    key = str(value or '').strip().upper()
+    return QosPayService.OPERATOR_ALIASES.get(key, key)
+
+
+def _statut_reservation(reference, operateur):
+    result = qos_service.check_transaction_status(reference, operateur)
+    if not result.get('succes'):
+        raise RuntimeError(result.get('erreur') or 'Statut QosPay indisponible')
+    return result['statut'], result
+
+
+def _statut_transaction(transref, method):
+    data = QosPayService().get_transaction_status(transref=transref, operator=method)
+    return status_from_qospay_code(extract_response_code(data)), data
+
+
+def _interroger(pool, limiters, items):
+    """``items`` : (clé, opérateur, fonction, args). Retourne {clé: (statut, data) | None}."""
+
+    def check(operator, func, args):
+        limiters[operator].wait()
+        try:
+            return func(*args)
+        except Exception as exc:
+            logger.warning("Reconciliation status check failed operator=%s error=%s", operator, exc)
+            return None
+
+    for _, operator, _, _ in items:
+        limiters.setdefault(operator, _RateLimiter(settings.RECONCILIATION_RATE_PER_OPERATOR))
+    futures = {key: pool.submit(check, operator, func, args) for key, operator, func, args in items}
+    return {key: future.result() for key, future in futures.items()}
+
+
+def _pages(queryset, page_size):
+    last = None
+    while True:
+        page = queryset
+        if last is not None:
+            page = page.filter(created_at__gte=last.created_at).exclude(
+                created_at=last.created_at, pk__lte=last.pk,
+            )
+        rows = list(page.order_by('created_at', 'pk')[:page_size])
+        if not rows:
+            return
+        yield rows
+        if len(rows) < page_size:
+            return
+        last = rows[-1]
+
+
+def _appliquer_reservations(statuts):
+    """Applique {pk: statut} aux réservations encore en attente ; les payées sont créditées au grand livre."""
+    paid_ids = [pk for pk, statut in statuts.items() if statut == 'success']
+    failed_ids = [pk for pk, statut in statuts.items() if statut in STATUTS_ECHEC]
+    if not paid_ids and not failed_ids:
+        return
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(
+            Reservation.objects
+            .select_for_update()
+            .filter(pk__in=paid_ids + failed_ids, statut_paiement=Reservation.STATUT_EN_ATTENTE)
+            .values_list('pk', 'siege_id')
+        )
+        paid_set = set(paid_ids)
+        paid = [row for row in rows if row[0] in paid_set]
+        failed = [row for row in rows if row[0] not in paid_set]
+        if paid:
+            Reservation.objects.filter(pk__in=[row[0] for row in paid]).update(
+                statut_paiement=Reservation.STATUT_PAYE,
+                paid_at=now,
+            )
+            Siege.objects.filter(pk__in=[row[1] for row in paid]).update(statut=Siege.STATUT_OCCUPE)
+            crediter_reservations([row[0] for row in paid])
+        if failed:
+            Reservation.objects.filter(pk__in=[row[0] for row in failed]).update(
+                statut_paiement=Reservation.STATUT_ECHOUE,
+            )
+            Siege.objects.filter(pk__in=[row[1] for row in failed]).update(
+                statut=Siege.STATUT_LIBRE,
+                reserve_at=None,
+            )
+        sync_ticket_index('mobile', [row[0] for row in rows])
+
+
+def _appliquer_transactions(reponses):
+    """Applique {transref: data} aux transactions non finalisées ; retourne le nombre finalisé."""
+    if not reponses:
+        return 0
+    now = timezone.now()
+    with transaction.atomic():
+        transactions = list(
+            Transaction.objects
+            .select_for_update()
+            .filter(transref__in=list(reponses))
+            .exclude(status__in=FINAL_STATUSES)
+        )
+        for item in transactions:
+            data = reponses[item.transref]
+            item.qos_response_code = extract_response_code(data)
+            item.status = status_from_qospay_code(item.qos_response_code)
+            item.qos_response_message = extract_message(data)
+            item.qos_raw_response = data
+            item.updated_at = now
+        Transaction.objects.bulk_update(
+            transactions,
+            ['status', 'qos_response_code', 'qos_response_message', 'qos_raw_response', 'updated_at'],
+        )
+    return sum(item.status in FINAL_STATUSES for item in transactions)
+
+
+def reconcilier_paiements(page_size=100, workers=None, min_age=None):
+    """Un passage complet sur les paiements en attente ; retourne les compteurs."""
+    started = time.monotonic()
+    cutoff = timezone.now() - timedelta(
+        seconds=settings.RECONCILIATION_MIN_AGE_SECONDS if min_age is None else min_age,
+    )
+    metrics = {'examines': 0, 'resolus': 0, 'toujours_en_attente': 0, 'erreurs_operateur': 0}
+    limiters = {}
+
+    reservations = (
+        Reservation.objects
+        .filter(statut_paiement=Reservation.STATUT_EN_ATTENTE, created_at__lt=cutoff)
+        # Demande pas encore envoyée à l'opérateur : rien à vérifier chez QoS.
+        .exclude(payment_job__status__in=[PaymentJob.STATUS_PENDING, PaymentJob.STATUS_RUNNING])
+        .only('pk', 'created_at', 'reference_evex', 'operateur')
+    )
+    transactions = (
+        Transaction.objects
+        .exclude(status__in=FINAL_STATUSES)
+        .filter(created_at__lt=cutoff)
+        .only('pk', 'created_at', 'transref', 'method')
+    )
+
+    with ThreadPoolExecutor(
+        max_workers=max(workers or settings.RECONCILIATION_WORKERS, 1),
+        thread_name_prefix='payment-reconcile',
+    ) as pool:
+        for page in _pages(reservations, page_size):
+            results = _interroger(pool, limiters, [
+                (item.pk, _operateur(item.operateur), _statut_reservation, (item.reference_evex, item.operateur))
+                for item in page
+            ])
+            statuts = {pk: result[0] for pk, result in results.items() if result is not None}
+            _appliquer_reservations(statuts)
+            resolus = sum(statut == 'success' or statut in STATUTS_ECHEC for statut in statuts.values())
+            metrics['examines'] += len(page)
+            metrics['erreurs_operateur'] += len(results) - len(statuts)
+            metrics['resolus'] += resolus
+            metrics['toujours_en_attente'] += len(statuts) - resolus
+
+        for page in _pages(transactions, page_size):
+            results = _interroger(pool, limiters, [
+                (item.transref, _operateur(item.method), _statut_transaction, (item.transref, item.method))
+                for item in page
+            ])
+            reponses = {transref: result[1] for transref, result in results.items() if result is not None}
+            resolus = _appliquer_transactions(reponses)
+            metrics['examines'] += len(page)
+            metrics['erreurs_operateur'] += len(results) - len(reponses)
+            metrics['resolus'] += resolus
+            metrics['toujours_en_attente'] += len(reponses) - resolus
+
+    metrics['duree_ms'] = round((time.monotonic() - started) * 1000)
+    cache.set(METRICS_CACHE_KEY, {**metrics, 'termine_at': timezone.now().isoformat()}, None)
+    logger.info(
+        "Payment reconciliation examined=%s resolved=%s pending=%s provider_errors=%s duration_ms=%s",
+        metrics['examines'],
+        metrics['resolus'],
+        metrics['toujours_en_attente'],
+        metrics['erreurs_operateur'],
+        metrics['duree_ms'],
+    )
+    return metrics
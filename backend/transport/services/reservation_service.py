@@ -1,23 +1,20 @@
 import logging
-import time
 import uuid
 from datetime import timedelta
 from decimal import Decimal, ROUND_HALF_UP
 
 from django.conf import settings
 from django.db import transaction
-from django.db.models import F
 from django.utils import timezone
 
 from transport.models import (
-    CompteCagnotte,
-    HistoriqueReversement,
     Reservation,
     ScheduledTrip,
     Siege,
     PlatformConfiguration,
 )
-from transport.services import qos_service
+from transport.services import company_payouts
+from transport.ticketing import sync_ticket_index
 
 logger = logging.getLogger(__name__)
 
@@ -113,87 +110,12 @@ def confirmer_paiement(reference_evex, transaction_id_qos):
         siege.statut = Siege.STATUT_OCCUPE
         siege.save(update_fields=['statut'])
 
-        declencher_reversement(reservation)
+        # Le montant dû à la compagnie est crédité au grand livre, reversé par fenêtre.
+        company_payouts.crediter_reservations([reservation.pk])
         logger.info("Payment confirmation finished reference=%s", reference_evex)
         return reservation
 
 
-def declencher_reversement(reservation):
-    reservation = (
-        Reservation.objects
-        .select_related('voyage__trip__company')
-        .get(pk=reservation.pk)
-    )
-    if reservation.reversement_effectue:
-        logger.info("Payout skipped already done reference=%s", reservation.reference_evex)
-        return True
-
-    compagnie = reservation.voyage.trip.company
-    reference_reversement = f"REV-{reservation.reference_evex}"
-    last_result = None
-
-    for tentative in range(1, 4):
-        logger.info(
-            "Payout attempt %s/3 reference=%s company=%s",
-            tentative,
-            reservation.reference_evex,
-            compagnie.id,
-        )
-        last_result = qos_service.reverser_compagnie(
-            compagnie.phone,
-            reservation.montant_reverse_compagnie,
-            reference_reversement,
-        )
-        if last_result.get('succes'):
-            with transaction.atomic():
-                cagnotte, _ = CompteCagnotte.objects.select_for_update().get_or_create(compagnie=compagnie)
-                cagnotte.solde_a_reverser = max(
-                    0,
-                    cagnotte.solde_a_reverser - reservation.montant_reverse_compagnie,
-                )
-                cagnotte.total_reverse = F('total_reverse') + reservation.montant_reverse_compagnie
-                cagnotte.save(update_fields=['solde_a_reverser', 'total_reverse', 'updated_at'])
-
-                HistoriqueReversement.objects.create(
-                    compagnie=compagnie,
-                    reservation=reservation,
-                    montant=reservation.montant_reverse_compagnie,
-                    reference_qos_reversement=last_result.get('transaction_id'),
-                    statut=HistoriqueReversement.STATUT_EFFECTUE,
-                )
-
-                reservation.reversement_effectue = True
-                reservation.reversement_at = timezone.now()
-                reservation.save(update_fields=['reversement_effectue', 'reversement_at'])
-
-            logger.info("Payout succeeded reference=%s", reservation.reference_evex)
-            return True
-
-        logger.error(
-            "Payout attempt failed reference=%s attempt=%s error=%s",
-            reservation.reference_evex,
-            tentative,
-            last_result.get('erreur'),
-        )
-        if tentative < 3:
-            time.sleep(30)
-
-    with transaction.atomic():
-        cagnotte, _ = CompteCagnotte.objects.select_for_update().get_or_create(compagnie=compagnie)
-        cagnotte.solde_a_reverser = F('solde_a_reverser') + reservation.montant_reverse_compagnie
-        cagnotte.save(update_fields=['solde_a_reverser', 'updated_at'])
-        HistoriqueReversement.objects.create(
-            compagnie=compagnie,
-            reservation=reservation,
-            montant=reservation.montant_reverse_compagnie,
-            reference_qos_reversement=None,
-            statut=HistoriqueReversement.STATUT_ECHOUE,
-        )
-
-    logger.error("Payout failed after 3 attempts reference=%s result=%s", reservation.reference_evex, last_result)
-    return False
-
-
 def liberer_siege(siege_id):
     logger.info("Seat release requested siege=%s", siege_id)
     Siege.objects.filter(pk=siege_id).update(statut=Siege.STATUT_LIBRE, reserve_at=None)
@@ -209,10 +131,13 @@ def liberer_sieges_expires():
     if not sieges:
         return 0
 
-    Reservation.objects.filter(
+    expired = Reservation.objects.filter(
         siege_id__in=sieges,
         statut_paiement=Reservation.STATUT_EN_ATTENTE,
-    ).update(statut_paiement=Reservation.STATUT_EXPIRE)
+    )
+    expired_ids = list(expired.values_list('id', flat=True))
+    expired.update(statut_paiement=Reservation.STATUT_EXPIRE)
+    sync_ticket_index('mobile', expired_ids)
 
     count = Siege.objects.filter(id__in=sieges).update(statut=Siege.STATUT_LIBRE, reserve_at=None)
     logger.info("Expired seats released count=%s", count)
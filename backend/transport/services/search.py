@@ -0,0 +1,115 @@
+"""Recherche partielle indexée par trigrammes.
+
+Les textes sont repliés (minuscules, sans accents) et les téléphones ramenés à
+leurs chiffres normalisés. Chaque document indexé écrit ses trigrammes dans
+``SearchGram`` ; une recherche sélectionne les lignes qui possèdent tous les
+trigrammes de la requête via l'index ``(scope, gram)``, puis confirme la
+sous-chaîne sur ``search_text`` pour ces seuls candidats. Les tables sont
+ordinaires : la même recherche fonctionne sur SQLite, PostgreSQL et
+CockroachDB.
+"""
+import re
+import unicodedata
+
+from django.db.models import Count
+
+from transport.models import SearchGram
+
+
+GRAM_SIZE = 3
+FIELD_SEPARATOR = ' | '
+PHONE_QUERY = re.compile(r'^[\d\s+().-]+$')
+
+
+def normalize_phone(value):
+    """Normalize phone to canonical '228' + 8 digits, or return None if invalid/empty."""
+    if not value:
+        return None
+    digits = ''.join([c for c in str(value) if c.isdigit()])
+    if digits.startswith('228') and len(digits) == 11:
+        return digits
+    if len(digits) == 8:
+        return '228' + digits
+    return None
+
+
+def fold_text(value):
+    """Minuscules sans accents ni espaces superflus : « Lomé » -> « lome »."""
+    decomposed = unicodedata.normalize('NFKD', str(value or ''))
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(stripped.lower().split())
+
+
+def phone_text(value):
+    if not value:
+        return ''
+    return normalize_phone(value) or ''.join(char for char in str(value) if char.isdigit())
+
+
+def search_document(*, texts=(), phones=()):
+    """Texte de recherche d'une ligne : un champ replié par segment."""
+    fields = [fold_text(value) for value in texts] + [phone_text(value) for value in phones]
+    return FIELD_SEPARATOR.join(field for field in fields if field)
+
+
+def audit_search_document(entry):
+    return search_document(texts=[
+        entry.object_repr,
+        entry.model_name,
+        entry.user.email if entry.user_id else '',
+    ])
+
+
+def trigrams(text):
+    return {
+        text[index:index + GRAM_SIZE]
+        for index in range(len(text) - GRAM_SIZE + 1)
+        if ' ' not in text[index:index + GRAM_SIZE] and '|' not in text[index:index + GRAM_SIZE]
+    }
+
+
+def search_terms(query):
+    """Termes à retrouver : les chiffres seuls pour un numéro, sinon les mots repliés."""
+    query = str(query or '').strip()
+    if PHONE_QUERY.match(query) and any(char.isdigit() for char in query):
+        return [''.join(char for char in query if char.isdigit())]
+    return fold_text(query).split()
+
+
+def index_documents(scope, documents):
+    """Remplace les trigrammes des documents ``{object_id: search_text}``."""
+    if not documents:
+        return
+    SearchGram.objects.filter(scope=scope, object_id__in=list(documents)).delete()
+    SearchGram.objects.bulk_create(
+        [
+            SearchGram(scope=scope, object_id=object_id, gram=gram)
+            for object_id, text in documents.items()
+            for gram in trigrams(text)
+        ],
+        batch_size=2000,
+    )
+
+
+def remove_documents(scope, object_ids):
+    SearchGram.objects.filter(scope=scope, object_id__in=list(object_ids)).delete()
+
+
+def apply_search(queryset, scope, query):
+    """Restreint ``queryset`` (qui porte ``search_text``) aux lignes contenant la requête."""
+    terms = search_terms(query)
+    if not terms:
+        return queryset
+    grams = set().union(*(trigrams(term) for term in terms))
+    if grams:
+        candidates = (
+            SearchGram.objects.filter(scope=scope, gram__in=grams)
+            .values('object_id')
+            .annotate(hits=Count('gram'))
+            .filter(hits=len(grams))
+            .values('object_id')
+        )
+        queryset = queryset.filter(pk__in=candidates)
+    for term in terms:
+        queryset = queryset.filter(search_text__contains=term)
+    return queryset
@@ -0,0 +1,225 @@
+"""Billets QR compacts et signés.
+
+Un jeton tient en une ligne alphanumérique (mode QR le plus dense) :
+``EVX1`` suivi du base32 d'une charge binaire de 30 octets et d'une signature
+HMAC-SHA256 tronquée à 16 octets. La charge contient le canal, l'identifiant
+du billet, le voyage, le siège, le segment (séquences des arrêts de montée et
+de descente, 0 pour le trajet complet) et l'expiration.
+
+La clé est dérivée par compagnie : un scanner qui ne connaît que la clé de sa
+compagnie vérifie ses billets hors ligne et rejette ceux des autres. Les
+agents la reçoivent par ``offline_key`` (point d'entrée authentifié du
+guichet). C'est une clé symétrique : un appareil qui la détient peut aussi
+signer des billets de sa compagnie. Le risque reste borné à cette compagnie
+et se révoque en changeant ``TICKET_SIGNING_KEY`` (``rebuild_ticket_index``
+re-signe alors les billets ; ceux déjà imprimés sont à réémettre). Une
+signature Ed25519 l'éviterait, mais ses 64 octets porteraient le jeton à
+plus de 150 caractères.
+"""
+import base64
+import binascii
+import hashlib
+import hmac
+import struct
+import threading
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+
+TOKEN_PREFIX = 'EVX1'
+SIGNATURE_BYTES = 16
+SOURCE_CODES = {'booking': 0, 'mobile': 1, 'guichet': 2}
+SOURCES = {code: source for source, code in SOURCE_CODES.items()}
+# canal, id (16 octets), voyage, siège, arrêt de montée, arrêt de descente, expiration
+PAYLOAD = struct.Struct('>B16sIHBBI')
+
+
+class InvalidTicketToken(Exception):
+    pass
+
+
+class ExpiredTicketToken(InvalidTicketToken):
+    def __init__(self, token):
+        super().__init__('Billet expiré')
+        self.token = token
+
+
+@dataclass(frozen=True)
+class TicketToken:
+    source: str
+    ticket_id: str
+    voyage_id: int
+    seat: int
+    origin_sequence: int
+    destination_sequence: int
+    expires_at: int
+
+
+def company_key(company_id):
+    return hmac.new(
+        str(settings.TICKET_SIGNING_KEY).encode(),
+        f'evex-ticket:{company_id}'.encode(),
+        hashlib.sha256,
+    ).digest()
+
+
+def offline_key(company_id):
+    """Clé et format de vérification hors ligne des billets d'une compagnie."""
+    key = company_key(company_id)
+    return {
+        'compagnie_id': company_id,
+        'algorithme': 'HMAC-SHA256',
+        'cle': base64.b64encode(key).decode(),
+        'empreinte': hashlib.sha256(key).hexdigest()[:16],
+        'prefixe': TOKEN_PREFIX,
+        'signature_octets': SIGNATURE_BYTES,
+        'charge': PAYLOAD.format,
+        'champs': ['canal', 'id', 'voyage_id', 'siege', 'arret_montee', 'arret_descente', 'expire_a'],
+        'canaux': SOURCE_CODES,
+    }
+
+
+def token_expiry(travel_date):
+    end_of_day = timezone.make_aware(datetime.combine(travel_date, time.max))
+    return int((end_of_day + timedelta(hours=settings.TICKET_TOKEN_GRACE_HOURS)).timestamp())
+
+
+def _id_bytes(source, ticket_id):
+    if source == 'booking':
+        return int(ticket_id).to_bytes(16, 'big')
+    return uuid.UUID(str(ticket_id)).bytes
+
+
+def _id_from_bytes(source, raw):
+    if source == 'booking':
+        return str(int.from_bytes(raw, 'big'))
+    return str(uuid.UUID(bytes=raw))
+
+
+def sign_ticket(company_id, *, source, ticket_id, voyage_id, seat, expires_at,
+                origin_sequence=0, destination_sequence=0):
+    body = PAYLOAD.pack(
+        SOURCE_CODES[source],
+        _id_bytes(source, ticket_id),
+        int(voyage_id),
+        int(seat),
+        int(origin_sequence),
+        int(destination_sequence),
+        int(expires_at),
+    )
+    signature = hmac.new(company_key(company_id), body, hashlib.sha256).digest()[:SIGNATURE_BYTES]
+    return TOKEN_PREFIX + base64.b32encode(body + signature).decode().rstrip('=')
+
+
+def is_ticket_token(raw):
+    return isinstance(raw, str) and raw.strip().upper().startswith(TOKEN_PREFIX)
+
+
+def verify_ticket(raw, company_id, now=None):
+    """Vérifie signature et expiration sans aucune requête en base."""
+    encoded = raw.strip().upper()[len(TOKEN_PREFIX):]
+    try:
+        data = base64.b32decode(encoded + '=' * (-len(encoded) % 8))
+    except (binascii.Error, ValueError):
+        raise InvalidTicketToken('QR invalide')
+    if len(data) != PAYLOAD.size + SIGNATURE_BYTES:
+        raise InvalidTicketToken('QR invalide')
+    body, signature = data[:PAYLOAD.size], data[PAYLOAD.size:]
+    expected = hmac.new(company_key(company_id), body, hashlib.sha256).digest()[:SIGNATURE_BYTES]
+    if not hmac.compare_digest(signature, expected):
+        raise InvalidTicketToken('Signature du billet invalide')
+    code, raw_id, voyage_id, seat, origin, destination, expires_at = PAYLOAD.unpack(body)
+    if code not in SOURCES:
+        raise InvalidTicketToken('QR invalide')
+    token = TicketToken(
+        source=SOURCES[code],
+        ticket_id=_id_from_bytes(SOURCES[code], raw_id),
+        voyage_id=voyage_id,
+        seat=seat,
+        origin_sequence=origin,
+        destination_sequence=destination,
+        expires_at=expires_at,
+    )
+    if (now or timezone.now()).timestamp() > expires_at:
+        raise ExpiredTicketToken(token)
+    return token
+
+
+def ticket_token_for(item, source):
+    """Jeton signé d'un billet, ou ``None`` s'il n'a pas de voyage ou de siège numérique."""
+    if source == 'booking':
+        voyage = item.scheduled_trip
+        company_id = item.trip.company_id
+        seat = item.seat_number
+        origin = item.origin_stop.sequence if item.origin_stop_id else 0
+        destination = item.destination_stop.sequence if item.destination_stop_id else 0
+    else:
+        voyage = item.voyage
+        company_id = voyage.trip.company_id
+        seat = item.siege.numero
+        origin = destination = 0
+    if voyage is None or not str(seat).isdigit():
+        return None
+    return sign_ticket(
+        company_id,
+        source=source,
+        ticket_id=item.pk,
+        voyage_id=voyage.id,
+        seat=int(seat),
+        expires_at=token_expiry(voyage.date),
+        origin_sequence=origin,
+        destination_sequence=destination,
+    )
+
+
+class UsedTicketBitmap:
+    """Billets déjà embarqués, par voyage, dans la mémoire du processus.
+
+    Un bit par couple (siège, arrêt de montée) : deux billets valides d'un même
+    voyage ne peuvent pas partager ce couple. Le bitmap n'est qu'un cache
+    positif ; un bit absent renvoie toujours vers la base.
+    """
+
+    SLOTS_PER_SEAT = 256
+
+    def __init__(self, max_voyages=1024):
+        self.max_voyages = max_voyages
+        self._voyages = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _position(self, token):
+        return token.seat * self.SLOTS_PER_SEAT + token.origin_sequence
+
+    def is_used(self, token):
+        position = self._position(token)
+        with self._lock:
+            bits = self._voyages.get(token.voyage_id)
+            if bits is None:
+                return False
+            self._voyages.move_to_end(token.voyage_id)
+            index = position >> 3
+            return index < len(bits) and bool(bits[index] & (1 << (position & 7)))
+
+    def mark_used(self, token):
+        position = self._position(token)
+        with self._lock:
+            bits = self._voyages.setdefault(token.voyage_id, bytearray())
+            self._voyages.move_to_end(token.voyage_id)
+            index = position >> 3
+            if index >= len(bits):
+                bits.extend(bytes(index + 1 - len(bits)))
+            bits[index] |= 1 << (position & 7)
+            while len(self._voyages) > self.max_voyages:
+                self._voyages.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._voyages.clear()
+
+
+used_tickets = UsedTicketBitmap()
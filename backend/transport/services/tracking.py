@@ -1,15 +1,19 @@
 import math
 from datetime import datetime, timedelta
 
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
 from django.db import transaction
 from django.utils import timezone
 
-from transport.models import Booking, BusPosition, TripTrackingSession
+from transport.models import Booking, BusPosition, Trip, TripTrackingSession
 
 
 APPROACH_RADIUS_KM = 5
 STOP_REACHED_RADIUS_KM = 2
 STALE_AFTER_SECONDS = 120
+MAX_BATCH_POSITIONS = 500
 
 
 def haversine_km(first, second):
@@ -24,30 +28,31 @@ def haversine_km(first, second):
     return 6371 * 2 * math.atan2(math.sqrt(value), math.sqrt(1 - value))
 
 
-def _agency_coordinate(company_id, city_id):
+def _agency_coordinates(company_id):
+    """Coordonnées de la première agence géolocalisée de la compagnie, par ville."""
     try:
         from guichet.models import Agence
 
-        agency = (
+        agencies = (
             Agence.objects.filter(
                 compagnie_id=company_id,
-                ville_id=city_id,
                 is_active=True,
                 is_deleted=False,
             )
             .exclude(latitude__isnull=True)
             .exclude(longitude__isnull=True)
             .order_by('nom')
-            .first()
+            .values_list('ville_id', 'latitude', 'longitude', 'nom')
         )
+        result = {}
+        for city_id, latitude, longitude, name in agencies:
+            result.setdefault(city_id, ((float(latitude), float(longitude)), name))
+        return result
     except (ImportError, LookupError):
-        agency = None
-    if not agency:
-        return None, None
-    return (float(agency.latitude), float(agency.longitude)), agency.nom
+        return {}
 
 
-def _stop_coordinate(stop):
+def _stop_coordinate(stop, agencies):
     zone = next(
         (
             item
@@ -58,17 +63,18 @@ def _stop_coordinate(stop):
     )
     if zone:
         return (float(zone.latitude), float(zone.longitude)), zone.name
-    return _agency_coordinate(stop.trip.company_id, stop.city_id)
+    return agencies.get(stop.city_id, (None, None))
 
 
-def tracking_stops(scheduled_trip):
-    trip = scheduled_trip.trip
+def _build_route_geometry(trip_id):
+    trip = Trip.objects.select_related('departure_city', 'arrival_city').get(pk=trip_id)
     stops = list(
-        trip.stops.select_related('city', 'trip').prefetch_related('boarding_zones').order_by('sequence')
+        trip.stops.select_related('city').prefetch_related('boarding_zones').order_by('sequence')
     )
+    agencies = _agency_coordinates(trip.company_id)
     result = []
     for stop in stops:
-        coordinate, station_name = _stop_coordinate(stop)
+        coordinate, station_name = _stop_coordinate(stop, agencies)
         result.append({
             'id': str(stop.id),
             'trip_stop_id': stop.id,
@@ -81,7 +87,7 @@ def tracking_stops(scheduled_trip):
 
     present_city_ids = {stop.city_id for stop in stops}
     if trip.departure_city_id not in present_city_ids:
-        coordinate, station_name = _agency_coordinate(trip.company_id, trip.departure_city_id)
+        coordinate, station_name = agencies.get(trip.departure_city_id, (None, None))
         result.insert(0, {
             'id': 'departure',
             'trip_stop_id': None,
@@ -92,7 +98,7 @@ def tracking_stops(scheduled_trip):
             'longitude': coordinate[1] if coordinate else None,
         })
     if trip.arrival_city_id not in present_city_ids:
-        coordinate, station_name = _agency_coordinate(trip.company_id, trip.arrival_city_id)
+        coordinate, station_name = agencies.get(trip.arrival_city_id, (None, None))
         result.append({
             'id': 'arrival',
             'trip_stop_id': None,
@@ -102,9 +108,74 @@ def tracking_stops(scheduled_trip):
             'latitude': coordinate[0] if coordinate else None,
             'longitude': coordinate[1] if coordinate else None,
         })
+
+    geolocated = [
+        index for index, item in enumerate(result)
+        if item['latitude'] is not None and item['longitude'] is not None
+    ]
+    segments = [
+        haversine_km(
+            (result[first]['latitude'], result[first]['longitude']),
+            (result[second]['latitude'], result[second]['longitude']),
+        )
+        for first, second in zip(geolocated, geolocated[1:])
+    ]
+    cumulative = [0.0]
+    for length in segments:
+        cumulative.append(cumulative[-1] + length)
+    return {
+        'stops': result,
+        'geolocated': geolocated,
+        'segments_km': segments,
+        'cumulative_km': cumulative if geolocated else [],
+        'length_km': cumulative[-1],
+    }
+
+
+def _route_cache_key(trip_id):
+    return f'tracking:route:{trip_id}'
+
+
+def route_geometry(trip_id):
+    """Géométrie du trajet, mise en cache : arrêts ordonnés, longueurs des segments et distances cumulées.
+
+    ``geolocated`` liste les indices des arrêts géolocalisés ; ``segments_km``
+    et ``cumulative_km`` suivent cet ordre. Le cache est vidé par les signaux
+    quand un arrêt, une zone d'embarquement ou une agence change ; partagé
+    entre les workers, il l'est pour tous à la fois.
+    """
+    key = _route_cache_key(trip_id)
+    geometry = cache.get(key)
+    if geometry is None:
+        geometry = _build_route_geometry(trip_id)
+        cache.set(key, geometry, settings.TRACKING_ROUTE_CACHE_SECONDS)
+    return geometry
+
+
+def route_geometries(trip_ids):
+    """Géométries de plusieurs trajets en une lecture du cache ; seules les absentes sont construites."""
+    keys = {pk: _route_cache_key(pk) for pk in set(trip_ids)}
+    cached = cache.get_many(list(keys.values()))
+    missing = {}
+    result = {}
+    for pk, key in keys.items():
+        geometry = cached.get(key)
+        if geometry is None:
+            geometry = missing[key] = _build_route_geometry(pk)
+        result[pk] = geometry
+    if missing:
+        cache.set_many(missing, settings.TRACKING_ROUTE_CACHE_SECONDS)
     return result
 
 
+def invalidate_route_geometry(trip_ids):
+    cache.delete_many([_route_cache_key(trip_id) for trip_id in set(trip_ids)])
+
+
+def tracking_stops(scheduled_trip):
+    return route_geometry(scheduled_trip.trip_id)['stops']
+
+
 def _planned_arrival(scheduled_trip):
     trip = scheduled_trip.trip
     departure = datetime.combine(scheduled_trip.date, trip.departure_time)
@@ -114,73 +185,93 @@ def _planned_arrival(scheduled_trip):
     return timezone.make_aware(arrival, timezone.get_current_timezone())
 
 
-def _remaining_distance(current, stops, passed_ids):
+def _remaining_distance(current, geometry, passed_ids):
+    stops = geometry['stops']
     remaining = [
-        item for item in stops
-        if item['id'] not in passed_ids
-        and item['latitude'] is not None
-        and item['longitude'] is not None
+        position for position, index in enumerate(geometry['geolocated'])
+        if stops[index]['id'] not in passed_ids
     ]
     if not remaining:
         return 0.0
-    total = haversine_km(current, (remaining[0]['latitude'], remaining[0]['longitude']))
-    for first, second in zip(remaining, remaining[1:]):
-        total += haversine_km(
-            (first['latitude'], first['longitude']),
-            (second['latitude'], second['longitude']),
-        )
+    first, last = remaining[0], remaining[-1]
+    target = stops[geometry['geolocated'][first]]
+    total = haversine_km(current, (target['latitude'], target['longitude']))
+    total += geometry['cumulative_km'][last] - geometry['cumulative_km'][first]
     return total * 1.12
 
 
-def _mark_reached_stops(current, stops, passed_stop_ids):
+def _mark_reached_stops(trace, stops, passed_stop_ids):
+    """Arrêts passés après la trace ``trace`` (positions dans l'ordre), en un seul parcours.
+
+    Atteindre un arrêt marque aussi tous les arrêts qui le précèdent : seul
+    l'arrêt atteint le plus loin compte, et chaque position ne teste que les
+    arrêts situés au-delà.
+    """
     passed = {str(item) for item in (passed_stop_ids or [])}
     geolocated = [
-        item for item in stops
+        (item['id'], (item['latitude'], item['longitude']))
+        for item in stops
         if item['latitude'] is not None and item['longitude'] is not None
     ]
-    for index, item in enumerate(geolocated):
-        distance = haversine_km(current, (item['latitude'], item['longitude']))
-        if distance <= STOP_REACHED_RADIUS_KM:
-            passed.update(stop['id'] for stop in geolocated[:index + 1])
+    furthest = -1
+    for current in trace:
+        for index in range(len(geolocated) - 1, furthest, -1):
+            if haversine_km(current, geolocated[index][1]) <= STOP_REACHED_RADIUS_KM:
+                furthest = index
+                break
+    passed.update(stop_id for stop_id, _ in geolocated[:furthest + 1])
     return sorted(passed)
 
 
-def _effective_speed(session, scheduled_trip, stops):
+def _effective_speed(session, scheduled_trip, geometry):
     if session and session.speed_kmh is not None and session.speed_kmh >= 5:
         return min(float(session.speed_kmh), 130)
-    geolocated = [
-        (item['latitude'], item['longitude'])
-        for item in stops
-        if item['latitude'] is not None and item['longitude'] is not None
-    ]
-    route_distance = sum(haversine_km(a, b) for a, b in zip(geolocated, geolocated[1:]))
+    route_distance = geometry['length_km']
     if route_distance and scheduled_trip.trip.duration:
         return max(25, min(route_distance / (scheduled_trip.trip.duration / 60), 90))
     return 45
 
 
-def _passenger_alert(user, scheduled_trip, current, stops, passed_ids):
-    if not user or not current:
-        return {'active': False, 'stop_name': None, 'distance_km': None}
-    booking = (
-        Booking.objects.filter(
-            user=user,
-            scheduled_trip=scheduled_trip,
-            status__in=['pending', 'confirmed', 'completed'],
+def _booking_origins_key(scheduled_trip_id):
+    return f'tracking:origins:{scheduled_trip_id}'
+
+
+def booking_origins(scheduled_trip_id):
+    """Arrêt de montée de chaque passager du voyage, ``{user_id: origin_stop_id}``, mis en cache.
+
+    Un passager avec plusieurs billets garde celui réservé en dernier ; le
+    cache, partagé entre les workers, est vidé par les signaux à chaque
+    changement de réservation.
+    """
+    key = _booking_origins_key(scheduled_trip_id)
+    origins = cache.get(key)
+    if origins is None:
+        origins = dict(
+            Booking.objects.filter(
+                scheduled_trip_id=scheduled_trip_id,
+                user__isnull=False,
+                status__in=['pending', 'confirmed', 'completed'],
+            )
+            .order_by('booking_date')
+            .values_list('user_id', 'origin_stop_id')
         )
-        .select_related('origin_stop__city', 'origin_stop__trip')
-        .order_by('-booking_date')
-        .first()
-    )
-    if not booking:
-        return {'active': False, 'stop_name': None, 'distance_km': None}
+        cache.set(key, origins, settings.TRACKING_ROUTE_CACHE_SECONDS)
+    return origins
+
 
+def invalidate_booking_origins(scheduled_trip_ids):
+    cache.delete_many([_booking_origins_key(pk) for pk in set(scheduled_trip_ids) if pk])
+
+
+def passenger_target(user, scheduled_trip_id, stops):
+    """Arrêt où le passager attend le bus, ou ``None`` s'il n'a pas de billet."""
+    origins = booking_origins(scheduled_trip_id)
+    if not user or user.pk not in origins:
+        return None
+    origin_stop_id = origins[user.pk]
     target = None
-    if booking.origin_stop_id:
-        target = next(
-            (item for item in stops if item['trip_stop_id'] == booking.origin_stop_id),
-            None,
-        )
+    if origin_stop_id:
+        target = next((item for item in stops if item['trip_stop_id'] == origin_stop_id), None)
     if not target:
         target = next(
             (
@@ -189,8 +280,14 @@ def _passenger_alert(user, scheduled_trip, current, stops, passed_ids):
             ),
             None,
         )
-    if not target or target['id'] in passed_ids:
-        return {'active': False, 'stop_name': target['station_name'] if target else None, 'distance_km': None}
+    return target
+
+
+def approach_alert(target, current, passed_ids):
+    if not target or not current:
+        return {'active': False, 'stop_name': None, 'distance_km': None}
+    if target['id'] in passed_ids:
+        return {'active': False, 'stop_name': target['station_name'], 'distance_km': None}
 
     distance = haversine_km(current, (target['latitude'], target['longitude']))
     return {
@@ -200,15 +297,16 @@ def _passenger_alert(user, scheduled_trip, current, stops, passed_ids):
     }
 
 
-def serialize_tracking(scheduled_trip, session=None, user=None, include_history=False):
-    stops = tracking_stops(scheduled_trip)
+def _live_state(scheduled_trip, session, geometry):
+    """Position, ETA, retard et statut d'un voyage ; commun au suivi détaillé et à la flotte."""
+    stops = geometry['stops']
     passed_ids = {str(item) for item in (session.passed_stop_ids if session else [])}
     current = None
     if session and session.latitude is not None and session.longitude is not None:
         current = (float(session.latitude), float(session.longitude))
 
-    distance_remaining = _remaining_distance(current, stops, passed_ids) if current else None
-    speed = _effective_speed(session, scheduled_trip, stops) if current else None
+    distance_remaining = _remaining_distance(current, geometry, passed_ids) if current else None
+    speed = _effective_speed(session, scheduled_trip, geometry) if current else None
     eta_minutes = math.ceil((distance_remaining / speed) * 60) if distance_remaining is not None and speed else None
     estimated_arrival = timezone.now() + timedelta(minutes=eta_minutes) if eta_minutes is not None else None
     planned_arrival = _planned_arrival(scheduled_trip)
@@ -245,35 +343,65 @@ def serialize_tracking(scheduled_trip, session=None, user=None, include_history=
             stop_status = 'upcoming'
         serialized_stops.append({**item, 'status': stop_status})
 
+    return {
+        'passed_ids': passed_ids,
+        'current': current,
+        'distance_remaining': distance_remaining,
+        'eta_minutes': eta_minutes,
+        'estimated_arrival': estimated_arrival,
+        'planned_arrival': planned_arrival,
+        'delay_minutes': delay_minutes,
+        'last_position_at': last_position_at,
+        'is_stale': is_stale,
+        'status': tracking_status,
+        'stops': serialized_stops,
+    }
+
+
+def _current_position(session, state):
+    current = state['current']
+    if not current:
+        return None
+    return {
+        'latitude': current[0],
+        'longitude': current[1],
+        'accuracy_m': session.accuracy_m,
+        'speed_kmh': round(float(session.speed_kmh or 0), 1),
+        'heading': session.heading,
+        'recorded_at': state['last_position_at'],
+    }
+
+
+def serialize_tracking(scheduled_trip, session=None, user=None, include_history=False):
+    geometry = route_geometry(scheduled_trip.trip_id)
+    stops = geometry['stops']
+    state = _live_state(scheduled_trip, session, geometry)
+    current, passed_ids = state['current'], state['passed_ids']
+    distance_remaining = state['distance_remaining']
+
     payload = {
         'scheduled_trip_id': scheduled_trip.id,
-        'status': tracking_status,
+        'status': state['status'],
         'is_active': bool(session and session.is_active),
-        'is_stale': is_stale,
+        'is_stale': state['is_stale'],
         'route': {
             'departure_city': scheduled_trip.trip.departure_city.name,
             'arrival_city': scheduled_trip.trip.arrival_city.name,
             'departure_time': scheduled_trip.trip.departure_time,
-            'planned_arrival_at': planned_arrival,
+            'planned_arrival_at': state['planned_arrival'],
         },
-        'current_position': (
-            {
-                'latitude': current[0],
-                'longitude': current[1],
-                'accuracy_m': session.accuracy_m,
-                'speed_kmh': round(float(session.speed_kmh or 0), 1),
-                'heading': session.heading,
-                'recorded_at': last_position_at,
-            }
-            if current else None
-        ),
-        'estimated_arrival_at': estimated_arrival,
-        'eta_minutes': eta_minutes,
-        'delay_minutes': delay_minutes,
+        'current_position': _current_position(session, state),
+        'estimated_arrival_at': state['estimated_arrival'],
+        'eta_minutes': state['eta_minutes'],
+        'delay_minutes': state['delay_minutes'],
         'distance_remaining_km': round(distance_remaining, 1) if distance_remaining is not None else None,
-        'stops': serialized_stops,
-        'approach_alert': _passenger_alert(user, scheduled_trip, current, stops, passed_ids),
-        'updated_at': last_position_at,
+        'stops': state['stops'],
+        'approach_alert': approach_alert(
+            passenger_target(user, scheduled_trip.id, stops) if current else None,
+            current,
+            passed_ids,
+        ),
+        'updated_at': state['last_position_at'],
         'server_time': timezone.now(),
     }
     if include_history and session:
@@ -289,11 +417,92 @@ def serialize_tracking(scheduled_trip, session=None, user=None, include_history=
             }
             for position in session.positions.all()[:30]
         ]
+        if not payload['history'] and not session.is_active:
+            # Suivi arrêté et compacté : les derniers points de la trajectoire simplifiée.
+            from transport.services.trajectories import session_trajectory
+
+            payload['history'] = [
+                {'id': None, 'accuracy_m': None, 'heading': None, **point}
+                for point in reversed(session_trajectory(session)[-30:])
+            ]
     else:
         payload['history'] = []
     return payload
 
 
+def _next_stop(stops):
+    next_stop = next((item for item in stops if item['status'] == 'next'), None)
+    if not next_stop:
+        return None
+    return {key: next_stop[key] for key in ('id', 'station_name', 'city_name', 'latitude', 'longitude')}
+
+
+def _fleet_vehicle(session, geometry):
+    scheduled_trip = session.scheduled_trip
+    trip = scheduled_trip.trip
+    state = _live_state(scheduled_trip, session, geometry)
+    stops = state['stops']
+    distance_remaining = state['distance_remaining']
+    return {
+        'scheduled_trip_id': scheduled_trip.id,
+        'date': scheduled_trip.date,
+        'company_id': trip.company_id,
+        'company_name': trip.company.name,
+        'departure_city': trip.departure_city.name,
+        'arrival_city': trip.arrival_city.name,
+        'departure_time': trip.departure_time,
+        'status': state['status'],
+        'is_stale': state['is_stale'],
+        'current_position': _current_position(session, state),
+        'estimated_arrival_at': state['estimated_arrival'],
+        'eta_minutes': state['eta_minutes'],
+        'delay_minutes': state['delay_minutes'],
+        'distance_remaining_km': round(distance_remaining, 1) if distance_remaining is not None else None,
+        'next_stop': _next_stop(stops),
+        'updated_at': state['last_position_at'],
+    }
+
+
+def fleet_snapshot(company_id=None):
+    """Suivis actifs d'une compagnie (ou de toute la plateforme) : une requête, géométries en cache."""
+    related = [
+        'scheduled_trip__trip__company',
+        'scheduled_trip__trip__departure_city',
+        'scheduled_trip__trip__arrival_city',
+    ]
+    if apps.is_installed('ai_assistant'):
+        related.append('scheduled_trip__intelligence_snapshot')
+    sessions = (
+        TripTrackingSession.objects
+        .filter(is_active=True)
+        .select_related(*related)
+        .order_by('scheduled_trip__date', 'scheduled_trip__trip__departure_time', 'pk')
+    )
+    if company_id is not None:
+        sessions = sessions.filter(scheduled_trip__trip__company_id=company_id)
+    sessions = list(sessions)
+    geometries = route_geometries(session.scheduled_trip.trip_id for session in sessions)
+    return [_fleet_vehicle(session, geometries[session.scheduled_trip.trip_id]) for session in sessions]
+
+
+def tracking_delta(payload):
+    """Part commune à tous les abonnés d'un état ``serialize_tracking`` : position, ETA, prochain arrêt, retard."""
+    stops = payload['stops']
+    return {
+        'scheduled_trip_id': payload['scheduled_trip_id'],
+        'status': payload['status'],
+        'is_active': payload['is_active'],
+        'current_position': payload['current_position'],
+        'estimated_arrival_at': payload['estimated_arrival_at'],
+        'eta_minutes': payload['eta_minutes'],
+        'delay_minutes': payload['delay_minutes'],
+        'distance_remaining_km': payload['distance_remaining_km'],
+        'next_stop': _next_stop(stops),
+        'passed_stop_ids': [item['id'] for item in stops if item['status'] == 'passed'],
+        'updated_at': payload['updated_at'],
+    }
+
+
 @transaction.atomic
 def start_tracking(scheduled_trip, driver):
     session, _ = TripTrackingSession.objects.select_for_update().get_or_create(
@@ -310,38 +519,64 @@ def start_tracking(scheduled_trip, driver):
     return session
 
 
+def _speed_kmh(fix):
+    speed_mps = fix.get('speed_mps')
+    return max(float(speed_mps) * 3.6, 0) if speed_mps is not None else None
+
+
 @transaction.atomic
-def record_position(scheduled_trip, driver, data):
+def record_positions(scheduled_trip, driver, fixes):
+    """Enregistre une rafale de positions GPS (ordonnées) en une seule écriture.
+
+    Les positions sont insérées d'un bloc, les arrêts passés calculés sur
+    toute la trace et la session mise à jour une fois, avec la position la
+    plus récente si elle l'est aussi pour la session.
+    """
     session = TripTrackingSession.objects.select_for_update().get(scheduled_trip=scheduled_trip)
     if not session.is_active:
         raise ValueError('Le suivi GPS doit être démarré avant l’envoi des positions.')
+    if not fixes:
+        return session, []
 
-    recorded_at = data.get('recorded_at') or timezone.now()
-    speed_mps = data.get('speed_mps')
-    speed_kmh = max(float(speed_mps) * 3.6, 0) if speed_mps is not None else None
-    current = (float(data['latitude']), float(data['longitude']))
-    stops = tracking_stops(scheduled_trip)
-    passed_ids = _mark_reached_stops(current, stops, session.passed_stop_ids)
-
-    position = BusPosition.objects.create(
-        session=session,
-        latitude=data['latitude'],
-        longitude=data['longitude'],
-        accuracy_m=data.get('accuracy_m'),
-        speed_kmh=speed_kmh,
-        heading=data.get('heading'),
-        recorded_at=recorded_at,
+    now = timezone.now()
+    fixes = sorted(
+        ({**fix, 'recorded_at': fix.get('recorded_at') or now} for fix in fixes),
+        key=lambda fix: fix['recorded_at'],
     )
+    positions = BusPosition.objects.bulk_create([
+        BusPosition(
+            session=session,
+            latitude=fix['latitude'],
+            longitude=fix['longitude'],
+            accuracy_m=fix.get('accuracy_m'),
+            speed_kmh=_speed_kmh(fix),
+            heading=fix.get('heading'),
+            recorded_at=fix['recorded_at'],
+        )
+        for fix in fixes
+    ])
+
+    trace = [(float(fix['latitude']), float(fix['longitude'])) for fix in fixes]
     session.driver = driver
-    session.latitude = data['latitude']
-    session.longitude = data['longitude']
-    session.accuracy_m = data.get('accuracy_m')
-    session.speed_kmh = speed_kmh
-    session.heading = data.get('heading')
-    session.passed_stop_ids = passed_ids
-    session.last_position_at = recorded_at
-    session.save()
-    return session, position
+    session.passed_stop_ids = _mark_reached_stops(trace, tracking_stops(scheduled_trip), session.passed_stop_ids)
+    update_fields = ['driver', 'passed_stop_ids', 'updated_at']
+    latest = fixes[-1]
+    # Une rafale en retard ne remplace pas une position plus récente.
+    if session.last_position_at is None or latest['recorded_at'] >= session.last_position_at:
+        session.latitude = latest['latitude']
+        session.longitude = latest['longitude']
+        session.accuracy_m = latest.get('accuracy_m')
+        session.speed_kmh = _speed_kmh(latest)
+        session.heading = latest.get('heading')
+        session.last_position_at = latest['recorded_at']
+        update_fields += ['latitude', 'longitude', 'accuracy_m', 'speed_kmh', 'heading', 'last_position_at']
+    session.save(update_fields=update_fields)
+    return session, positions
+
+
+def record_position(scheduled_trip, driver, data):
+    session, positions = record_positions(scheduled_trip, driver, [data])
+    return session, positions[0]
 
 
 @transaction.atomic
@@ -0,0 +1,100 @@
+"""Diffusion en direct du suivi GPS, un canal par voyage programmé.
+
+À chaque position (ou démarrage, arrêt du suivi), l'état du voyage est
+calculé une seule fois côté chauffeur ; sa part commune (``tracking_delta``)
+est publiée dans le cache sous un numéro d'événement croissant. Les
+abonnés ne relisent que cette entrée : aucun recalcul des arrêts, de l'ETA
+ou de requête de réservation par passager. Dans le processus qui publie,
+les abonnés sont réveillés aussitôt ; ailleurs, ils relisent le cache toutes
+les ``POLL_SECONDS``. Le cache doit donc être commun aux workers (base de
+données ou Redis, check ``transport.E001``) : un cache local à chaque
+processus garderait les publications dans le worker du chauffeur.
+
+Un marqueur global (``fleet_seq``) change à chaque publication : la carte
+de flotte ne relit les canaux de ses voyages que lorsqu'il a bougé. C'est
+un horodatage en nanosecondes plutôt qu'un compteur : l'incrément du cache
+en base n'est pas atomique, deux workers publiant ensemble écriraient la
+même valeur et la carte manquerait la seconde publication.
+"""
+import threading
+import time
+
+from django.core.cache import cache
+
+from transport.services.tracking import tracking_delta
+
+POLL_SECONDS = 1
+RETENTION_SECONDS = 24 * 3600
+FLEET_SEQ_KEY = 'tracking:fleet:seq'
+
+_published = threading.Condition()
+
+
+def _channel_key(scheduled_trip_id):
+    return f'tracking:live:{scheduled_trip_id}'
+
+
+def _next(key):
+    cache.add(key, 0, RETENTION_SECONDS)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, RETENTION_SECONDS)
+        return 1
+
+
+def publish(payload):
+    """Publie l'état commun d'un ``serialize_tracking`` ; retourne le numéro d'événement."""
+    key = _channel_key(payload['scheduled_trip_id'])
+    seq = _next(f'{key}:seq')
+    cache.set(key, {'seq': seq, 'delta': tracking_delta(payload)}, RETENTION_SECONDS)
+    cache.set(FLEET_SEQ_KEY, time.time_ns(), RETENTION_SECONDS)
+    with _published:
+        _published.notify_all()
+    return seq
+
+
+def latest(scheduled_trip_id):
+    """Dernier événement publié, ``{'seq', 'delta'}``, ou ``None``."""
+    return cache.get(_channel_key(scheduled_trip_id))
+
+
+def latest_many(scheduled_trip_ids):
+    """Derniers événements de plusieurs voyages, en une lecture du cache : ``{id: message}``."""
+    keys = {_channel_key(pk): pk for pk in scheduled_trip_ids}
+    return {keys[key]: message for key, message in cache.get_many(list(keys)).items()}
+
+
+def fleet_seq():
+    return cache.get(FLEET_SEQ_KEY, 0)
+
+
+def _wait(read, timeout):
+    deadline = time.monotonic() + timeout
+    while True:
+        value = read()
+        if value is not None:
+            return value
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        with _published:
+            _published.wait(min(remaining, POLL_SECONDS))
+
+
+def wait_for(scheduled_trip_id, seen_seq, timeout):
+    """Attend un événement différent de ``seen_seq`` ; ``None`` à l'échéance."""
+    def read():
+        message = latest(scheduled_trip_id)
+        return message if message and message['seq'] != seen_seq else None
+
+    return _wait(read, timeout)
+
+
+def wait_for_fleet(seen_seq, timeout):
+    """Attend que le marqueur de flotte diffère de ``seen_seq`` ; retourne sa valeur ou ``None``."""
+    def read():
+        seq = fleet_seq()
+        return seq if seq != seen_seq else None
+
+    return _wait(read, timeout)
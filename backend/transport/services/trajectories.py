@@ -0,0 +1,247 @@
+"""Compactage des trajectoires GPS des suivis terminés.
+
+Un suivi actif garde toutes ses ``BusPosition``. Une fois arrêté depuis
+``TRACKING_COMPACT_AFTER_MINUTES``, sa trace est simplifiée par
+Douglas–Peucker : un point est conservé s'il s'écarte de plus de
+``TRACKING_SIMPLIFY_TOLERANCE_M`` du segment simplifié, ou si sa vitesse
+s'écarte de plus de ``TRACKING_SIMPLIFY_SPEED_KMH`` de la vitesse
+interpolée (arrêts, ralentissements). Les points retenus sont stockés en
+polyline encodée dans une ``CompactTrajectory`` et les positions brutes
+sont supprimées.
+
+Le rejeu (``session_trajectory``) et les statistiques lisent la forme
+compacte, complétée des positions brutes d'un suivi redémarré.
+"""
+import math
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from transport.models import BusPosition, CompactTrajectory, TripTrackingSession
+from transport.services.tracking import haversine_km
+
+COORDINATE_FACTOR = 1e5
+SPEED_FACTOR = 10
+
+
+def _encode_columns(rows):
+    """Encoded polyline généralisée : chaque colonne entière est codée en différences."""
+    chunks = []
+    previous = None
+    for row in rows:
+        previous = previous or [0] * len(row)
+        for column, value in enumerate(row):
+            delta = value - previous[column]
+            previous[column] = value
+            encoded = ~(delta << 1) if delta < 0 else delta << 1
+            while encoded >= 0x20:
+                chunks.append(chr((0x20 | (encoded & 0x1f)) + 63))
+                encoded >>= 5
+            chunks.append(chr(encoded + 63))
+    return ''.join(chunks)
+
+
+def _decode_columns(text, width):
+    rows = []
+    previous = [0] * width
+    index = 0
+    while index < len(text):
+        row = []
+        for column in range(width):
+            result = shift = 0
+            while True:
+                byte = ord(text[index]) - 63
+                index += 1
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            previous[column] += ~(result >> 1) if result & 1 else result >> 1
+            row.append(previous[column])
+        rows.append(row)
+    return rows
+
+
+def encode_polyline(coordinates):
+    return _encode_columns(
+        [round(latitude * COORDINATE_FACTOR), round(longitude * COORDINATE_FACTOR)]
+        for latitude, longitude in coordinates
+    )
+
+
+def decode_polyline(text):
+    return [(latitude / COORDINATE_FACTOR, longitude / COORDINATE_FACTOR) for latitude, longitude in _decode_columns(text, 2)]
+
+
+def simplify(points, tolerance_m, speed_tolerance_kmh):
+    """Indices conservés de ``points`` ``(lat, lon, secondes, vitesse | None)`` ; extrémités toujours gardées."""
+    if len(points) <= 2:
+        return list(range(len(points)))
+
+    # Projection plane locale (m) : suffisante à l'échelle d'un trajet.
+    origin_lat, origin_lon = points[0][0], points[0][1]
+    cos_lat = math.cos(math.radians(origin_lat))
+    xy = [
+        ((lon - origin_lon) * 111320 * cos_lat, (lat - origin_lat) * 110540)
+        for lat, lon, _, _ in points
+    ]
+
+    def deviation(first, last, index):
+        (x1, y1), (x2, y2), (x, y) = xy[first], xy[last], xy[index]
+        dx, dy = x2 - x1, y2 - y1
+        length = dx * dx + dy * dy
+        ratio = max(0.0, min(1.0, ((x - x1) * dx + (y - y1) * dy) / length)) if length else 0.0
+        score = math.hypot(x - (x1 + ratio * dx), y - (y1 + ratio * dy)) / tolerance_m
+        speeds = points[first][3], points[last][3], points[index][3]
+        if None not in speeds:
+            span = points[last][2] - points[first][2]
+            elapsed = (points[index][2] - points[first][2]) / span if span else 0.5
+            expected = speeds[0] + (speeds[1] - speeds[0]) * elapsed
+            score = max(score, abs(speeds[2] - expected) / speed_tolerance_kmh)
+        return score
+
+    kept = {0, len(points) - 1}
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        worst, worst_score = None, 1.0
+        for index in range(first + 1, last):
+            score = deviation(first, last, index)
+            if score > worst_score:
+                worst, worst_score = index, score
+        if worst is not None:
+            kept.add(worst)
+            stack.extend([(first, worst), (worst, last)])
+    return sorted(kept)
+
+
+def trajectory_points(trajectory):
+    """Points d'une ``CompactTrajectory``, du plus ancien au plus récent."""
+    coordinates = decode_polyline(trajectory.polyline)
+    times = _decode_columns(trajectory.times, 1)
+    speeds = _decode_columns(trajectory.speeds, 1)
+    return [
+        {
+            'latitude': latitude,
+            'longitude': longitude,
+            'recorded_at': trajectory.started_at + timedelta(seconds=seconds),
+            'speed_kmh': speed / SPEED_FACTOR if speed >= 0 else None,
+        }
+        for (latitude, longitude), (seconds,), (speed,) in zip(coordinates, times, speeds)
+    ]
+
+
+def _raw_points(session, newest_first=False):
+    positions = session.positions.order_by(
+        *(('-recorded_at', '-id') if newest_first else ('recorded_at', 'id'))
+    )
+    return [
+        {
+            'latitude': float(latitude),
+            'longitude': float(longitude),
+            'recorded_at': recorded_at,
+            'speed_kmh': speed_kmh,
+        }
+        for latitude, longitude, recorded_at, speed_kmh in positions.values_list(
+            'latitude', 'longitude', 'recorded_at', 'speed_kmh',
+        )
+    ]
+
+
+def session_trajectory(session):
+    """Trajectoire complète pour le rejeu : forme compacte puis positions brutes récentes."""
+    trajectory = CompactTrajectory.objects.filter(session=session).first()
+    compact = trajectory_points(trajectory) if trajectory else []
+    return compact + _raw_points(session)
+
+
+def trajectory_summary(points):
+    distance = sum(
+        haversine_km((first['latitude'], first['longitude']), (second['latitude'], second['longitude']))
+        for first, second in zip(points, points[1:])
+    )
+    speeds = [point['speed_kmh'] for point in points if point['speed_kmh'] is not None]
+    hours = (points[-1]['recorded_at'] - points[0]['recorded_at']).total_seconds() / 3600 if points else 0
+    return {
+        'distance_km': round(distance, 3),
+        'max_speed_kmh': max(speeds) if speeds else None,
+        'avg_speed_kmh': round(distance / hours, 1) if hours else None,
+    }
+
+
+@transaction.atomic
+def compact_session(session_id):
+    """Compacte les positions brutes d'un suivi arrêté ; retourne la trajectoire ou ``None``."""
+    session = TripTrackingSession.objects.select_for_update().get(pk=session_id)
+    if session.is_active:
+        return None
+    raw = _raw_points(session)
+    trajectory = CompactTrajectory.objects.filter(session=session).first()
+    if not raw:
+        return trajectory
+
+    # Suivi redémarré après un premier compactage : on repart de la forme compacte.
+    points = (trajectory_points(trajectory) if trajectory else []) + raw
+    points.sort(key=lambda point: point['recorded_at'])
+    started_at = points[0]['recorded_at']
+    kept = [
+        points[index]
+        for index in simplify(
+            [
+                (
+                    point['latitude'],
+                    point['longitude'],
+                    (point['recorded_at'] - started_at).total_seconds(),
+                    point['speed_kmh'],
+                )
+                for point in points
+            ],
+            settings.TRACKING_SIMPLIFY_TOLERANCE_M,
+            settings.TRACKING_SIMPLIFY_SPEED_KMH,
+        )
+    ]
+    trajectory, _ = CompactTrajectory.objects.update_or_create(session=session, defaults={
+        'polyline': encode_polyline((point['latitude'], point['longitude']) for point in kept),
+        'times': _encode_columns(
+            [round((point['recorded_at'] - started_at).total_seconds())] for point in kept
+        ),
+        'speeds': _encode_columns(
+            [round(point['speed_kmh'] * SPEED_FACTOR) if point['speed_kmh'] is not None else -1]
+            for point in kept
+        ),
+        'started_at': started_at,
+        'ended_at': points[-1]['recorded_at'],
+        'raw_points': len(raw) + (trajectory.raw_points if trajectory else 0),
+        'points': len(kept),
+        **trajectory_summary(points),
+    })
+    # Session verrouillée et inactive : aucune position ne peut arriver entre-temps.
+    session.positions.all().delete()
+    return trajectory
+
+
+def compact_trajectories(limit=100, min_age_minutes=None):
+    """Compacte les suivis arrêtés depuis assez longtemps ; retourne les compteurs."""
+    cutoff = timezone.now() - timedelta(
+        minutes=settings.TRACKING_COMPACT_AFTER_MINUTES if min_age_minutes is None else min_age_minutes,
+    )
+    session_ids = list(
+        TripTrackingSession.objects
+        .filter(is_active=False, stopped_at__lt=cutoff)
+        .filter(Exists(BusPosition.objects.filter(session=OuterRef('pk'))))
+        .order_by('stopped_at')
+        .values_list('pk', flat=True)[:limit]
+    )
+    metrics = {'sessions': 0, 'positions_supprimees': 0, 'points_conserves': 0}
+    for session_id in session_ids:
+        raw_before = BusPosition.objects.filter(session_id=session_id).count()
+        trajectory = compact_session(session_id)
+        if trajectory is None:
+            continue
+        metrics['sessions'] += 1
+        metrics['positions_supprimees'] += raw_before
+        metrics['points_conserves'] += trajectory.points
+    return metrics
@@ -0,0 +1,258 @@
+"""Migration des passagers d'un voyage annulé ou immobilisé.
+
+Tous les billets actifs du voyage (réservations application, paiements
+mobiles, ventes guichet) sont placés sur un voyage de remplacement de la même
+compagnie et du même trajet, segment par segment (``assign_target_seats``).
+Les écritures sont groupées : un ``bulk_update`` par canal, les sièges créés
+ou repris en lot, les notifications et le journal d'audit en ``bulk_create``.
+
+Si le voyage d'origine est annulé, les billets qu'aucun siège n'a pu accueillir
+sont remboursés (ou annulés s'ils n'étaient pas payés) et les reversements de
+la compagnie sont régularisés. Les billets transférés restent dans la même
+compagnie : leur reversement ne change pas.
+"""
+from django.db import transaction
+from rest_framework.exceptions import NotFound, ValidationError
+
+from guichet.models import VenteGuichet
+from transport.models import (
+    Booking,
+    Notification,
+    Reservation,
+    ScheduledTrip,
+)
+from transport.models.audit import log_action
+from transport.ticketing import (
+    TICKET_MODELS,
+    actor_role,
+    assign_target_seats,
+    bulk_log_actions,
+    close_tickets,
+    lock_target_voyage,
+    lock_tickets,
+    move_tickets,
+    recalculate_voyage_availability,
+    release_unused_seats,
+    sync_ticket_index,
+    target_stops,
+    ticket_refusal,
+    ticket_seat,
+    ticket_status,
+)
+
+
+def _active_ticket_keys(voyage):
+    keys = [
+        ('booking', str(pk))
+        for pk in Booking.objects.filter(
+            scheduled_trip=voyage,
+            status__in=['pending', 'confirmed'],
+        ).values_list('pk', flat=True)
+    ]
+    keys.extend(
+        ('mobile', str(pk))
+        for pk in Reservation.objects.filter(
+            voyage=voyage,
+            statut_paiement__in=[Reservation.STATUT_EN_ATTENTE, Reservation.STATUT_PAYE],
+        ).values_list('pk', flat=True)
+    )
+    keys.extend(
+        ('guichet', str(pk))
+        for pk in VenteGuichet.objects.filter(voyage=voyage, statut='valide').values_list('pk', flat=True)
+    )
+    return keys
+
+
+def _is_paid(item, source):
+    if source == 'booking':
+        return any(payment.status == 'completed' for payment in item.payments.all())
+    if source == 'mobile':
+        return item.statut_paiement == Reservation.STATUT_PAYE
+    return True
+
+
+def _passenger(item, source):
+    if source == 'booking':
+        return item.passenger_name, item.passenger_phone
+    return item.client_nom, item.client_telephone
+
+
+def _report_line(item, source, **extra):
+    name, phone = _passenger(item, source)
+    return {
+        'source': source,
+        'id': str(item.pk),
+        'client_name': name,
+        'client_phone': phone,
+        'seat': str(ticket_seat(item, source)),
+        **extra,
+    }
+
+
+def _voyage_label(voyage):
+    return f'{voyage.trip.departure_city.name} → {voyage.trip.arrival_city.name} du {voyage.date:%d/%m/%Y} à {voyage.trip.departure_time:%H:%M}'
+
+
+def _notifications(moved, closed, assigned, target, source_voyage):
+    notifications = []
+    for source, item in moved:
+        if source == 'booking' and item.user_id:
+            notifications.append(Notification(
+                user_id=item.user_id,
+                type='trip_update',
+                title='Changement de voyage',
+                message=(
+                    f'Votre voyage {_voyage_label(source_voyage)} est remplacé par le voyage '
+                    f'{_voyage_label(target)}. Nouveau siège : {assigned[(source, str(item.pk))]}.'
+                ),
+            ))
+    for source, item in closed:
+        if source == 'booking' and item.user_id:
+            notifications.append(Notification(
+                user_id=item.user_id,
+                type='trip_update',
+                title='Voyage annulé',
+                message=(
+                    f'Votre voyage {_voyage_label(source_voyage)} est annulé et aucun siège '
+                    'n\'était disponible sur le voyage de remplacement. Votre billet est remboursé.'
+                ),
+            ))
+    Notification.objects.bulk_create(notifications, batch_size=500)
+    return len(notifications)
+
+
+@transaction.atomic
+def migrate_voyage_passengers(
+    *,
+    user,
+    company,
+    voyage_id,
+    target_voyage_id,
+    reason='',
+    cancel_source=True,
+    dry_run=False,
+    ip_address=None,
+):
+    """Transfère les passagers de ``voyage_id`` vers ``target_voyage_id`` et retourne le rapport.
+
+    ``dry_run`` calcule le plan de placement sans rien écrire.
+    """
+    reason = str(reason or '').strip()
+    if not reason:
+        raise ValidationError({'detail': 'Une justification est obligatoire.'})
+    voyage = (
+        ScheduledTrip.objects.select_for_update(of=('self',))
+        .select_related('trip__departure_city', 'trip__arrival_city')
+        .filter(pk=voyage_id, trip__company=company)
+        .first()
+    )
+    if voyage is None:
+        raise NotFound('Voyage introuvable pour cette compagnie.')
+    target = lock_target_voyage(company, target_voyage_id)
+    if target.pk == voyage.pk:
+        raise ValidationError({'detail': 'Le voyage cible doit être différent du voyage d\'origine.'})
+    stops = target_stops(target)
+
+    loaded = lock_tickets(company, _active_ticket_keys(voyage))
+    eligible, unplaced = [], []
+    for (source, pk), item in loaded.items():
+        refusal = ticket_refusal(item, source, 'move', target, stops)
+        if refusal:
+            unplaced.append(((source, item), refusal))
+        else:
+            eligible.append((source, item))
+    assigned = assign_target_seats(target, eligible, stops)
+    moved = [entry for entry in eligible if (entry[0], str(entry[1].pk)) in assigned]
+    unplaced.extend(
+        (entry, 'Plus de siège libre sur le voyage cible.')
+        for entry in eligible
+        if (entry[0], str(entry[1].pk)) not in assigned
+    )
+
+    report = {
+        'voyage_id': voyage.pk,
+        'target_voyage_id': target.pk,
+        'dry_run': bool(dry_run),
+        'source_cancelled': bool(cancel_source) and not dry_run,
+        'placed': [
+            _report_line(item, source, new_seat=str(assigned[(source, str(item.pk))]))
+            for source, item in moved
+        ],
+        'unplaced': [
+            _report_line(item, source, detail=detail)
+            for (source, item), detail in unplaced
+        ],
+        'refunded': 0,
+        'notifications': 0,
+        'payout_adjustment': 0,
+    }
+    if dry_run:
+        return report
+
+    old_values = {
+        (source, str(item.pk)): {
+            'status': ticket_status(item, source),
+            'voyage_id': voyage.pk,
+            'seat': str(ticket_seat(item, source)),
+        }
+        for (source, _), item in loaded.items()
+    }
+    released = {ticket_seat(item, source) for source, item in moved}
+    if moved:
+        move_tickets(user, target, moved, assigned, stops)
+
+    closed = []
+    if cancel_source:
+        # Les billets déjà embarqués restent tels quels.
+        closed = [entry for entry, _ in unplaced if not ticket_refusal(entry[1], entry[0], 'cancel')]
+        paid = [entry for entry in closed if _is_paid(entry[1], entry[0])]
+        report['payout_adjustment'] = close_tickets(user, 'refund', paid)
+        close_tickets(user, 'cancel', [entry for entry in closed if entry not in paid])
+        released.update(ticket_seat(item, source) for source, item in closed)
+        ScheduledTrip.objects.filter(pk=voyage.pk).update(is_active=False)
+        report['refunded'] = len(paid)
+
+    release_unused_seats(voyage, released)
+    recalculate_voyage_availability(voyage)
+    recalculate_voyage_availability(target)
+    touched = moved + closed
+    for source in TICKET_MODELS:
+        sync_ticket_index(source, [item.pk for item_source, item in touched if item_source == source])
+    report['notifications'] = _notifications(moved, closed, assigned, target, voyage)
+
+    bulk_log_actions(
+        user,
+        'UPDATE',
+        [
+            (
+                item,
+                old_values[(source, str(item.pk))],
+                {
+                    'operation': 'migrate' if (source, str(item.pk)) in assigned else 'refund',
+                    'bulk': True,
+                    'reason': reason,
+                    'actor_role': actor_role(user),
+                    'source': source,
+                    'voyage_id': target.pk if (source, str(item.pk)) in assigned else voyage.pk,
+                    'seat': str(assigned.get((source, str(item.pk)), ticket_seat(item, source))),
+                },
+            )
+            for source, item in touched
+        ],
+        ip_address=ip_address,
+    )
+    log_action(
+        user=user,
+        action='UPDATE',
+        instance=voyage,
+        new_values={
+            'operation': 'migrate_voyage',
+            'reason': reason,
+            'target_voyage_id': target.pk,
+            'placed': len(moved),
+            'unplaced': len(unplaced),
+            'source_cancelled': bool(cancel_source),
+        },
+        ip_address=ip_address,
+    )
+    return report
@@ -1,8 +1,26 @@
-from django.db.models.signals import post_save
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
-from .models import Booking
+from guichet.models import Agence, ControlePassager, VenteGuichet
+
+from .models import (
+    AuditLog,
+    BoardingZone,
+    Booking,
+    City,
+    Company,
+    Payment,
+    Reservation,
+    SearchGram,
+    TicketIndex,
+    Trip,
+    TripStop,
+)
 from .services.loyalty import award_completed_trip_xp, reverse_completed_trip_xp
+from .services.search import audit_search_document, index_documents, remove_documents
+from .services.tracking import invalidate_booking_origins, invalidate_route_geometry
+from .ticketing import reindex_tickets, remove_ticket_index, sync_ticket_index
 
 
 @receiver(post_save, sender=Booking)
@@ -11,3 +29,122 @@ def synchronize_booking_xp(sender, instance, **kwargs):
         award_completed_trip_xp(instance)
     elif instance.status == 'cancelled':
         reverse_completed_trip_xp(instance)
+
+
+TICKET_SOURCES = {
+    Booking: 'booking',
+    Reservation: 'mobile',
+    VenteGuichet: 'guichet',
+}
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_save, sender=Reservation)
+@receiver(post_save, sender=VenteGuichet)
+def index_ticket(sender, instance, **kwargs):
+    sync_ticket_index(TICKET_SOURCES[sender], [instance.pk])
+
+
+@receiver(post_delete, sender=Booking)
+@receiver(post_delete, sender=Reservation)
+@receiver(post_delete, sender=VenteGuichet)
+def unindex_ticket(sender, instance, **kwargs):
+    remove_ticket_index(TICKET_SOURCES[sender], instance.pk)
+
+
+# Champs recopiés dans les lignes d'index des billets.
+INDEXED_FIELDS = {
+    Trip: ('departure_time', 'departure_city_id', 'arrival_city_id'),
+    City: ('name',),
+}
+
+
+@receiver(pre_save, sender=Trip)
+@receiver(pre_save, sender=City)
+def remember_indexed_fields(sender, instance, **kwargs):
+    instance._indexed_values = (
+        sender.objects.filter(pk=instance.pk).values_list(*INDEXED_FIELDS[sender]).first() if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=Trip)
+@receiver(post_save, sender=City)
+def reindex_route_tickets(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_indexed_values', None)
+    if created or previous is None or previous == tuple(getattr(instance, field) for field in INDEXED_FIELDS[sender]):
+        return
+    if sender is Trip:
+        tickets = TicketIndex.objects.filter(voyage__trip=instance)
+    else:
+        tickets = TicketIndex.objects.filter(
+            Q(voyage__trip__departure_city=instance) | Q(voyage__trip__arrival_city=instance)
+        )
+    reindex_tickets(tickets)
+
+
+@receiver(post_save, sender=Company)
+def reindex_company_tickets(sender, instance, created, **kwargs):
+    if not created:
+        reindex_tickets(TicketIndex.objects.filter(company=instance).exclude(company_name=instance.name))
+
+
+@receiver(post_save, sender=Payment)
+def index_booking_payment(sender, instance, **kwargs):
+    sync_ticket_index('booking', [instance.booking_id])
+
+
+@receiver(post_save, sender=ControlePassager)
+@receiver(post_delete, sender=ControlePassager)
+def index_controlled_ticket(sender, instance, **kwargs):
+    sync_ticket_index('booking', [instance.booking_id])
+    sync_ticket_index('mobile', [instance.reservation_id])
+    sync_ticket_index('guichet', [instance.vente_id])
+
+
+@receiver(pre_save, sender=AuditLog)
+def prepare_audit_search(sender, instance, **kwargs):
+    instance.search_text = audit_search_document(instance)
+
+
+@receiver(post_save, sender=AuditLog)
+def index_audit_search(sender, instance, **kwargs):
+    index_documents(SearchGram.SCOPE_AUDIT, {instance.pk: instance.search_text})
+
+
+@receiver(post_delete, sender=AuditLog)
+def unindex_audit_search(sender, instance, **kwargs):
+    remove_documents(SearchGram.SCOPE_AUDIT, [instance.pk])
+
+
+@receiver(post_save, sender=Trip)
+@receiver(post_save, sender=TripStop)
+@receiver(post_delete, sender=TripStop)
+def invalidate_trip_route(sender, instance, **kwargs):
+    invalidate_route_geometry([instance.pk if sender is Trip else instance.trip_id])
+
+
+@receiver(post_save, sender=BoardingZone)
+@receiver(post_delete, sender=BoardingZone)
+def invalidate_boarding_zone_route(sender, instance, **kwargs):
+    invalidate_route_geometry(TripStop.objects.filter(pk=instance.trip_stop_id).values_list('trip_id', flat=True))
+
+
+@receiver(post_save, sender=Agence)
+@receiver(post_delete, sender=Agence)
+def invalidate_agency_routes(sender, instance, **kwargs):
+    invalidate_route_geometry(Trip.objects.filter(company_id=instance.compagnie_id).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=City)
+def invalidate_city_routes(sender, instance, **kwargs):
+    invalidate_route_geometry(
+        Trip.objects.filter(
+            Q(departure_city=instance) | Q(arrival_city=instance) | Q(stops__city=instance)
+        ).values_list('pk', flat=True)
+    )
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def invalidate_trip_passengers(sender, instance, **kwargs):
+    invalidate_booking_origins([instance.scheduled_trip_id])
@@ -0,0 +1,159 @@
+from datetime import time, timedelta
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .models import (
+    City,
+    Company,
+    CompteCagnotte,
+    HistoriqueReversement,
+    MouvementCagnotte,
+    Reservation,
+    ReversementCompagnie,
+    ScheduledTrip,
+    Trip,
+)
+from .qospay_stub import QosPayStub
+from .services import reservation_service
+from .services.company_payouts import (
+    _ouvrir_reversement,
+    reconcilier_cagnottes,
+    regler_fenetre,
+    verifier_reversements_en_cours,
+)
+from .services.qospay_client import qospay_client
+from .ticketing import close_tickets, perform_ticket_action
+
+
+@override_settings(QOSPAY_CLIENT_ID='CLIENT', REVERSEMENT_FENETRE_MINUTES=60)
+class CompanyPayoutBatchTest(TestCase):
+    def setUp(self):
+        self.stub = QosPayStub().start()
+        self.addCleanup(self.stub.stop)
+        self.addCleanup(qospay_client.close)
+        settings_override = override_settings(QOSPAY_BASE_URL=self.stub.url)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.company = Company.objects.create(
+            name='Payout Transport',
+            description='Test',
+            address='Lomé',
+            phone='90000500',
+            email='payout@example.com',
+        )
+        trip = Trip.objects.create(
+            company=self.company,
+            departure_city=City.objects.create(name='Lomé Payout', region='Maritime'),
+            arrival_city=City.objects.create(name='Dapaong Payout', region='Savanes'),
+            departure_time=time(6, 0),
+            arrival_time=time(14, 0),
+            price=8000,
+            duration=480,
+            bus_type='VIP',
+            capacity=10,
+        )
+        self.voyage = ScheduledTrip.objects.get(trip=trip, date=timezone.localdate() + timedelta(days=1))
+
+    def pay(self, seat, montant=8000):
+        siege_id = reservation_service.reserver_siege_temporaire(self.voyage.id, seat)
+        reservation = reservation_service.creer_reservation(
+            self.voyage.id, siege_id, 'Yao Mensah', '+22890555666', montant, Reservation.OPERATEUR_TMONEY,
+        )
+        return reservation_service.confirmer_paiement(reservation.reference_evex, None)
+
+    def test_paid_reservations_are_paid_out_once_per_window(self):
+        paid = [self.pay(seat) for seat in (1, 2, 3)]
+        reservation_service.confirmer_paiement(paid[0].reference_evex, None)
+        self.assertEqual(MouvementCagnotte.objects.filter(type=MouvementCagnotte.TYPE_CREDIT).count(), 3)
+        self.assertFalse(CompteCagnotte.objects.exists())
+
+        fin = timezone.now() + timedelta(seconds=1)
+        [reversement] = regler_fenetre(fin)
+        self.assertEqual(regler_fenetre(fin), [])
+        self.assertEqual(self.stub.requests, 1)
+        self.assertEqual(
+            (reversement.statut, reversement.montant, reversement.nombre_mouvements),
+            (ReversementCompagnie.STATUT_EFFECTUE, 24000, 3),
+        )
+        cagnotte = CompteCagnotte.objects.get(compagnie=self.company)
+        self.assertEqual((cagnotte.solde_a_reverser, cagnotte.total_reverse), (0, 24000))
+        self.assertEqual(Reservation.objects.filter(reversement_effectue=True).count(), 3)
+        self.assertEqual(HistoriqueReversement.objects.filter(montant=8000).count(), 3)
+
+        late = self.pay(4, montant=6000)
+        self.stub.deposit_code = '02'
+        [refused] = regler_fenetre(timezone.now() + timedelta(seconds=2))
+        self.assertEqual(refused.statut, ReversementCompagnie.STATUT_ECHOUE)
+        self.assertFalse(MouvementCagnotte.objects.get(reservation=late).reversement_id)
+        self.stub.deposit_code = '00'
+        [retried] = regler_fenetre(timezone.now() + timedelta(seconds=3))
+        self.assertEqual((retried.statut, retried.montant), (ReversementCompagnie.STATUT_EFFECTUE, 6000))
+
+    def test_unanswered_deposit_stays_open_until_its_status_is_known(self):
+        paid = self.pay(1)
+        self.stub.fail_next = 1
+        [pending] = regler_fenetre(timezone.now() + timedelta(seconds=1))
+
+        self.assertEqual(pending.statut, ReversementCompagnie.STATUT_EN_COURS)
+        self.assertEqual(MouvementCagnotte.objects.get(reservation=paid).reversement_id, pending.pk)
+        # Les écritures restent rattachées : la fenêtre suivante ne les reverse pas une seconde fois.
+        self.assertEqual(regler_fenetre(timezone.now() + timedelta(seconds=2)), [])
+        self.assertEqual(verifier_reversements_en_cours(age_minutes=60), [])
+
+        self.stub.statuses[pending.reference] = '01'
+        self.assertEqual(verifier_reversements_en_cours(age_minutes=0), [])
+        self.stub.statuses[pending.reference] = '00'
+        [settled] = verifier_reversements_en_cours(age_minutes=0)
+        self.assertEqual(settled.statut, ReversementCompagnie.STATUT_EFFECTUE)
+        self.assertTrue(Reservation.objects.get(pk=paid.pk).reversement_effectue)
+        self.assertEqual(CompteCagnotte.objects.get(compagnie=self.company).solde_a_reverser, 0)
+
+    def test_refused_deposit_found_by_verification_releases_its_entries(self):
+        paid = self.pay(1)
+        reversement = _ouvrir_reversement(self.company.pk, timezone.now() + timedelta(seconds=1))
+        # Worker interrompu avant l'appel : QoS ne connaît pas le transref.
+        self.stub.statuses[reversement.reference] = '02'
+
+        [released] = verifier_reversements_en_cours(age_minutes=0)
+
+        self.assertEqual(released.statut, ReversementCompagnie.STATUT_ECHOUE)
+        self.assertIsNone(MouvementCagnotte.objects.get(reservation=paid).reversement_id)
+        [retried] = regler_fenetre(timezone.now() + timedelta(seconds=2))
+        self.assertEqual(retried.statut, ReversementCompagnie.STATUT_EFFECTUE)
+
+    def test_every_refund_path_debits_the_company(self):
+        single, bulk, kept = self.pay(1), self.pay(2, montant=6000), self.pay(3)
+        admin = User.objects.create_superuser('payout-admin', password='secret')
+
+        perform_ticket_action(
+            user=admin, company=self.company, source='mobile', pk=single.pk, action='refund', reason='Annulation',
+        )
+        self.assertEqual(close_tickets(admin, 'refund', [('mobile', bulk)]), 6000)
+
+        regularisations = MouvementCagnotte.objects.filter(type=MouvementCagnotte.TYPE_REGULARISATION)
+        self.assertEqual(
+            sorted(regularisations.values_list('reservation_id', 'montant')),
+            sorted([(single.pk, -8000), (bulk.pk, -6000)]),
+        )
+        self.assertEqual(CompteCagnotte.objects.get(compagnie=self.company).solde_a_reverser, kept.montant_reverse_compagnie)
+        [reversement] = regler_fenetre(timezone.now() + timedelta(seconds=1))
+        self.assertEqual(reversement.montant, 8000)
+
+    def test_reconciliation_reports_and_credits_missing_reservations(self):
+        self.pay(1)
+        siege_id = reservation_service.reserver_siege_temporaire(self.voyage.id, 2)
+        missing = reservation_service.creer_reservation(
+            self.voyage.id, siege_id, 'Abla Dogbe', '+22890777888', 5000, Reservation.OPERATEUR_FLOOZ,
+        )
+        Reservation.objects.filter(pk=missing.pk).update(statut_paiement=Reservation.STATUT_PAYE)
+
+        [ecart] = reconcilier_cagnottes()
+        self.assertEqual(
+            (ecart['attendu'], ecart['grand_livre'], ecart['ecart'], ecart['manquantes']),
+            (13000, 8000, 5000, 1),
+        )
+        reconcilier_cagnottes(corriger=True)
+        self.assertEqual(reconcilier_cagnottes(), [])
@@ -0,0 +1,168 @@
+from datetime import time, timedelta
+
+import requests
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from payments.services import QosPayService
+
+from .checks import shared_cache_check
+from .models import City, Company, Reservation, ScheduledTrip, Siege, Trip
+from .qospay_stub import QosPayStub
+from .services import operator_health, qos_service
+from .services.qospay_client import qospay_client
+
+
+@override_settings(
+    QOSPAY_CLIENT_ID='CLIENT',
+    QOSPAY_CLIENT_ID_MOOV='MOOV',
+    QOSPAY_API_PASSWORD_MOOV='secret',
+    QOSPAY_REQUEST_URL_MOOV='/QosicBridge/tg/v1/requestpayment',
+    QOSPAY_STATUS_URL_MOOV='/QosicBridge/tg/v1/gettransactionstatus',
+    QOSPAY_STATUS_RETRIES=0,
+    QOSPAY_BREAKER_MIN_CALLS=3,
+    QOSPAY_BREAKER_ERROR_RATE=0.5,
+    QOSPAY_BREAKER_OPEN_SECONDS=30,
+    PAYMENT_WORKERS=0,
+)
+class OperatorCircuitBreakerTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.stub = QosPayStub().start()
+        self.addCleanup(self.stub.stop)
+        self.addCleanup(qospay_client.close)
+        settings_override = override_settings(QOSPAY_BASE_URL=self.stub.url)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+
+    def trip_moov(self):
+        self.stub.fail_next = 3
+        for _ in range(3):
+            result = qos_service.pay_moov_togo('90000000', 1000, 'Ama', 'Koffi')
+            self.assertFalse(result['succes'])
+
+    def test_failures_open_the_breaker_and_calls_fail_fast(self):
+        self.trip_moov()
+        requests_before = self.stub.requests
+
+        result = qos_service.pay_moov_togo('90000000', 1000, 'Ama', 'Koffi')
+
+        self.assertFalse(result['succes'])
+        self.assertIn('T-Money', result['erreur'])
+        self.assertEqual(self.stub.requests, requests_before)
+        with self.assertRaises(operator_health.OperatorUnavailable) as raised:
+            QosPayService().get_transaction_status('EVEX-1', 'FLOOZ')
+        self.assertEqual(raised.exception.alternative, 'TOGOCEL')
+        self.assertGreater(raised.exception.reessayer_dans, 0)
+        # L'autre opérateur n'est pas touché.
+        qos_service.pay_togocel('90000000', 1000, 'Ama', 'Koffi')
+        self.assertEqual(self.stub.requests, requests_before + 1)
+
+    def test_business_refusals_do_not_open_the_breaker(self):
+        self.stub.status_code = '02'
+        for _ in range(5):
+            self.assertEqual(qos_service.check_transaction_status('EVEX-1', 'FLOOZ')['statut'], 'failed')
+
+        operator_health.verifier_disponible('FLOOZ')
+
+    def test_client_errors_do_not_open_the_breaker(self):
+        def rejected():
+            response = requests.Response()
+            response.status_code = 400
+            raise requests.HTTPError(response=response)
+
+        for _ in range(5):
+            with self.assertRaises(requests.HTTPError):
+                operator_health.executer('MOOV', rejected)
+
+        operator_health.verifier_disponible('MOOV')
+
+    def test_half_open_probe_closes_the_breaker_on_success(self):
+        self.trip_moov()
+        with override_settings(QOSPAY_BREAKER_OPEN_SECONDS=0):
+            operator_health.autoriser('MOOV')
+            # Une seule sonde à la fois.
+            with self.assertRaises(operator_health.OperatorUnavailable):
+                operator_health.autoriser('MOOV')
+            operator_health.enregistrer('MOOV', True, 0.05)
+
+        operator_health.verifier_disponible('MOOV')
+        self.assertEqual(qos_service.check_transaction_status('EVEX-1', 'FLOOZ')['statut'], 'success')
+
+    def test_failed_probe_reopens_the_breaker(self):
+        self.trip_moov()
+        with override_settings(QOSPAY_BREAKER_OPEN_SECONDS=0):
+            self.stub.fail_next = 1
+            self.assertFalse(qos_service.check_transaction_status('EVEX-1', 'FLOOZ')['succes'])
+
+        with self.assertRaises(operator_health.OperatorUnavailable):
+            operator_health.verifier_disponible('MOOV')
+
+    def test_initiation_is_refused_before_holding_the_seat(self):
+        company = Company.objects.create(
+            name='Breaker Transport',
+            description='Test',
+            address='Lomé',
+            phone='90000500',
+            email='breaker@example.com',
+        )
+        trip = Trip.objects.create(
+            company=company,
+            departure_city=City.objects.create(name='Lomé Breaker', region='Maritime'),
+            arrival_city=City.objects.create(name='Kpalimé Breaker', region='Plateaux'),
+            departure_time=time(9, 0),
+            arrival_time=time(11, 0),
+            price=3000,
+            duration=120,
+            bus_type='Standard',
+            capacity=20,
+        )
+        voyage = ScheduledTrip.objects.get(trip=trip, date=timezone.localdate() + timedelta(days=2))
+        self.trip_moov()
+
+        response = self.client.post(reverse('payment-initier'), {
+            'voyage_id': voyage.id,
+            'numero_siege': 4,
+            'client_nom': 'Ama Koffi',
+            'client_telephone': '+22890333444',
+            'montant_billet': 3000,
+            'operateur': 'FLOOZ',
+        }, format='json')
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.data['erreur'], 'OPERATEUR_INDISPONIBLE')
+        self.assertEqual(response.data['alternative'], 'TMONEY')
+        self.assertTrue(response.has_header('Retry-After'))
+        self.assertFalse(Reservation.objects.exists())
+        self.assertFalse(Siege.objects.filter(voyage=voyage).exclude(statut=Siege.STATUT_LIBRE).exists())
+
+    def test_health_endpoint_suggests_the_other_operator(self):
+        self.trip_moov()
+
+        response = self.client.get(reverse('payment-operateurs'))
+
+        self.assertEqual(response.status_code, 200)
+        sante = {item['operateur']: item for item in response.data['operateurs']}
+        self.assertEqual(sante['MOOV']['etat'], 'indisponible')
+        self.assertFalse(sante['MOOV']['disponible'])
+        self.assertEqual(sante['MOOV']['alternative'], 'TOGOCEL')
+        self.assertEqual(sante['MOOV']['taux_erreur'], 1.0)
+        self.assertEqual(sante['TOGOCEL']['etat'], 'ok')
+        self.assertIsNone(sante['TOGOCEL']['alternative'])
+
+
+class SharedCacheCheckTest(TestCase):
+    def test_process_local_cache_is_refused_outside_debug(self):
+        local = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with override_settings(DEBUG=False, CACHES=local):
+            self.assertEqual([error.id for error in shared_cache_check(None)], ['transport.E001'])
+        with override_settings(DEBUG=True, CACHES=local):
+            self.assertEqual(shared_cache_check(None), [])
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'evex_cache'}}
+        with override_settings(DEBUG=False, CACHES=shared):
+            self.assertEqual(shared_cache_check(None), [])
@@ -0,0 +1,105 @@
+from datetime import time, timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from .models import City, Company, PaymentJob, Reservation, ScheduledTrip, Siege, Trip
+from .qospay_stub import QosPayStub
+from .services.payment_jobs import run_pending_jobs
+from .services.qospay_client import qospay_client
+
+
+@override_settings(PAYMENT_WORKERS=0, QOSPAY_CLIENT_ID='CLIENT', QOSPAY_STATUS_RETRIES=0)
+class AsyncPaymentInitiationTest(TestCase):
+    def setUp(self):
+        self.stub = QosPayStub().start()
+        self.addCleanup(self.stub.stop)
+        self.addCleanup(qospay_client.close)
+        settings_override = override_settings(QOSPAY_BASE_URL=self.stub.url)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        company = Company.objects.create(
+            name='Async Pay Transport',
+            description='Test',
+            address='Lomé',
+            phone='90000200',
+            email='async-pay@example.com',
+        )
+        trip = Trip.objects.create(
+            company=company,
+            departure_city=City.objects.create(name='Lomé Pay', region='Maritime'),
+            arrival_city=City.objects.create(name='Kara Pay', region='Kara'),
+            departure_time=time(8, 0),
+            arrival_time=time(12, 0),
+            price=5000,
+            duration=240,
+            bus_type='Standard',
+            capacity=10,
+        )
+        self.voyage = ScheduledTrip.objects.get(trip=trip, date=timezone.localdate() + timedelta(days=1))
+        self.client = APIClient()
+
+    def initiate(self, seat):
+        return self.client.post('/api/payment/initier/', {
+            'voyage_id': self.voyage.id,
+            'numero_siege': seat,
+            'client_nom': 'Afi Mensah',
+            'client_telephone': '+22890123456',
+            'montant_billet': 5000,
+            'operateur': Reservation.OPERATEUR_FLOOZ,
+        }, format='json')
+
+    def test_initiation_returns_immediately_and_worker_calls_operator(self):
+        response = self.initiate(3)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        reference = response.data['reference_evex']
+        self.assertTrue(response.data['statut_url'].endswith(f'/api/payment/verifier/{reference}/'))
+        self.assertEqual(self.stub.requests, 0)
+
+        pending = self.client.get(f'/api/payment/verifier/{reference}/')
+        self.assertEqual((pending.data['statut'], pending.data['initiation']), ('en_attente', 'pending'))
+
+        self.assertEqual(run_pending_jobs(workers=1), 1)
+        self.assertEqual(run_pending_jobs(workers=1), 0)
+        self.assertEqual(self.stub.requests, 1)
+        reservation = Reservation.objects.get(reference_evex=reference)
+        self.assertEqual(reservation.transaction_id_qos, reference)
+        sent = self.client.get(f'/api/payment/verifier/{reference}/')
+        self.assertEqual((sent.data['statut'], sent.data['initiation'], sent.data['termine']), ('en_attente', 'done', False))
+
+        Reservation.objects.filter(pk=reservation.pk).update(statut_paiement=Reservation.STATUT_PAYE)
+        stream = self.client.get(f'/api/payment/verifier/{reference}/flux/', HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(stream['Content-Type'], 'text/event-stream')
+        body = b''.join(stream.streaming_content).decode()
+        self.assertIn('event: statut', body)
+        self.assertIn('"paye": true', body)
+
+    def test_refused_initiation_fails_reservation_and_frees_seat(self):
+        reference = self.initiate(4).data['reference_evex']
+        self.stub.request_code = '02'
+        run_pending_jobs(workers=1)
+
+        job = PaymentJob.objects.get(reservation__reference_evex=reference)
+        self.assertEqual(job.status, PaymentJob.STATUS_FAILED)
+        self.assertTrue(job.last_error)
+        checked = self.client.get(f'/api/payment/verifier/{reference}/')
+        self.assertEqual((checked.data['statut'], checked.data['termine']), ('echoue', True))
+        self.assertEqual(Siege.objects.get(voyage=self.voyage, numero=4).statut, Siege.STATUT_LIBRE)
+
+        missing = self.client.get('/api/payment/verifier/EVEX-INCONNU/flux/', HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(missing.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_unanswered_initiation_keeps_reservation_pending(self):
+        reference = self.initiate(5).data['reference_evex']
+        self.stub.fail_next = 1
+        run_pending_jobs(workers=1)
+
+        job = PaymentJob.objects.get(reservation__reference_evex=reference)
+        self.assertEqual(job.status, PaymentJob.STATUS_DONE)
+        self.assertTrue(job.last_error)
+        checked = self.client.get(f'/api/payment/verifier/{reference}/')
+        self.assertEqual((checked.data['statut'], checked.data['termine']), ('en_attente', False))
+        self.assertNotEqual(Siege.objects.get(voyage=self.voyage, numero=5).statut, Siege.STATUT_LIBRE)
@@ -0,0 +1,86 @@
+import time as clock
+from datetime import time, timedelta
+
+import requests
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from .models import City, Company, Reservation, ScheduledTrip, Trip
+from .qospay_stub import QosPayStub
+from .services import reservation_service
+from .services.payment_loadtest import percentiles, seat_violations
+
+
+PAYMENT_PATH = '/QosicBridge/tg/v1/requestpayment'
+STATUS_PATH = '/QosicBridge/tg/v1/gettransactionstatus'
+
+
+class QosPaySimulatorTest(SimpleTestCase):
+    def test_accepted_payment_resolves_and_calls_back_after_delay(self):
+        with QosPayStub() as receiver, QosPayStub(
+            callback_url=f'{receiver.url}/api/payment/webhook/',
+            callback_delay=0.05,
+            success_rate=0.0,
+        ) as simulator:
+            accepted = requests.post(f'{simulator.url}{PAYMENT_PATH}', json={'transref': 'EVEX-SIM-1'}, timeout=5)
+            self.assertEqual(accepted.json()['responsecode'], '01')
+            status = requests.post(f'{simulator.url}{STATUS_PATH}', json={'transref': 'EVEX-SIM-1'}, timeout=5)
+            self.assertEqual(status.json()['responsecode'], '01')
+
+            deadline = clock.monotonic() + 5
+            while simulator.callbacks < 1 and clock.monotonic() < deadline:
+                clock.sleep(0.01)
+            self.assertEqual((simulator.callbacks, receiver.requests), (1, 1))
+            status = requests.post(f'{simulator.url}{STATUS_PATH}', json={'transref': 'EVEX-SIM-1'}, timeout=5)
+            self.assertEqual(status.json()['responsecode'], '02')
+
+    def test_failure_rate_answers_503(self):
+        with QosPayStub(failure_rate=1.0) as simulator:
+            response = requests.post(f'{simulator.url}{STATUS_PATH}', json={'transref': 'EVEX-SIM-2'}, timeout=5)
+        self.assertEqual(response.status_code, 503)
+
+    def test_percentiles_use_nearest_rank(self):
+        self.assertEqual(percentiles(range(1, 101)), {'p50': 50, 'p95': 95, 'p99': 99})
+        self.assertEqual(percentiles([]), {'p50': None, 'p95': None, 'p99': None})
+
+
+class SeatConsistencyTest(TestCase):
+    def test_double_sale_and_blocked_seat_are_reported(self):
+        company = Company.objects.create(
+            name='Load Transport',
+            description='Test',
+            address='Lomé',
+            phone='90000600',
+            email='load@example.com',
+        )
+        trip = Trip.objects.create(
+            company=company,
+            departure_city=City.objects.create(name='Lomé Load', region='Maritime'),
+            arrival_city=City.objects.create(name='Kpalimé Load', region='Plateaux'),
+            departure_time=time(10, 0),
+            arrival_time=time(12, 0),
+            price=2500,
+            duration=120,
+            bus_type='Standard',
+            capacity=10,
+        )
+        voyage = ScheduledTrip.objects.get(trip=trip, date=timezone.localdate() + timedelta(days=1))
+
+        def reserve(seat):
+            siege_id = reservation_service.reserver_siege_temporaire(voyage.id, seat)
+            return reservation_service.creer_reservation(
+                voyage.id, siege_id, 'Client Charge', '+22890000600', 2500, Reservation.OPERATEUR_FLOOZ,
+            )
+
+        paid = reserve(1)
+        reservation_service.confirmer_paiement(paid.reference_evex, None)
+        self.assertEqual(seat_violations(voyage.id), [])
+
+        duplicate = reserve(2)
+        Reservation.objects.filter(pk=duplicate.pk).update(siege=paid.siege, statut_paiement=Reservation.STATUT_PAYE)
+        blocked = reserve(3)
+        Reservation.objects.filter(pk=blocked.pk).update(statut_paiement=Reservation.STATUT_ECHOUE)
+
+        violations = seat_violations(voyage.id)
+        self.assertIn({'type': 'vendu_plusieurs_fois', 'siege': 1, 'reservations': 2}, violations)
+        self.assertIn({'type': 'siege_bloque', 'siege': 3}, violations)
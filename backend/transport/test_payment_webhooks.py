@@ -0,0 +1,113 @@
+from datetime import time, timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from payments.models import Transaction
+
+from .models import City, Company, PaymentWebhook, Reservation, ScheduledTrip, Siege, Trip
+from .services import reservation_service
+from .services.payment_webhooks import drain_webhooks
+
+
+@override_settings(PAYMENT_WORKERS=0)
+class PaymentWebhookInboxTest(TestCase):
+    def setUp(self):
+        company = Company.objects.create(
+            name='Webhook Transport',
+            description='Test',
+            address='Lomé',
+            phone='90000300',
+            email='webhook@example.com',
+        )
+        trip = Trip.objects.create(
+            company=company,
+            departure_city=City.objects.create(name='Lomé Hook', region='Maritime'),
+            arrival_city=City.objects.create(name='Sokodé Hook', region='Centrale'),
+            departure_time=time(7, 0),
+            arrival_time=time(11, 0),
+            price=4000,
+            duration=240,
+            bus_type='Standard',
+            capacity=10,
+        )
+        self.voyage = ScheduledTrip.objects.get(trip=trip, date=timezone.localdate() + timedelta(days=1))
+        self.client = APIClient()
+
+    def reserve(self, seat):
+        siege_id = reservation_service.reserver_siege_temporaire(self.voyage.id, seat)
+        return reservation_service.creer_reservation(
+            self.voyage.id, siege_id, 'Kossi Agbo', '+22890111222', 4000, Reservation.OPERATEUR_FLOOZ,
+        )
+
+    def callback(self, reference, qos_status):
+        return self.client.post('/api/payment/webhook/', {
+            'reference': reference,
+            'status': qos_status,
+            'transactionId': f'QOS-{reference}',
+        }, format='json')
+
+    def test_callbacks_are_stored_once_and_applied_in_order(self):
+        reservation = self.reserve(2)
+        for qos_status in ('SUCCESS', 'success', 'FAILED'):
+            response = self.callback(reservation.reference_evex, qos_status)
+            self.assertEqual(response.data, {'received': True})
+        self.assertEqual(PaymentWebhook.objects.count(), 2)
+        reservation.refresh_from_db()
+        self.assertEqual(reservation.statut_paiement, Reservation.STATUT_EN_ATTENTE)
+
+        self.assertEqual(drain_webhooks(), 2)
+        self.assertEqual(drain_webhooks(), 0)
+        reservation.refresh_from_db()
+        self.assertEqual(reservation.statut_paiement, Reservation.STATUT_PAYE)
+        self.assertEqual(reservation.transaction_id_qos, f'QOS-{reservation.reference_evex}')
+        self.assertEqual(Siege.objects.get(pk=reservation.siege_id).statut, Siege.STATUT_OCCUPE)
+        self.assertEqual(
+            list(PaymentWebhook.objects.order_by('received_at').values_list('provider_status', 'status')),
+            [('SUCCESS', PaymentWebhook.STATUS_DONE), ('FAILED', PaymentWebhook.STATUS_IGNORED)],
+        )
+
+        failed = self.reserve(3)
+        self.callback(failed.reference_evex, 'EXPIRED')
+        unknown = self.callback('EVEX-INCONNUE', 'SUCCESS')
+        self.assertEqual(unknown.status_code, 404)
+        self.assertFalse(PaymentWebhook.objects.filter(transref='EVEX-INCONNUE').exists())
+        self.assertEqual(drain_webhooks(), 1)
+        failed.refresh_from_db()
+        self.assertEqual(failed.statut_paiement, Reservation.STATUT_ECHOUE)
+        self.assertEqual(Siege.objects.get(pk=failed.siege_id).statut, Siege.STATUT_LIBRE)
+
+        # Un succès tardif ne ressuscite pas la réservation échouée.
+        self.callback(failed.reference_evex, 'SUCCESS')
+        self.assertEqual(drain_webhooks(), 1)
+        failed.refresh_from_db()
+        self.assertEqual(failed.statut_paiement, Reservation.STATUT_ECHOUE)
+        self.assertEqual(Siege.objects.get(pk=failed.siege_id).statut, Siege.STATUT_LIBRE)
+        late = PaymentWebhook.objects.get(transref=failed.reference_evex, provider_status='SUCCESS')
+        self.assertEqual(late.status, PaymentWebhook.STATUS_REVIEW)
+        self.assertIn('remboursement', late.last_error)
+
+    def test_qospay_transaction_status_is_final_once_set(self):
+        Transaction.objects.create(
+            transref='EVEX-TX-1', method=Transaction.METHOD_MOOV, phone='90111222',
+            amount=4300, firstname='', lastname='',
+        )
+        for code in ('00', '00', '02'):
+            response = self.client.post('/api/payments/webhook/', {'transref': 'EVEX-TX-1', 'responsecode': code}, format='json')
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(Transaction.objects.get(transref='EVEX-TX-1').status, Transaction.STATUS_PENDING)
+
+        drain_webhooks()
+        transaction = Transaction.objects.get(transref='EVEX-TX-1')
+        self.assertEqual((transaction.status, transaction.qos_response_code), (Transaction.STATUS_SUCCESS, '00'))
+        self.assertEqual(
+            PaymentWebhook.objects.get(provider_status='02').status,
+            PaymentWebhook.STATUS_IGNORED,
+        )
+
+    def test_qospay_callback_for_unknown_transaction_is_not_stored(self):
+        response = self.client.post('/api/payments/webhook/', {'transref': 'EVEX-INCONNU', 'responsecode': '00'}, format='json')
+
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(PaymentWebhook.objects.filter(transref='EVEX-INCONNU').exists())
@@ -1,12 +1,14 @@
 from datetime import timedelta
+from io import StringIO
 
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from .models import Booking, City, Company, PlatformConfiguration, ScheduledTrip, Trip
+from .models import AuditLog, Booking, City, Company, PlatformConfiguration, ScheduledTrip, SearchGram, Trip
 
 
 class PlatformAdminApiTest(TestCase):
@@ -144,7 +146,63 @@ class PlatformAdminApiTest(TestCase):
         )
 
         self.assertEqual(list_response.status_code, status.HTTP_200_OK)
-        self.assertIn(str(booking.id), [item['id'] for item in list_response.data])
+        self.assertIn(str(booking.id), [item['id'] for item in list_response.data['tickets']])
         self.assertEqual(mutation_response.status_code, status.HTTP_404_NOT_FOUND)
         booking.refresh_from_db()
         self.assertEqual(booking.status, 'confirmed')
+
+    def test_ticket_and_audit_search_fold_accents_and_phone_formats(self):
+        for index, (name, phone) in enumerate([
+            ('Kossi Agbéko', '+228 90 12 34 56'),
+            ('Afi Mensah', '91765432'),
+        ]):
+            Booking.objects.create(
+                trip=self.trip,
+                scheduled_trip=self.voyage,
+                passenger_name=name,
+                passenger_email=f'search{index}@example.com',
+                passenger_phone=phone,
+                seat_number=str(index + 1),
+                status='confirmed',
+                payment_method='cash',
+                total_price=self.trip.price,
+            )
+
+        def search(query):
+            response = self.client.get('/api/platform-admin/tickets/', {'q': query})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return [item['client_name'] for item in response.data['tickets']]
+
+        self.assertEqual(search('agbeko'), ['Kossi Agbéko'])
+        self.assertEqual(search('AGBÉK kos'), ['Kossi Agbéko'])
+        self.assertEqual(search('90 12 34'), ['Kossi Agbéko'])
+        self.assertEqual(search('22891765432'), ['Afi Mensah'])
+        self.assertEqual(search('mensah kossi'), [])
+        self.assertEqual(len(search('admin test lome')), 2)
+
+        self.client.patch(
+            f'/api/platform-admin/companies/{self.company.id}/status/',
+            {'is_active': False, 'reason': 'Contrôle'},
+            format='json',
+        )
+        audit = self.client.get('/api/platform-admin/audit/', {'q': 'compagnie api'})
+        self.assertEqual(audit.status_code, status.HTTP_200_OK)
+        self.assertEqual({item['model'] for item in audit.data}, {'Company'})
+        self.assertEqual(
+            self.client.get('/api/platform-admin/audit/', {'q': 'introuvable'}).data,
+            [],
+        )
+
+        SearchGram.objects.all().delete()
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(search('agbeko'), ['Kossi Agbéko'])
+        self.assertEqual(
+            len(self.client.get('/api/platform-admin/audit/', {'q': 'compagnie api'}).data),
+            len(audit.data),
+        )
+
+        AuditLog.objects.filter(model_name='Company').delete()
+        self.assertFalse(SearchGram.objects.filter(
+            scope=SearchGram.SCOPE_AUDIT,
+            object_id__in=[item['id'] for item in audit.data],
+        ).exists())
@@ -0,0 +1,67 @@
+from django.test import SimpleTestCase, override_settings
+
+from .qospay_stub import QosPayStub
+from .services import qos_service
+from .services.qospay_client import QosPayClient, qospay_client, redact
+
+
+STATUS_PATH = '/QosicBridge/tg/v1/gettransactionstatus'
+PAYMENT_PATH = '/QosicBridge/tg/v1/requestpayment'
+
+
+@override_settings(QOSPAY_STATUS_RETRIES=2, QOSPAY_CONNECT_TIMEOUT=1, QOSPAY_STATUS_DEADLINE=5)
+class QosPayClientTest(SimpleTestCase):
+    def setUp(self):
+        self.stub = QosPayStub().start()
+        self.addCleanup(self.stub.stop)
+        self.client_http = QosPayClient(pool_size=2)
+        self.addCleanup(self.client_http.close)
+
+    def test_calls_reuse_one_keep_alive_connection(self):
+        for index in range(5):
+            response = self.client_http.post(
+                f'{self.stub.url}{STATUS_PATH}',
+                {'transref': f'EVEX-{index}'},
+                auth=('user', 'secret'),
+            )
+            self.assertEqual(response.json()['transref'], f'EVEX-{index}')
+        self.assertEqual((self.stub.requests, self.stub.connections), (5, 1))
+
+    def test_only_idempotent_calls_are_retried(self):
+        self.stub.fail_next = 1
+        status_response = self.client_http.post(
+            f'{self.stub.url}{STATUS_PATH}',
+            {'transref': 'EVEX-STATUS'},
+            auth=('user', 'secret'),
+            idempotent=True,
+        )
+        self.assertEqual((status_response.status_code, self.stub.requests), (200, 2))
+
+        self.stub.fail_next = 1
+        payment_response = self.client_http.post(
+            f'{self.stub.url}{PAYMENT_PATH}',
+            {'transref': 'EVEX-PAY'},
+            auth=('user', 'secret'),
+        )
+        self.assertEqual((payment_response.status_code, self.stub.requests), (503, 3))
+
+    def test_status_check_goes_through_shared_client(self):
+        self.addCleanup(qospay_client.close)
+        with override_settings(QOSPAY_BASE_URL=self.stub.url, QOSPAY_CLIENT_ID='CLIENT'):
+            self.stub.fail_next = 1
+            result = qos_service.check_transaction_status('EVEX-1')
+            qos_service.check_transaction_status('EVEX-2')
+        self.assertEqual((result['statut'], result['responsecode']), ('success', '00'))
+        self.assertEqual((self.stub.requests, self.stub.connections), (3, 1))
+
+    def test_redact_masks_phone_numbers_and_identifiers(self):
+        redacted = redact({
+            'msisdn': '90123456',
+            'clientid': 'EVEXCLIENT',
+            'amount': '5300',
+            'raw': 'Echec pour 22890123456',
+        })
+        self.assertEqual(redacted['msisdn'], '******56')
+        self.assertEqual(redacted['clientid'], '********NT')
+        self.assertEqual(redacted['amount'], '5300')
+        self.assertEqual(redacted['raw'], 'Echec pour *********56')
@@ -0,0 +1,98 @@
+from datetime import time, timedelta
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from payments.models import Transaction
+
+from .models import City, Company, PaymentJob, Reservation, ScheduledTrip, Siege, Trip
+from .qospay_stub import QosPayStub
+from .services import reservation_service
+from .services.qospay_client import qospay_client
+from .services.reconciliation import METRICS_CACHE_KEY, reconcilier_paiements
+
+
+@override_settings(
+    QOSPAY_CLIENT_ID='CLIENT',
+    QOSPAY_CLIENT_ID_MOOV='MOOV',
+    QOSPAY_API_PASSWORD_MOOV='secret',
+    QOSPAY_REQUEST_URL_MOOV='/QosicBridge/tg/v1/requestpayment',
+    QOSPAY_STATUS_URL_MOOV='/QosicBridge/tg/v1/gettransactionstatus',
+    QOSPAY_STATUS_RETRIES=0,
+    RECONCILIATION_RATE_PER_OPERATOR=0,
+    # Les workers du balayage écrivent le disjoncteur en parallèle : SQLite
+    # verrouillerait la table du cache, partagée en production.
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class PaymentReconciliationTest(TestCase):
+    def setUp(self):
+        self.stub = QosPayStub(status_code='01').start()
+        self.addCleanup(self.stub.stop)
+        self.addCleanup(qospay_client.close)
+        settings_override = override_settings(QOSPAY_BASE_URL=self.stub.url)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        company = Company.objects.create(
+            name='Reconcile Transport',
+            description='Test',
+            address='Lomé',
+            phone='90000400',
+            email='reconcile@example.com',
+        )
+        trip = Trip.objects.create(
+            company=company,
+            departure_city=City.objects.create(name='Lomé Sweep', region='Maritime'),
+            arrival_city=City.objects.create(name='Atakpamé Sweep', region='Plateaux'),
+            departure_time=time(9, 0),
+            arrival_time=time(11, 0),
+            price=3000,
+            duration=120,
+            bus_type='Standard',
+            capacity=20,
+        )
+        self.voyage = ScheduledTrip.objects.get(trip=trip, date=timezone.localdate() + timedelta(days=2))
+
+    def reserve(self, seat, job_status=PaymentJob.STATUS_DONE):
+        siege_id = reservation_service.reserver_siege_temporaire(self.voyage.id, seat)
+        reservation = reservation_service.creer_reservation(
+            self.voyage.id, siege_id, 'Ama Koffi', '+22890333444', 3000, Reservation.OPERATEUR_FLOOZ,
+        )
+        PaymentJob.objects.create(reservation=reservation, status=job_status)
+        return reservation
+
+    def test_sweeper_resolves_stale_payments_in_pages(self):
+        paid = [self.reserve(seat) for seat in (1, 2, 3)]
+        failed = self.reserve(4)
+        pending = self.reserve(5)
+        queued = self.reserve(6, job_status=PaymentJob.STATUS_PENDING)
+        Transaction.objects.create(
+            transref='EVEX-TX-SWEEP', method=Transaction.METHOD_MOOV, phone='90333444',
+            amount=3300, firstname='', lastname='',
+        )
+        Reservation.objects.update(created_at=timezone.now() - timedelta(minutes=5))
+        Transaction.objects.update(created_at=timezone.now() - timedelta(minutes=5))
+        self.stub.statuses = {item.reference_evex: '00' for item in paid}
+        self.stub.statuses.update({failed.reference_evex: '02', 'EVEX-TX-SWEEP': '00'})
+
+        metrics = reconcilier_paiements(page_size=2, workers=4)
+
+        self.assertEqual(
+            {key: metrics[key] for key in ('examines', 'resolus', 'toujours_en_attente', 'erreurs_operateur')},
+            {'examines': 6, 'resolus': 5, 'toujours_en_attente': 1, 'erreurs_operateur': 0},
+        )
+        self.assertEqual(self.stub.requests, 6)
+        statuts = dict(Reservation.objects.values_list('reference_evex', 'statut_paiement'))
+        self.assertEqual({statuts[item.reference_evex] for item in paid}, {Reservation.STATUT_PAYE})
+        self.assertEqual(statuts[failed.reference_evex], Reservation.STATUT_ECHOUE)
+        self.assertEqual(statuts[pending.reference_evex], Reservation.STATUT_EN_ATTENTE)
+        self.assertEqual(statuts[queued.reference_evex], Reservation.STATUT_EN_ATTENTE)
+        self.assertEqual(Siege.objects.get(pk=paid[0].siege_id).statut, Siege.STATUT_OCCUPE)
+        self.assertEqual(Siege.objects.get(pk=failed.siege_id).statut, Siege.STATUT_LIBRE)
+        self.assertEqual(Transaction.objects.get(transref='EVEX-TX-SWEEP').status, Transaction.STATUS_SUCCESS)
+        self.assertEqual(cache.get(METRICS_CACHE_KEY)['resolus'], 5)
+
+        self.stub.fail_next = 1
+        again = reconcilier_paiements(page_size=2, workers=1)
+        self.assertEqual((again['examines'], again['erreurs_operateur']), (1, 1))
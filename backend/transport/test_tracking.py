@@ -1,11 +1,17 @@
-from datetime import time
+import json
+from datetime import time, timedelta
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from togotrans_api.streaming import open_streams
+
 from .models import (
     BoardingZone,
     Booking,
@@ -17,6 +23,13 @@ from .models import (
     TripStop,
     TripTrackingSession,
 )
+from .services.tracking import booking_origins
+from .ticketing import close_tickets
+
+
+def app_queries(queries):
+    """Requêtes hors table du cache : lire le canal partagé est attendu."""
+    return [query for query in queries.captured_queries if settings.CACHES['default']['LOCATION'] not in query['sql']]
 
 
 class LiveTripTrackingTest(TestCase):
@@ -130,6 +143,12 @@ class LiveTripTrackingTest(TestCase):
     def test_tracking_is_private_and_driver_can_stop_it(self):
         self.authenticate(self.driver)
         self.client.post(f'{self.base_url}/start/', {}, format='json')
+        with CaptureQueriesContext(connection) as queries:
+            started = self.client.get(f'{self.base_url}/')
+        self.assertEqual(started.data['history'], [])
+        self.assertFalse([
+            query['sql'] for query in queries.captured_queries if 'transport_compacttrajectory' in query['sql']
+        ])
 
         self.authenticate(self.stranger)
         forbidden = self.client.get(f'{self.base_url}/')
@@ -161,3 +180,245 @@ class LiveTripTrackingTest(TestCase):
         response = self.client.get('/api/tracking/trips/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data[0]['id'], self.scheduled_trip.id)
+
+    def test_driver_flushes_buffered_positions_in_one_batch(self):
+        self.authenticate(self.driver)
+        self.client.post(f'{self.base_url}/start/', {}, format='json')
+        now = timezone.now()
+        trace = [
+            (6.1725, 1.2314),
+            (6.9000, 1.1800),
+            (7.5265, 1.1269),
+            (7.6000, 1.1300),
+        ]
+        positions = [
+            {
+                'latitude': latitude,
+                'longitude': longitude,
+                'speed_mps': 20,
+                'recorded_at': (now - timedelta(minutes=len(trace) - index)).isoformat(),
+            }
+            for index, (latitude, longitude) in enumerate(trace)
+        ]
+
+        response = self.client.post(f'{self.base_url}/positions/', {'positions': positions}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['accepted'], 4)
+        self.assertEqual(BusPosition.objects.count(), 4)
+        self.assertEqual(response.data['current_position']['latitude'], 7.6)
+        statuses = [item['status'] for item in response.data['stops']]
+        self.assertEqual(statuses, ['passed', 'passed', 'next'])
+
+        # Une rafale plus ancienne complète l'historique sans reculer le bus.
+        late = self.client.post(f'{self.base_url}/positions/', [
+            {'latitude': 6.5, 'longitude': 1.2, 'recorded_at': (now - timedelta(hours=1)).isoformat()},
+        ], format='json')
+        self.assertEqual(late.status_code, status.HTTP_200_OK)
+        self.assertEqual(BusPosition.objects.count(), 5)
+        self.assertEqual(late.data['current_position']['latitude'], 7.6)
+
+    def test_batch_rejects_invalid_fix_without_recording_any(self):
+        self.authenticate(self.driver)
+        self.client.post(f'{self.base_url}/start/', {}, format='json')
+
+        response = self.client.post(f'{self.base_url}/positions/', {'positions': [
+            {'latitude': 6.2, 'longitude': 1.2},
+            {'latitude': 6.3, 'longitude': 300},
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['index'], 1)
+        self.assertFalse(BusPosition.objects.exists())
+
+    def test_route_geometry_is_cached_until_a_stop_coordinate_changes(self):
+        self.authenticate(self.driver)
+        self.client.post(f'{self.base_url}/start/', {}, format='json')
+        self.client.post(f'{self.base_url}/position/', {'latitude': 6.2, 'longitude': 1.2}, format='json')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                f'{self.base_url}/position/',
+                {'latitude': 6.3, 'longitude': 1.2},
+                format='json',
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        route_tables = ('transport_tripstop', 'transport_boardingzone', 'guichet_agence')
+        self.assertFalse([
+            query['sql'] for query in queries.captured_queries
+            if any(table in query['sql'] for table in route_tables)
+        ])
+        self.assertEqual(response.data['stops'][0]['latitude'], 6.1725)
+
+        zone = BoardingZone.objects.get(trip_stop=self.departure_stop)
+        zone.latitude = '6.180000'
+        zone.save()
+        refreshed = self.client.get(f'{self.base_url}/')
+        self.assertEqual(refreshed.data['stops'][0]['latitude'], 6.18)
+
+    def test_passenger_origins_are_refreshed_after_bulk_ticket_changes(self):
+        booking = Booking.objects.get(user=self.passenger)
+        self.assertEqual(booking_origins(self.scheduled_trip.id), {self.passenger.id: self.departure_stop.id})
+
+        close_tickets(self.driver, 'cancel', [('booking', booking)])
+
+        self.assertEqual(booking_origins(self.scheduled_trip.id), {})
+
+    def test_passenger_stream_receives_each_published_position_once_computed(self):
+        self.authenticate(self.driver)
+        self.client.post(f'{self.base_url}/start/', {}, format='json')
+
+        self.authenticate(self.passenger)
+        stream = self.client.get(f'{self.base_url}/stream/', HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(stream.status_code, status.HTTP_200_OK)
+        events = iter(stream.streaming_content)
+        snapshot = next(events).decode()
+        self.assertIn('event: snapshot', snapshot)
+
+        self.authenticate(self.driver)
+        self.client.post(
+            f'{self.base_url}/position/',
+            {'latitude': 6.2025, 'longitude': 1.2314, 'speed_mps': 15},
+            format='json',
+        )
+        with CaptureQueriesContext(connection) as queries:
+            chunk = next(events).decode()
+        stream.close()
+
+        self.assertEqual(app_queries(queries), [])
+        self.assertIn('event: position', chunk)
+        data = json.loads(chunk.split('data: ', 1)[1])
+        self.assertEqual(data['current_position']['latitude'], 6.2025)
+        self.assertEqual(data['next_stop']['station_name'], 'Gare Lomé Live')
+        self.assertTrue(data['approach_alert']['active'])
+        self.assertIn('eta_minutes', data)
+        self.assertNotIn('history', data)
+
+    def test_streams_per_process_are_capped(self):
+        self.authenticate(self.passenger)
+        with override_settings(SSE_MAX_STREAMS=1):
+            stream = self.client.get(f'{self.base_url}/stream/', HTTP_ACCEPT='text/event-stream')
+            refused = self.client.get(f'{self.base_url}/stream/', HTTP_ACCEPT='text/event-stream')
+            stream.close()
+            reopened = self.client.get(f'{self.base_url}/stream/', HTTP_ACCEPT='text/event-stream')
+            reopened.close()
+
+        self.assertEqual(stream.status_code, status.HTTP_200_OK)
+        self.assertEqual(refused.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertTrue(refused.has_header('Retry-After'))
+        self.assertEqual(reopened.status_code, status.HTTP_200_OK)
+        self.assertEqual(open_streams(), 0)
+
+    def test_stream_is_private(self):
+        self.authenticate(self.stranger)
+        response = self.client.get(f'{self.base_url}/stream/', HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class FleetTrackingTest(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.manager = User.objects.create_user('fleet-manager', password='secret')
+        self.other_manager = User.objects.create_user('other-fleet', password='secret')
+        self.passenger = User.objects.create_user('fleet-passenger', password='secret')
+        self.admin = User.objects.create_superuser('fleet-admin', password='secret')
+        self.client = APIClient()
+        self.scheduled_trip = self.active_trip('Flotte Lomé', self.manager, 6.2)
+        self.other_trip = self.active_trip('Flotte Kara', self.other_manager, 9.5)
+        self.base_url = f'/api/scheduled_trips/{self.scheduled_trip.id}/tracking'
+
+    def authenticate(self, user):
+        self.client.force_authenticate(user=user)
+
+    def active_trip(self, name, manager, latitude):
+        company = Company.objects.create(
+            name=name,
+            description='Test',
+            address='Lomé',
+            phone='90000102',
+            email=f'{manager.username}@example.com',
+        )
+        company.admins.add(manager)
+        trip = Trip.objects.create(
+            company=company,
+            departure_city=City.objects.create(name=f'{name} départ', region='Maritime'),
+            arrival_city=City.objects.create(name=f'{name} arrivée', region='Kara'),
+            departure_time=time(8, 0),
+            arrival_time=time(12, 0),
+            price=3000,
+            duration=240,
+            capacity=30,
+        )
+        scheduled_trip = ScheduledTrip.objects.get(trip=trip, date=timezone.localdate() + timedelta(days=1))
+        self.authenticate(manager)
+        base_url = f'/api/scheduled_trips/{scheduled_trip.id}/tracking'
+        self.client.post(f'{base_url}/start/', {}, format='json')
+        self.client.post(f'{base_url}/position/', {'latitude': latitude, 'longitude': 1.2, 'speed_mps': 15}, format='json')
+        return scheduled_trip
+
+    def test_company_sees_only_its_active_vehicles(self):
+        self.authenticate(self.manager)
+        response = self.client.get('/api/tracking/fleet/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        vehicles = response.data['vehicles']
+        self.assertEqual([vehicle['scheduled_trip_id'] for vehicle in vehicles], [self.scheduled_trip.id])
+        self.assertEqual(vehicles[0]['status'], 'live')
+        self.assertEqual(vehicles[0]['current_position']['latitude'], 6.2)
+        self.assertEqual(vehicles[0]['company_name'], 'Flotte Lomé')
+        self.assertIsNotNone(vehicles[0]['next_stop'])
+        self.assertFalse(vehicles[0]['is_stale'])
+
+        self.client.post(f'{self.base_url}/stop/', {}, format='json')
+        self.assertEqual(self.client.get('/api/tracking/fleet/').data['vehicles'], [])
+
+    def test_platform_sees_every_fleet_in_a_bounded_number_of_queries(self):
+        self.authenticate(self.admin)
+        self.client.get('/api/tracking/fleet/')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/tracking/fleet/')
+
+        self.assertEqual(
+            {vehicle['scheduled_trip_id'] for vehicle in response.data['vehicles']},
+            {self.scheduled_trip.id, self.other_trip.id},
+        )
+        session_queries = [query for query in queries.captured_queries if 'transport_triptrackingsession' in query['sql']]
+        self.assertEqual(len(session_queries), 1)
+        self.assertLessEqual(len(queries.captured_queries), 3)
+
+    def test_fleet_is_reserved_to_companies(self):
+        self.authenticate(self.passenger)
+        self.assertEqual(self.client.get('/api/tracking/fleet/').status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(
+            self.client.get('/api/tracking/fleet/stream/', HTTP_ACCEPT='text/event-stream').status_code,
+            status.HTTP_403_FORBIDDEN,
+        )
+
+    def test_fleet_stream_sends_snapshot_then_updates_of_its_vehicles(self):
+        self.authenticate(self.manager)
+        stream = self.client.get('/api/tracking/fleet/stream/', HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(stream.status_code, status.HTTP_200_OK)
+        events = iter(stream.streaming_content)
+        snapshot = next(events).decode()
+        self.assertIn('event: snapshot', snapshot)
+        self.assertEqual(len(json.loads(snapshot.split('data: ', 1)[1])['vehicles']), 1)
+
+        # Position d'une autre compagnie puis de la sienne : seule la seconde est poussée.
+        self.authenticate(self.other_manager)
+        self.client.post(
+            f'/api/scheduled_trips/{self.other_trip.id}/tracking/position/',
+            {'latitude': 6.3, 'longitude': 1.23},
+            format='json',
+        )
+        self.authenticate(self.manager)
+        self.client.post(f'{self.base_url}/position/', {'latitude': 6.5, 'longitude': 1.2}, format='json')
+        with CaptureQueriesContext(connection) as queries:
+            chunk = next(events).decode()
+        stream.close()
+
+        self.assertEqual(app_queries(queries), [])
+        self.assertIn('event: update', chunk)
+        data = json.loads(chunk.split('data: ', 1)[1])
+        self.assertEqual(data['scheduled_trip_id'], self.scheduled_trip.id)
+        self.assertEqual(data['current_position']['latitude'], 6.5)
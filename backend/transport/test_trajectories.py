@@ -0,0 +1,122 @@
+from datetime import time, timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from .models import BusPosition, City, Company, CompactTrajectory, ScheduledTrip, Trip, TripTrackingSession
+from .services.trajectories import (
+    compact_trajectories,
+    decode_polyline,
+    encode_polyline,
+    session_trajectory,
+    simplify,
+)
+
+
+class TrajectoryCompactionTest(TestCase):
+    def setUp(self):
+        self.manager = get_user_model().objects.create_user('fleet-manager', password='secret')
+        company = Company.objects.create(
+            name='Trace Transport',
+            description='Test',
+            address='Lomé',
+            phone='90000600',
+            email='trace@example.com',
+        )
+        company.admins.add(self.manager)
+        trip = Trip.objects.create(
+            company=company,
+            departure_city=City.objects.create(name='Lomé Trace', region='Maritime'),
+            arrival_city=City.objects.create(name='Tsévié Trace', region='Maritime'),
+            departure_time=time(8, 0),
+            arrival_time=time(9, 0),
+            price=1500,
+            duration=60,
+            capacity=30,
+        )
+        self.scheduled_trip = ScheduledTrip.objects.get(trip=trip, date=timezone.localdate() + timedelta(days=1))
+        self.started_at = timezone.now() - timedelta(hours=2)
+
+    def session_with_trace(self, count=120, is_active=False):
+        session = TripTrackingSession.objects.create(
+            scheduled_trip=self.scheduled_trip,
+            is_active=is_active,
+            started_at=self.started_at,
+            stopped_at=None if is_active else self.started_at + timedelta(hours=1),
+        )
+        positions = []
+        for index in range(count):
+            # Ligne droite vers le nord à 60 km/h, avec un arrêt de 5 fixes au milieu.
+            stopped = count // 2 <= index < count // 2 + 5
+            positions.append(BusPosition(
+                session=session,
+                latitude=f'{6.13 + index * 0.0005:.6f}',
+                longitude='1.220000',
+                speed_kmh=0.0 if stopped else 60.0,
+                recorded_at=self.started_at + timedelta(seconds=5 * index),
+            ))
+        BusPosition.objects.bulk_create(positions)
+        return session
+
+    def test_polyline_round_trip(self):
+        coordinates = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+        encoded = encode_polyline(coordinates)
+        self.assertEqual(encoded, '_p~iF~ps|U_ulLnnqC_mqNvxq`@')
+        self.assertEqual(decode_polyline(encoded), coordinates)
+
+    def test_simplify_keeps_shape_and_speed_changes(self):
+        line = [(6.0 + index * 0.001, 1.2, index * 5, 60.0) for index in range(50)]
+        self.assertEqual(simplify(line, 15, 10), [0, 49])
+
+        detour = list(line)
+        detour[20] = (6.02, 1.201, 100, 60.0)
+        self.assertIn(20, simplify(detour, 15, 10))
+
+        halt = list(line)
+        halt[30] = (halt[30][0], 1.2, 150, 0.0)
+        self.assertIn(30, simplify(halt, 15, 10))
+
+    def test_stopped_session_is_compacted_and_raw_positions_purged(self):
+        session = self.session_with_trace()
+
+        metrics = compact_trajectories(min_age_minutes=0)
+
+        self.assertEqual(metrics['sessions'], 1)
+        self.assertEqual(metrics['positions_supprimees'], 120)
+        self.assertFalse(BusPosition.objects.filter(session=session).exists())
+        trajectory = CompactTrajectory.objects.get(session=session)
+        self.assertEqual(trajectory.raw_points, 120)
+        self.assertLess(trajectory.points, 20)
+        self.assertEqual(trajectory.started_at, self.started_at)
+        self.assertAlmostEqual(trajectory.distance_km, 6.6, delta=0.1)
+
+        points = session_trajectory(session)
+        self.assertAlmostEqual(points[0]['latitude'], 6.13)
+        self.assertAlmostEqual(points[-1]['latitude'], 6.13 + 119 * 0.0005, places=5)
+        self.assertIn(0.0, [point['speed_kmh'] for point in points])
+
+    def test_active_session_keeps_full_resolution(self):
+        session = self.session_with_trace(count=20, is_active=True)
+
+        self.assertEqual(compact_trajectories(min_age_minutes=0)['sessions'], 0)
+        self.assertEqual(BusPosition.objects.filter(session=session).count(), 20)
+
+    def test_replay_and_history_read_the_compact_form(self):
+        self.session_with_trace()
+        compact_trajectories(min_age_minutes=0)
+        client = APIClient()
+        client.force_authenticate(self.manager)
+
+        replay = client.get(f'/api/scheduled_trips/{self.scheduled_trip.id}/tracking/replay/')
+        tracking = client.get(f'/api/scheduled_trips/{self.scheduled_trip.id}/tracking/')
+
+        self.assertEqual(replay.status_code, status.HTTP_200_OK)
+        self.assertTrue(replay.data['compacted'])
+        self.assertEqual(decode_polyline(replay.data['polyline'])[0], (6.13, 1.22))
+        self.assertEqual(replay.data['max_speed_kmh'], 60.0)
+        self.assertEqual(tracking.status_code, status.HTTP_200_OK)
+        self.assertTrue(tracking.data['history'])
+        self.assertGreater(tracking.data['history'][0]['recorded_at'], tracking.data['history'][-1]['recorded_at'])
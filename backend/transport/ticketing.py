@@ -1,12 +1,41 @@
+import base64
+import binascii
+import json
+import uuid
+from datetime import date, datetime
+
 from django.db import transaction
-from django.db.models import Q
+from django.db.models import Count, Q
 from django.utils import timezone
 from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
 
+from guichet.compteurs import compter_controles, compter_ventes
 from guichet.models import ControlePassager, VenteGuichet
 
-from .models import Booking, Reservation, ScheduledTrip, Siege
+from .models import (
+    AuditLog,
+    Booking,
+    Payment,
+    Reservation,
+    ScheduledTrip,
+    SearchGram,
+    Siege,
+    TicketIndex,
+    TicketRemoval,
+)
 from .models.audit import log_action
+from .services.company_payouts import regulariser_reservations
+from .services.loyalty import award_completed_trip_xp
+from .services.search import (
+    apply_search,
+    audit_search_document,
+    index_documents,
+    remove_documents,
+    search_document,
+)
+from .services.ticket_tokens import ticket_token_for
+from .services.tracking import invalidate_booking_origins
 
 
 TERMINAL_STATUSES = {
@@ -28,14 +57,17 @@ def _route(trip):
     return f'{trip.departure_city.name} → {trip.arrival_city.name}'
 
 
-def _last_control(item, source):
+def _controls(item, source):
     relation = {
         'booking': 'controles_guichet',
         'mobile': 'controles',
         'guichet': 'controles',
     }[source]
-    controls = getattr(item, relation).all()
-    return max(controls, key=lambda control: control.created_at, default=None)
+    return getattr(item, relation).all()
+
+
+def _last_control(item, source):
+    return max(_controls(item, source), key=lambda control: control.created_at, default=None)
 
 
 def serialize_ticket(item, source):
@@ -123,7 +155,7 @@ def serialize_ticket(item, source):
     last_control = _last_control(item, source)
     used = (
         status in {'completed', 'utilise'}
-        or bool(last_control and last_control.resultat == 'valide')
+        or any(control.resultat == 'valide' for control in _controls(item, source))
     )
     terminal = status in TERMINAL_STATUSES[source]
     payload.update({
@@ -135,24 +167,71 @@ def serialize_ticket(item, source):
         'can_cancel': not terminal and not used,
         'can_refund': can_refund and not used,
         'can_edit': not terminal and not used,
+        'used': used,
+        'qr_token': None if terminal else ticket_token_for(item, source),
     })
     return payload
 
 
-def ticket_collection(company=None, voyage=None, limit=500):
-    booking_queryset = Booking.all_objects.select_related(
-        'trip__company',
-        'trip__departure_city',
-        'trip__arrival_city',
-        'scheduled_trip',
-    ).prefetch_related('payments', 'controles_guichet')
-    reservation_queryset = Reservation.objects.select_related(
-        'voyage__trip__company',
-        'voyage__trip__departure_city',
-        'voyage__trip__arrival_city',
-        'siege',
-    ).prefetch_related('controles')
-    counter_queryset = VenteGuichet.objects.select_related(
+BOARDABLE_STATUSES = {
+    'booking': {'confirmed'},
+    'mobile': {Reservation.STATUT_PAYE},
+    'guichet': {'valide'},
+}
+
+
+def boarding_state(payload):
+    """État d'embarquement d'un billet sérialisé : ``used``, ``valid`` ou ``invalid``."""
+    if payload.get('used'):
+        return 'used'
+    if payload['status'] in BOARDABLE_STATUSES[payload['source']]:
+        return 'valid'
+    return 'invalid'
+
+
+TICKET_MODELS = {
+    'booking': Booking.all_objects,
+    'mobile': Reservation.objects,
+    'guichet': VenteGuichet.objects,
+}
+
+INDEX_FIELDS = [
+    'company',
+    'voyage',
+    'reference',
+    'client_name',
+    'client_phone',
+    'company_name',
+    'route',
+    'seat',
+    'travel_date',
+    'status',
+    'control_status',
+    'search_text',
+    'payload',
+    'created_at',
+    'indexed_at',
+]
+
+
+def _ticket_queryset(source):
+    if source == 'booking':
+        return TICKET_MODELS[source].select_related(
+            'trip__company',
+            'trip__departure_city',
+            'trip__arrival_city',
+            'scheduled_trip',
+            'origin_stop',
+            'destination_stop',
+        ).prefetch_related('payments', 'controles_guichet')
+    if source == 'mobile':
+        return TICKET_MODELS[source].select_related(
+            'voyage__trip__company',
+            'voyage__trip__departure_city',
+            'voyage__trip__arrival_city',
+            'siege',
+        ).prefetch_related('controles')
+    return TICKET_MODELS[source].select_related(
         'voyage__trip__company',
         'voyage__trip__departure_city',
         'voyage__trip__arrival_city',
@@ -161,55 +240,250 @@ def ticket_collection(company=None, voyage=None, limit=500):
         'guichet',
     ).prefetch_related('controles')
 
-    if company is not None:
-        booking_queryset = booking_queryset.filter(trip__company=company)
-        reservation_queryset = reservation_queryset.filter(voyage__trip__company=company)
-        counter_queryset = counter_queryset.filter(voyage__trip__company=company)
-    if voyage is not None:
-        booking_queryset = booking_queryset.filter(scheduled_trip=voyage)
-        reservation_queryset = reservation_queryset.filter(voyage=voyage)
-        counter_queryset = counter_queryset.filter(voyage=voyage)
 
-    if limit:
-        booking_queryset = booking_queryset.order_by('-booking_date')[:limit]
-        reservation_queryset = reservation_queryset.order_by('-created_at')[:limit]
-        counter_queryset = counter_queryset.order_by('-created_at')[:limit]
+def _index_row(item, source):
+    payload = serialize_ticket(item, source)
+    return TicketIndex(
+        source=source,
+        source_id=payload['id'],
+        company_id=payload['company_id'],
+        voyage_id=payload['voyage_id'],
+        reference=payload['reference'],
+        client_name=payload['client_name'] or '',
+        client_phone=payload['client_phone'] or '',
+        company_name=payload['company_name'],
+        route=payload['route'],
+        seat=str(payload['seat'] or ''),
+        travel_date=payload['travel_date'],
+        status=payload['status'],
+        control_status=payload['control_status'],
+        search_text=search_document(
+            texts=[
+                payload['reference'],
+                payload['client_name'],
+                payload['company_name'],
+                payload['route'],
+            ],
+            phones=[payload['client_phone']],
+        ),
+        payload=payload,
+        created_at=payload['created_at'],
+    )
+
+
+def _record_removals(removed):
+    """Pierres tombales ``(voyage_id, source, source_id)`` des manifestes hors ligne."""
+    now = timezone.now()
+    TicketRemoval.objects.bulk_create(
+        [
+            TicketRemoval(voyage_id=voyage_id, source=source, source_id=source_id, removed_at=now)
+            for voyage_id, source, source_id in removed
+        ],
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['voyage', 'source', 'source_id'],
+        update_fields=['removed_at'],
+    )
+
+
+def _write_index_rows(source, rows):
+    previous = dict(
+        TicketIndex.objects.filter(
+            source=source,
+            source_id__in=[row.source_id for row in rows],
+        ).exclude(voyage=None).values_list('source_id', 'voyage_id')
+    )
+    _record_removals([
+        (previous[row.source_id], source, row.source_id)
+        for row in rows
+        if row.source_id in previous and previous[row.source_id] != row.voyage_id
+    ])
+    TicketIndex.objects.bulk_create(
+        rows,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['source', 'source_id'],
+        update_fields=INDEX_FIELDS,
+    )
+    documents = dict(
+        TicketIndex.objects.filter(
+            source=source,
+            source_id__in=[row.source_id for row in rows],
+        ).values_list('id', 'search_text')
+    )
+    index_documents(SearchGram.SCOPE_TICKET, documents)
+    return len(documents)
+
+
+def _delete_index_rows(queryset):
+    rows = list(queryset.values_list('id', 'voyage_id', 'source', 'source_id'))
+    if not rows:
+        return
+    _record_removals([(voyage_id, source, source_id) for _, voyage_id, source, source_id in rows if voyage_id])
+    remove_documents(SearchGram.SCOPE_TICKET, [pk for pk, _, _, _ in rows])
+    TicketIndex.objects.filter(pk__in=[pk for pk, _, _, _ in rows]).delete()
+
+
+def sync_ticket_index(source, pks):
+    """Réécrit les lignes d'index des billets ``pks`` d'un canal.
+
+    Les billets qui n'existent plus sont retirés de l'index.
+    """
+    keys = [str(pk) for pk in pks if pk]
+    if not keys:
+        return
+    rows = [_index_row(item, source) for item in _ticket_queryset(source).filter(pk__in=keys)]
+    _delete_index_rows(
+        TicketIndex.objects.filter(source=source, source_id__in=keys).exclude(
+            source_id__in=[row.source_id for row in rows],
+        )
+    )
+    if rows:
+        _write_index_rows(source, rows)
+
 
-    items = [serialize_ticket(item, 'booking') for item in booking_queryset]
-    items.extend(serialize_ticket(item, 'mobile') for item in reservation_queryset)
-    items.extend(serialize_ticket(item, 'guichet') for item in counter_queryset)
-    return sorted(items, key=lambda item: item['created_at'], reverse=True)
+def reindex_tickets(queryset, batch_size=500):
+    """Réécrit les lignes ``TicketIndex`` de ``queryset`` depuis leurs billets, par lots."""
+    keys = {}
+    for source, source_id in queryset.values_list('source', 'source_id').iterator(chunk_size=batch_size):
+        keys.setdefault(source, []).append(source_id)
+    for source, source_ids in keys.items():
+        for start in range(0, len(source_ids), batch_size):
+            sync_ticket_index(source, source_ids[start:start + batch_size])
 
 
-def filter_ticket_collection(items, params):
-    query = str(params.get('q') or '').strip().lower()
+def remove_ticket_index(source, pk):
+    _delete_index_rows(TicketIndex.objects.filter(source=source, source_id=str(pk)))
+
+
+@transaction.atomic
+def rebuild_ticket_index(batch_size=500):
+    """Reconstruit tout l'index des billets à partir des trois tables sources.
+
+    Les lignes sont réécrites en place puis celles qui n'ont pas été
+    réécrites sont retirées : déplacements et suppressions laissent leurs
+    pierres tombales aux manifestes hors ligne.
+    """
+    started = timezone.now()
+    SearchGram.objects.filter(scope=SearchGram.SCOPE_TICKET).delete()
+    total = 0
+    for source in TICKET_MODELS:
+        batch = []
+        for item in _ticket_queryset(source).order_by('pk').iterator(chunk_size=batch_size):
+            batch.append(_index_row(item, source))
+            if len(batch) >= batch_size:
+                total += _write_index_rows(source, batch)
+                batch = []
+        if batch:
+            total += _write_index_rows(source, batch)
+    _delete_index_rows(TicketIndex.objects.filter(indexed_at__lt=started))
+    return total
+
+
+def ticket_index_incomplete():
+    """Vrai si une table source a plus de billets que l'index n'en a pour elle.
+
+    Cas d'un index jamais rempli (billets antérieurs à sa création) ou
+    d'un import direct en base ; deux comptages par source, sans relire les
+    billets.
+    """
+    indexed = dict(TicketIndex.objects.values('source').annotate(total=Count('id')).values_list('source', 'total'))
+    return any(model.count() > indexed.get(source, 0) for source, model in TICKET_MODELS.items())
+
+
+def _filtered_index(company=None, voyage=None, params=None):
+    queryset = TicketIndex.objects.all()
+    params = params or {}
+    if company is not None:
+        queryset = queryset.filter(company=company)
+    if voyage is not None:
+        queryset = queryset.filter(voyage=voyage)
+
+    query = str(params.get('q') or '').strip()
     source = str(params.get('source') or '').strip()
     state = str(params.get('status') or '').strip()
     company_id = str(params.get('company') or '').strip()
     travel_date = str(params.get('date') or '').strip()
     voyage_id = str(params.get('voyage') or '').strip()
     if query:
-        items = [
-            item for item in items
-            if query in ' '.join([
-                item['reference'],
-                item['client_name'],
-                item['client_phone'],
-                item['company_name'],
-                item['route'],
-            ]).lower()
-        ]
+        queryset = apply_search(queryset, SearchGram.SCOPE_TICKET, query)
     if source:
-        items = [item for item in items if item['source'] == source]
+        queryset = queryset.filter(source=source)
     if state:
-        items = [item for item in items if item['status'] == state]
-    if company_id:
-        items = [item for item in items if str(item['company_id']) == company_id]
-    if travel_date:
-        items = [item for item in items if str(item['travel_date'] or '') == travel_date]
-    if voyage_id:
-        items = [item for item in items if str(item['voyage_id'] or '') == voyage_id]
-    return items
+        queryset = queryset.filter(status=state)
+    try:
+        if company_id:
+            queryset = queryset.filter(company_id=int(company_id))
+        if voyage_id:
+            queryset = queryset.filter(voyage_id=int(voyage_id))
+        if travel_date:
+            queryset = queryset.filter(travel_date=date.fromisoformat(travel_date))
+    except ValueError:
+        return queryset.none()
+    return queryset
+
+
+def encode_ticket_cursor(created_at, pk):
+    raw = json.dumps([created_at.isoformat(), pk if isinstance(pk, int) else str(pk)])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_ticket_cursor(cursor, pk_type=int):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), pk_type(pk)
+    except (TypeError, ValueError, binascii.Error):
+        raise ValidationError({'detail': 'Curseur de pagination invalide.'})
+
+
+def keyset_page(queryset, cursor=None, limit=50, pk_type=int):
+    """Page d'un queryset ``values()`` du plus récent au plus ancien, par curseur sur ``(created_at, id)``.
+
+    Le queryset doit projeter ``id`` et ``created_at``. Retourne
+    ``(lignes, curseur_suivant)`` ; sans ``limit``, toutes les lignes.
+    """
+    if cursor:
+        created_at, pk = decode_ticket_cursor(cursor, pk_type)
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk)
+        )
+    rows = queryset.order_by('-created_at', '-id')
+    rows = list(rows[:limit + 1]) if limit else list(rows)
+    next_cursor = None
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_ticket_cursor(rows[-1]['created_at'], rows[-1]['id'])
+    return rows, next_cursor
+
+
+def ticket_page(company=None, voyage=None, params=None, cursor=None, limit=50):
+    """Page de billets tous canaux confondus, du plus récent au plus ancien.
+
+    Une seule requête sur ``TicketIndex``, paginée par curseur sur
+    ``(created_at, id)`` : une page profonde coûte autant que la première.
+    Retourne ``(billets, curseur_suivant)``.
+    """
+    queryset = _filtered_index(company=company, voyage=voyage, params=params)
+    rows, next_cursor = keyset_page(queryset.values('id', 'created_at', 'payload'), cursor, limit)
+    return [row['payload'] for row in rows], next_cursor
+
+
+def ticket_page_limit(params, default, maximum):
+    try:
+        limit = int(params.get('limit') or default)
+    except (TypeError, ValueError):
+        raise ValidationError({'detail': 'Le paramètre limit doit être un entier.'})
+    return min(max(limit, 1), maximum)
+
+
+def ticket_page_response(items, next_cursor):
+    """Page de billets et curseur suivant, dans le corps comme les historiques du guichet."""
+    return Response({'tickets': items, 'next_cursor': next_cursor})
+
+
+def ticket_collection(company=None, voyage=None, limit=500):
+    return ticket_page(company=company, voyage=voyage, limit=limit)[0]
 
 
 def _get_ticket(company, source, pk, for_update=False):
@@ -254,9 +528,8 @@ def _ticket_is_used(item, source):
     ).exists()
 
 
-def recalculate_voyage_availability(voyage):
-    if voyage is None:
-        return
+def occupied_seats(voyage):
+    """Numéros des sièges tenus par un billet actif du voyage, tous canaux confondus."""
     occupied = {
         str(number)
         for number in Booking.objects.filter(
@@ -281,8 +554,14 @@ def recalculate_voyage_availability(voyage):
             statut__in=['valide', 'utilise'],
         ).values_list('siege__numero', flat=True)
     )
+    return occupied
+
+
+def recalculate_voyage_availability(voyage):
+    if voyage is None:
+        return
     ScheduledTrip.objects.filter(pk=voyage.pk).update(
-        available_seats=max(voyage.trip.capacity - len(occupied), 0),
+        available_seats=max(voyage.trip.capacity - len(occupied_seats(voyage)), 0),
     )
 
 
@@ -316,7 +595,7 @@ def _release_seat_if_unused(voyage, seat_number):
         )
 
 
-def _actor_role(user):
+def actor_role(user):
     if hasattr(user, 'agentguichet'):
         return 'AGENT_GUICHET'
     return 'ADMIN_COMPAGNIE'
@@ -392,6 +671,7 @@ def perform_ticket_action(
         ])
         if action == 'refund':
             item.payments.filter(status='completed').update(status='refunded')
+            sync_ticket_index(source, [item.pk])
     elif source == 'mobile':
         if item.statut_paiement in TERMINAL_STATUSES[source]:
             raise ValidationError({'detail': 'Ce billet est déjà clôturé.'})
@@ -403,11 +683,14 @@ def perform_ticket_action(
             else Reservation.STATUT_EXPIRE
         )
         item.save(update_fields=['statut_paiement'])
+        if action == 'refund':
+            regulariser_reservations([item.pk])
     else:
         if item.statut in TERMINAL_STATUSES[source]:
             raise ValidationError({'detail': 'Ce billet est déjà clôturé.'})
         item.statut = 'rembourse' if action == 'refund' else 'annule'
         item.save(update_fields=['statut'])
+        compter_ventes([item], sens=-1)
 
     _release_seat_if_unused(voyage, seat_number)
     recalculate_voyage_availability(voyage)
@@ -421,7 +704,7 @@ def perform_ticket_action(
         new_values={
             'operation': action,
             'reason': reason or 'Mise à jour des informations du passager',
-            'actor_role': _actor_role(user),
+            'actor_role': actor_role(user),
             'source': source,
             'status': serialized['status'],
             'client_name': serialized['client_name'],
@@ -433,19 +716,480 @@ def perform_ticket_action(
     return serialized
 
 
+BULK_TICKET_ACTIONS = {'cancel', 'refund', 'move', 'mark_used'}
+MAX_BULK_TICKETS = 500
+BULK_MANUAL_BOARDING = 'Embarquement validé manuellement'
+
+
+def ticket_status(item, source):
+    if source == 'booking':
+        return item.status
+    return item.statut_paiement if source == 'mobile' else item.statut
+
+
+def ticket_seat(item, source):
+    return item.seat_number if source == 'booking' else item.siege.numero
+
+
+def _loaded_ticket_is_used(item, source):
+    """``_ticket_is_used`` sur un billet chargé par ``_ticket_queryset`` (contrôles préchargés)."""
+    if ticket_status(item, source) in {'completed', 'utilise'}:
+        return True
+    return any(control.resultat == 'valide' for control in _controls(item, source))
+
+
+def _bulk_ticket_keys(tickets):
+    if not isinstance(tickets, list) or not tickets:
+        raise ValidationError({'detail': 'La liste des billets est obligatoire.'})
+    if len(tickets) > MAX_BULK_TICKETS:
+        raise ValidationError({'detail': f'{MAX_BULK_TICKETS} billets maximum par opération.'})
+    keys = []
+    for entry in tickets:
+        source = str(entry.get('source') or '') if isinstance(entry, dict) else ''
+        pk = str(entry.get('id') or '').strip() if isinstance(entry, dict) else ''
+        try:
+            if source == 'booking':
+                pk = str(int(pk))
+            elif source in TICKET_MODELS:
+                pk = str(uuid.UUID(pk))
+            else:
+                raise ValueError(source)
+        except ValueError:
+            raise ValidationError({'detail': 'Chaque billet doit porter une source et un identifiant valides.'})
+        keys.append((source, pk))
+    return list(dict.fromkeys(keys))
+
+
+def lock_tickets(company, keys):
+    """Verrouille puis charge les billets de la compagnie, une requête par canal."""
+    loaded = {}
+    for source in TICKET_MODELS:
+        pks = [pk for key_source, pk in keys if key_source == source]
+        if not pks:
+            continue
+        company_field = 'trip__company' if source == 'booking' else 'voyage__trip__company'
+        locked = list(
+            TICKET_MODELS[source]
+            .select_for_update(of=('self',))
+            .filter(pk__in=pks, **{company_field: company})
+            .values_list('pk', flat=True)
+        )
+        for item in _ticket_queryset(source).filter(pk__in=locked):
+            loaded[(source, str(item.pk))] = item
+    return loaded
+
+
+def lock_target_voyage(company, voyage_id):
+    try:
+        voyage_id = int(voyage_id)
+    except (TypeError, ValueError):
+        raise ValidationError({'detail': 'Le voyage cible est obligatoire.'})
+    target = (
+        ScheduledTrip.objects.select_for_update(of=('self',))
+        .select_related('trip')
+        .filter(pk=voyage_id, trip__company=company, is_active=True, date__gte=timezone.localdate())
+        .first()
+    )
+    if target is None:
+        raise NotFound('Voyage cible introuvable ou déjà parti.')
+    return target
+
+
+def target_stops(target):
+    return {stop.city_id: stop for stop in target.trip.stops.all()}
+
+
+def _move_refusal(item, source, target, stops):
+    voyage = _ticket_voyage(item, source)
+    if voyage is not None and voyage.pk == target.pk:
+        return 'Le billet est déjà sur ce voyage.'
+    trip = item.trip if source == 'booking' else item.voyage.trip
+    if (trip.departure_city_id, trip.arrival_city_id) != (
+        target.trip.departure_city_id,
+        target.trip.arrival_city_id,
+    ):
+        return 'Le voyage cible ne dessert pas ce trajet.'
+    if source == 'booking':
+        origin = stops.get(item.origin_stop.city_id) if item.origin_stop_id else None
+        destination = stops.get(item.destination_stop.city_id) if item.destination_stop_id else None
+        if (item.origin_stop_id and origin is None) or (item.destination_stop_id and destination is None):
+            return 'Le voyage cible ne dessert pas les arrêts du billet.'
+        if origin and destination and origin.sequence >= destination.sequence:
+            return 'Le voyage cible ne dessert pas les arrêts du billet.'
+    return None
+
+
+def ticket_refusal(item, source, action, target=None, stops=None):
+    if item is None:
+        return 'Billet introuvable pour cette compagnie.'
+    status = ticket_status(item, source)
+    if action == 'mark_used':
+        if _loaded_ticket_is_used(item, source):
+            return 'Billet déjà utilisé.'
+        if status not in BOARDABLE_STATUSES[source]:
+            return 'Billet annulé ou non payé.'
+        if _ticket_voyage(item, source) is None:
+            return 'Billet sans voyage programmé.'
+        return None
+    if _loaded_ticket_is_used(item, source):
+        return 'Un billet déjà utilisé ne peut plus être modifié, annulé ou remboursé.'
+    if status in TERMINAL_STATUSES[source]:
+        return 'Ce billet est déjà clôturé.'
+    if action == 'refund' and source == 'mobile' and status != Reservation.STATUT_PAYE:
+        return 'Seul un billet payé peut être remboursé.'
+    if action == 'move':
+        return _move_refusal(item, source, target, stops)
+    return None
+
+
+def release_unused_seats(voyage, seat_numbers):
+    """Libère en une requête les sièges qu'aucun billet actif du voyage ne tient plus."""
+    occupied = occupied_seats(voyage)
+    free = {int(number) for number in seat_numbers if str(number).isdigit() and str(number) not in occupied}
+    if free:
+        Siege.objects.filter(voyage=voyage, numero__in=free).update(
+            statut=Siege.STATUT_LIBRE,
+            reserve_at=None,
+        )
+
+
+def close_tickets(user, action, items):
+    """Annule ou rembourse des billets chargés ; retourne le débit des compagnies."""
+    now = timezone.now()
+    booking_ids = [item.pk for source, item in items if source == 'booking']
+    if booking_ids:
+        Booking.all_objects.filter(pk__in=booking_ids).update(
+            status='cancelled',
+            is_deleted=True,
+            deleted_at=now,
+            deleted_by=user,
+            updated_by=user,
+        )
+        if action == 'refund':
+            Payment.objects.filter(booking_id__in=booking_ids, status='completed').update(status='refunded')
+        # update() ne déclenche pas les signaux qui vident le cache du suivi.
+        invalidate_booking_origins(item.scheduled_trip_id for source, item in items if source == 'booking')
+    reservation_ids = [item.pk for source, item in items if source == 'mobile']
+    Reservation.objects.filter(pk__in=reservation_ids).update(
+        statut_paiement=Reservation.STATUT_REMBOURSE if action == 'refund' else Reservation.STATUT_EXPIRE,
+    )
+    ventes = [item for source, item in items if source == 'guichet']
+    VenteGuichet.objects.filter(pk__in=[item.pk for item in ventes]).update(
+        statut='rembourse' if action == 'refund' else 'annule',
+    )
+    compter_ventes(ventes, sens=-1)
+    return regulariser_reservations(reservation_ids) if action == 'refund' else 0
+
+
+def _bulk_mark_used(user, items):
+    agent = getattr(user, 'agentguichet', None)
+    now = timezone.now()
+    compter_controles(ControlePassager.objects.bulk_create(
+        [
+            ControlePassager(
+                agent=agent,
+                booking_id=item.pk if source == 'booking' else None,
+                reservation_id=item.pk if source == 'mobile' else None,
+                vente_id=item.pk if source == 'guichet' else None,
+                voyage_id=_ticket_voyage(item, source).pk,
+                resultat='valide',
+                message=BULK_MANUAL_BOARDING,
+                scanned_at=now,
+            )
+            for source, item in items
+        ],
+        batch_size=500,
+    ))
+    bookings = [item for source, item in items if source == 'booking']
+    Booking.all_objects.filter(pk__in=[item.pk for item in bookings]).update(status='completed')
+    invalidate_booking_origins(item.scheduled_trip_id for item in bookings)
+    # update() ne déclenche pas le signal d'XP fidélité.
+    for booking in bookings:
+        booking.status = 'completed'
+        award_completed_trip_xp(booking)
+    VenteGuichet.objects.filter(pk__in=[item.pk for source, item in items if source == 'guichet']).update(
+        statut='utilise',
+    )
+
+
+def _segment_bounds(stops):
+    sequences = [stop.sequence for stop in stops.values()]
+    return (min(sequences), max(sequences)) if sequences else (0, 1)
+
+
+def _target_segment(item, source, stops, bounds):
+    """Segment ``(montée, descente)`` du billet en séquences d'arrêts du voyage cible."""
+    if source != 'booking' or not (item.origin_stop_id and item.destination_stop_id):
+        return bounds
+    return stops[item.origin_stop.city_id].sequence, stops[item.destination_stop.city_id].sequence
+
+
+def _target_occupancy(target, bounds):
+    """Segments déjà occupés sur le voyage cible, par numéro de siège."""
+    occupancy = {}
+    for seat, origin, destination in Booking.objects.filter(
+        scheduled_trip=target,
+        status__in=['pending', 'confirmed'],
+    ).values_list('seat_number', 'origin_stop__sequence', 'destination_stop__sequence'):
+        if str(seat).isdigit():
+            segment = (origin, destination) if origin is not None and destination is not None else bounds
+            occupancy.setdefault(int(seat), []).append(segment)
+    full = set(
+        Siege.objects.filter(voyage=target).exclude(statut=Siege.STATUT_LIBRE).values_list('numero', flat=True)
+    )
+    full.update(int(number) for number in occupied_seats(target) if number.isdigit())
+    booked = set(occupancy)
+    for number in full - booked:
+        occupancy[number] = [bounds]
+    return occupancy
+
+
+def assign_target_seats(target, items, stops=None):
+    """Plan de placement des billets ``items`` sur le voyage cible, segment par segment.
+
+    Un siège accueille plusieurs billets dont les segments ne se chevauchent
+    pas. Les billets sont traités par arrêt de descente croissant et chacun
+    prend le siège compatible dont l'occupation précédente finit le plus tard
+    (ajustement au plus serré) : sans occupation préalable, ce glouton place le
+    nombre maximal de billets. À ajustement égal, le passager garde son numéro,
+    sinon il prend le plus petit.
+
+    Retourne ``{(source, id): numéro}`` ; les billets absents n'ont pas trouvé de place.
+    """
+    stops = target_stops(target) if stops is None else stops
+    bounds = _segment_bounds(stops)
+    occupancy = _target_occupancy(target, bounds)
+    segments = {
+        (source, str(item.pk)): _target_segment(item, source, stops, bounds)
+        for source, item in items
+    }
+    assigned = {}
+    for source, item in sorted(items, key=lambda entry: segments[(entry[0], str(entry[1].pk))][::-1]):
+        key = (source, str(item.pk))
+        start, end = segments[key]
+        current = str(ticket_seat(item, source))
+        best = None
+        for number in range(1, target.trip.capacity + 1):
+            taken = occupancy.get(number, ())
+            if any(origin < end and destination > start for origin, destination in taken):
+                continue
+            fit = max((destination for _, destination in taken if destination <= start), default=-1)
+            rank = (fit, str(number) == current, -number)
+            if best is None or rank > best[0]:
+                best = (rank, number)
+        if best is not None:
+            assigned[key] = best[1]
+            occupancy.setdefault(best[1], []).append((start, end))
+    return assigned
+
+
+def move_tickets(user, target, items, assigned, stops):
+    """Réécrit les billets vers ``target`` : sièges créés ou repris en lot, puis ``bulk_update`` par canal."""
+    now = timezone.now()
+    seat_states = {}
+    for source, item in items:
+        if source == 'booking':
+            continue
+        old_seat = item.siege
+        held = old_seat.statut == Siege.STATUT_RESERVE_TEMP and source == 'mobile'
+        seat_states[assigned[(source, str(item.pk))]] = (
+            (Siege.STATUT_RESERVE_TEMP, old_seat.reserve_at or now) if held else (Siege.STATUT_OCCUPE, None)
+        )
+    seats = {seat.numero: seat for seat in Siege.objects.filter(voyage=target, numero__in=list(seat_states))}
+    for seat in seats.values():
+        seat.statut, seat.reserve_at = seat_states[seat.numero]
+    Siege.objects.bulk_update(list(seats.values()), ['statut', 'reserve_at'], batch_size=500)
+    created = [
+        Siege(voyage=target, numero=number, statut=state[0], reserve_at=state[1])
+        for number, state in seat_states.items()
+        if number not in seats
+    ]
+    Siege.objects.bulk_create(created, batch_size=500)
+    seats.update({seat.numero: seat for seat in created})
+
+    bookings, reservations, ventes = [], [], []
+    left_trips = set()
+    for source, item in items:
+        number = assigned[(source, str(item.pk))]
+        if source == 'booking':
+            left_trips.add(item.scheduled_trip_id)
+            item.scheduled_trip = target
+            item.trip = target.trip
+            item.seat_number = str(number)
+            if item.origin_stop_id:
+                item.origin_stop = stops[item.origin_stop.city_id]
+            if item.destination_stop_id:
+                item.destination_stop = stops[item.destination_stop.city_id]
+            item.updated_by = user
+            bookings.append(item)
+            continue
+        item.voyage = target
+        item.siege = seats[number]
+        if source == 'mobile':
+            reservations.append(item)
+        else:
+            item.qr_code_data = ticket_token_for(item, source) or item.qr_code_data
+            ventes.append(item)
+    Booking.all_objects.bulk_update(
+        bookings,
+        ['scheduled_trip', 'trip', 'seat_number', 'origin_stop', 'destination_stop', 'updated_by'],
+        batch_size=500,
+    )
+    if bookings:
+        invalidate_booking_origins([*left_trips, target.pk])
+    Reservation.objects.bulk_update(reservations, ['voyage', 'siege'], batch_size=500)
+    VenteGuichet.objects.bulk_update(ventes, ['voyage', 'siege', 'qr_code_data'], batch_size=500)
+
+
+def _indexed_payloads(keys):
+    condition = Q(pk__in=[])
+    for source in {source for source, _ in keys}:
+        condition |= Q(source=source, source_id__in=[pk for key_source, pk in keys if key_source == source])
+    return {
+        (source, source_id): payload
+        for source, source_id, payload in TicketIndex.objects.filter(condition).values_list(
+            'source', 'source_id', 'payload',
+        )
+    }
+
+
+def bulk_log_actions(user, action, entries, ip_address=None):
+    """Version groupée de ``log_action`` : ``entries`` est une liste ``(instance, old_values, new_values)``.
+
+    ``bulk_create`` ne passe pas par les signaux : le texte de recherche et ses
+    trigrammes sont donc écrits ici.
+    """
+    logs = [
+        AuditLog(
+            user=user,
+            action=action,
+            model_name=instance.__class__.__name__,
+            object_id=str(instance.pk),
+            object_repr=str(instance)[:255],
+            old_values=old_values,
+            new_values=new_values,
+            ip_address=ip_address,
+        )
+        for instance, old_values, new_values in entries
+    ]
+    for log in logs:
+        log.search_text = audit_search_document(log)
+    AuditLog.objects.bulk_create(logs, batch_size=500)
+    index_documents(SearchGram.SCOPE_AUDIT, {log.pk: log.search_text for log in logs if log.pk})
+    return logs
+
+
+@transaction.atomic
+def perform_bulk_ticket_action(
+    *,
+    user,
+    company,
+    tickets,
+    action,
+    reason='',
+    target_voyage_id=None,
+    ip_address=None,
+):
+    """Applique une même action à un lot de billets, tous canaux confondus.
+
+    Les billets sont verrouillés puis modifiés par requêtes groupées (une par
+    canal et par statut cible), les places sont recalculées une seule fois par
+    voyage touché et le journal d'audit est écrit en un ``bulk_create``. Les
+    billets inéligibles sont ignorés et rapportés avec leur motif.
+    """
+    if action not in BULK_TICKET_ACTIONS:
+        raise ValidationError({'detail': 'Action de billet inconnue.'})
+    reason = str(reason or '').strip()
+    if action in {'cancel', 'refund', 'move'} and not reason:
+        raise ValidationError({'detail': 'Une justification est obligatoire.'})
+    keys = _bulk_ticket_keys(tickets)
+    target = lock_target_voyage(company, target_voyage_id) if action == 'move' else None
+    stops = target_stops(target) if target else None
+    loaded = lock_tickets(company, keys)
+
+    items, skipped = [], []
+    for source, pk in keys:
+        item = loaded.get((source, pk))
+        refusal = ticket_refusal(item, source, action, target, stops)
+        if refusal:
+            skipped.append({'source': source, 'id': pk, 'detail': refusal})
+        else:
+            items.append((source, item))
+
+    assigned = {}
+    if action == 'move':
+        assigned = assign_target_seats(target, items, stops)
+        for source, item in items:
+            if (source, str(item.pk)) not in assigned:
+                skipped.append({'source': source, 'id': str(item.pk), 'detail': 'Plus de siège libre sur le voyage cible.'})
+        items = [(source, item) for source, item in items if (source, str(item.pk)) in assigned]
+
+    old_values = {
+        (source, str(item.pk)): {
+            'status': ticket_status(item, source),
+            'voyage_id': getattr(_ticket_voyage(item, source), 'pk', None),
+            'seat': str(ticket_seat(item, source)),
+        }
+        for source, item in items
+    }
+    voyages = {}
+    released = {}
+    for source, item in items:
+        voyage = _ticket_voyage(item, source)
+        if voyage is not None:
+            voyages[voyage.pk] = voyage
+            released.setdefault(voyage.pk, set()).add(ticket_seat(item, source))
+
+    if action in {'cancel', 'refund'}:
+        close_tickets(user, action, items)
+    elif action == 'mark_used':
+        _bulk_mark_used(user, items)
+    elif items:
+        move_tickets(user, target, items, assigned, stops)
+        voyages[target.pk] = target
+
+    if action != 'mark_used':
+        for voyage_id, seat_numbers in released.items():
+            release_unused_seats(voyages[voyage_id], seat_numbers)
+    for voyage in voyages.values():
+        recalculate_voyage_availability(voyage)
+    for source in TICKET_MODELS:
+        sync_ticket_index(source, [item.pk for item_source, item in items if item_source == source])
+
+    payloads = _indexed_payloads([(source, str(item.pk)) for source, item in items])
+    bulk_log_actions(
+        user,
+        'UPDATE',
+        [
+            (
+                item,
+                old_values[(source, str(item.pk))],
+                {
+                    'operation': action,
+                    'bulk': True,
+                    'reason': reason or BULK_MANUAL_BOARDING,
+                    'actor_role': actor_role(user),
+                    'source': source,
+                    'status': payloads[(source, str(item.pk))]['status'],
+                    'voyage_id': payloads[(source, str(item.pk))]['voyage_id'],
+                    'seat': payloads[(source, str(item.pk))]['seat'],
+                },
+            )
+            for source, item in items
+        ],
+        ip_address=ip_address,
+    )
+    return {
+        'action': action,
+        'tickets': [payloads[(source, str(item.pk))] for source, item in items],
+        'skipped': skipped,
+    }
+
+
 def ticket_audit_queryset(company):
-    booking_ids = Booking.all_objects.filter(
-        trip__company=company,
-    ).values_list('id', flat=True)
-    reservation_ids = Reservation.objects.filter(
-        voyage__trip__company=company,
-    ).values_list('id', flat=True)
-    sale_ids = VenteGuichet.objects.filter(
-        voyage__trip__company=company,
-    ).values_list('id', flat=True)
-    from .models import AuditLog
+    tickets = TicketIndex.objects.filter(company=company)
     return AuditLog.objects.select_related('user').filter(
-        Q(model_name='Booking', object_id__in=[str(value) for value in booking_ids])
-        | Q(model_name='Reservation', object_id__in=[str(value) for value in reservation_ids])
-        | Q(model_name='VenteGuichet', object_id__in=[str(value) for value in sale_ids])
+        Q(model_name='Booking', object_id__in=tickets.filter(source='booking').values('source_id'))
+        | Q(model_name='Reservation', object_id__in=tickets.filter(source='mobile').values('source_id'))
+        | Q(model_name='VenteGuichet', object_id__in=tickets.filter(source='guichet').values('source_id'))
     )
@@ -35,9 +35,14 @@ urlpatterns = [
     path('me/', views.CurrentUserView.as_view(), name='current-user'),
     path('loyalty/', views.LoyaltySummaryView.as_view(), name='loyalty-summary'),
     path('tracking/trips/', views.ManageableTrackingTripsView.as_view(), name='manageable-tracking-trips'),
+    path('tracking/fleet/', views.FleetTrackingView.as_view(), name='fleet-tracking'),
+    path('tracking/fleet/stream/', views.FleetTrackingStreamView.as_view(), name='fleet-tracking-stream'),
     path('scheduled_trips/<int:pk>/tracking/', views.TripTrackingView.as_view(), name='trip-tracking'),
+    path('scheduled_trips/<int:pk>/tracking/replay/', views.TripTrackingReplayView.as_view(), name='trip-tracking-replay'),
+    path('scheduled_trips/<int:pk>/tracking/stream/', views.TripTrackingStreamView.as_view(), name='trip-tracking-stream'),
     path('scheduled_trips/<int:pk>/tracking/start/', views.StartTripTrackingView.as_view(), name='start-trip-tracking'),
     path('scheduled_trips/<int:pk>/tracking/position/', views.TripTrackingPositionView.as_view(), name='trip-tracking-position'),
+    path('scheduled_trips/<int:pk>/tracking/positions/', views.TripTrackingPositionsView.as_view(), name='trip-tracking-positions'),
     path('scheduled_trips/<int:pk>/tracking/stop/', views.StopTripTrackingView.as_view(), name='stop-trip-tracking'),
     path('scheduled_trips/<int:pk>/stops/', views.scheduled_trip_stops, name='scheduled-trip-stops'),
     path('scheduled_trips/search/', views.ScheduledTripSearchView.as_view(), name='scheduled-trip-search'),
@@ -47,8 +52,10 @@ urlpatterns = [
     path('cities/', views.cities_list, name='cities-list'),
     path('my-bookings/', views.MyBookingsView.as_view(), name='my-bookings'),
     path('payment/initier/', views.InitierPaiementView.as_view(), name='payment-initier'),
+    path('payment/operateurs/', views.OperateursPaiementView.as_view(), name='payment-operateurs'),
     path('payment/webhook/', views.WebhookQOSView.as_view(), name='payment-webhook'),
     path('payment/verifier/<str:ref>/', views.VerifierPaiementView.as_view(), name='payment-verifier'),
+    path('payment/verifier/<str:ref>/flux/', views.VerifierPaiementFluxView.as_view(), name='payment-verifier-flux'),
     path('sieges/<str:voyage_id>/', views.SiegesView.as_view(), name='sieges-voyage'),
     # Inclure les routes du routeur
     path('', include(router.urls)),
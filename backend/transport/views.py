@@ -1,5 +1,6 @@
 import json
 import logging
+import time
 from decimal import Decimal
 from rest_framework.decorators import action
 from rest_framework.decorators import api_view
@@ -23,19 +24,31 @@ from django.contrib.auth import authenticate
 from .models import ScheduledTrip
 from .serializers import ScheduledTripSerializer
 from .serializers import RegisterSerializer, UserSerializer, CompanySerializer, TripSerializer, BookingSerializer, PaymentSerializer, ReviewSerializer, NotificationSerializer, ScheduledTripSerializer, CompanyStatsSerializer, TripStopSerializer, BoardingZoneSerializer, CitySerializer, TripSearchSerializer, BookingCreateSerializer, DashboardStatsSerializer
+from django.conf import settings
 from django.http import Http404
+from django.urls import reverse
+from togotrans_api.renderers import EventStreamRenderer, SafeIntegerJSONRenderer, preserve_large_integer_ids
+from togotrans_api.streaming import event_stream_response
 from .models import Company, City, Trip, Booking, Payment, Review, Notification, Reservation, ScheduledTrip, UserProfile, TripStop, BoardingZone
 from .models.audit import log_action
+from .services.search import normalize_phone
 from .services.loyalty import get_loyalty_summary
 from django.contrib.auth import authenticate
 from django.contrib.auth.hashers import check_password, make_password
 from django.utils.dateparse import parse_datetime
 from .models import TripTrackingSession
+from .services import tracking_live
 from .services.tracking import (
+    MAX_BATCH_POSITIONS,
+    approach_alert,
+    fleet_snapshot,
+    passenger_target,
     record_position,
+    record_positions,
     serialize_tracking,
     start_tracking,
     stop_tracking,
+    tracking_stops,
 )
 
 logger = logging.getLogger(__name__)
@@ -50,18 +63,6 @@ def make_json_safe(data):
     return json.loads(json.dumps(data, cls=DjangoJSONEncoder))
 
 
-def normalize_phone(value):
-    """Normalize phone to canonical '228' + 8 digits, or return None if invalid/empty."""
-    if not value:
-        return None
-    digits = ''.join([c for c in str(value) if c.isdigit()])
-    if digits.startswith('228') and len(digits) == 11:
-        return digits
-    if len(digits) == 8:
-        return '228' + digits
-    return None
-
-
 def build_company_delete_snapshot(company):
     trip_ids = list(Trip.all_objects.filter(company=company).values_list('id', flat=True))
     booking_ids = list(Booking.all_objects.filter(trip_id__in=trip_ids).values_list('id', flat=True))
@@ -731,6 +732,162 @@ class TripTrackingView(APIView):
         ))
 
 
+def _tracking_response(request, scheduled_trip, session, **extra):
+    """État du voyage pour le chauffeur, publié aussi aux abonnés du flux en direct."""
+    payload = serialize_tracking(
+        scheduled_trip,
+        session,
+        user=request.user,
+        include_history=True,
+    )
+    if session.delay_minutes != payload['delay_minutes']:
+        session.delay_minutes = payload['delay_minutes']
+        session.save(update_fields=['delay_minutes', 'updated_at'])
+    tracking_live.publish(payload)
+    return Response({**payload, **extra})
+
+
+class TripTrackingReplayView(APIView):
+    """Trajectoire complète d'un voyage pour le rejeu et les statistiques, lue sous forme compacte."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        from .services.trajectories import encode_polyline, session_trajectory, trajectory_summary
+
+        scheduled_trip = _tracking_trip(pk)
+        if not _can_manage_tracking(request.user, scheduled_trip):
+            return Response({'detail': 'Accès non autorisé.'}, status=status.HTTP_403_FORBIDDEN)
+        session = TripTrackingSession.objects.filter(scheduled_trip=scheduled_trip).first()
+        points = session_trajectory(session) if session else []
+        return Response({
+            'scheduled_trip_id': scheduled_trip.id,
+            'compacted': bool(session and hasattr(session, 'compact_trajectory')),
+            'polyline': encode_polyline((point['latitude'], point['longitude']) for point in points),
+            'points': points,
+            **trajectory_summary(points),
+        })
+
+
+def _sse_event(name, seq, data):
+    body = json.dumps(preserve_large_integer_ids(data), cls=DjangoJSONEncoder)
+    return f"id: {seq}\nevent: {name}\ndata: {body}\n\n"
+
+
+class TripTrackingStreamView(APIView):
+    """Suivi en Server-Sent Events : un instantané, puis les changements publiés à chaque position.
+
+    Le flux se ferme après ``TRACKING_SSE_SECONDS`` ; le client se reconnecte
+    et reçoit un nouvel instantané.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = [SafeIntegerJSONRenderer, EventStreamRenderer]
+    PING_SECONDS = 15
+
+    def get(self, request, pk):
+        scheduled_trip = _tracking_trip(pk)
+        if not _can_view_tracking(request.user, scheduled_trip):
+            return Response(
+                {'detail': 'Le suivi est réservé aux voyageurs ayant un billet pour ce voyage.'},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+        last = tracking_live.latest(scheduled_trip.id)
+        session = TripTrackingSession.objects.filter(scheduled_trip=scheduled_trip).first()
+        snapshot = serialize_tracking(scheduled_trip, session, user=request.user)
+        # Arrêt du passager résolu une fois : les alertes d'approche se calculent sans requête.
+        target = passenger_target(request.user, scheduled_trip.id, tracking_stops(scheduled_trip))
+
+        def events():
+            seq = last['seq'] if last else 0
+            yield _sse_event('snapshot', seq, snapshot)
+            deadline = time.monotonic() + settings.TRACKING_SSE_SECONDS
+            while (remaining := deadline - time.monotonic()) > 0:
+                message = tracking_live.wait_for(scheduled_trip.id, seq, min(remaining, self.PING_SECONDS))
+                if message is None:
+                    yield ': ping\n\n'
+                    continue
+                seq, delta = message['seq'], message['delta']
+                position = delta['current_position']
+                current = (position['latitude'], position['longitude']) if position else None
+                yield _sse_event('position', seq, {
+                    **delta,
+                    'approach_alert': approach_alert(target, current, set(delta['passed_stop_ids'])),
+                })
+
+        return event_stream_response(events())
+
+
+class FleetTrackingView(APIView):
+    """Carte de flotte : tous les suivis actifs de la compagnie (de la plateforme pour un superutilisateur)."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        company = _tracking_company_for_user(request.user)
+        if company is False:
+            return Response({'detail': 'Accès réservé à la compagnie.'}, status=status.HTTP_403_FORBIDDEN)
+        return Response({
+            'generated_at': timezone.now(),
+            'vehicles': fleet_snapshot(company.id if company else None),
+        })
+
+
+class FleetTrackingStreamView(APIView):
+    """Carte de flotte en Server-Sent Events.
+
+    Un instantané à l'ouverture puis toutes les ``SNAPSHOT_SECONDS`` (suivis
+    démarrés ou devenus hors ligne) ; entre-temps, un événement ``update`` par
+    voyage dont le canal a publié, lu en une seule passe du cache.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = [SafeIntegerJSONRenderer, EventStreamRenderer]
+    PING_SECONDS = 15
+    SNAPSHOT_SECONDS = 30
+
+    def get(self, request):
+        company = _tracking_company_for_user(request.user)
+        if company is False:
+            return Response({'detail': 'Accès réservé à la compagnie.'}, status=status.HTTP_403_FORBIDDEN)
+        company_id = company.id if company else None
+
+        def events():
+            deadline = time.monotonic() + settings.TRACKING_SSE_SECONDS
+            next_snapshot = 0
+            fleet_seq = None
+            while (remaining := deadline - time.monotonic()) > 0:
+                if time.monotonic() >= next_snapshot:
+                    # Marqueur lu avant l'instantané : une position publiée pendant sa
+                    # construction réveille la boucle aussitôt.
+                    fleet_seq = tracking_live.fleet_seq()
+                    vehicles = fleet_snapshot(company_id)
+                    published = tracking_live.latest_many([vehicle['scheduled_trip_id'] for vehicle in vehicles])
+                    seen = {}
+                    for vehicle in vehicles:
+                        message = published.get(vehicle['scheduled_trip_id'])
+                        in_snapshot = message and (
+                            message['delta']['updated_at'], message['delta']['status'],
+                        ) == (vehicle['updated_at'], vehicle['status'])
+                        seen[vehicle['scheduled_trip_id']] = message['seq'] if in_snapshot else None
+                    yield _sse_event('snapshot', fleet_seq, {'generated_at': timezone.now(), 'vehicles': vehicles})
+                    next_snapshot = time.monotonic() + self.SNAPSHOT_SECONDS
+                    continue
+                changed = tracking_live.wait_for_fleet(
+                    fleet_seq, min(remaining, self.PING_SECONDS, max(next_snapshot - time.monotonic(), 0)),
+                )
+                if changed is None:
+                    if time.monotonic() < next_snapshot:
+                        yield ': ping\n\n'
+                    continue
+                fleet_seq = changed
+                for pk, message in tracking_live.latest_many(list(seen)).items():
+                    if message['seq'] == seen[pk]:
+                        continue
+                    seen[pk] = message['seq']
+                    yield _sse_event('update', fleet_seq, message['delta'])
+                    if not message['delta']['is_active']:
+                        del seen[pk]
+
+        return event_stream_response(events())
+
+
 class StartTripTrackingView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
@@ -739,16 +896,50 @@ class StartTripTrackingView(APIView):
         if not _can_manage_tracking(request.user, scheduled_trip):
             return Response({'detail': 'Accès non autorisé.'}, status=status.HTTP_403_FORBIDDEN)
         session = start_tracking(scheduled_trip, request.user)
-        payload = serialize_tracking(
-            scheduled_trip,
-            session,
-            user=request.user,
-            include_history=True,
-        )
-        if session.delay_minutes != payload['delay_minutes']:
-            session.delay_minutes = payload['delay_minutes']
-            session.save(update_fields=['delay_minutes', 'updated_at'])
-        return Response(payload)
+        return _tracking_response(request, scheduled_trip, session)
+
+
+def _parse_tracking_fix(data):
+    """Valide une position GPS envoyée par le chauffeur ; lève ``ValueError`` avec le message d'erreur."""
+    try:
+        latitude = float(data.get('latitude'))
+        longitude = float(data.get('longitude'))
+    except (TypeError, ValueError):
+        raise ValueError('Coordonnées GPS invalides.')
+    if not -90 <= latitude <= 90 or not -180 <= longitude <= 180:
+        raise ValueError('Coordonnées GPS hors limites.')
+
+    def optional_number(name, minimum=None, maximum=None):
+        raw_value = data.get(name)
+        if raw_value is None:
+            return None
+        value = float(raw_value)
+        if minimum is not None and value < minimum:
+            raise ValueError
+        if maximum is not None and value > maximum:
+            raise ValueError
+        return value
+
+    try:
+        accuracy_m = optional_number('accuracy_m', 0)
+        speed_mps = optional_number('speed_mps', 0, 80)
+        heading = optional_number('heading', 0, 360)
+    except (TypeError, ValueError):
+        raise ValueError('Précision, vitesse ou direction invalide.')
+
+    recorded_at = None
+    if data.get('recorded_at'):
+        parsed = parse_datetime(str(data['recorded_at']))
+        if parsed:
+            recorded_at = parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+    return {
+        'latitude': latitude,
+        'longitude': longitude,
+        'accuracy_m': accuracy_m,
+        'speed_mps': speed_mps,
+        'heading': heading,
+        'recorded_at': recorded_at,
+    }
 
 
 class TripTrackingPositionView(APIView):
@@ -760,46 +951,51 @@ class TripTrackingPositionView(APIView):
             return Response({'detail': 'Accès non autorisé.'}, status=status.HTTP_403_FORBIDDEN)
 
         try:
-            latitude = float(request.data.get('latitude'))
-            longitude = float(request.data.get('longitude'))
-        except (TypeError, ValueError):
-            return Response({'detail': 'Coordonnées GPS invalides.'}, status=status.HTTP_400_BAD_REQUEST)
-        if not -90 <= latitude <= 90 or not -180 <= longitude <= 180:
-            return Response({'detail': 'Coordonnées GPS hors limites.'}, status=status.HTTP_400_BAD_REQUEST)
-
-        def optional_number(name, minimum=None, maximum=None):
-            raw_value = request.data.get(name)
-            if raw_value is None:
-                return None
-            value = float(raw_value)
-            if minimum is not None and value < minimum:
-                raise ValueError
-            if maximum is not None and value > maximum:
-                raise ValueError
-            return value
+            fix = _parse_tracking_fix(request.data)
+        except ValueError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            accuracy_m = optional_number('accuracy_m', 0)
-            speed_mps = optional_number('speed_mps', 0, 80)
-            heading = optional_number('heading', 0, 360)
-        except (TypeError, ValueError):
-            return Response({'detail': 'Précision, vitesse ou direction invalide.'}, status=status.HTTP_400_BAD_REQUEST)
-
-        recorded_at = timezone.now()
-        if request.data.get('recorded_at'):
-            parsed = parse_datetime(str(request.data['recorded_at']))
-            if parsed:
-                recorded_at = parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+            session, _ = record_position(scheduled_trip, request.user, fix)
+        except TripTrackingSession.DoesNotExist:
+            return Response(
+                {'detail': 'Démarrez d’abord le suivi GPS.'},
+                status=status.HTTP_409_CONFLICT,
+            )
+        except ValueError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_409_CONFLICT)
+        return _tracking_response(request, scheduled_trip, session)
+
+
+class TripTrackingPositionsView(APIView):
+    """Rafale de positions GPS mises en mémoire par le téléphone du chauffeur hors réseau."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, pk):
+        scheduled_trip = _tracking_trip(pk)
+        if not _can_manage_tracking(request.user, scheduled_trip):
+            return Response({'detail': 'Accès non autorisé.'}, status=status.HTTP_403_FORBIDDEN)
+
+        raw_fixes = request.data if isinstance(request.data, list) else request.data.get('positions')
+        if not isinstance(raw_fixes, list) or not raw_fixes:
+            return Response({'detail': 'Envoyez une liste de positions.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(raw_fixes) > MAX_BATCH_POSITIONS:
+            return Response(
+                {'detail': f'{MAX_BATCH_POSITIONS} positions au maximum par envoi.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        fixes = []
+        for index, raw_fix in enumerate(raw_fixes):
+            try:
+                if not isinstance(raw_fix, dict):
+                    raise ValueError('Coordonnées GPS invalides.')
+                fixes.append(_parse_tracking_fix(raw_fix))
+            except ValueError as exc:
+                return Response({'detail': str(exc), 'index': index}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            session, _ = record_position(scheduled_trip, request.user, {
-                'latitude': latitude,
-                'longitude': longitude,
-                'accuracy_m': accuracy_m,
-                'speed_mps': speed_mps,
-                'heading': heading,
-                'recorded_at': recorded_at,
-            })
+            session, positions = record_positions(scheduled_trip, request.user, fixes)
         except TripTrackingSession.DoesNotExist:
             return Response(
                 {'detail': 'Démarrez d’abord le suivi GPS.'},
@@ -807,16 +1003,7 @@ class TripTrackingPositionView(APIView):
             )
         except ValueError as exc:
             return Response({'detail': str(exc)}, status=status.HTTP_409_CONFLICT)
-        payload = serialize_tracking(
-            scheduled_trip,
-            session,
-            user=request.user,
-            include_history=True,
-        )
-        if session.delay_minutes != payload['delay_minutes']:
-            session.delay_minutes = payload['delay_minutes']
-            session.save(update_fields=['delay_minutes', 'updated_at'])
-        return Response(payload)
+        return _tracking_response(request, scheduled_trip, session, accepted=len(positions))
 
 
 class StopTripTrackingView(APIView):
@@ -830,12 +1017,7 @@ class StopTripTrackingView(APIView):
             session = stop_tracking(scheduled_trip, request.user)
         except TripTrackingSession.DoesNotExist:
             return Response({'detail': 'Aucun suivi à arrêter.'}, status=status.HTTP_409_CONFLICT)
-        return Response(serialize_tracking(
-            scheduled_trip,
-            session,
-            user=request.user,
-            include_history=True,
-        ))
+        return _tracking_response(request, scheduled_trip, session)
 
 
 class UserViewSet(viewsets.ModelViewSet):
@@ -1798,12 +1980,41 @@ def availability_view(request):
     })
 
 
+def _operateur_indisponible(exc):
+    """Réponse 503 d'un opérateur coupé par le disjoncteur, avec l'alternative."""
+    from .services import operator_health
+
+    response = Response({
+        'erreur': 'OPERATEUR_INDISPONIBLE',
+        'detail': str(exc),
+        'operateur': operator_health.CODES_RESERVATION[exc.operateur],
+        'alternative': operator_health.CODES_RESERVATION[exc.alternative],
+        'reessayer_dans': exc.reessayer_dans,
+    }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    response['Retry-After'] = str(exc.reessayer_dans)
+    return response
+
+
+class OperateursPaiementView(APIView):
+    """Santé des opérateurs mobile money, pour proposer l'autre en cas de panne."""
+    permission_classes = [AllowAny]
+    authentication_classes = []
+
+    def get(self, request, *args, **kwargs):
+        from .services import operator_health
+
+        operateurs = operator_health.sante_operateurs()
+        disponibles = [item['operateur'] for item in operateurs if item['disponible']]
+        for item in operateurs:
+            item['alternative'] = next((code for code in disponibles if code != item['operateur']), None)
+        return Response({'operateurs': operateurs})
+
+
 class InitierPaiementView(APIView):
     permission_classes = [AllowAny]
 
     def post(self, request, *args, **kwargs):
-        from .models import Reservation
-        from .services import qos_service, reservation_service
+        from .services import operator_health, payment_jobs, reservation_service
 
         required = [
             'voyage_id',
@@ -1817,6 +2028,12 @@ class InitierPaiementView(APIView):
         if missing:
             return Response({'erreur': 'CHAMPS_REQUIS', 'champs': missing}, status=status.HTTP_400_BAD_REQUEST)
 
+        # Opérateur coupé : on refuse avant de bloquer le siège.
+        try:
+            operator_health.verifier_disponible(request.data.get('operateur'))
+        except operator_health.OperatorUnavailable as exc:
+            return _operateur_indisponible(exc)
+
         voyage_id = request.data.get('voyage_id')
         numero_siege = request.data.get('numero_siege')
         siege_id = reservation_service.reserver_siege_temporaire(voyage_id, numero_siege)
@@ -1824,84 +2041,69 @@ class InitierPaiementView(APIView):
             return Response({'erreur': 'SIEGE_INDISPONIBLE'}, status=status.HTTP_409_CONFLICT)
 
         try:
-            reservation = reservation_service.creer_reservation(
-                voyage_id=voyage_id,
-                siege_id=siege_id,
-                client_nom=request.data.get('client_nom'),
-                client_telephone=request.data.get('client_telephone'),
-                montant_billet=request.data.get('montant_billet'),
-                operateur=request.data.get('operateur'),
-            )
-
-            description = (
-                f"Billet EVEX {request.data.get('ville_depart', '')} "
-                f"- {request.data.get('ville_arrivee', '')}"
-            ).strip()
-            paiement = qos_service.initier_paiement(
-                reservation.client_telephone,
-                reservation.montant_total,
-                reservation.reference_evex,
-                reservation.operateur,
-                description,
-            )
-            if not paiement.get('succes'):
-                reservation_service.liberer_siege(siege_id)
-                reservation.statut_paiement = Reservation.STATUT_ECHOUE
-                reservation.save(update_fields=['statut_paiement'])
-                return Response(
-                    {'erreur': 'QOS_INIT_ECHOUE', 'detail': paiement.get('erreur')},
-                    status=status.HTTP_502_BAD_GATEWAY,
+            with transaction.atomic():
+                reservation = reservation_service.creer_reservation(
+                    voyage_id=voyage_id,
+                    siege_id=siege_id,
+                    client_nom=request.data.get('client_nom'),
+                    client_telephone=request.data.get('client_telephone'),
+                    montant_billet=request.data.get('montant_billet'),
+                    operateur=request.data.get('operateur'),
                 )
-
-            reservation.transaction_id_qos = paiement.get('transaction_id')
-            reservation.reference_qos = paiement.get('reference_qos')
-            reservation.save(update_fields=['transaction_id_qos', 'reference_qos'])
-            return Response({
-                'reference_evex': reservation.reference_evex,
-                'transaction_id': reservation.transaction_id_qos,
-                'montant_billet': reservation.montant_billet,
-                'frais_evex': reservation.frais_evex,
-                'montant_total': reservation.montant_total,
-                'operateur': reservation.operateur,
-                'siege': numero_siege,
-                'expires_dans': '5 minutes',
-            })
+                # L'appel à l'opérateur part sur le pool de workers après le commit.
+                payment_jobs.enqueue_payment(reservation)
         except Exception as exc:
             logger.exception("Payment init endpoint failed")
             reservation_service.liberer_siege(siege_id)
             return Response({'erreur': 'ERREUR_INTERNE', 'detail': str(exc)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+        statut_url = reverse('payment-verifier', args=[reservation.reference_evex])
+        return Response({
+            'reference_evex': reservation.reference_evex,
+            # La référence EVEX est le transref envoyé à l'opérateur.
+            'transaction_id': reservation.reference_evex,
+            'statut': reservation.statut_paiement,
+            'statut_url': request.build_absolute_uri(statut_url),
+            'flux_url': request.build_absolute_uri(
+                reverse('payment-verifier-flux', args=[reservation.reference_evex]),
+            ),
+            'montant_billet': reservation.montant_billet,
+            'frais_evex': reservation.frais_evex,
+            'montant_total': reservation.montant_total,
+            'operateur': reservation.operateur,
+            'siege': numero_siege,
+            'expires_dans': '5 minutes',
+        }, status=status.HTTP_202_ACCEPTED)
+
 
 class WebhookQOSView(APIView):
     permission_classes = [AllowAny]
     authentication_classes = []
 
     def post(self, request, *args, **kwargs):
-        from .models import Reservation
-        from .services import qos_service, reservation_service
+        from .models import PaymentWebhook, Reservation
+        from .services import payment_webhooks, qos_service
 
         signature = request.headers.get('X-QOS-Signature')
-        if not qos_service.valider_signature_webhook(request.body, signature):
+        if not qos_service.valider_webhook(request.body, signature):
             logger.warning("Invalid QOS webhook signature")
             return Response({'erreur': 'SIGNATURE_INVALIDE'}, status=status.HTTP_401_UNAUTHORIZED)
 
         payload = request.data
         reference = payload.get('reference')
-        qos_status = str(payload.get('status') or '').upper()
-        transaction_id = payload.get('transactionId') or payload.get('transaction_id')
-
-        try:
-            reservation = Reservation.objects.get(reference_evex=reference)
-        except Reservation.DoesNotExist:
+        if not reference:
+            return Response({'erreur': 'REFERENCE_MANQUANTE'}, status=status.HTTP_400_BAD_REQUEST)
+        if not Reservation.objects.filter(reference_evex=str(reference)).exists():
             return Response({'erreur': 'RESERVATION_INTROUVABLE'}, status=status.HTTP_404_NOT_FOUND)
 
-        if qos_status == 'SUCCESS':
-            reservation_service.confirmer_paiement(reference, transaction_id)
-        elif qos_status in ['FAILED', 'CANCELLED', 'EXPIRED']:
-            reservation_service.liberer_siege(reservation.siege_id)
-            reservation.statut_paiement = Reservation.STATUT_ECHOUE
-            reservation.save(update_fields=['statut_paiement'])
-
+        # Acquittement immédiat : le worker de payment_webhooks applique le callback.
+        payment_webhooks.recevoir_webhook(
+            PaymentWebhook.SOURCE_RESERVATION,
+            reference,
+            str(payload.get('status') or '').upper(),
+            payload,
+            transaction_id=payload.get('transactionId') or payload.get('transaction_id'),
+        )
         return Response({'received': True})
 
 
@@ -1910,37 +2112,45 @@ class VerifierPaiementView(APIView):
 
     def get(self, request, ref, *args, **kwargs):
         from .models import Reservation
-        from .services import qos_service, reservation_service
+        from .services.payment_jobs import payment_status_payload
 
+        # Statut stocké uniquement : les workers, le webhook et l'expiration le tiennent à jour.
         try:
-            reservation = Reservation.objects.select_related('siege').get(reference_evex=ref)
+            reservation = Reservation.objects.select_related('siege', 'payment_job').get(reference_evex=ref)
         except Reservation.DoesNotExist:
             return Response({'erreur': 'RESERVATION_INTROUVABLE'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(payment_status_payload(reservation))
 
-        if reservation.statut_paiement == Reservation.STATUT_EN_ATTENTE and reservation.transaction_id_qos:
-            verification = qos_service.verifier_paiement(reservation.transaction_id_qos)
-            nouveau_statut = verification.get('statut')
-            if nouveau_statut == Reservation.STATUT_PAYE:
-                reservation = reservation_service.confirmer_paiement(
-                    reservation.reference_evex,
-                    reservation.transaction_id_qos,
-                )
-            elif nouveau_statut in [Reservation.STATUT_ECHOUE, Reservation.STATUT_EXPIRE]:
-                reservation_service.liberer_siege(reservation.siege_id)
-                reservation.statut_paiement = nouveau_statut
-                reservation.save(update_fields=['statut_paiement'])
 
-        reservation.refresh_from_db()
-        return Response({
-            'reference': reservation.reference_evex,
-            'statut': reservation.statut_paiement,
-            'montant_total': reservation.montant_total,
-            'frais_evex': reservation.frais_evex,
-            'montant_billet': reservation.montant_billet,
-            'siege': reservation.siege.numero,
-            'paye': reservation.statut_paiement == Reservation.STATUT_PAYE,
-            'message': 'Paiement confirme' if reservation.statut_paiement == Reservation.STATUT_PAYE else 'Paiement en attente',
-        })
+class VerifierPaiementFluxView(APIView):
+    """Statut du paiement en Server-Sent Events, jusqu'à un statut final ou ``PAYMENT_SSE_SECONDS``."""
+
+    permission_classes = [AllowAny]
+    renderer_classes = [SafeIntegerJSONRenderer, EventStreamRenderer]
+    POLL_SECONDS = 1
+
+    def get(self, request, ref, *args, **kwargs):
+        from .models import Reservation
+        from .services.payment_jobs import payment_status_payload
+
+        reservations = Reservation.objects.select_related('siege', 'payment_job')
+        if not reservations.filter(reference_evex=ref).exists():
+            return Response({'erreur': 'RESERVATION_INTROUVABLE'}, status=status.HTTP_404_NOT_FOUND)
+
+        def events():
+            deadline = time.monotonic() + settings.PAYMENT_SSE_SECONDS
+            last = None
+            while True:
+                payload = payment_status_payload(reservations.get(reference_evex=ref))
+                if payload != last:
+                    yield f"event: statut\ndata: {json.dumps(payload)}\n\n"
+                    last = payload
+                if payload['termine'] or time.monotonic() >= deadline:
+                    return
+                time.sleep(self.POLL_SECONDS)
+                yield ': ping\n\n'
+
+        return event_stream_response(events())
 
 
 class SiegesView(APIView):
@@ -330,6 +330,16 @@ export async function sendTripPosition(
   });
 }
 
+export async function sendTripPositions(
+  tripId: ApiId,
+  locations: DriverLocationPayload[],
+): Promise<TrackingSnapshot & { accepted: number }> {
+  return request<TrackingSnapshot & { accepted: number }>(`/scheduled_trips/${tripId}/tracking/positions/`, {
+    method: 'POST',
+    body: JSON.stringify({ positions: locations }),
+  });
+}
+
 export async function stopTripTracking(tripId: ApiId): Promise<TrackingSnapshot> {
   return request<TrackingSnapshot>(`/scheduled_trips/${tripId}/tracking/stop/`, {
     method: 'POST',
@@ -41,6 +41,21 @@ export const AdminVoyagesPage: React.FC = () => {
     }
   }, [filters]);
 
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const page = await apiService.getPlatformAdminTickets({ ...filters, cursor: nextCursor });
+      setTickets((current) => [...current, ...page.tickets]);
+      setNextCursor(page.next_cursor);
+      setError(null);
+    } catch (err: any) {
+      setError(err?.message || 'Impossible de charger les billets suivants.');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   useEffect(() => {
     const id = window.setTimeout(() => void load(), 200);
     return () => window.clearTimeout(id);
@@ -147,6 +162,8 @@ const AdminTicketTable: React.FC<{ tickets: PlatformAdminTicket[] }> = ({ ticket
 
 export const AdminTicketsPage: React.FC = () => {
   const [tickets, setTickets] = useState<PlatformAdminTicket[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [companies, setCompanies] = useState<PlatformAdminCompany[]>([]);
   const [filters, setFilters] = useState({ q: '', source: '', status: '', company: '', date: '' });
   const [groupBy, setGroupBy] = useState<'company_day' | 'company' | 'date' | 'none'>('company_day');
@@ -156,11 +173,12 @@ export const AdminTicketsPage: React.FC = () => {
   const load = useCallback(async () => {
     setLoading(true);
     try {
-      const [items, companyItems] = await Promise.all([
+      const [page, companyItems] = await Promise.all([
         apiService.getPlatformAdminTickets(filters),
         apiService.getPlatformAdminCompanies(),
       ]);
-      setTickets(items);
+      setTickets(page.tickets);
+      setNextCursor(page.next_cursor);
       setCompanies(companyItems);
       setError(null);
     } catch (err: any) {
@@ -234,6 +252,11 @@ export const AdminTicketsPage: React.FC = () => {
               <AdminTicketTable tickets={group.items} />
             </section>
           ))}
+          {nextCursor && (
+            <div className="flex justify-center">
+              <SecondaryButton onClick={() => void loadMore()} disabled={loadingMore}>{loadingMore ? 'Chargement…' : 'Charger plus de billets'}</SecondaryButton>
+            </div>
+          )}
         </div>
       )}
     </AdminPageShell>
@@ -95,7 +95,7 @@ const ManagementCopilotPage: React.FC<Props> = ({ scope }) => {
           ? apiService.getPlatformAdminVoyages({ status: 'upcoming' })
           : apiService.getScheduledTrips(companyId),
         scope === 'admin'
-          ? apiService.getPlatformAdminTickets({ source: 'booking' })
+          ? apiService.getPlatformAdminTickets({ source: 'booking' }).then((page) => page.tickets)
           : apiService.getCompanyBookings(companyId),
         apiService.askManagementCopilot('Résume la situation et les priorités du jour.').catch((copilotError: any) => {
           if (copilotError?.status === 429) {
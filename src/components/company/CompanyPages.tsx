@@ -570,6 +570,8 @@ export const CompanyVoyageDetailPage: React.FC = () => {
 export const CompanyTicketsPage: React.FC = () => {
   const { companyId } = useCompanyPortal();
   const [tickets, setTickets] = useState<UnifiedTicket[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [stats, setStats] = useState<CompanyStats>(emptyStats);
   const [operations, setOperations] = useState<TicketOperation[]>([]);
   const [filters, setFilters] = useState({ q: '', source: '', status: '', date: '' });
@@ -580,7 +582,9 @@ export const CompanyTicketsPage: React.FC = () => {
   const loadTickets = useCallback(async () => {
     setLoading(true);
     try {
-      setTickets(await apiService.getCompanyTickets(filters));
+      const page = await apiService.getCompanyTickets(filters);
+      setTickets(page.tickets);
+      setNextCursor(page.next_cursor);
       setError(null);
     } catch (loadError: any) {
       setError(loadError?.message || 'Impossible de charger les billets.');
@@ -589,6 +593,21 @@ export const CompanyTicketsPage: React.FC = () => {
     }
   }, [filters]);
 
+  const loadMoreTickets = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const page = await apiService.getCompanyTickets({ ...filters, cursor: nextCursor });
+      setTickets((current) => [...current, ...page.tickets]);
+      setNextCursor(page.next_cursor);
+      setError(null);
+    } catch (loadError: any) {
+      setError(loadError?.message || 'Impossible de charger les billets suivants.');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const loadOperations = useCallback(async () => {
     try {
       setOperations(await apiService.getCompanyTicketOperations());
@@ -666,6 +685,7 @@ export const CompanyTicketsPage: React.FC = () => {
               </div>
             </section>
           ))}
+          {nextCursor && <div className="flex justify-center"><button type="button" disabled={loadingMore} onClick={() => void loadMoreTickets()} className="rounded-xl border border-slate-200 bg-white px-4 py-2.5 text-sm font-semibold text-slate-700 hover:bg-slate-50 disabled:opacity-50">{loadingMore ? 'Chargement…' : 'Charger plus de billets'}</button></div>}
         </div>
       )}
       <section className="overflow-hidden rounded-3xl border border-slate-200 bg-white shadow-sm">
@@ -39,6 +39,7 @@ const displayDate = (value?: string) => value ? new Intl.DateTimeFormat('fr-FR',
 const displayDateTime = (value?: string) => value ? new Intl.DateTimeFormat('fr-FR', { dateStyle: 'short', timeStyle: 'short' }).format(new Date(value)) : '—';
 const fieldInput = 'h-12 w-full rounded-2xl border border-slate-200 bg-white px-4 text-sm leading-6 text-slate-900 outline-none transition focus:border-blue-500 focus:ring-2 focus:ring-blue-100';
 const filterInput = 'h-11 w-full rounded-xl border border-slate-200 bg-white px-3 text-sm leading-6 text-slate-900 outline-none transition focus:border-blue-500 focus:ring-2 focus:ring-blue-100';
+const CONTROLS_PAGE_SIZE = 10;
 
 const dateInputLabel = (value: string) => {
   const [year, month, day] = value.split('-');
@@ -200,7 +201,8 @@ export const GuichetScannerPage: React.FC = () => {
   const { refreshDashboard } = useGuichetPortal();
   const [raw, setRaw] = useState('');
   const [result, setResult] = useState<GuichetScanResult | null>(null);
-  const [historyData, setHistoryData] = useState<GuichetControlsHistory>({ total: 0, valides: 0, invalides: 0, deja_utilises: 0, controles: [] });
+  const [historyData, setHistoryData] = useState<GuichetControlsHistory>({ total: 0, valides: 0, invalides: 0, deja_utilises: 0, controles: [], next_cursor: null });
+  const [loadingMore, setLoadingMore] = useState(false);
   const [loading, setLoading] = useState(false);
   const [cameraActive, setCameraActive] = useState(false);
   const [error, setError] = useState<string | null>(null);
@@ -209,7 +211,14 @@ export const GuichetScannerPage: React.FC = () => {
   const intervalRef = useRef<ReturnType<typeof setInterval> | null>(null);
   const processingRef = useRef(false);
 
-  const loadHistory = useCallback(async () => { try { setHistoryData(await apiService.historiqueControlesGuichet({ date: todayIso() })); } catch { /* Le scanner reste utilisable. */ } }, []);
+  const loadHistory = useCallback(async () => { try { setHistoryData(await apiService.historiqueControlesGuichet({ date: todayIso(), limit: CONTROLS_PAGE_SIZE })); } catch { /* Le scanner reste utilisable. */ } }, []);
+  const loadMoreHistory = async () => {
+    if (!historyData.next_cursor) return;
+    setLoadingMore(true);
+    try { const page = await apiService.historiqueControlesGuichet({ date: todayIso(), limit: CONTROLS_PAGE_SIZE, cursor: historyData.next_cursor }); setHistoryData((current) => ({ ...current, controles: [...current.controles, ...page.controles], next_cursor: page.next_cursor })); }
+    catch (loadError: any) { setError(loadError?.message || 'Impossible de charger les contrôles précédents.'); }
+    finally { setLoadingMore(false); }
+  };
   useEffect(() => { void loadHistory(); }, [loadHistory]);
   const stopCamera = useCallback(() => { if (intervalRef.current) clearInterval(intervalRef.current); intervalRef.current = null; streamRef.current?.getTracks().forEach((track) => track.stop()); streamRef.current = null; setCameraActive(false); }, []);
   useEffect(() => () => stopCamera(), [stopCamera]);
@@ -236,21 +245,31 @@ export const GuichetScannerPage: React.FC = () => {
   };
 
   const resultTone = result?.resultat === 'valide' ? 'border-emerald-200 bg-emerald-50 text-emerald-800' : result?.resultat === 'deja_utilise' ? 'border-amber-200 bg-amber-50 text-amber-800' : 'border-red-200 bg-red-50 text-red-800';
-  return <GuichetPageShell eyebrow="Contrôle embarquement" title="Scanner un billet" description="Lisez le QR avec la caméra ou collez son contenu pour vérifier immédiatement le billet."><ErrorMessage message={error} /><div className="grid gap-6 xl:grid-cols-[1fr_0.85fr]"><section className="rounded-3xl border border-slate-200 bg-white p-6 shadow-sm"><div className="flex flex-wrap gap-3"><button type="button" onClick={() => cameraActive ? stopCamera() : void startCamera()} className={`inline-flex items-center gap-2 rounded-2xl px-4 py-2.5 text-sm font-semibold ${cameraActive ? 'bg-red-50 text-red-700' : 'bg-blue-600 text-white hover:bg-blue-700'}`}>{cameraActive ? <CameraOff className="h-4 w-4" /> : <Camera className="h-4 w-4" />}{cameraActive ? 'Arrêter la caméra' : 'Ouvrir la caméra'}</button></div><div className={`mt-5 overflow-hidden rounded-2xl bg-slate-950 ${cameraActive ? 'block' : 'hidden'}`}><video ref={videoRef} muted playsInline className="aspect-video w-full object-cover" /></div><form onSubmit={(event) => { event.preventDefault(); void validate(raw); }} className="mt-6"><label className="block"><span className="mb-2 block text-sm font-semibold text-slate-700">Contenu du QR</span><textarea rows={5} value={raw} onChange={(event) => setRaw(event.target.value)} placeholder='{"type":"guichet","reference":"GUICHET-..."}' className="w-full rounded-2xl border border-slate-200 px-4 py-3 font-mono text-xs outline-none focus:border-blue-500" /></label><button type="submit" disabled={loading || !raw.trim()} className="mt-4 inline-flex w-full items-center justify-center gap-2 rounded-2xl bg-blue-600 px-5 py-3 text-sm font-semibold text-white hover:bg-blue-700 disabled:opacity-50">{loading ? <Loader2 className="h-4 w-4 animate-spin" /> : <QrCode className="h-4 w-4" />}{loading ? 'Contrôle…' : 'Valider le billet'}</button></form>{result && <div className={`mt-5 rounded-2xl border p-5 ${resultTone}`}><div className="flex items-start gap-3">{result.resultat === 'valide' ? <CheckCircle2 className="h-6 w-6 shrink-0" /> : <XCircle className="h-6 w-6 shrink-0" />}<div><p className="font-bold">{result.resultat === 'valide' ? 'Billet accepté' : result.resultat === 'deja_utilise' ? 'Billet déjà utilisé' : 'Billet refusé'}</p><p className="mt-1 text-sm">{result.message}</p>{result.reference && <p className="mt-2 text-xs font-semibold">Référence : {result.reference}</p>}</div></div></div>}</section><section className="rounded-3xl border border-slate-200 bg-white p-6 shadow-sm"><h2 className="text-lg font-semibold text-slate-900">Contrôles du jour</h2><div className="mt-4 grid grid-cols-3 gap-2 text-center"><div className="rounded-2xl bg-emerald-50 p-3"><p className="text-xl font-bold text-emerald-700">{historyData.valides}</p><p className="text-xs text-emerald-700">Valides</p></div><div className="rounded-2xl bg-red-50 p-3"><p className="text-xl font-bold text-red-700">{historyData.invalides}</p><p className="text-xs text-red-700">Invalides</p></div><div className="rounded-2xl bg-amber-50 p-3"><p className="text-xl font-bold text-amber-700">{historyData.deja_utilises}</p><p className="text-xs text-amber-700">Déjà lus</p></div></div><div className="mt-5 space-y-3">{historyData.controles.slice(0, 8).map((control) => <div key={control.id} className="rounded-2xl border border-slate-200 p-4"><div className="flex items-center justify-between gap-3"><p className="truncate text-sm font-semibold text-slate-900">{control.reference || 'Sans référence'}</p><span className={`h-2.5 w-2.5 shrink-0 rounded-full ${control.resultat === 'valide' ? 'bg-emerald-500' : control.resultat === 'deja_utilise' ? 'bg-amber-500' : 'bg-red-500'}`} /></div><p className="mt-1 truncate text-xs text-slate-500">{control.message}</p><p className="mt-2 text-[11px] text-slate-400">{displayDateTime(control.created_at)}</p></div>)}{historyData.controles.length === 0 && <div className="py-10 text-center text-sm text-slate-500">Aucun contrôle aujourd’hui.</div>}</div></section></div></GuichetPageShell>;
+  return <GuichetPageShell eyebrow="Contrôle embarquement" title="Scanner un billet" description="Lisez le QR avec la caméra ou collez son contenu pour vérifier immédiatement le billet."><ErrorMessage message={error} /><div className="grid gap-6 xl:grid-cols-[1fr_0.85fr]"><section className="rounded-3xl border border-slate-200 bg-white p-6 shadow-sm"><div className="flex flex-wrap gap-3"><button type="button" onClick={() => cameraActive ? stopCamera() : void startCamera()} className={`inline-flex items-center gap-2 rounded-2xl px-4 py-2.5 text-sm font-semibold ${cameraActive ? 'bg-red-50 text-red-700' : 'bg-blue-600 text-white hover:bg-blue-700'}`}>{cameraActive ? <CameraOff className="h-4 w-4" /> : <Camera className="h-4 w-4" />}{cameraActive ? 'Arrêter la caméra' : 'Ouvrir la caméra'}</button></div><div className={`mt-5 overflow-hidden rounded-2xl bg-slate-950 ${cameraActive ? 'block' : 'hidden'}`}><video ref={videoRef} muted playsInline className="aspect-video w-full object-cover" /></div><form onSubmit={(event) => { event.preventDefault(); void validate(raw); }} className="mt-6"><label className="block"><span className="mb-2 block text-sm font-semibold text-slate-700">Contenu du QR</span><textarea rows={5} value={raw} onChange={(event) => setRaw(event.target.value)} placeholder='{"type":"guichet","reference":"GUICHET-..."}' className="w-full rounded-2xl border border-slate-200 px-4 py-3 font-mono text-xs outline-none focus:border-blue-500" /></label><button type="submit" disabled={loading || !raw.trim()} className="mt-4 inline-flex w-full items-center justify-center gap-2 rounded-2xl bg-blue-600 px-5 py-3 text-sm font-semibold text-white hover:bg-blue-700 disabled:opacity-50">{loading ? <Loader2 className="h-4 w-4 animate-spin" /> : <QrCode className="h-4 w-4" />}{loading ? 'Contrôle…' : 'Valider le billet'}</button></form>{result && <div className={`mt-5 rounded-2xl border p-5 ${resultTone}`}><div className="flex items-start gap-3">{result.resultat === 'valide' ? <CheckCircle2 className="h-6 w-6 shrink-0" /> : <XCircle className="h-6 w-6 shrink-0" />}<div><p className="font-bold">{result.resultat === 'valide' ? 'Billet accepté' : result.resultat === 'deja_utilise' ? 'Billet déjà utilisé' : 'Billet refusé'}</p><p className="mt-1 text-sm">{result.message}</p>{result.reference && <p className="mt-2 text-xs font-semibold">Référence : {result.reference}</p>}</div></div></div>}</section><section className="rounded-3xl border border-slate-200 bg-white p-6 shadow-sm"><h2 className="text-lg font-semibold text-slate-900">Contrôles du jour</h2><div className="mt-4 grid grid-cols-3 gap-2 text-center"><div className="rounded-2xl bg-emerald-50 p-3"><p className="text-xl font-bold text-emerald-700">{historyData.valides}</p><p className="text-xs text-emerald-700">Valides</p></div><div className="rounded-2xl bg-red-50 p-3"><p className="text-xl font-bold text-red-700">{historyData.invalides}</p><p className="text-xs text-red-700">Invalides</p></div><div className="rounded-2xl bg-amber-50 p-3"><p className="text-xl font-bold text-amber-700">{historyData.deja_utilises}</p><p className="text-xs text-amber-700">Déjà lus</p></div></div><div className="mt-5 space-y-3">{historyData.controles.map((control) => <div key={control.id} className="rounded-2xl border border-slate-200 p-4"><div className="flex items-center justify-between gap-3"><p className="truncate text-sm font-semibold text-slate-900">{control.reference || 'Sans référence'}</p><span className={`h-2.5 w-2.5 shrink-0 rounded-full ${control.resultat === 'valide' ? 'bg-emerald-500' : control.resultat === 'deja_utilise' ? 'bg-amber-500' : 'bg-red-500'}`} /></div><p className="mt-1 truncate text-xs text-slate-500">{control.message}</p><p className="mt-2 text-[11px] text-slate-400">{displayDateTime(control.created_at)}</p></div>)}{historyData.controles.length === 0 && <div className="py-10 text-center text-sm text-slate-500">Aucun contrôle aujourd’hui.</div>}{historyData.next_cursor && <button type="button" disabled={loadingMore} onClick={() => void loadMoreHistory()} className="w-full rounded-2xl border border-slate-200 px-4 py-2.5 text-sm font-semibold text-slate-700 hover:bg-slate-50 disabled:opacity-50">{loadingMore ? 'Chargement…' : 'Voir les contrôles précédents'}</button>}</div></section></div></GuichetPageShell>;
 };
 
 export const GuichetHistoryPage: React.FC = () => {
   const { refreshDashboard } = useGuichetPortal();
   const [filters, setFilters] = useState({ date_debut: todayIso(), date_fin: todayIso(), statut: '', mode_paiement: '', q: '' });
-  const [historyData, setHistoryData] = useState<GuichetSalesHistory>({ total_billets: 0, total_valides: 0, total_annules: 0, total_montant: 0, ventes: [] });
+  const [historyData, setHistoryData] = useState<GuichetSalesHistory>({ total_billets: 0, total_valides: 0, total_annules: 0, total_montant: 0, ventes: [], next_cursor: null });
   const [loading, setLoading] = useState(false);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState<string | null>(null);
-
-  const load = useCallback(async () => { setLoading(true); setError(null); try { setHistoryData(await apiService.historiqueVentesGuichet(filters)); } catch (loadError: any) { setError(loadError?.message || 'Impossible de charger l’historique.'); } finally { setLoading(false); } }, [filters]);
+  // Filtres de la dernière recherche : le curseur ne vaut que pour eux.
+  const appliedFilters = useRef(filters);
+
+  const load = useCallback(async () => { setLoading(true); setError(null); try { appliedFilters.current = filters; setHistoryData(await apiService.historiqueVentesGuichet(filters)); } catch (loadError: any) { setError(loadError?.message || 'Impossible de charger l’historique.'); } finally { setLoading(false); } }, [filters]);
+  const loadMore = async () => {
+    if (!historyData.next_cursor) return;
+    setLoadingMore(true);
+    try { const page = await apiService.historiqueVentesGuichet({ ...appliedFilters.current, cursor: historyData.next_cursor }); setHistoryData((current) => ({ ...current, ventes: [...current.ventes, ...page.ventes], next_cursor: page.next_cursor })); }
+    catch (loadError: any) { setError(loadError?.message || 'Impossible de charger les ventes suivantes.'); }
+    finally { setLoadingMore(false); }
+  };
   useEffect(() => { void load(); }, []); // Chargement initial, les filtres suivants sont appliqués par le bouton.
   const cancel = async (sale: GuichetSale) => { if (!window.confirm(`Annuler la vente ${sale.reference_vente} ? Le siège sera libéré.`)) return; try { await apiService.annulerVenteGuichet(sale.reference_vente); await Promise.all([load(), refreshDashboard()]); } catch (cancelError: any) { setError(cancelError?.message || 'Impossible d’annuler cette vente.'); } };
 
-  return <GuichetPageShell eyebrow="Caisse" title="Historique des ventes" description="Recherchez vos opérations, contrôlez les montants encaissés et annulez les billets encore éligibles."><ErrorMessage message={error} /><section className="grid gap-4 md:grid-cols-3"><MetricCard icon={<Ticket className="h-5 w-5" />} label="Ventes" value={historyData.total_billets} note={`${historyData.total_valides} valide(s)`} tone="blue" /><MetricCard icon={<WalletCards className="h-5 w-5" />} label="Montant encaissé" value={money(historyData.total_montant)} note="Hors ventes annulées" tone="emerald" /><MetricCard icon={<XCircle className="h-5 w-5" />} label="Annulations" value={historyData.total_annules} note="Sur la période" tone="amber" /></section><form onSubmit={(event) => { event.preventDefault(); void load(); }} className="rounded-3xl border border-slate-200 bg-white p-5 shadow-sm"><div className="grid gap-4 md:grid-cols-2 xl:grid-cols-5"><FilterField label="Du"><GuichetDateInput compact value={filters.date_debut} onChange={(event) => setFilters((current) => ({ ...current, date_debut: event.target.value }))} /></FilterField><FilterField label="Au"><GuichetDateInput compact value={filters.date_fin} onChange={(event) => setFilters((current) => ({ ...current, date_fin: event.target.value }))} /></FilterField><FilterField label="Statut"><GuichetSelect compact value={filters.statut} onChange={(event) => setFilters((current) => ({ ...current, statut: event.target.value }))}><option value="">Tous</option><option value="valide">Valide</option><option value="utilise">Utilisé</option><option value="annule">Annulé</option></GuichetSelect></FilterField><FilterField label="Paiement"><GuichetSelect compact value={filters.mode_paiement} onChange={(event) => setFilters((current) => ({ ...current, mode_paiement: event.target.value }))}><option value="">Tous</option><option value="cash">Espèces</option><option value="flooz">Flooz</option><option value="tmoney">T-Money</option></GuichetSelect></FilterField><FilterField label="Recherche"><div className="flex gap-2"><input value={filters.q} onChange={(event) => setFilters((current) => ({ ...current, q: event.target.value }))} placeholder="Référence ou client" className={`${filterInput} min-w-0`} /><button type="submit" className="rounded-xl bg-blue-600 p-3 text-white hover:bg-blue-700" aria-label="Rechercher">{loading ? <Loader2 className="h-4 w-4 animate-spin" /> : <Search className="h-4 w-4" />}</button></div></FilterField></div></form><section className="overflow-x-auto rounded-3xl border border-slate-200 bg-white shadow-sm"><SalesTable sales={historyData.ventes} empty="Aucune vente pour ces filtres." onCancel={cancel} /></section></GuichetPageShell>;
+  return <GuichetPageShell eyebrow="Caisse" title="Historique des ventes" description="Recherchez vos opérations, contrôlez les montants encaissés et annulez les billets encore éligibles."><ErrorMessage message={error} /><section className="grid gap-4 md:grid-cols-3"><MetricCard icon={<Ticket className="h-5 w-5" />} label="Ventes" value={historyData.total_billets} note={`${historyData.total_valides} valide(s)`} tone="blue" /><MetricCard icon={<WalletCards className="h-5 w-5" />} label="Montant encaissé" value={money(historyData.total_montant)} note="Hors ventes annulées" tone="emerald" /><MetricCard icon={<XCircle className="h-5 w-5" />} label="Annulations" value={historyData.total_annules} note="Sur la période" tone="amber" /></section><form onSubmit={(event) => { event.preventDefault(); void load(); }} className="rounded-3xl border border-slate-200 bg-white p-5 shadow-sm"><div className="grid gap-4 md:grid-cols-2 xl:grid-cols-5"><FilterField label="Du"><GuichetDateInput compact value={filters.date_debut} onChange={(event) => setFilters((current) => ({ ...current, date_debut: event.target.value }))} /></FilterField><FilterField label="Au"><GuichetDateInput compact value={filters.date_fin} onChange={(event) => setFilters((current) => ({ ...current, date_fin: event.target.value }))} /></FilterField><FilterField label="Statut"><GuichetSelect compact value={filters.statut} onChange={(event) => setFilters((current) => ({ ...current, statut: event.target.value }))}><option value="">Tous</option><option value="valide">Valide</option><option value="utilise">Utilisé</option><option value="annule">Annulé</option></GuichetSelect></FilterField><FilterField label="Paiement"><GuichetSelect compact value={filters.mode_paiement} onChange={(event) => setFilters((current) => ({ ...current, mode_paiement: event.target.value }))}><option value="">Tous</option><option value="cash">Espèces</option><option value="flooz">Flooz</option><option value="tmoney">T-Money</option></GuichetSelect></FilterField><FilterField label="Recherche"><div className="flex gap-2"><input value={filters.q} onChange={(event) => setFilters((current) => ({ ...current, q: event.target.value }))} placeholder="Référence ou client" className={`${filterInput} min-w-0`} /><button type="submit" className="rounded-xl bg-blue-600 p-3 text-white hover:bg-blue-700" aria-label="Rechercher">{loading ? <Loader2 className="h-4 w-4 animate-spin" /> : <Search className="h-4 w-4" />}</button></div></FilterField></div></form><section className="overflow-x-auto rounded-3xl border border-slate-200 bg-white shadow-sm"><SalesTable sales={historyData.ventes} empty="Aucune vente pour ces filtres." onCancel={cancel} /></section>{historyData.next_cursor && <div className="flex justify-center"><button type="button" disabled={loadingMore} onClick={() => void loadMore()} className="inline-flex items-center gap-2 rounded-2xl border border-slate-200 bg-white px-5 py-2.5 text-sm font-semibold text-slate-700 hover:bg-slate-50 disabled:opacity-50">{loadingMore && <Loader2 className="h-4 w-4 animate-spin" />}Charger plus de ventes</button></div>}</GuichetPageShell>;
 };
 
 const MetricCard: React.FC<{ icon: React.ReactNode; label: string; value: React.ReactNode; note: string; tone: 'blue' | 'emerald' | 'amber' }> = ({ icon, label, value, note, tone }) => {
@@ -114,6 +114,9 @@ export interface InitiateQosPaymentPayload {
 export interface InitiateQosPaymentResponse {
   reference_evex: string;
   transaction_id: string;
+  statut: 'en_attente' | 'echoue';
+  statut_url: string;
+  flux_url: string;
   montant_billet: number;
   frais_evex: number;
   montant_total: number;
@@ -130,9 +133,27 @@ export interface VerifyQosPaymentResponse {
   montant_billet: number;
   siege: string;
   paye: boolean;
+  termine?: boolean;
+  initiation?: 'pending' | 'running' | 'done' | 'failed' | null;
+  erreur?: string | null;
   message: string;
 }
 
+export interface QosOperatorHealth {
+  operateur: 'MOOV' | 'TOGOCEL';
+  nom: string;
+  code_reservation: 'FLOOZ' | 'TMONEY';
+  code_paiement: 'moov' | 'togocel';
+  etat: 'ok' | 'degrade' | 'indisponible';
+  disjoncteur: 'ferme' | 'ouvert' | 'semi_ouvert';
+  disponible: boolean;
+  appels: number;
+  taux_erreur: number;
+  latence_ms: number | null;
+  reessayer_dans: number;
+  alternative: 'MOOV' | 'TOGOCEL' | null;
+}
+
 export interface DashboardStats {
   total_bookings: number;
   bookings_this_week: number;
@@ -178,6 +199,38 @@ export interface CompanyStats {
   recent_guichet_sales: any[];
 }
 
+export interface FleetVehicle {
+  scheduled_trip_id: ApiId;
+  date: string;
+  company_id: ApiId;
+  company_name: string;
+  departure_city: string;
+  arrival_city: string;
+  departure_time: string;
+  status: 'live' | 'offline' | 'stopped' | 'not_started';
+  is_stale: boolean;
+  current_position: {
+    latitude: number;
+    longitude: number;
+    accuracy_m: number | null;
+    speed_kmh: number;
+    heading: number | null;
+    recorded_at: string;
+  } | null;
+  estimated_arrival_at: string | null;
+  eta_minutes: number | null;
+  delay_minutes: number;
+  distance_remaining_km: number | null;
+  next_stop: {
+    id: string;
+    station_name: string;
+    city_name: string;
+    latitude: number | null;
+    longitude: number | null;
+  } | null;
+  updated_at: string | null;
+}
+
 export interface PlatformAdminUser {
   id: ApiId;
   email: string;
@@ -529,6 +582,8 @@ export interface GuichetDashboardData {
     montant_collecte: number;
     voyages_actifs: number;
     paiements: Record<string, { billets: number; montant: number }>;
+    controles: number;
+    controles_valides: number;
   };
   voyages_du_jour: GuichetTrip[];
   ventes_recentes: GuichetSale[];
@@ -545,6 +600,7 @@ export interface GuichetSeatMap {
 export interface GuichetSaleReceipt {
   reference_vente: string;
   qr_code_data: Record<string, unknown>;
+  qr_token: string;
   qr_code_base64: string;
   client_nom: string;
   client_telephone: string;
@@ -559,12 +615,19 @@ export interface GuichetSaleReceipt {
   created_at: string;
 }
 
+export interface GuichetSaleBatch {
+  nombre_billets: number;
+  montant_total: number;
+  billets: GuichetSaleReceipt[];
+}
+
 export interface GuichetSalesHistory {
   total_billets: number;
   total_valides: number;
   total_annules: number;
   total_montant: number;
   ventes: GuichetSale[];
+  next_cursor: string | null;
 }
 
 export interface GuichetScanResult {
@@ -577,12 +640,18 @@ export interface GuichetScanResult {
   numero_siege: number | null;
 }
 
+export interface TicketPage<T> {
+  tickets: T[];
+  next_cursor: string | null;
+}
+
 export interface GuichetControlsHistory {
   total: number;
   valides: number;
   invalides: number;
   deja_utilises: number;
   controles: GuichetControl[];
+  next_cursor: string | null;
 }
 
 export interface TripSearchParams {
@@ -984,6 +1053,11 @@ class ApiService {
     };
   }
 
+  async getQosOperatorsHealth(): Promise<QosOperatorHealth[]> {
+    const response = await this.request<{ operateurs: QosOperatorHealth[] }>('/payment/operateurs/');
+    return response.operateurs;
+  }
+
   async verifyQosPayment(reference: string): Promise<VerifyQosPaymentResponse> {
     const response = await this.request<any>('/payments/status/', {
       method: 'POST',
@@ -1058,6 +1132,12 @@ class ApiService {
     return this.request<DashboardStats>('/dashboard/stats/');
   }
 
+  // Carte de flotte : suivis GPS actifs de la compagnie (ou de la plateforme)
+  async getFleetTracking(): Promise<FleetVehicle[]> {
+    const response = await this.request<{ generated_at: string; vehicles: FleetVehicle[] }>('/tracking/fleet/');
+    return response.vehicles;
+  }
+
   // Administration générale de la plateforme
   async getPlatformAdminDashboard(): Promise<PlatformAdminDashboard> {
     return this.request<PlatformAdminDashboard>('/platform-admin/dashboard/');
@@ -1122,10 +1202,10 @@ class ApiService {
     return this.request<PlatformAdminVoyage>(`/platform-admin/voyages/${id}/status/`, { method: 'PATCH', body: JSON.stringify({ is_active: isActive, reason }) });
   }
 
-  async getPlatformAdminTickets(filters?: { q?: string; source?: string; status?: string; company?: string; date?: string }): Promise<PlatformAdminTicket[]> {
+  async getPlatformAdminTickets(filters?: { q?: string; source?: string; status?: string; company?: string; date?: string; cursor?: string }): Promise<TicketPage<PlatformAdminTicket>> {
     const params = new URLSearchParams();
     Object.entries(filters || {}).forEach(([key, value]) => { if (value) params.set(key, value); });
-    return this.request<PlatformAdminTicket[]>(`/platform-admin/tickets/${params.size ? `?${params}` : ''}`);
+    return this.request<TicketPage<PlatformAdminTicket>>(`/platform-admin/tickets/${params.size ? `?${params}` : ''}`);
   }
 
   async getPlatformAdminFinance(): Promise<PlatformAdminFinance> {
@@ -1185,6 +1265,16 @@ class ApiService {
     return this.request<GuichetSaleReceipt>('/guichet/ventes/creer/', { method: 'POST', body: JSON.stringify(payload) });
   }
 
+  async creerVentesLotGuichet(payload: {
+    voyage_id: string;
+    mode_paiement: 'cash' | 'flooz' | 'tmoney';
+    client_nom: string;
+    client_telephone: string;
+    passagers: Array<{ numero_siege?: number; client_nom?: string; client_telephone?: string }>;
+  }): Promise<GuichetSaleBatch> {
+    return this.request<GuichetSaleBatch>('/guichet/ventes/creer-lot/', { method: 'POST', body: JSON.stringify(payload) });
+  }
+
   async annulerVenteGuichet(ref: string): Promise<any> {
     return this.request<any>(`/guichet/ventes/${encodeURIComponent(ref)}/annuler/`, { method: 'DELETE' });
   }
@@ -1193,29 +1283,33 @@ class ApiService {
     return this.request<GuichetScanResult>('/guichet/controle/scanner/', { method: 'POST', body: JSON.stringify(payload) });
   }
 
-  async historiqueVentesGuichet(filters?: { date_debut?: string; date_fin?: string; statut?: string; mode_paiement?: string; q?: string }): Promise<GuichetSalesHistory> {
+  async historiqueVentesGuichet(filters?: { date_debut?: string; date_fin?: string; statut?: string; mode_paiement?: string; q?: string; cursor?: string; limit?: number }): Promise<GuichetSalesHistory> {
     const params = new URLSearchParams();
     if (filters?.date_debut) params.set('date_debut', filters.date_debut);
     if (filters?.date_fin) params.set('date_fin', filters.date_fin);
     if (filters?.statut) params.set('statut', filters.statut);
     if (filters?.mode_paiement) params.set('mode_paiement', filters.mode_paiement);
     if (filters?.q) params.set('q', filters.q);
+    if (filters?.cursor) params.set('cursor', filters.cursor);
+    if (filters?.limit) params.set('limit', String(filters.limit));
     const query = params.toString();
     return this.request<GuichetSalesHistory>(`/guichet/ventes/historique/${query ? `?${query}` : ''}`);
   }
 
-  async historiqueControlesGuichet(filters?: { date?: string; resultat?: string }): Promise<GuichetControlsHistory> {
+  async historiqueControlesGuichet(filters?: { date?: string; resultat?: string; cursor?: string; limit?: number }): Promise<GuichetControlsHistory> {
     const params = new URLSearchParams();
     if (filters?.date) params.set('date', filters.date);
     if (filters?.resultat) params.set('resultat', filters.resultat);
+    if (filters?.cursor) params.set('cursor', filters.cursor);
+    if (filters?.limit) params.set('limit', String(filters.limit));
     const query = params.toString();
     return this.request<GuichetControlsHistory>(`/guichet/controle/historique/${query ? `?${query}` : ''}`);
   }
 
-  async getCompanyTickets(filters?: { q?: string; source?: string; status?: string; date?: string; voyage?: string }): Promise<UnifiedTicket[]> {
+  async getCompanyTickets(filters?: { q?: string; source?: string; status?: string; date?: string; voyage?: string; cursor?: string }): Promise<TicketPage<UnifiedTicket>> {
     const params = new URLSearchParams();
     Object.entries(filters || {}).forEach(([key, value]) => { if (value) params.set(key, value); });
-    return this.request<UnifiedTicket[]>(`/guichet/billets/${params.size ? `?${params}` : ''}`);
+    return this.request<TicketPage<UnifiedTicket>>(`/guichet/billets/${params.size ? `?${params}` : ''}`);
   }
 
   async actionCompanyTicket(